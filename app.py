@@ -1,116 +1,291 @@
 ﻿# -*- coding: utf-8 -*-
-from flask import Flask, render_template, request, redirect, url_for
+from flask import Flask, Response, render_template, request, redirect, url_for, send_file, jsonify, g, has_app_context
+from werkzeug.local import LocalProxy
 import json
-import plotly.graph_objs as go
-import plotly.io as pio
+import click
+import numpy as np
 import os
+import runpy
+from importlib.util import find_spec
 from datetime import datetime
+from functools import wraps
 import math
+import hmac
+
+from berechnung import (
+    convertiere_monat_to_num, berechne_guv,
+    break_even_indizes,
+)
+from personalkosten import (
+    _ym_to_ordinal,
+)
+from datenspeicher import oeffne_speicher, safe_load_json
+from inkrementell import GuVStand
+from ausduennung import lttb, minmax
+from montecarlo import FAKTOREN, simuliere, verteilung_aus_text
+from sensitivitaet import baue_modell, groesste_gehaelter, raster, tornado
+from break_even import VARIABLEN, kumulierte_basis, loese
+from export import FORMATE, ExportNichtVerfuegbar, csv_stream, exportiere_datei
+from massenimport import lese_csv, lese_json, pruefe_und_berechne
+from kohorten import lese_kohorte, vergleiche, zusammenfassung
+from figurcache import FigurCache
+from json_antwort import json_antwort, serialisiere
+from arbeitsbereiche import Arbeitsbereiche, PlanNichtGefunden
+from verdichtung import GROESSEN, Hierarchie, konsolidiere
+from tarife import Tariftabellen
+from auftraege import Auftragsverwaltung, export_auftrag, kennung, kohorten_auftrag, montecarlo_auftrag
+from messung import (
+    PROFILER, Metriken, ProfilerNichtVerfuegbar, anfrage_beginnen, anfrage_beenden, messpunkt,
+    profil_beenden, profil_starten, server_timing,
+)
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATEN_DATEI = os.path.join(BASE_DIR, "daten.json")
 PERSONAL_DATEI = os.path.join(BASE_DIR, "personal.json")
-
-print("starte")
+# Optional: Plan in einer SQLite-Datenbank statt in den JSON-Dateien halten
+DATENBANK_DATEI = os.environ.get("FINANZPLAN_DB")
+# Optional: Plan als Änderungsjournal mit Historie (Verzeichnis, siehe speicher_journal.py)
+JOURNAL_VERZEICHNIS = os.environ.get("FINANZPLAN_JOURNAL")
+# Weitere Pläne (je Unterverzeichnis), wählbar über /plan/<name>/... oder den Header X-Finanzplan-Plan
+PLAENE_VERZEICHNIS = os.environ.get("FINANZPLAN_PLAENE", os.path.join(BASE_DIR, "plaene"))
+PLAN_HEADER = "X-Finanzplan-Plan"
+# Zuordnung Kostenstelle -> Standort -> Gruppe für /api/v1/verdichtung
+KOSTENSTELLEN_DATEI = os.environ.get("FINANZPLAN_KOSTENSTELLEN", os.path.join(BASE_DIR, "kostenstellen.json"))
+# Entgelttabellen für Tarifverträge (ohne Datei: nur feste Gehälter)
+TARIF_DATEI = os.environ.get("FINANZPLAN_TARIFE", os.path.join(BASE_DIR, "tarife.json"))
+# Hintergrundaufträge: Status und Ergebnis-Cache (Dateien), Größe des Caches, Pool-Prozesse
+AUFTRAGS_VERZEICHNIS = os.environ.get("FINANZPLAN_AUFTRAEGE", os.path.join(BASE_DIR, "auftraege"))
+AUFTRAGS_CACHE_MB = int(os.environ.get("FINANZPLAN_AUFTRAEGE_MB", 512))
+AUFTRAGS_PROZESSE = int(os.environ.get("FINANZPLAN_AUFTRAG_PROZESSE", 2))
+# Lange Zeiträume: ab DIAGRAMM_SVG_MAX Monaten WebGL mit Datumsachse, ab DIAGRAMM_PUNKTE ausgedünnt
+DIAGRAMM_SVG_MAX = int(os.environ.get("FINANZPLAN_DIAGRAMM_SVG_MAX", 240))
+DIAGRAMM_PUNKTE = int(os.environ.get("FINANZPLAN_DIAGRAMM_PUNKTE", 1000))
+# Profiling einzelner Anfragen (?profil=cprofile|pyinstrument&token=...) nur mit gesetztem Token
+PROFIL_TOKEN = os.environ.get("FINANZPLAN_PROFIL_TOKEN")
+
+# plotly.js wird einmal als statische Datei aus der lokalen Installation ausgeliefert.
+# Plotly selbst wird erst in den Diagramm-Routen importiert (plotly.offline zieht u. a.
+# IPython nach); Pfad und Version lesen wir deshalb ohne Import des Pakets.
+PLOTLY_VERZEICHNIS = find_spec("plotly").submodule_search_locations[0]
+PLOTLY_JS_DATEI = os.path.join(PLOTLY_VERZEICHNIS, "package_data", "plotly.min.js")
+PLOTLY_JS_VERSION = runpy.run_path(
+    os.path.join(PLOTLY_VERZEICHNIS, "offline", "_plotlyjs_version.py"))["__plotlyjs_version__"]
+
+tarife = Tariftabellen.laden(TARIF_DATEI)
+
+arbeitsbereiche = Arbeitsbereiche(
+    PLAENE_VERZEICHNIS,
+    standard=oeffne_speicher(DATEN_DATEI, PERSONAL_DATEI, DATENBANK_DATEI, tarife, JOURNAL_VERZEICHNIS),
+    max_offen=int(os.environ.get("FINANZPLAN_PLAENE_OFFEN", 32)),
+    bei_schliessen=lambda name: figur_cache.bereich_leeren(name),
+)
+
+hierarchie = Hierarchie.laden(KOSTENSTELLEN_DATEI)
+
+auftragsverwaltung = Auftragsverwaltung(AUFTRAGS_VERZEICHNIS, max_bytes=AUFTRAGS_CACHE_MB * 1024 * 1024,
+                                        prozesse=AUFTRAGS_PROZESSE)
+
+def aktueller_plan():
+    """Name des Plans der laufenden Anfrage bzw. des CLI-Aufrufs (None = Standardplan)."""
+    return g.get("plan") if has_app_context() else None
+
+def waehle_plan(name):
+    """Setzt den Plan für die laufende Anfrage; PlanNichtGefunden, wenn es ihn nicht gibt."""
+    g.plan_speicher = arbeitsbereiche.hole(name)
+    g.plan = name
+
+def _plan_speicher():
+    if has_app_context() and "plan_speicher" in g:
+        return g.plan_speicher
+    return arbeitsbereiche.standard
+
+# Speicher des aktuellen Plans
+speicher = LocalProxy(_plan_speicher)
 
 # ---------- Hilfsfunktionen ----------
-def convertiere_monat_to_num(monatsname):
-    monate = {
-        "januar": 1, "februar": 2, "märz": 3, "april": 4,
-        "mai": 5, "juni": 6, "juli": 7, "august": 8,
-        "september": 9, "oktober": 10, "november": 11, "dezember": 12
-    }
-    return monate.get(monatsname.strip().lower(), 0)
+def berechne_monatsdaten(jahr_auswahl):
+    """
+    Spalten, Personalkosten und GuV für 'alle' Jahre oder ein einzelnes Jahr.
+    Alles stammt aus dem nachgeführten GuV-Stand des Speichers und darf nicht verändert werden.
+    """
+    jahr = None if jahr_auswahl == "alle" else int(jahr_auswahl)
+    return speicher.stand().auswahl(jahr)
 
-def safe_load_json(path, default):
-    if not os.path.exists(path):
-        return default
-    try:
-        with open(path, "r") as f:
-            return json.load(f)
-    except json.JSONDecodeError:
-        return default
+def speichere_monatsdaten(monat, jahr, revenue, costs, profit, extra=None, personnel_included=False):
+    speicher.setze_monat(
+        monat, jahr,
+        werte={
+            "revenue": revenue,
+            "costs": costs,
+            "profit": profit,
+            "personnel_included": bool(personnel_included),
+        },
+        components=extra,
+    )
+
+def importiere_monate(zeilen, zeilen_versatz, trocken=False, teilweise=False):
+    """
+    Prüft und berechnet alle Zeilen eines Massenimports und schreibt sie in einem Vorgang.
+    Ohne `teilweise` wird bei einem Fehler nichts geschrieben. Rückgabe: (Ergebnis, geschrieben).
+    """
+    ergebnis = pruefe_und_berechne(zeilen, speicher.zeitachse(), zeilen_versatz, speicher.kostenstelle)
+    schreiben = ergebnis.eintraege and not trocken and (teilweise or not ergebnis.fehler)
+    if schreiben:
+        speicher.setze_monate(ergebnis.eintraege)
+    return ergebnis, bool(schreiben)
 
-# =====  Mitarbeiter =====
-def _ym_to_ordinal(monat:int, jahr:int) -> int:
-    """Wandelt (Monat, Jahr) in fortlaufenden Index (Jahre*12 + Monat) um."""
-    return int(jahr) * 12 + int(monat)
+# ---------- Flask ----------
+app = Flask(__name__)
 
-def mitarbeiter_aktiv_im(monat: int, jahr: int, m: dict) -> bool:
+class PlanPraefix:
     """
-    Aktiv, wenn (startmonat/startjahr) <= (monat/jahr) <= (endmonat/endjahr) (falls Enddatum gesetzt).
-    Rückwärtskompatibel: fehlen Jahresfelder, wird startjahr=1900, endjahr=None angenommen.
+    WSGI-Middleware: /plan/<name>/pfad wird als /pfad mit SCRIPT_NAME /plan/<name>
+    bearbeitet, so dass url_for() alle Links innerhalb des Plans erzeugt.
     """
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        pfad = environ.get("PATH_INFO", "")
+        if pfad.startswith("/plan/"):
+            name, _, rest = pfad[len("/plan/"):].partition("/")
+            environ["finanzplan.plan"] = name
+            environ["SCRIPT_NAME"] = environ.get("SCRIPT_NAME", "") + "/plan/" + name
+            environ["PATH_INFO"] = "/" + rest
+        return self.wsgi_app(environ, start_response)
+
+app.wsgi_app = PlanPraefix(app.wsgi_app)
+
+# --- Messung: Server-Timing, /metrics, Profiling ---
+metriken = Metriken()
+
+@app.before_request
+def messung_beginnen():
+    anfrage_beginnen()
+    art = request.args.get("profil")
+    if art is None or not PROFIL_TOKEN:
+        return None
+    token = request.args.get("token") or request.headers.get("X-Finanzplan-Token") or ""
+    if not hmac.compare_digest(token.encode(), PROFIL_TOKEN.encode()):
+        return "Fehler: Profiling nur mit gültigem Token.", 403
+    art = art if art in PROFILER else "cprofile"
     try:
-        startmonat = m.get("startmonat")
-        if not startmonat or not isinstance(startmonat, int):
-            return False
-        if not (1 <= startmonat <= 12): 
-            return False
-            
-        startjahr = m.get("startjahr")
-        startjahr = int(startjahr) if startjahr not in (None, "",) else 1900
-
-        endmonat = m.get("endmonat")
-        endmonat = int(endmonat) if (endmonat not in (None, "",)) else None
-        endjahr  = m.get("endjahr")
-        endjahr  = int(endjahr) if (endjahr not in (None, "",)) else None
-
-        cur = _ym_to_ordinal(monat, jahr)
-        start = _ym_to_ordinal(startmonat, startjahr)
-
-        if endmonat is not None and endjahr is not None:
-            end = _ym_to_ordinal(endmonat, endjahr)
-            return start <= cur <= end
-        else:
-            return start <= cur
-    except Exception:
-        return False
+        g.profiler = (profil_starten(art), art)
+    except ProfilerNichtVerfuegbar as e:
+        return f"Fehler: {e}", 501
+    return None
+
+@app.after_request
+def messung_beenden(antwort):
+    if "messung_start" not in g:
+        return antwort
+    profiler = g.pop("profiler", None)
+    if profiler is not None:
+        inhalt, content_type = profil_beenden(*profiler)
+        antwort = app.response_class(inhalt, content_type=content_type)
+    gesamt, phasen = anfrage_beenden()
+    antwort.headers["Server-Timing"] = server_timing(gesamt, phasen, antwort.headers.get("X-Cache"))
+    metriken.anfrage(request.endpoint or "unbekannt", request.method, antwort.status_code, gesamt, phasen)
+    return antwort
+
+@app.before_request
+def plan_waehlen():
+    name = request.environ.get("finanzplan.plan") or request.headers.get(PLAN_HEADER)
+    if not name:
+        return None
+    try:
+        waehle_plan(name)
+    except PlanNichtGefunden as e:
+        return f"Fehler: {e}", 404
+    return None
 
-def berechne_personalkosten(monat_nummer: int, jahr: int, personal_liste: list) -> float:
-    return sum(float(m.get("gehalt", 0.0)) for m in personal_liste if mitarbeiter_aktiv_im(monat_nummer, jahr, m))
+@app.context_processor
+def plotly_js_einbinden():
+    return {"plotly_js_url": url_for("plotly_js", version=PLOTLY_JS_VERSION), "plan_name": aktueller_plan()}
 
-def speichere_monatsdaten(monat, jahr, revenue, costs, profit, extra=None, personnel_included=False):
-    daten = safe_load_json(DATEN_DATEI, [])
+def figur_html(fig) -> str:
+    """Diagramm-Fragment ohne eingebettetes plotly.js (wird in base.html referenziert)."""
+    import plotly.io as pio
+    return pio.to_html(fig, full_html=False, include_plotlyjs=False)
 
-    def _merge_extra(e, extra_dict):
-        if not extra_dict:
-            return
-        e["components"] = {
-            "units": extra_dict.get("units"),
-            "price": extra_dict.get("price"),
-            "fixed_costs": extra_dict.get("fixed_costs"),
-            "variable_costs": extra_dict.get("variable_costs"),
-        }
+def webgl_darstellung(spalten) -> bool:
+    """
+    Lange Zeiträume als Scattergl mit Datumsachse statt SVG mit einer Kategorie je Monat;
+    ?darstellung=svg|webgl erzwingt eine Variante (unbekannte Monatsnamen: immer SVG).
+    """
+    wahl = request.args.get("darstellung")
+    webgl = wahl == "webgl" if wahl in ("svg", "webgl") else len(spalten) > DIAGRAMM_SVG_MAX
+    return webgl and spalten.datum() is not None
 
-    ersetzt = False
-    for eintrag in daten:
-        if eintrag["monat"].lower() == monat.lower() and int(eintrag.get("jahr", 0)) == int(jahr):
-            eintrag["revenue"] = revenue
-            eintrag["costs"]   = costs
-            eintrag["profit"]  = profit
-            eintrag["personnel_included"] = bool(personnel_included)
-            _merge_extra(eintrag, extra)
-            ersetzt = True
-            break
-
-    if not ersetzt:
-        neu = {
-            "monat": monat,
-            "jahr": int(jahr),
-            "revenue": revenue,
-            "costs": costs,
-            "profit": profit,
-            "personnel_included": bool(personnel_included)
-        }
-        _merge_extra(neu, extra)
-        daten.append(neu)
+def linie(x, y, glatt=False, behalten=()) -> dict:
+    """
+    x/y einer Linie der WebGL-Darstellung, oberhalb von DIAGRAMM_PUNKTE ausgedünnt:
+    glatte Reihen per LTTB, schwankende per Min/Max; `behalten` (Break-Even) bleibt exakt.
+    """
+    y = np.asarray(y)
+    if len(y) <= DIAGRAMM_PUNKTE:
+        return dict(x=x, y=y)
+    if glatt:
+        idx = lttb(x.astype(np.int64), y, DIAGRAMM_PUNKTE, behalten)
+    else:
+        idx = minmax(y, DIAGRAMM_PUNKTE, behalten)
+    return dict(x=x[idx], y=y[idx])
 
-    with open(DATEN_DATEI, "w") as f:
-        json.dump(daten, f, indent=2)
+def datumsachse(fig):
+    fig.update_xaxes(type="date", tickformat="%Y", hoverformat="%m/%Y")
 
-# ---------- Flask ----------
-app = Flask(__name__)
+def figur_json_gewuenscht() -> bool:
+    """?format=json liefert statt der Seite nur die Figur für clientseitiges Rendern."""
+    return request.args.get("format") == "json"
+
+def figur_json_antwort(fig):
+    import plotly.io as pio
+    return app.response_class(pio.to_json(fig, validate=False), mimetype="application/json")
+
+# Gerenderte Diagramm-Seiten/-JSON je (Datenstand, Route, Query); leer bei jeder Datenänderung
+figur_cache = FigurCache(
+    max_eintraege=int(os.environ.get("FINANZPLAN_FIGUR_CACHE", 128)),
+    max_bytes=int(os.environ.get("FINANZPLAN_FIGUR_CACHE_MB", 64)) * 1024 * 1024,
+)
+
+def figur_gecacht(ansicht):
+    """
+    GET-Antworten der Ansicht werden je Datenstand, Query-Parametern und script_root
+    zwischengespeichert und mit ETag ausgeliefert; If-None-Match ergibt 304 ohne erneutes Rendern.
+    """
+    @wraps(ansicht)
+    def wrapper(*args, **kwargs):
+        if request.method != "GET":
+            return ansicht(*args, **kwargs)
+        version = speicher.version
+        # Die Seiten enthalten Links mit script_root (/plan/<name> bzw. leer bei Auswahl per Header)
+        schluessel = (request.script_root, request.endpoint, tuple(sorted(request.args.items(multi=True))))
+        eintrag = figur_cache.hole(version, schluessel, aktueller_plan())
+        status = "HIT"
+        if eintrag is None:
+            antwort = app.make_response(ansicht(*args, **kwargs))
+            if antwort.status_code != 200 or antwort.is_streamed:
+                return antwort
+            eintrag = figur_cache.ablegen(version, schluessel, antwort.get_data(), antwort.content_type,
+                                          aktueller_plan())
+            status = "MISS"
+        antwort = app.response_class(eintrag.inhalt, content_type=eintrag.content_type)
+        antwort.set_etag(eintrag.etag)
+        antwort.cache_control.no_cache = True
+        antwort.headers["X-Cache"] = status
+        return antwort.make_conditional(request)
+    return wrapper
+
+# --- plotly.js (versioniert, dauerhaft cachebar) ---
+@app.route("/plotly-<version>.min.js")
+def plotly_js(version):
+    if version != PLOTLY_JS_VERSION:
+        return redirect(url_for("plotly_js", version=PLOTLY_JS_VERSION))
+    response = send_file(PLOTLY_JS_DATEI, mimetype="text/javascript",
+                         conditional=True, etag=True, max_age=365 * 24 * 3600)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 # --- Start ---
 @app.route("/")
@@ -123,17 +298,18 @@ def bearbeiten():
     monat = request.args.get("monat")
     jahr = request.args.get("jahr", type=int)
 
-    daten = safe_load_json(DATEN_DATEI, [])
-    eintrag = next((e for e in daten if e["monat"].lower() == str(monat).lower() and int(e.get("jahr", 0)) == int(jahr)), None)
+    eintrag = speicher.finde_monat(str(monat), jahr)
     if not eintrag:
         return "Eintrag nicht gefunden.", 404
 
     if request.method == "POST":
-        eintrag["revenue"] = float(request.form["revenue"])
-        eintrag["costs"] = float(request.form["costs"])
-        eintrag["profit"] = float(request.form["profit"])
-        with open(DATEN_DATEI, "w") as f:
-            json.dump(daten, f, indent=2)
+        werte = {
+            "revenue": float(request.form["revenue"]),
+            "costs": float(request.form["costs"]),
+            "profit": float(request.form["profit"]),
+        }
+        if not speicher.aendere_monat(str(monat), jahr, werte):
+            return "Eintrag nicht gefunden.", 404
         return redirect(url_for("monatsdaten"))
 
     return render_template("bearbeiten.html", eintrag=eintrag)
@@ -141,61 +317,21 @@ def bearbeiten():
 # --- monatsdaten  ---
 @app.route("/monatsdaten")
 def monatsdaten():
-    daten = safe_load_json(DATEN_DATEI, [])
-    personal = safe_load_json(PERSONAL_DATEI, [])
-
     # Jahre sammeln
-    jahre = sorted(list({int(d.get("jahr", 0)) for d in daten if "jahr" in d}))
-    if not jahre:
-        jahre = [datetime.now().year]
+    jahre = speicher.jahre()
 
     # Jahr-Auswahl
     jahr_auswahl = request.args.get("jahr", "alle")
 
-    # Filtern nach Jahr
-    if jahr_auswahl == "alle":
-        daten_gefiltert = daten
-    else:
-        jahr_auswahl_int = int(jahr_auswahl)
-        daten_gefiltert = [d for d in daten if int(d.get("jahr", 0)) == jahr_auswahl_int]
-
-    daten_berechnet = []
-    for d in daten_gefiltert:
-        monat = d.get("monat")
-        jahr  = int(d.get("jahr", 0))
-        mnum  = convertiere_monat_to_num(monat)
-
-        comps = d.get("components") or {}
-        units = comps.get("units")
-        price = comps.get("price")
-        fixed_costs = comps.get("fixed_costs")
-        variable_costs = comps.get("variable_costs")
-
-        pers = berechne_personalkosten(mnum, jahr, personal)
-
-        if None not in (units, price, fixed_costs, variable_costs):
-            revenue_calc = float(units) * float(price)
-            costs_calc   = float(fixed_costs) + float(variable_costs) * float(units) + float(pers)
-            profit_calc  = revenue_calc - costs_calc
-        else:
-            revenue_calc = float(d.get("revenue", 0.0))
-            costs_stored = float(d.get("costs", 0.0))
-            if not d.get("personnel_included", False):
-                costs_stored += float(pers)
-            costs_calc  = costs_stored
-            profit_calc = revenue_calc - costs_calc
-
-        daten_berechnet.append({
-            "monat": monat,
-            "jahr": jahr,
-            "revenue_calc": round(revenue_calc, 2),
-            "costs_calc": round(costs_calc, 2),
-            "profit_calc": round(profit_calc, 2),
-        })
+    spalten, pers, guv = berechne_monatsdaten(jahr_auswahl)
+
+    daten_berechnet = [
+        {"monat": monat, "jahr": jahr, "revenue_calc": rev, "costs_calc": cost, "profit_calc": prof}
+        for monat, jahr, rev, cost, prof in zip(
+            spalten.monat, spalten.jahr.tolist(),
+            np.round(guv.revenue, 2).tolist(), np.round(guv.costs, 2).tolist(), np.round(guv.profit, 2).tolist())
+    ]
 
-    # Sortierung nach Jahr und Monat
-    daten_berechnet.sort(key=lambda x: (x["jahr"], convertiere_monat_to_num(x["monat"])))
-    
     return render_template("monatsdaten.html", 
                          daten=daten_berechnet,
                          jahre=jahre,
@@ -204,11 +340,7 @@ def monatsdaten():
 # --- personal ---
 @app.route("/personal", methods=["GET", "POST"], endpoint="personal")
 def personal_view():
-    if not os.path.exists(PERSONAL_DATEI):
-        with open(PERSONAL_DATEI, "w") as f:
-            json.dump([], f)
-
-    mitarbeiter = safe_load_json(PERSONAL_DATEI, [])
+    mitarbeiter = speicher.personal()
 
     if request.method == "POST":
         try:
@@ -218,9 +350,24 @@ def personal_view():
             startjahr_raw  = (request.form.get("startjahr") or "").strip()
             endmonat_raw   = (request.form.get("endmonat") or "").strip()
             endjahr_raw    = (request.form.get("endjahr") or "").strip()
+            tarifgruppe_raw = (request.form.get("tarifgruppe") or "").strip()
+            stufe_raw      = (request.form.get("stufe") or "").strip()
 
             if not rolle:
                 return "Fehler: 'Rolle' darf nicht leer sein.", 400
+            tarif = entgeltgruppe = None
+            stufe = 1
+            if tarifgruppe_raw:
+                tarif, _, entgeltgruppe = tarifgruppe_raw.partition("|")
+                stufe = int(stufe_raw) if stufe_raw != "" else 1
+                stufen = {(t, gr): n for t, gr, n in (tarife.gruppen() if tarife is not None else [])}
+                if (tarif, entgeltgruppe) not in stufen:
+                    return "Fehler: Unbekannte Tarif-/Entgeltgruppe.", 400
+                if not (1 <= stufe <= stufen[(tarif, entgeltgruppe)]):
+                    return f"Fehler: Stufe muss zwischen 1 und {stufen[(tarif, entgeltgruppe)]} liegen.", 400
+                if gehalt_raw == "":
+                    # Gehalt nur als Anzeige und Rückfall ohne Tariftabellen
+                    gehalt_raw = str(tarife.entgelt(tarif, entgeltgruppe, stufe))
             if gehalt_raw == "":
                 return "Fehler: 'Monatsgehalt' darf nicht leer sein.", 400
             if startmonat_raw == "":
@@ -249,16 +396,17 @@ def personal_view():
                 if _ym_to_ordinal(endmonat, endjahr) < _ym_to_ordinal(startmonat, startjahr):
                     return "Fehler: Ende liegt vor dem Beginn.", 400
 
-            mitarbeiter.append({
+            neu = {
                 "rolle": rolle,
                 "gehalt": gehalt,
                 "startmonat": startmonat,
                 "startjahr": startjahr,
                 "endmonat": endmonat,
                 "endjahr": endjahr
-            })
-            with open(PERSONAL_DATEI, "w") as f:
-                json.dump(mitarbeiter, f, indent=2)
+            }
+            if tarif:
+                neu.update(tarif=tarif, entgeltgruppe=entgeltgruppe, stufe=stufe)
+            speicher.mitarbeiter_hinzufuegen(neu)
 
             return redirect(url_for("personal"))
 
@@ -269,16 +417,13 @@ def personal_view():
             traceback.print_exc()
             return f"Unerwarteter Fehler beim Speichern: {e}", 500
 
-    return render_template("personal.html", mitarbeiter=mitarbeiter)
+    return render_template("personal.html", mitarbeiter=mitarbeiter,
+                           tarifgruppen=tarife.gruppen() if tarife is not None else [])
 
 # --- personal/loeschen ---
 @app.route("/personal/loeschen/<int:index>", methods=["POST"])
 def personal_loeschen(index):
-    mitarbeiter = safe_load_json(PERSONAL_DATEI, [])
-    if 0 <= index < len(mitarbeiter):
-        del mitarbeiter[index]
-        with open(PERSONAL_DATEI, "w") as f:
-            json.dump(mitarbeiter, f, indent=2)
+    speicher.mitarbeiter_loeschen(index)
     return redirect(url_for("personal"))
 
 # --- calculate ---
@@ -296,8 +441,7 @@ def calculate():
         if monat_num == 0:
             return "Fehler: Ungültiger Monatsname."
 
-        personal = safe_load_json(PERSONAL_DATEI, [])
-        personalkosten = berechne_personalkosten(monat_num, jahr, personal)
+        personalkosten = speicher.zeitachse().kosten(monat_num, jahr)
 
         revenue = units * price
         costs_total = fixed_costs + (variable_costs * units) + personalkosten
@@ -325,105 +469,57 @@ def calculate():
 
 # --- diagramm ---
 @app.route("/diagramm")
+@figur_gecacht
 def diagramm():
-    daten = safe_load_json(DATEN_DATEI, [])
-    personal = safe_load_json(PERSONAL_DATEI, [])
-
-    jahre = sorted(list({int(d.get("jahr", 0)) for d in daten if "jahr" in d and isinstance(d.get("jahr"), int)}))
-    if not jahre:
-        jahre = [datetime.now().year]
+    jahre = speicher.jahre()
 
     jahr_auswahl = request.args.get("jahr", str(jahre[-1]))
 
-    if jahr_auswahl == "alle":
-        daten_jahr = daten
-    else:
-        jahr_auswahl_int = int(jahr_auswahl)
-        daten_jahr = [d for d in daten if int(d.get("jahr", 0)) == jahr_auswahl_int]
+    stand = speicher.stand()
+    messpunkt("laden")
+    jahr = None if jahr_auswahl == "alle" else int(jahr_auswahl)
+    spalten, pers, guv = stand.auswahl(jahr)
+    monate = spalten.labels(mit_jahr=(jahr is None))
 
-    if jahr_auswahl == "alle":
-        daten_sorted = sorted(
-            daten_jahr,
-            key=lambda d: (int(d.get("jahr", 0)), convertiere_monat_to_num(d["monat"]))
-        )
-    else:
-        monats_sortierung = ["Januar", "Februar", "März", "April", "Mai", "Juni",
-                             "Juli", "August", "September", "Oktober", "November", "Dezember"]
-        monats_sortierung_lower = [m.lower() for m in monats_sortierung]
-        daten_sorted = sorted(
-            daten_jahr,
-            key=lambda d: monats_sortierung_lower.index(d["monat"].strip().lower())
-            if d["monat"].strip().lower() in monats_sortierung_lower else 99
-        )
-
-    monate = [f"{d['monat']} {d['jahr']}" for d in daten_sorted] if jahr_auswahl == "alle" else [d["monat"] for d in daten_sorted]
-
-    revenues = []
-    costs_liste = []
-    profits = []
-    personalkosten_liste = []
-
-    for d in daten_sorted:
-        j = int(d.get("jahr", jahre[-1]))
-        mnum = convertiere_monat_to_num(d["monat"])
-
-        pers = berechne_personalkosten(mnum, j, personal)
-        personalkosten_liste.append(pers)
-
-        comps = d.get("components") or {}
-        units = comps.get("units")
-        price = comps.get("price")
-        fixed_costs = comps.get("fixed_costs")
-        variable_costs = comps.get("variable_costs")
-
-        if None not in (units, price, fixed_costs, variable_costs):
-            rev  = float(units) * float(price)
-            cost = float(fixed_costs) + float(variable_costs) * float(units) + float(pers)
-            prof = rev - cost
-            revenues.append(rev)
-            costs_liste.append(cost)
-            profits.append(prof)
-        else:
-            rev_stored   = float(d["revenue"])
-            cost_stored  = float(d["costs"])
-            incl_flag    = bool(d.get("personnel_included", False))
-            cost_effect  = cost_stored if incl_flag else (cost_stored + float(pers))
-            prof_effect  = rev_stored - cost_effect
-
-            revenues.append(rev_stored)
-            costs_liste.append(cost_effect)
-            profits.append(prof_effect)
-
-    kumulierte_gewinn = []
-    s = 0.0
-    break_even_monat = None
-    for i, p in enumerate(profits):
-        s += float(p)
-        kumulierte_gewinn.append(s)
-        if break_even_monat is None and s >= 0:
-            break_even_monat = monate[i] if i < len(monate) else None
+    kumulierte_gewinn, be_idx = stand.kumuliert_und_break_even(jahr)
+    break_even_monat = monate[be_idx] if be_idx is not None else None
+    messpunkt("berechnung")
 
+    import plotly.graph_objs as go
     fig = go.Figure()
-    fig.add_trace(go.Scatter(x=monate, y=revenues,            mode='lines+markers', name='Umsatz'))
-    fig.add_trace(go.Scatter(x=monate, y=costs_liste,         mode='lines+markers', name='Kosten'))
-    fig.add_trace(go.Scatter(x=monate, y=profits,             mode='lines+markers', name='Gewinn'))
-    fig.add_trace(go.Scatter(x=monate, y=personalkosten_liste,mode='lines+markers', name='Mitarbeiterkosten'))
-    fig.add_trace(go.Scatter(x=monate, y=kumulierte_gewinn,   mode='lines+markers', name='Kumul. Gewinn', line=dict(dash="dash")))
-
-    fig.update_xaxes(type="category", categoryorder="array", categoryarray=monate)
+    if webgl_darstellung(spalten):
+        # Lange Zeiträume: WebGL, Datumsachse, ausgedünnt; der Break-Even-Monat bleibt erhalten
+        x = spalten.datum()
+        behalten = (be_idx - 1, be_idx) if be_idx is not None else ()
+        fig.add_trace(go.Scattergl(**linie(x, guv.revenue, behalten=behalten),  mode='lines', name='Umsatz'))
+        fig.add_trace(go.Scattergl(**linie(x, guv.costs, behalten=behalten),    mode='lines', name='Kosten'))
+        fig.add_trace(go.Scattergl(**linie(x, guv.profit, behalten=behalten),   mode='lines', name='Gewinn'))
+        fig.add_trace(go.Scattergl(**linie(x, pers, behalten=behalten),         mode='lines', name='Mitarbeiterkosten'))
+        fig.add_trace(go.Scattergl(**linie(x, kumulierte_gewinn, glatt=True, behalten=behalten),
+                                   mode='lines', name='Kumul. Gewinn', line=dict(dash="dash")))
+        datumsachse(fig)
+        break_even_x = np.datetime_as_string(x[be_idx], unit="D") if be_idx is not None else None
+    else:
+        fig.add_trace(go.Scatter(x=monate, y=guv.revenue,       mode='lines+markers', name='Umsatz'))
+        fig.add_trace(go.Scatter(x=monate, y=guv.costs,         mode='lines+markers', name='Kosten'))
+        fig.add_trace(go.Scatter(x=monate, y=guv.profit,        mode='lines+markers', name='Gewinn'))
+        fig.add_trace(go.Scatter(x=monate, y=pers,              mode='lines+markers', name='Mitarbeiterkosten'))
+        fig.add_trace(go.Scatter(x=monate, y=kumulierte_gewinn, mode='lines+markers', name='Kumul. Gewinn', line=dict(dash="dash")))
+        fig.update_xaxes(type="category", categoryorder="array", categoryarray=monate)
+        break_even_x = break_even_monat
 
     if break_even_monat is not None:
         fig.update_layout(shapes=[
             dict(
                 type="line",
                 xref="x", yref="paper",
-                x0=break_even_monat, x1=break_even_monat,
+                x0=break_even_x, x1=break_even_x,
                 y0=0, y1=1,
                 line=dict(color="black", width=2, dash="dot"),
             )
         ])
         fig.add_annotation(
-            x=break_even_monat, xref="x",
+            x=break_even_x, xref="x",
             y=1, yref="paper",
             text=f"Break-Even: {break_even_monat}",
             showarrow=False,
@@ -437,8 +533,12 @@ def diagramm():
         template="plotly_white",
         margin=dict(t=30)
     )
+    messpunkt("figur")
+
+    if figur_json_gewuenscht():
+        return figur_json_antwort(fig)
 
-    plot_html = pio.to_html(fig, full_html=False)
+    plot_html = figur_html(fig)
 
     return render_template(
         "diagramm.html",
@@ -485,6 +585,7 @@ def kostenvergleich():
     delta = op_year - cons_year
 
     # --- PLOTLY DIAGRAMM ---
+    import plotly.graph_objs as go
     fig = go.Figure()
     
     fig.add_trace(go.Bar(
@@ -528,7 +629,10 @@ def kostenvergleich():
         font=dict(size=16, color="#002F6C", family="Arial Black") 
     )
     
-    plot_html = pio.to_html(fig, full_html=False)
+    if figur_json_gewuenscht():
+        return figur_json_antwort(fig)
+    
+    plot_html = figur_html(fig)
     
     # --- ERGEBNISSE ---
     results = {
@@ -540,145 +644,135 @@ def kostenvergleich():
     
     return render_template("kostenvergleich.html", params=params, results=results, plot_html=plot_html)
 
+@app.route("/kostenvergleich/kohorte", methods=["POST"])
+def kostenvergleich_kohorte():
+    """
+    OP vs. konservativ für eine ganze Kohorte: Datei-Upload "datei", JSON-Body (Liste oder
+    {"patienten": [...]}) oder CSV-Body, je Patient die Spalten aus kohorten.FELDER
+    (fehlende Werte = Standardwert). ?teilweise=1 wertet die gültigen Zeilen trotz Fehlern aus.
+    """
+    teilweise = request.args.get("teilweise") in ("1", "true", "ja")
+    try:
+        zeilen, versatz = importzeilen("patienten")
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"fehler": [{"zeile": None, "meldung": f"Fehlerhafte Eingabe: {e}"}]}), 400
+    kohorte, fehler = lese_kohorte(zeilen, versatz)
+    messpunkt("laden")
+    if fehler and not teilweise:
+        return jsonify({"zeilen": len(zeilen), "gueltig": len(kohorte),
+                        "fehler": [f._asdict() for f in fehler]}), 400
+
+    ergebnis = vergleiche(kohorte)
+    messpunkt("berechnung")
+    antwort = {"zeilen": len(zeilen), **zusammenfassung(ergebnis), "fehler": [f._asdict() for f in fehler]}
+    return json_antwort(antwort, request)
+
 # ===== SZENARIEN-VERGLEICH =====
+# Szenarien-Definitionen
+SZENARIEN_PARAMS = {
+    "Pessimistisch": {
+        "units_faktor": 0.7,
+        "preis_faktor": 0.95,
+        "fixkosten_faktor": 1.15,
+        "varkosten_faktor": 1.10,
+        "color": "#E57373"
+    },
+    "Realistisch": {
+        "units_faktor": 1.0,
+        "preis_faktor": 1.0,
+        "fixkosten_faktor": 1.0,
+        "varkosten_faktor": 1.0,
+        "color": "#779FB5"
+    },
+    "Optimistisch": {
+        "units_faktor": 1.3,
+        "preis_faktor": 1.05,
+        "fixkosten_faktor": 0.95,
+        "varkosten_faktor": 0.90,
+        "color": "#A8C7DC"
+    }
+}
+
 @app.route("/szenarien", methods=["GET", "POST"])
+@figur_gecacht
 def szenarien():
     """
     Vergleicht 3 Szenarien (Pessimistisch/Realistisch/Optimistisch)
     basierend auf den aktuellen Monatsdaten mit verschiedenen Faktoren.
     """
-    daten = safe_load_json(DATEN_DATEI, [])
-    personal = safe_load_json(PERSONAL_DATEI, [])
-    
-    if not daten:
+    if not speicher.monate():
         return render_template("szenarien.html", 
                              plot_html=None, 
                              no_data=True,
                              results=None)
     
-    # Szenarien-Definitionen 
-    szenarien_params = {
-        "Pessimistisch": {
-            "units_faktor": 0.7,
-            "preis_faktor": 0.95,
-            "fixkosten_faktor": 1.15,
-            "varkosten_faktor": 1.10,
-            "color": "#E57373"
-        },
-        "Realistisch": {
-            "units_faktor": 1.0,
-            "preis_faktor": 1.0,
-            "fixkosten_faktor": 1.0,
-            "varkosten_faktor": 1.0,
-            "color": "#779FB5"
-        },
-        "Optimistisch": {
-            "units_faktor": 1.3,
-            "preis_faktor": 1.05,
-            "fixkosten_faktor": 0.95,
-            "varkosten_faktor": 0.90,
-            "color": "#A8C7DC"
-        }
-    }    
-    # Jahre sammeln
-    jahre = sorted(list({int(d.get("jahr", 0)) for d in daten}))
-    if not jahre:
-        jahre = [datetime.now().year]
+    jahre = speicher.jahre()
     
     jahr_auswahl = request.args.get("jahr", str(jahre[-1]))
     
-    # Filtern nach Jahr
-    if jahr_auswahl == "alle":
-        daten_jahr = daten
-    else:
-        jahr_auswahl_int = int(jahr_auswahl)
-        daten_jahr = [d for d in daten if int(d.get("jahr", 0)) == jahr_auswahl_int]
-    
-    # Sortierung
-    if jahr_auswahl == "alle":
-        daten_sorted = sorted(daten_jahr, key=lambda d: (int(d.get("jahr", 0)), convertiere_monat_to_num(d["monat"])))
-    else:
-        monats_sortierung_lower = ["januar", "februar", "märz", "april", "mai", "juni",
-                                   "juli", "august", "september", "oktober", "november", "dezember"]
-        daten_sorted = sorted(daten_jahr, key=lambda d: monats_sortierung_lower.index(d["monat"].strip().lower())
-                            if d["monat"].strip().lower() in monats_sortierung_lower else 99)
+    spalten, pers, _ = berechne_monatsdaten(jahr_auswahl)
+    messpunkt("laden")
     
     # X-Achsen-Labels
-    monate = [f"{d['monat']} {d['jahr']}" for d in daten_sorted] if jahr_auswahl == "alle" else [d["monat"] for d in daten_sorted]
+    monate = spalten.labels(mit_jahr=(jahr_auswahl == "alle"))
     
-    # Berechnung für jedes Szenario
-    szenarien_ergebnisse = {}
+    # Alle Szenarien in einem Schritt (Szenarien x Monate)
+    def _faktoren(name):
+        return np.array([[p[name]] for p in SZENARIEN_PARAMS.values()])
     
-    for szenario_name, params in szenarien_params.items():
-        profits = []
-        
-        for d in daten_sorted:
-            j = int(d.get("jahr", jahre[-1]))
-            mnum = convertiere_monat_to_num(d["monat"])
-            pers = berechne_personalkosten(mnum, j, personal)
-            
-            comps = d.get("components") or {}
-            units = comps.get("units")
-            price = comps.get("price")
-            fixed_costs = comps.get("fixed_costs")
-            variable_costs = comps.get("variable_costs")
-            
-            if None not in (units, price, fixed_costs, variable_costs):
-                # Szenario-Faktoren anwenden
-                units_adj = float(units) * params["units_faktor"]
-                price_adj = float(price) * params["preis_faktor"]
-                fixed_adj = float(fixed_costs) * params["fixkosten_faktor"]
-                var_adj = float(variable_costs) * params["varkosten_faktor"]
-                
-                rev = units_adj * price_adj
-                cost = fixed_adj + (var_adj * units_adj) + float(pers)
-                prof = rev - cost
-                profits.append(prof)
-            else:
-                profits.append(0.0)
-        
-        # Kumulierte Gewinne
-        kumuliert = []
-        s = 0.0
-        break_even_monat = None
-        break_even_index = None
-        
-        for i, p in enumerate(profits):
-            s += p
-            kumuliert.append(s)
-            if break_even_monat is None and s >= 0:
-                break_even_monat = monate[i] if i < len(monate) else None
-                break_even_index = i
-        
-        # Gesamt-Gewinn
-        total_profit = sum(profits)
-        
+    guv = berechne_guv(
+        spalten, pers,
+        units_faktor=_faktoren("units_faktor"),
+        preis_faktor=_faktoren("preis_faktor"),
+        fixkosten_faktor=_faktoren("fixkosten_faktor"),
+        varkosten_faktor=_faktoren("varkosten_faktor"),
+    )
+    kumuliert_matrix = np.cumsum(guv.profit, axis=1)
+    be_indizes = break_even_indizes(kumuliert_matrix).tolist() if len(spalten) else [-1] * len(SZENARIEN_PARAMS)
+    
+    szenarien_ergebnisse = {}
+    for i, (szenario_name, params) in enumerate(SZENARIEN_PARAMS.items()):
+        idx = be_indizes[i]
         szenarien_ergebnisse[szenario_name] = {
-            "kumuliert": kumuliert,
-            "break_even_monat": break_even_monat,
-            "break_even_index": break_even_index,
-            "total_profit": round(total_profit, 2),
+            "kumuliert": kumuliert_matrix[i].tolist(),
+            "break_even_monat": monate[idx] if idx >= 0 else None,
+            "break_even_index": idx if idx >= 0 else None,
+            "total_profit": round(float(guv.profit[i].sum()), 2),
             "color": params["color"]
         }
+    messpunkt("berechnung")
     
     # Plotly
+    import plotly.graph_objs as go
     fig = go.Figure()
+    webgl = webgl_darstellung(spalten)
+    x = spalten.datum() if webgl else monate
     
-    for szenario_name, ergebnis in szenarien_ergebnisse.items():
-        fig.add_trace(go.Scatter(
-            x=monate,
-            y=ergebnis["kumuliert"],
-            mode='lines+markers',
-            name=szenario_name,
-            line=dict(width=3, color=ergebnis["color"]),
-            marker=dict(size=8)
-        ))
+    for i, (szenario_name, ergebnis) in enumerate(szenarien_ergebnisse.items()):
+        if webgl:
+            # Lange Zeiträume: WebGL, Datumsachse, per LTTB ausgedünnt; der Break-Even bleibt erhalten
+            idx = ergebnis["break_even_index"]
+            fig.add_trace(go.Scattergl(
+                **linie(x, kumuliert_matrix[i], glatt=True, behalten=(idx - 1, idx) if idx is not None else ()),
+                mode='lines',
+                name=szenario_name,
+                line=dict(width=3, color=ergebnis["color"]),
+            ))
+        else:
+            fig.add_trace(go.Scatter(
+                x=monate,
+                y=ergebnis["kumuliert"],
+                mode='lines+markers',
+                name=szenario_name,
+                line=dict(width=3, color=ergebnis["color"]),
+                marker=dict(size=8)
+            ))
         
         # Break-Even Marker
         if ergebnis["break_even_index"] is not None:
             idx = ergebnis["break_even_index"]
             fig.add_trace(go.Scatter(
-                x=[monate[idx]],
+                x=[x[idx]],
                 y=[ergebnis["kumuliert"][idx]],
                 mode='markers+text',
                 marker=dict(size=15, color=ergebnis["color"], symbol='star'),
@@ -691,7 +785,10 @@ def szenarien():
     # Null-Linie
     fig.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5)
     
-    fig.update_xaxes(type="category", categoryorder="array", categoryarray=monate)
+    if webgl:
+        datumsachse(fig)
+    else:
+        fig.update_xaxes(type="category", categoryorder="array", categoryarray=monate)
     fig.update_layout(
         title="Kumulierter Gewinn: Szenarien-Vergleich",
         xaxis_title="Monat",
@@ -707,8 +804,12 @@ def szenarien():
             x=1
         )
     )
+    messpunkt("figur")
+    
+    if figur_json_gewuenscht():
+        return figur_json_antwort(fig)
     
-    plot_html = pio.to_html(fig, full_html=False)
+    plot_html = figur_html(fig)
     
     return render_template("szenarien.html", 
                          plot_html=plot_html,
@@ -717,80 +818,890 @@ def szenarien():
                          jahr_auswahl=jahr_auswahl,
                          no_data=False)
 
+# ===== MONTE-CARLO-SZENARIEN =====
+MC_MAX_PFADE = 200000
+
+def mc_standardverteilungen() -> dict:
+    """Dreiecksverteilung je Faktor: Spannweite der festen Szenarien, Modus = Realistisch."""
+    verteilungen = {}
+    for name in FAKTOREN:
+        werte = [p[name] for p in SZENARIEN_PARAMS.values()]
+        verteilungen[name] = ("dreieck", min(werte), SZENARIEN_PARAMS["Realistisch"][name], max(werte))
+    return verteilungen
+
+def mc_verteilungen() -> dict:
+    """Standardverteilungen, überschrieben durch die Query-Parameter je Faktor."""
+    verteilungen = mc_standardverteilungen()
+    for name in FAKTOREN:
+        text = request.args.get(name, "").strip()
+        if text:
+            verteilungen[name] = verteilung_aus_text(text)
+    return verteilungen
+
+@app.route("/szenarien/montecarlo")
+def szenarien_montecarlo():
+    """Stochastische Szenarien: Perzentilbänder des kumulierten Gewinns und Break-Even-Verteilung."""
+    if not speicher.monate():
+        return render_template("szenarien.html", plot_html=None, no_data=True, results=None)
+
+    jahre = speicher.jahre()
+    jahr_auswahl = request.args.get("jahr", str(jahre[-1]))
+
+    try:
+        pfade = int(request.args.get("pfade", 10000))
+        seed_raw = request.args.get("seed", "").strip()
+        seed = int(seed_raw) if seed_raw else None
+        if not (1 <= pfade <= MC_MAX_PFADE):
+            return f"Fehler: Pfade muss zwischen 1 und {MC_MAX_PFADE} liegen.", 400
+        verteilungen = mc_verteilungen()
+        spalten, pers, _ = berechne_monatsdaten(jahr_auswahl)
+        ergebnis = simuliere(spalten, pers, verteilungen, pfade=pfade, seed=seed)
+    except ValueError as ve:
+        return f"Fehlerhafte Eingabe: {ve}", 400
+    messpunkt("berechnung")
+
+    monate = spalten.labels(mit_jahr=(jahr_auswahl == "alle"))
+    q = {p: ergebnis.kumuliert_perzentile[i] for i, p in enumerate(ergebnis.perzentile)}
+
+    import plotly.graph_objs as go
+    from plotly.subplots import make_subplots
+    fig = make_subplots(rows=2, cols=1, row_heights=[0.65, 0.35], vertical_spacing=0.12,
+                        subplot_titles=("Kumulierter Gewinn (Perzentilbänder)", "Verteilung des Break-Even-Monats"))
+    band = dict(mode="lines", line=dict(width=0), hoverinfo="skip", showlegend=False)
+    fig.add_trace(go.Scatter(x=monate, y=q[95], **band), row=1, col=1)
+    fig.add_trace(go.Scatter(x=monate, y=q[5], fill="tonexty", fillcolor="rgba(119,159,181,0.25)",
+                             name="5.–95. Perzentil", mode="lines", line=dict(width=0)), row=1, col=1)
+    fig.add_trace(go.Scatter(x=monate, y=q[75], **band), row=1, col=1)
+    fig.add_trace(go.Scatter(x=monate, y=q[25], fill="tonexty", fillcolor="rgba(0,47,108,0.30)",
+                             name="25.–75. Perzentil", mode="lines", line=dict(width=0)), row=1, col=1)
+    fig.add_trace(go.Scatter(x=monate, y=q[50], mode="lines", name="Median",
+                             line=dict(width=3, color="#002F6C")), row=1, col=1)
+    fig.add_trace(go.Scatter(x=monate, y=ergebnis.kumuliert_mittel, mode="lines", name="Mittelwert",
+                             line=dict(width=2, color="#E57373", dash="dash")), row=1, col=1)
+    fig.add_hline(y=0, line_dash="dash", line_color="gray", opacity=0.5, row=1, col=1)
+
+    anteile = ergebnis.break_even_haeufigkeit / ergebnis.pfade * 100.0
+    fig.add_trace(go.Bar(x=monate, y=anteile, name="Break-Even (% der Pfade)",
+                         marker_color="#779FB5", showlegend=False), row=2, col=1)
 
-# --- CSV EXPORT ---
+    fig.update_xaxes(type="category", categoryorder="array", categoryarray=monate)
+    fig.update_yaxes(title_text="Kumulierter Gewinn (€)", row=1, col=1)
+    fig.update_yaxes(title_text="% der Pfade", row=2, col=1)
+    fig.update_layout(
+        template="plotly_white",
+        height=750,
+        margin=dict(t=80, b=60),
+        hovermode="x unified",
+        legend=dict(orientation="h", yanchor="bottom", y=1.05, xanchor="right", x=1)
+    )
+    messpunkt("figur")
+
+    if figur_json_gewuenscht():
+        return figur_json_antwort(fig)
+
+    plot_html = figur_html(fig)
+
+    be_perzentile = {
+        p: (monate[idx] if idx is not None else None)
+        for p, idx in ergebnis.break_even_perzentile.items()
+    }
+
+    return render_template("montecarlo.html",
+                           plot_html=plot_html,
+                           jahre=jahre,
+                           jahr_auswahl=jahr_auswahl,
+                           pfade=pfade,
+                           seed=seed_raw,
+                           verteilungen={n: request.args.get(n, "") for n in FAKTOREN},
+                           standard={n: ",".join(f"{w:g}" for w in v[1:]) for n, v in mc_standardverteilungen().items()},
+                           be_wahrscheinlichkeit=round(ergebnis.break_even_wahrscheinlichkeit * 100.0, 1),
+                           be_perzentile=be_perzentile,
+                           gesamtgewinn={p: round(float(w), 2) for p, w in zip(ergebnis.perzentile, ergebnis.gesamtgewinn_perzentile)},
+                           no_data=False)
+# ===== SENSITIVITÄTSANALYSE =====
+PARAMETER_NAMEN = {
+    "units_faktor": "Verkäufe",
+    "preis_faktor": "Preis",
+    "fixkosten_faktor": "Fixkosten",
+    "varkosten_faktor": "Variable Kosten",
+}
+
+@app.route("/sensitivitaet")
+@figur_gecacht
+def sensitivitaet():
+    """
+    Tornado-Analyse (ein Parameter nach dem anderen) und optional ein 2-D-Raster
+    zweier Parameter (?x=...&y=...). ?format=json liefert das Raster bzw. den Tornado als Figur.
+    """
+    if not speicher.monate():
+        return render_template("szenarien.html", plot_html=None, no_data=True, results=None)
+
+    jahre = speicher.jahre()
+    jahr_auswahl = request.args.get("jahr", "alle")
+    try:
+        spanne = float(request.args.get("spanne", 10)) / 100.0
+        top_n = int(request.args.get("mitarbeiter", 10))
+        schritte = int(request.args.get("schritte", 41))
+        if not (0 < spanne < 1):
+            return "Fehler: Spanne muss zwischen 0 und 100 % liegen.", 400
+        if not (2 <= schritte <= 1000):
+            return "Fehler: Schritte müssen zwischen 2 und 1000 liegen.", 400
+        spalten, pers, _ = berechne_monatsdaten(jahr_auswahl)
+    except ValueError as ve:
+        return f"Fehlerhafte Eingabe: {ve}", 400
+
+    personal = speicher.personal()
+    monate = spalten.labels(mit_jahr=(jahr_auswahl == "alle"))
+    namen = dict(PARAMETER_NAMEN)
+    parameter_x = request.args.get("x", "")
+    parameter_y = request.args.get("y", "")
+
+    vertraege = speicher.vertraege()
+    ausgewaehlt = groesste_gehaelter(vertraege, spalten, max(0, top_n), speicher.tarife)
+    for p in (parameter_x, parameter_y):
+        if p.startswith("gehalt:") and p[7:].isdigit() and int(p[7:]) < len(personal) and int(p[7:]) not in ausgewaehlt:
+            ausgewaehlt.append(int(p[7:]))
+    for i in ausgewaehlt:
+        namen[f"gehalt:{i}"] = f"Gehalt {personal[i].get('rolle', i)}"
+    modell = baue_modell(spalten, pers, vertraege, ausgewaehlt, speicher.tarife)
+
+    def monat_label(idx):
+        return monate[idx] if 0 <= idx < len(monate) else "nicht erreicht"
+
+    # --- Tornado ---
+    (basis_be, basis_gewinn), zeilen = tornado(modell, spanne)
+    zeilen = list(reversed(zeilen))     # größte Wirkung oben
+    labels = [namen[z.parameter] for z in zeilen]
+    import plotly.graph_objs as go
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        y=labels, x=[z.gewinn_niedrig - basis_gewinn for z in zeilen], base=basis_gewinn,
+        orientation="h", name=f"−{spanne * 100:g} %", marker_color="#E57373",
+        customdata=[monat_label(z.break_even_niedrig) for z in zeilen],
+        hovertemplate="%{y}: %{x:,.0f} € (Break-Even: %{customdata})<extra></extra>",
+    ))
+    fig.add_trace(go.Bar(
+        y=labels, x=[z.gewinn_hoch - basis_gewinn for z in zeilen], base=basis_gewinn,
+        orientation="h", name=f"+{spanne * 100:g} %", marker_color="#779FB5",
+        customdata=[monat_label(z.break_even_hoch) for z in zeilen],
+        hovertemplate="%{y}: %{x:,.0f} € (Break-Even: %{customdata})<extra></extra>",
+    ))
+    fig.add_vline(x=basis_gewinn, line_dash="dash", line_color="gray")
+    fig.update_layout(
+        barmode="overlay",
+        xaxis_title="Gesamtgewinn im Zeitraum (€)",
+        template="plotly_white",
+        height=max(350, 45 * len(zeilen) + 120),
+        margin=dict(t=40, l=200),
+        legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1)
+    )
+    figur = fig
+
+    # --- 2-D-Raster ---
+    raster_html = None
+    if parameter_x and parameter_y:
+        if parameter_x not in namen or parameter_y not in namen:
+            return "Fehler: Unbekannter Parameter für das Raster.", 400
+        werte = np.linspace(1.0 - spanne, 1.0 + spanne, schritte)
+        try:
+            ergebnis = raster(modell, parameter_x, werte, parameter_y, werte)
+        except ValueError as ve:
+            return f"Fehlerhafte Eingabe: {ve}", 400
+        be = ergebnis.break_even
+        fig_raster = go.Figure(go.Heatmap(
+            x=werte * 100.0, y=werte * 100.0,
+            z=np.where(be >= 0, be + 1, np.nan),
+            colorscale="RdYlGn_r",
+            colorbar=dict(title="Break-Even<br>(Monat Nr.)"),
+            hovertemplate=(f"{namen[parameter_x]}: %{{x:.1f}} %<br>{namen[parameter_y]}: %{{y:.1f}} %<br>"
+                           "Break-Even im %{z}. Monat<extra></extra>"),
+        ))
+        fig_raster.update_layout(
+            xaxis_title=f"{namen[parameter_x]} (% der Planung)",
+            yaxis_title=f"{namen[parameter_y]} (% der Planung)",
+            template="plotly_white",
+            margin=dict(t=30),
+        )
+        figur = fig_raster
+        if not figur_json_gewuenscht():
+            raster_html = figur_html(fig_raster)
+
+    if figur_json_gewuenscht():
+        return figur_json_antwort(figur)
+
+    return render_template("sensitivitaet.html",
+                           plot_html=figur_html(fig),
+                           raster_html=raster_html,
+                           jahre=jahre,
+                           jahr_auswahl=jahr_auswahl,
+                           spanne=round(spanne * 100, 2),
+                           mitarbeiter=top_n,
+                           schritte=schritte,
+                           parameter=namen,
+                           parameter_x=parameter_x,
+                           parameter_y=parameter_y,
+                           basis_break_even=monat_label(basis_be),
+                           basis_gewinn=round(basis_gewinn, 2))
+
+# ===== BREAK-EVEN-ZIELE =====
+@app.route("/break_even", methods=["GET", "POST"])
+def break_even():
+    """
+    Benötigte Faktoren für Break-Even bis zu jedem Monat (je Variable, übrige Faktoren = Planung).
+    POST mit JSON {"jahr": ..., "ziele": [{"monat", "jahr", "variable", "faktoren"}, ...]}
+    löst beliebig viele Ziele in einem Aufruf; ?format=json liefert die Tabelle als JSON.
+    """
+    anfrage = request.get_json(silent=True) if request.method == "POST" else None
+    if request.method == "POST" and not isinstance(anfrage, dict):
+        return "Fehler: JSON-Objekt erwartet.", 400
+    jahr_auswahl = str((anfrage or request.args).get("jahr", "alle"))
+    try:
+        spalten, pers, _ = berechne_monatsdaten(jahr_auswahl)
+    except ValueError as ve:
+        return f"Fehlerhafte Eingabe: {ve}", 400
+    kum_basis = kumulierte_basis(spalten, pers)
+
+    def als_liste(werte):
+        return [None if math.isnan(w) else round(w, 6) for w in werte.tolist()]
+
+    # --- Stapel von Zielen (JSON) ---
+    if anfrage is not None:
+        ziele = anfrage.get("ziele")
+        if not isinstance(ziele, list) or not ziele:
+            return "Fehler: 'ziele' muss eine nicht-leere Liste sein.", 400
+        ordinal_zu_index = {o: i for i, o in enumerate((spalten.jahr * 12 + spalten.monat_num).tolist())}
+        try:
+            zielmonat = [ordinal_zu_index.get(int(z["jahr"]) * 12 + convertiere_monat_to_num(z["monat"]), -1)
+                         for z in ziele]
+            variable = [z["variable"] for z in ziele]
+            faktoren = {name: [float((z.get("faktoren") or {}).get(name, 1.0)) for z in ziele]
+                        for name in VARIABLEN}
+            loesung = loese(kum_basis, zielmonat, variable, faktoren)
+        except (KeyError, TypeError, ValueError) as e:
+            return f"Fehlerhafte Eingabe: {e}", 400
+        return jsonify({"grenze": als_liste(loesung.grenze), "richtung": loesung.richtung.tolist()})
+
+    # --- Tabelle: jeder Monat als Ziel, je Variable ---
+    monate = spalten.labels(mit_jahr=(jahr_auswahl == "alle"))
+    tabelle = {}
+    if len(spalten):
+        n = len(spalten)
+        loesung = loese(kum_basis, np.tile(np.arange(n), len(VARIABLEN)), np.repeat(np.array(VARIABLEN, dtype=object), n))
+        for i, name in enumerate(VARIABLEN):
+            tabelle[name] = (loesung.grenze[i * n:(i + 1) * n], loesung.richtung[i * n:(i + 1) * n])
+
+    if figur_json_gewuenscht():
+        return jsonify({"monate": monate,
+                        "variablen": {name: {"grenze": als_liste(g), "richtung": r.tolist()}
+                                      for name, (g, r) in tabelle.items()}})
+
+    zeilen = []
+    for idx, monat in enumerate(monate):
+        zellen = []
+        for name in VARIABLEN:
+            grenze, richtung = tabelle[name][0][idx], int(tabelle[name][1][idx])
+            if math.isnan(grenze):
+                zellen.append(("–", "red"))
+            elif richtung == 0:
+                zellen.append(("erreicht", "green"))
+            else:
+                zeichen = "≥" if richtung > 0 else "≤"
+                farbe = "green" if (grenze <= 1.0 if richtung > 0 else grenze >= 1.0) else "inherit"
+                zellen.append((f"{zeichen} {grenze * 100:,.1f} %", farbe))
+        zeilen.append((monat, zellen))
+
+    return render_template("break_even.html",
+                           zeilen=zeilen,
+                           variablen=[PARAMETER_NAMEN.get(name, "Personalkosten") for name in VARIABLEN],
+                           jahre=speicher.jahre(),
+                           jahr_auswahl=jahr_auswahl,
+                           no_data=not len(spalten))
+
+# --- Massenimport (CSV oder JSON) ---
+def importzeilen(schluessel="monate"):
+    """
+    (Zeilen, Zeilenversatz) aus Datei-Upload "datei", JSON-Body oder CSV-Body der Anfrage.
+    Wirft ValueError bzw. UnicodeDecodeError bei unlesbarer Eingabe.
+    """
+    datei = request.files.get("datei")
+    if datei is not None:
+        text = datei.read().decode("utf-8-sig")
+        if (datei.filename or "").lower().endswith(".json"):
+            return lese_json(json.loads(text), schluessel), 1
+        return lese_csv(text), 2
+    if request.is_json:
+        return lese_json(request.get_json(), schluessel), 1
+    return lese_csv(request.get_data(as_text=True).lstrip("\ufeff")), 2
+
+@app.route("/import", methods=["POST"])
+def import_monate():
+    """
+    Nimmt viele Monate auf einmal an: JSON-Body, CSV-Body (text/csv) oder Datei-Upload "datei".
+    ?trocken=1 prüft nur, ?teilweise=1 übernimmt die gültigen Zeilen trotz Fehlern.
+    """
+    trocken = request.args.get("trocken") in ("1", "true", "ja")
+    teilweise = request.args.get("teilweise") in ("1", "true", "ja")
+    try:
+        zeilen, versatz = importzeilen()
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"fehler": [{"zeile": None, "meldung": f"Fehlerhafte Eingabe: {e}"}]}), 400
+
+    ergebnis, geschrieben = importiere_monate(zeilen, versatz, trocken, teilweise)
+    antwort = {
+        "zeilen": ergebnis.zeilen,
+        "gueltig": len(ergebnis.eintraege),
+        "importiert": len(ergebnis.eintraege) if geschrieben else 0,
+        "fehler": [f._asdict() for f in ergebnis.fehler],
+    }
+    return jsonify(antwort), (400 if ergebnis.fehler and not teilweise else 200)
+
+# --- EXPORT ---
 @app.route("/export_csv")
 def export_csv():
     """Exportiert Monatsdaten als CSV"""
-    import csv
-    from io import StringIO
-    from flask import make_response
-    
-    daten = safe_load_json(DATEN_DATEI, [])
-    personal = safe_load_json(PERSONAL_DATEI, [])
-    
+    return export("csv")
+
+@app.route("/export/<format_name>")
+def export(format_name):
+    """Exportiert Monatsdaten als CSV (gestreamt), XLSX, Parquet oder Arrow"""
+    if format_name not in FORMATE:
+        return f"Fehler: Unbekanntes Exportformat '{format_name}'.", 404
+    endung, mimetype, _ = FORMATE[format_name]
+
     # Jahr-Filter
     jahr_auswahl = request.args.get("jahr", "alle")
-    
-    if jahr_auswahl == "alle":
-        daten_gefiltert = daten
+    try:
+        spalten, pers, guv = berechne_monatsdaten(jahr_auswahl)
+    except ValueError as ve:
+        return f"Fehlerhafte Eingabe: {ve}", 400
+    messpunkt("laden")
+    dateiname = f"monatsdaten_{jahr_auswahl}.{endung}"
+
+    if format_name == "csv":
+        # Das Streamen läuft nach der Antwort an; seine Dauer erscheint nur in /metrics
+        stream = metriken.gemessen(csv_stream(spalten, pers, guv), request.endpoint)
+        response = Response(stream, mimetype="text/csv")
+        response.headers["Content-Disposition"] = f"attachment; filename={dateiname}"
+        response.headers["Content-type"] = mimetype
+        return response
+
+    try:
+        datei = exportiere_datei(format_name, spalten, pers, guv)
+    except ExportNichtVerfuegbar as e:
+        return f"Fehler: {e}", 501
+    messpunkt("export")
+    return send_file(datei, mimetype=mimetype, as_attachment=True, download_name=dateiname)
+
+# ===== JSON-API (v1) =====
+# Spaltenweise Reihen (je Feld ein Array) für einen Jahresbereich, seitenweise nach Jahren
+API_JAHRE_PRO_SEITE = 10
+API_JAHRE_PRO_SEITE_MAX = 100
+
+def api_fehler(meldung, status=400):
+    return json_antwort({"fehler": meldung}, request, status)
+
+def api_seite():
+    """
+    Liest von/bis (Standard: alle Jahre des Plans), seite (ab 1) und jahre_pro_seite.
+    Rückgabe: (von, bis, Jahre der Seite als (erstes, letztes), Seiteninfo für die Antwort).
+    """
+    jahre = speicher.jahre()
+
+    def ganzzahl(name, standard):
+        wert = request.args.get(name)
+        if wert is None:
+            return standard
+        try:
+            return int(wert)
+        except ValueError:
+            raise ValueError(f"'{name}' muss eine ganze Zahl sein.") from None
+
+    von = ganzzahl("von", jahre[0])
+    bis = ganzzahl("bis", jahre[-1])
+    seite = ganzzahl("seite", 1)
+    pro_seite = ganzzahl("jahre_pro_seite", API_JAHRE_PRO_SEITE)
+    if von > bis:
+        raise ValueError("'von' darf nicht nach 'bis' liegen.")
+    if not 1 <= pro_seite <= API_JAHRE_PRO_SEITE_MAX:
+        raise ValueError(f"'jahre_pro_seite' muss zwischen 1 und {API_JAHRE_PRO_SEITE_MAX} liegen.")
+    seiten = (bis - von) // pro_seite + 1
+    if not 1 <= seite <= seiten:
+        raise ValueError(f"'seite' muss zwischen 1 und {seiten} liegen.")
+    erstes = von + (seite - 1) * pro_seite
+    letztes = min(bis, erstes + pro_seite - 1)
+    naechste = None
+    if seite < seiten:
+        naechste = url_for(request.endpoint, **{**request.args.to_dict(), "seite": seite + 1})
+    info = {"von": von, "bis": bis, "seite": seite, "seiten": seiten,
+            "jahre": [erstes, letztes], "naechste": naechste}
+    return von, bis, (erstes, letztes), info
+
+def api_reihen(funktion):
+    """Fehlerhafte Query-Parameter ergeben 400 mit {"fehler": ...}; Datenstand wird mitgeliefert."""
+    @wraps(funktion)
+    def wrapper():
+        version = speicher.version
+        stand = speicher.stand()
+        try:
+            von, bis, seite, info = api_seite()
+        except ValueError as e:
+            return api_fehler(str(e))
+        messpunkt("laden")
+        daten = funktion(stand, von, bis, seite)
+        messpunkt("berechnung")
+        return json_antwort({"datenstand": version, **info, **daten}, request)
+    return wrapper
+
+@app.route("/api/v1/monatsdaten")
+@api_reihen
+def api_monatsdaten(stand, von, bis, seite):
+    """Umsatz, Kosten, Gewinn, Personalkosten und kumulierter Gewinn (ab 'von') je Monat."""
+    gesamt = stand.jahresbereich(von, bis)
+    bereich = stand.jahresbereich(*seite)
+    kumuliert = np.cumsum(stand.guv.profit[gesamt])[bereich.start - gesamt.start:bereich.stop - gesamt.start]
+    spalten, pers, guv = stand.bereich(bereich)
+    return {
+        "jahr": spalten.jahr,
+        "monat": spalten.monat,
+        "monat_num": spalten.monat_num,
+        "umsatz": guv.revenue,
+        "kosten": guv.costs,
+        "gewinn": guv.profit,
+        "personalkosten": pers,
+        "kumuliert": kumuliert,
+    }
+
+@app.route("/api/v1/szenarien")
+@api_reihen
+def api_szenarien(stand, von, bis, seite):
+    """Je Szenario Umsatz, Kosten, Gewinn und kumulierter Gewinn; Break-Even über den ganzen Bereich."""
+    gesamt = stand.jahresbereich(von, bis)
+    bereich = stand.jahresbereich(*seite)
+    spalten, pers, _ = stand.bereich(gesamt)
+
+    def _faktoren(name):
+        return np.array([[p[name]] for p in SZENARIEN_PARAMS.values()])
+
+    guv = berechne_guv(
+        spalten, pers,
+        units_faktor=_faktoren("units_faktor"),
+        preis_faktor=_faktoren("preis_faktor"),
+        fixkosten_faktor=_faktoren("fixkosten_faktor"),
+        varkosten_faktor=_faktoren("varkosten_faktor"),
+    )
+    kumuliert_matrix = np.cumsum(guv.profit, axis=1)
+    be_indizes = break_even_indizes(kumuliert_matrix).tolist() if len(spalten) else [-1] * len(SZENARIEN_PARAMS)
+    teil = slice(bereich.start - gesamt.start, bereich.stop - gesamt.start)
+
+    ergebnisse = {}
+    for i, (name, params) in enumerate(SZENARIEN_PARAMS.items()):
+        idx = be_indizes[i]
+        ergebnisse[name] = {
+            "faktoren": {k: v for k, v in params.items() if k != "color"},
+            "umsatz": guv.revenue[i, teil],
+            "kosten": guv.costs[i, teil],
+            "gewinn": guv.profit[i, teil],
+            "kumuliert": kumuliert_matrix[i, teil],
+            "break_even": ({"jahr": int(spalten.jahr[idx]), "monat": spalten.monat[idx]} if idx >= 0 else None),
+            "gesamtgewinn": float(guv.profit[i].sum()),
+        }
+    return {
+        "jahr": spalten.jahr[teil],
+        "monat": spalten.monat[teil],
+        "monat_num": spalten.monat_num[teil],
+        "szenarien": ergebnisse,
+    }
+
+@app.route("/api/v1/personalkosten")
+@api_reihen
+def api_personalkosten(stand, von, bis, seite):
+    """Personalkosten aller zwölf Monate je Jahr der Seite (auch Monate ohne Planzeile)."""
+    erstes, letztes = seite
+    jahr = np.repeat(np.arange(erstes, letztes + 1, dtype=np.int64), 12)
+    monat_num = np.tile(np.arange(1, 13, dtype=np.int64), letztes - erstes + 1)
+    return {
+        "jahr": jahr,
+        "monat_num": monat_num,
+        "personalkosten": stand.zeitachse.kosten_fuer(monat_num, jahr),
+    }
+
+@app.route("/api/v1/verdichtung")
+def api_verdichtung():
+    """
+    Summen je Periode (zeit=monat|quartal|jahr) und Organisationsebene
+    (ebene=kostenstelle|standort|gruppe) für die Jahre von..bis. plaene=a,b bzw.
+    plaene=alle konsolidiert mehrere Pläne, ohne Angabe gilt der aktuelle Plan.
+    """
+    auswahl = request.args.get("plaene", "").strip()
+    if auswahl == "alle":
+        plaene = [None] + arbeitsbereiche.namen()
+    elif auswahl:
+        plaene = [p.strip() for p in auswahl.split(",") if p.strip()]
     else:
-        jahr_auswahl_int = int(jahr_auswahl)
-        daten_gefiltert = [d for d in daten if int(d.get("jahr", 0)) == jahr_auswahl_int]
-    
-    # Daten berechnen 
-    daten_berechnet = []
-    for d in daten_gefiltert:
-        monat = d.get("monat")
-        jahr = int(d.get("jahr", 0))
-        mnum = convertiere_monat_to_num(monat)
-        
-        comps = d.get("components") or {}
-        units = comps.get("units")
-        price = comps.get("price")
-        fixed_costs = comps.get("fixed_costs")
-        variable_costs = comps.get("variable_costs")
-        
-        pers = berechne_personalkosten(mnum, jahr, personal)
-        
-        if None not in (units, price, fixed_costs, variable_costs):
-            revenue_calc = float(units) * float(price)
-            costs_calc = float(fixed_costs) + float(variable_costs) * float(units) + float(pers)
-            profit_calc = revenue_calc - costs_calc
+        plaene = [aktueller_plan()]
+    try:
+        von = int(request.args["von"]) if "von" in request.args else None
+        bis = int(request.args["bis"]) if "bis" in request.args else None
+    except ValueError:
+        return api_fehler("'von' und 'bis' müssen ganze Zahlen sein.")
+
+    try:
+        offene_plaene = arbeitsbereiche.hole_alle(plaene)
+    except PlanNichtGefunden as e:
+        return api_fehler(str(e), 404)
+    wuerfel, versionen = [], {}
+    for plan_speicher in offene_plaene:
+        versionen[plan_speicher.kostenstelle] = plan_speicher.version
+        wuerfel.append(plan_speicher.wuerfel(hierarchie))
+    messpunkt("laden")
+    try:
+        daten = konsolidiere(wuerfel, request.args.get("ebene", "kostenstelle"),
+                             request.args.get("zeit", "jahr"), von, bis)
+    except ValueError as e:
+        return api_fehler(str(e))
+    messpunkt("berechnung")
+    return json_antwort({"datenstand": versionen, "groessen": GROESSEN, **daten}, request)
+
+def journal_backend():
+    """JournalSpeicher des aktuellen Plans oder None (JSON-/SQLite-Pläne haben keine Historie)."""
+    backend = speicher.backend
+    return backend if hasattr(backend, "stand_bei") else None
+
+def api_journal(funktion):
+    """404 ohne Journal, 400 bei fehlerhaften Versionsangaben, 404 für nicht vorhandene Versionen."""
+    @wraps(funktion)
+    def wrapper(**kwargs):
+        from speicher_journal import VersionNichtVerfuegbar
+        journal = journal_backend()
+        if journal is None:
+            return api_fehler("Dieser Plan hat kein Änderungsjournal.", 404)
+        try:
+            daten = funktion(journal, **kwargs)
+        except ValueError:
+            return api_fehler("Versionen müssen ganze Zahlen sein.")
+        except VersionNichtVerfuegbar as e:
+            return api_fehler(str(e), 404)
+        messpunkt("berechnung")
+        return json_antwort(daten, request)
+    return wrapper
+
+@app.route("/api/v1/journal")
+@api_journal
+def api_journal_verlauf(journal):
+    """Ereignisse von..bis (Versionen) ohne die geänderten Werte."""
+    bis = request.args.get("bis")
+    return {"version": journal.version,
+            "ereignisse": journal.historie(int(request.args.get("von", 1)), int(bis) if bis else None)}
+
+@app.route("/api/v1/journal/<int:version>")
+@api_journal
+def api_journal_stand(journal, version):
+    """Monate, Mitarbeiter und Gesamtsummen des Plans zu einer früheren Version."""
+    stand = journal.stand_bei(version)
+    guv = GuVStand.aufbauen(stand.monate, stand.personal, speicher.tarife)
+    return {
+        "version": stand.version,
+        "monate": stand.monate,
+        "personal": stand.personal,
+        "summen": {"umsatz": float(guv.guv.revenue.sum()), "kosten": float(guv.guv.costs.sum()),
+                   "gewinn": float(guv.guv.profit.sum()), "personalkosten": float(guv.personal.sum())},
+    }
+
+@app.route("/api/v1/journal/unterschied")
+@api_journal
+def api_journal_unterschied(journal):
+    """Geänderte Monate und Mitarbeiter zwischen zwei Versionen (bis: Standard aktuelle Version)."""
+    bis = request.args.get("bis")
+    return journal.unterschied(int(request.args["von"]) if "von" in request.args else 0,
+                               int(bis) if bis else journal.version)
+
+# ===== HINTERGRUNDAUFTRÄGE =====
+# Lange Berechnungen und Exporte im Prozess-Pool; Antwort sofort mit Kennung, danach Status abfragen
+def auftrag_antwort(status, http_status=None):
+    status = dict(status,
+                  status_url=url_for("auftrag_status", auftrag_id=status["id"]),
+                  ergebnis_url=url_for("auftrag_ergebnis", auftrag_id=status["id"]))
+    if http_status is None:
+        http_status = 200 if status["status"] == "fertig" else 202
+    return json_antwort(status, request, http_status)
+
+@app.route("/auftraege/export/<format_name>", methods=["POST"])
+def auftrag_export(format_name):
+    """Export (?jahr=...) als Auftrag; das Ergebnis ist die Exportdatei."""
+    if format_name not in FORMATE:
+        return api_fehler(f"Unbekanntes Exportformat '{format_name}'.", 404)
+    endung, mimetype, paket = FORMATE[format_name]
+    if paket is not None and find_spec(paket) is None:
+        return api_fehler(f"Für den {format_name.upper()}-Export wird das Paket '{paket}' benötigt "
+                          f"(pip install {paket}).", 501)
+    jahr_auswahl = request.args.get("jahr", "alle")
+    try:
+        spalten, pers, guv = berechne_monatsdaten(jahr_auswahl)
+    except ValueError as ve:
+        return api_fehler(f"Fehlerhafte Eingabe: {ve}")
+    argumente = {"format_name": format_name, "spalten": spalten, "pers": pers, "guv": guv}
+    status = auftragsverwaltung.einreichen(kennung("export", **argumente), "export", export_auftrag, argumente,
+                                           mimetype, f"monatsdaten_{jahr_auswahl}.{endung}")
+    return auftrag_antwort(status)
+
+@app.route("/auftraege/montecarlo", methods=["POST"])
+def auftrag_montecarlo():
+    """Monte-Carlo-Szenarien (Parameter wie /szenarien/montecarlo) als Auftrag; Ergebnis als JSON."""
+    if not speicher.monate():
+        return api_fehler("Keine Monatsdaten vorhanden.", 404)
+    jahr_auswahl = request.args.get("jahr", str(speicher.jahre()[-1]))
+    try:
+        pfade = int(request.args.get("pfade", 10000))
+        seed_raw = request.args.get("seed", "").strip()
+        seed = int(seed_raw) if seed_raw else None
+        if not (1 <= pfade <= MC_MAX_PFADE):
+            return api_fehler(f"Pfade muss zwischen 1 und {MC_MAX_PFADE} liegen.")
+        verteilungen = mc_verteilungen()
+        spalten, pers, _ = berechne_monatsdaten(jahr_auswahl)
+    except ValueError as ve:
+        return api_fehler(f"Fehlerhafte Eingabe: {ve}")
+    argumente = {"spalten": spalten, "pers": pers, "verteilungen": verteilungen, "pfade": pfade, "seed": seed,
+                 "monate": spalten.labels(mit_jahr=(jahr_auswahl == "alle"))}
+    # Ohne Seed ist jeder Lauf ein eigener Auftrag
+    zufall = None if seed is not None else os.urandom(8).hex()
+    status = auftragsverwaltung.einreichen(kennung("montecarlo", zufall=zufall, **argumente), "montecarlo",
+                                           montecarlo_auftrag, argumente, "application/json", "montecarlo.json")
+    return auftrag_antwort(status)
+
+@app.route("/auftraege/kohorte", methods=["POST"])
+def auftrag_kohorte():
+    """Kostenvergleich einer Kohorte (Eingabe wie /kostenvergleich/kohorte) als Auftrag; Ergebnis als JSON."""
+    teilweise = request.args.get("teilweise") in ("1", "true", "ja")
+    try:
+        zeilen, versatz = importzeilen("patienten")
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"fehler": [{"zeile": None, "meldung": f"Fehlerhafte Eingabe: {e}"}]}), 400
+    kohorte, fehler = lese_kohorte(zeilen, versatz)
+    if fehler and not teilweise:
+        return jsonify({"zeilen": len(zeilen), "gueltig": len(kohorte),
+                        "fehler": [f._asdict() for f in fehler]}), 400
+    argumente = {"kohorte": kohorte, "zeilen": len(zeilen), "fehler": fehler}
+    status = auftragsverwaltung.einreichen(kennung("kohorte", **argumente), "kohorte", kohorten_auftrag, argumente,
+                                           "application/json", "kohorte.json")
+    return auftrag_antwort(status)
+
+@app.route("/auftraege/<auftrag_id>", methods=["GET"])
+def auftrag_status(auftrag_id):
+    """Status, Fortschritt (0..1) und ggf. Fehlermeldung eines Auftrags."""
+    status = auftragsverwaltung.status(auftrag_id)
+    if status is None:
+        return api_fehler("Unbekannter Auftrag.", 404)
+    return auftrag_antwort(status, 200)
+
+@app.route("/auftraege/<auftrag_id>", methods=["DELETE"])
+def auftrag_abbrechen(auftrag_id):
+    """Bricht einen wartenden oder laufenden Auftrag ab."""
+    status = auftragsverwaltung.abbrechen(auftrag_id)
+    if status is None:
+        return api_fehler("Unbekannter Auftrag.", 404)
+    return auftrag_antwort(status, 200)
+
+@app.route("/auftraege/<auftrag_id>/ergebnis")
+def auftrag_ergebnis(auftrag_id):
+    """Ergebnis eines fertigen Auftrags (Exportdatei bzw. JSON); 409, solange er nicht fertig ist."""
+    pfad, status = auftragsverwaltung.ergebnis(auftrag_id)
+    if status is None:
+        return api_fehler("Unbekannter Auftrag.", 404)
+    if pfad is None:
+        return api_fehler(f"Auftrag ist nicht fertig (Status: {status['status']}).", 409)
+    # send_file ergänzt den Zeichensatz selbst; nur den MIME-Typ ohne Parameter übergeben
+    mimetype = status["content_type"].split(";")[0].strip()
+    return send_file(pfad, mimetype=mimetype, download_name=status["dateiname"],
+                     as_attachment=mimetype != "application/json", conditional=True)
+
+# ===== METRIKEN (Prometheus) =====
+def _cache_wert(name):
+    return lambda: figur_cache.statistik()[name]
+
+def _plan_wert(name):
+    return lambda: [({"plan": plan or "standard"}, sp.statistik()[name]) for plan, sp in arbeitsbereiche.offene()]
+
+def _trefferquote():
+    stat = figur_cache.statistik()
+    abrufe = stat["treffer"] + stat["fehlgriffe"]
+    return round(stat["treffer"] / abrufe, 4) if abrufe else 0
+
+for _name, _typ, _hilfe, _funktion in (
+    ("figur_cache_treffer_gesamt", "counter", "Antworten aus dem Figur-Cache.", _cache_wert("treffer")),
+    ("figur_cache_fehlgriffe_gesamt", "counter", "Neu gerenderte Diagramm-Antworten.", _cache_wert("fehlgriffe")),
+    ("figur_cache_trefferquote", "gauge", "Anteil der Treffer seit dem Start.", _trefferquote),
+    ("figur_cache_verdraengt_gesamt", "counter", "Aus Platzgründen verdrängte Einträge.", _cache_wert("verdraengt")),
+    ("figur_cache_invalidierungen_gesamt", "counter", "Wegen Datenänderung verworfene Einträge.",
+     _cache_wert("invalidierungen")),
+    ("figur_cache_eintraege", "gauge", "Einträge im Figur-Cache.", _cache_wert("eintraege")),
+    ("figur_cache_bytes", "gauge", "Größe des Figur-Caches in Bytes.", _cache_wert("bytes")),
+    ("plaene_offen", "gauge", "Geöffnete Pläne (ohne Standardplan).", lambda: arbeitsbereiche.statistik()["offen"]),
+    ("plaene_geschlossen_gesamt", "counter", "Wegen des Limits geschlossene Pläne.",
+     lambda: arbeitsbereiche.statistik()["geschlossen"]),
+    ("speicher_neu_geladen_gesamt", "counter", "Neu eingelesene Dateien bzw. Tabellen je Plan.",
+     _plan_wert("neu_geladen")),
+    ("speicher_schreibvorgaenge_gesamt", "counter", "Schreibvorgänge je Plan.", _plan_wert("schreibvorgaenge")),
+    ("guv_neu_aufgebaut_gesamt", "counter", "Vollständig neu berechnete GuV-Stände je Plan.",
+     _plan_wert("guv_neu_aufgebaut")),
+    ("guv_nachgefuehrt_gesamt", "counter", "Gezielt nachgeführte GuV-Stände je Plan.", _plan_wert("guv_nachgefuehrt")),
+    ("wuerfel_aufgebaut_gesamt", "counter", "Neu aufgebaute Verdichtungswürfel je Plan.",
+     _plan_wert("wuerfel_aufgebaut")),
+    ("wuerfel_nachgefuehrt_gesamt", "counter", "Gezielt nachgeführte Verdichtungswürfel je Plan.",
+     _plan_wert("wuerfel_nachgefuehrt")),
+    ("auftraege_eingereicht_gesamt", "counter", "Gestartete Hintergrundaufträge.",
+     lambda: auftragsverwaltung.statistik()["eingereicht"]),
+    ("auftraege_cache_treffer_gesamt", "counter", "Aufträge, deren Ergebnis schon vorlag.",
+     lambda: auftragsverwaltung.statistik()["cache_treffer"]),
+    ("auftraege_fertig_gesamt", "counter", "Erfolgreich beendete Aufträge.",
+     lambda: auftragsverwaltung.statistik()["fertig"]),
+    ("auftraege_fehlgeschlagen_gesamt", "counter", "Mit Fehler beendete Aufträge.",
+     lambda: auftragsverwaltung.statistik()["fehlgeschlagen"]),
+    ("auftraege_abgebrochen_gesamt", "counter", "Abgebrochene Aufträge.",
+     lambda: auftragsverwaltung.statistik()["abgebrochen"]),
+    ("auftraege_laufend", "gauge", "Wartende und laufende Aufträge dieses Prozesses.",
+     lambda: auftragsverwaltung.statistik()["laufend"]),
+):
+    metriken.registriere(_name, _typ, _hilfe, _funktion)
+
+@app.route("/metrics")
+def metrics():
+    """Zähler und Histogramme dieses Prozesses im Prometheus-Textformat."""
+    return Response(metriken.text(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+# --- SQLite-Import (flask --app app importiere-sqlite plan.sqlite) ---
+@app.cli.command("importiere-sqlite")
+@click.argument("db_datei")
+def importiere_sqlite(db_datei):
+    """Übernimmt daten.json und personal.json einmalig in eine SQLite-Datenbank."""
+    from speicher_sqlite import importiere_json
+    daten = safe_load_json(DATEN_DATEI, [])
+    personal = safe_load_json(PERSONAL_DATEI, [])
+    importiere_json(db_datei, daten, personal)
+    click.echo(f"{len(daten)} Monate und {len(personal)} Mitarbeiter nach {db_datei} importiert.")
+    click.echo(f"Starten mit: FINANZPLAN_DB={db_datei}")
+
+# --- Journal-Import (flask --app app importiere-journal journal/) ---
+@app.cli.command("importiere-journal")
+@click.argument("verzeichnis")
+def importiere_journal(verzeichnis):
+    """Übernimmt daten.json und personal.json einmalig in ein Änderungsjournal."""
+    from speicher_journal import importiere_json
+    daten = safe_load_json(DATEN_DATEI, [])
+    personal = safe_load_json(PERSONAL_DATEI, [])
+    importiere_json(verzeichnis, daten, personal)
+    click.echo(f"{len(daten)} Monate und {len(personal)} Mitarbeiter nach {verzeichnis} importiert.")
+    click.echo(f"Starten mit: FINANZPLAN_JOURNAL={verzeichnis}")
+
+# --- Massenimport (flask --app app importiere-monate plan.csv) ---
+@app.cli.command("importiere-monate")
+@click.argument("datei", type=click.Path(exists=True, dir_okay=False))
+@click.option("--trocken", is_flag=True, help="Nur prüfen, nichts schreiben.")
+@click.option("--teilweise", is_flag=True, help="Gültige Zeilen trotz Fehlern übernehmen.")
+@click.option("--plan", help="Name des Plans (Standard: daten.json/personal.json).")
+def importiere_monate_cli(datei, trocken, teilweise, plan):
+    """Importiert Monatsdaten (jahr, monat, units, price, fixed_costs, variable_costs) aus CSV oder JSON."""
+    if plan:
+        try:
+            waehle_plan(plan)
+        except PlanNichtGefunden as e:
+            raise click.ClickException(str(e))
+    with open(datei, encoding="utf-8-sig") as f:
+        text = f.read()
+    try:
+        if datei.lower().endswith(".json"):
+            zeilen, versatz = lese_json(json.loads(text)), 1
         else:
-            revenue_calc = float(d.get("revenue", 0.0))
-            costs_stored = float(d.get("costs", 0.0))
-            if not d.get("personnel_included", False):
-                costs_stored += float(pers)
-            costs_calc = costs_stored
-            profit_calc = revenue_calc - costs_calc
-        
-        daten_berechnet.append({
-            "Jahr": jahr,
-            "Monat": monat,
-            "Umsatz": round(revenue_calc, 2),
-            "Kosten": round(costs_calc, 2),
-            "Gewinn": round(profit_calc, 2),
-            "Personalkosten": round(pers, 2)
-        })
-    
-    # Sortieren
-    daten_berechnet.sort(key=lambda x: (x["Jahr"], convertiere_monat_to_num(x["Monat"])))
-    
-    # CSV erstellen
-    si = StringIO()
-    if daten_berechnet:
-        fieldnames = ["Jahr", "Monat", "Umsatz", "Kosten", "Gewinn", "Personalkosten"]
-        writer = csv.DictWriter(si, fieldnames=fieldnames, delimiter=';')
-        writer.writeheader()
-        writer.writerows(daten_berechnet)
-    
-    # Response erstellen
-    output = make_response(si.getvalue())
-    output.headers["Content-Disposition"] = f"attachment; filename=monatsdaten_{jahr_auswahl}.csv"
-    output.headers["Content-type"] = "text/csv; charset=utf-8"
-    
-    return output
+            zeilen, versatz = lese_csv(text), 2
+    except ValueError as e:
+        raise click.ClickException(f"Fehlerhafte Eingabe: {e}")
+
+    ergebnis, geschrieben = importiere_monate(zeilen, versatz, trocken, teilweise)
+    for f in ergebnis.fehler:
+        click.echo(f"Zeile {f.zeile}: {f.meldung}", err=True)
+    if geschrieben:
+        click.echo(f"{len(ergebnis.eintraege)} von {ergebnis.zeilen} Monaten importiert.")
+    else:
+        click.echo(f"{len(ergebnis.eintraege)} von {ergebnis.zeilen} Monaten gültig, nichts geschrieben.")
+    if ergebnis.fehler and not teilweise:
+        raise SystemExit(1)
+
+# --- Kohorten-Kostenvergleich (flask --app app kostenvergleich-kohorte faelle.csv) ---
+@app.cli.command("kostenvergleich-kohorte")
+@click.argument("datei", type=click.Path(exists=True, dir_okay=False))
+@click.option("--ausgabe", type=click.Path(dir_okay=False), help="Vollständiges Ergebnis als JSON-Datei.")
+def kostenvergleich_kohorte_cli(datei, ausgabe):
+    """Vergleicht OP und konservative Behandlung für alle Patienten einer CSV- oder JSON-Datei."""
+    with open(datei, encoding="utf-8-sig") as f:
+        text = f.read()
+    try:
+        if datei.lower().endswith(".json"):
+            zeilen, versatz = lese_json(json.loads(text), "patienten"), 1
+        else:
+            zeilen, versatz = lese_csv(text), 2
+    except ValueError as e:
+        raise click.ClickException(f"Fehlerhafte Eingabe: {e}")
+
+    kohorte, fehler = lese_kohorte(zeilen, versatz)
+    for f in fehler:
+        click.echo(f"Zeile {f.zeile}: {f.meldung}", err=True)
+    daten = zusammenfassung(vergleiche(kohorte))
+    kosten, kreuzung = daten["gesamtkosten"], daten["kreuzungsmonat"]
+    click.echo(f"{len(kohorte)} von {len(zeilen)} Patienten ausgewertet.")
+    click.echo(f"OP im Zeitraum nicht teurer: {daten['op_guenstiger_anteil'] * 100:.1f} %")
+    for name in ("op", "konservativ", "differenz"):
+        p = kosten[name]["perzentile"]
+        click.echo(f"Gesamtkosten {name:<12} Mittel {kosten[name]['mittel']}  Median {p['50']}  "
+                   f"5.–95. Perzentil {p['5']} … {p['95']}")
+    if kreuzung["patienten"]:
+        click.echo(f"Kreuzungsmonat: Median {kreuzung['perzentile']['50']}, "
+                   f"5.–95. Perzentil {kreuzung['perzentile']['5']} … {kreuzung['perzentile']['95']}")
+    if ausgabe:
+        with open(ausgabe, "wb") as f:
+            f.write(serialisiere(daten))
+
+# --- Pläne (flask --app app plan-anlegen klinik-nord) ---
+@app.cli.command("plan-anlegen")
+@click.argument("name")
+@click.option("--sqlite", is_flag=True, help="Plan in einer SQLite-Datenbank statt in JSON-Dateien.")
+@click.option("--journal", is_flag=True, help="Plan als Änderungsjournal mit Historie statt in JSON-Dateien.")
+def plan_anlegen(name, sqlite, journal):
+    """Legt einen leeren Plan unter plaene/<name>/ an."""
+    if sqlite and journal:
+        raise click.ClickException("--sqlite und --journal schließen sich aus.")
+    try:
+        arbeitsbereiche.anlegen(name, sqlite=sqlite, journal=journal)
+    except (PlanNichtGefunden, FileExistsError) as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Plan '{name}' angelegt: {arbeitsbereiche.pfad(name)}")
+    click.echo(f"Aufruf über /plan/{name}/ oder mit dem Header {PLAN_HEADER}: {name}")
+
+# ---------- Einstiegspunkt für WSGI-Server (wsgi.py, server.py) ----------
+# Beim Vorladen einmal gerendert: lädt Plotly mit den benötigten Validatoren und Vorlagen
+VORLADE_ROUTEN = ("/diagramm", "/szenarien", "/sensitivitaet", "/kostenvergleich", "/szenarien/montecarlo?pfade=100")
+
+def lade_vor(plaene=()):
+    """
+    Baut den GuV-Stand des Standardplans (und der genannten Pläne) auf und ruft die
+    Diagramm-Routen einmal ab (Plotly, Jinja-Templates, Figur-Cache). Mit preload_app
+    geschieht das einmal im gunicorn-Master; die Worker erben alles per fork und
+    beantworten schon die erste Anfrage warm.
+    """
+    arbeitsbereiche.standard.stand()
+    for name in plaene:
+        arbeitsbereiche.hole(name).stand()
+    client = app.test_client()
+    for url in VORLADE_ROUTEN:
+        client.get(url)
+
+def erstelle_app(vorladen=True):
+    """
+    App für den Produktivbetrieb; FINANZPLAN_VORLADEN nennt zusätzlich vorzuladende
+    Pläne (kommagetrennt). Die Routen hängen an der Modul-App, es gibt also eine Instanz.
+    """
+    if vorladen:
+        lade_vor([p.strip() for p in os.environ.get("FINANZPLAN_VORLADEN", "").split(",") if p.strip()])
+    return app
 
 if __name__ == "__main__":
+    # Entwicklungsserver mit Reloader; für den Betrieb: python3 server.py
     app.run(debug=True)
\ No newline at end of file
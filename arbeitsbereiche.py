@@ -0,0 +1,136 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Mehrere Pläne in einem Prozess.
+
+Jeder Plan liegt in einem eigenen Verzeichnis unter plaene/<name>/, entweder
+als daten.json und personal.json, als plan.sqlite oder als Journal (journal/).
+Geöffnete Pläne
+(Planspeicher samt GuV-Stand und abgeleiteten Ergebnissen) werden in einem
+LRU gehalten; wird die Höchstzahl überschritten, wird der am längsten nicht
+benutzte Plan geschlossen und beim nächsten Zugriff neu geöffnet. Der
+Standardplan (daten.json/personal.json neben app.py) bleibt immer geöffnet.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from datenspeicher import Planspeicher, oeffne_speicher, atomar_schreiben
+
+PLANNAME = re.compile(r"[A-Za-z0-9][A-Za-z0-9_-]{0,63}")
+
+
+class PlanNichtGefunden(LookupError):
+    """Kein Plan dieses Namens (oder ungültiger Name)."""
+
+
+class Arbeitsbereiche:
+    """Threadsicheres LRU geöffneter Pläne."""
+
+    def __init__(self, verzeichnis, standard: Planspeicher, max_offen: int = 32, bei_schliessen=None):
+        self.verzeichnis = verzeichnis
+        self.standard = standard
+        self.max_offen = max_offen
+        self._bei_schliessen = bei_schliessen     # wird mit dem Namen eines geschlossenen Plans aufgerufen
+        self._offen = OrderedDict()
+        self._lock = threading.Lock()
+        self.geoeffnet = 0
+        self.geschlossen = 0
+
+    def pfad(self, name: str) -> str:
+        if not isinstance(name, str) or not PLANNAME.fullmatch(name):
+            raise PlanNichtGefunden(f"Ungültiger Planname '{name}'.")
+        return os.path.join(self.verzeichnis, name)
+
+    def existiert(self, name: str) -> bool:
+        try:
+            return os.path.isdir(self.pfad(name))
+        except PlanNichtGefunden:
+            return False
+
+    def namen(self) -> list:
+        if not os.path.isdir(self.verzeichnis):
+            return []
+        return sorted(n for n in os.listdir(self.verzeichnis) if PLANNAME.fullmatch(n) and self.existiert(n))
+
+    def _oeffnen(self, name: str) -> Planspeicher:
+        ordner = self.pfad(name)
+        if not os.path.isdir(ordner):
+            raise PlanNichtGefunden(f"Plan '{name}' nicht gefunden.")
+        db_datei = os.path.join(ordner, "plan.sqlite")
+        journal = os.path.join(ordner, "journal")
+        # Tariftabellen gelten für alle Pläne; der Name ist die Kostenstelle des Plans
+        return oeffne_speicher(os.path.join(ordner, "daten.json"), os.path.join(ordner, "personal.json"),
+                               db_datei if os.path.exists(db_datei) else None, self.standard.tarife,
+                               journal if os.path.isdir(journal) else None, kostenstelle=name)
+
+    def hole(self, name=None) -> Planspeicher:
+        """Speicher des Plans `name` (None = Standardplan); öffnet ihn bei Bedarf."""
+        if name is None:
+            return self.standard
+        with self._lock:
+            speicher = self._offen.get(name)
+            if speicher is not None:
+                self._offen.move_to_end(name)
+                return speicher
+            speicher = self._oeffnen(name)
+            self._offen[name] = speicher
+            self.geoeffnet += 1
+            verdraengt = []
+            while len(self._offen) > self.max_offen:
+                verdraengt.append(self._offen.popitem(last=False)[0])
+                self.geschlossen += 1
+        for alt in verdraengt:
+            if self._bei_schliessen is not None:
+                self._bei_schliessen(alt)
+        return speicher
+
+    def hole_alle(self, namen: list) -> list:
+        """
+        Speicher mehrerer Pläne für eine gemeinsame Auswertung. Passen sie nicht alle
+        ins LRU, wird es auf ihre Zahl vergrößert, damit sie sich nicht gegenseitig
+        verdrängen und bei jeder Auswertung neu geöffnet werden.
+        """
+        anzahl = len({n for n in namen if n is not None and self.existiert(n)})
+        with self._lock:
+            self.max_offen = max(self.max_offen, anzahl)
+        return [self.hole(n) for n in namen]
+
+    def schliessen(self, name: str):
+        with self._lock:
+            vorhanden = self._offen.pop(name, None) is not None
+            if vorhanden:
+                self.geschlossen += 1
+        if vorhanden and self._bei_schliessen is not None:
+            self._bei_schliessen(name)
+
+    def anlegen(self, name: str, sqlite: bool = False, journal: bool = False) -> Planspeicher:
+        """Legt einen leeren Plan an (JSON-Dateien, SQLite-Datenbank oder Journal)."""
+        ordner = self.pfad(name)
+        if os.path.isdir(ordner):
+            raise FileExistsError(f"Plan '{name}' existiert bereits.")
+        os.makedirs(ordner)
+        if sqlite:
+            from speicher_sqlite import SqliteSpeicher
+            SqliteSpeicher(os.path.join(ordner, "plan.sqlite"))
+        elif journal:
+            from speicher_journal import JournalSpeicher
+            JournalSpeicher(os.path.join(ordner, "journal"))
+        else:
+            atomar_schreiben(os.path.join(ordner, "daten.json"), [])
+            atomar_schreiben(os.path.join(ordner, "personal.json"), [])
+        return self.hole(name)
+
+    def offene(self) -> list:
+        """(Name, Speicher) aller geöffneten Pläne, der Standardplan mit Name None zuerst."""
+        with self._lock:
+            return [(None, self.standard)] + list(self._offen.items())
+
+    def statistik(self) -> dict:
+        with self._lock:
+            return {
+                "offen": len(self._offen),
+                "max_offen": self.max_offen,
+                "geoeffnet": self.geoeffnet,
+                "geschlossen": self.geschlossen,
+            }
@@ -0,0 +1,366 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Hintergrundaufträge für lange Berechnungen und Exporte.
+
+Ein Auftrag ist eine Funktion auf Modulebene, die in einem Prozess-Pool läuft:
+funktion(fortschritt, **argumente) -> bytes. Seine Kennung ist ein Hash über
+Art und Eingaben (die Arrays selbst, nicht der Datenstand eines Prozesses).
+Status, Fortschritt und Ergebnis liegen als Dateien im Auftragsverzeichnis; so
+sehen alle Worker-Prozesse (gunicorn) denselben Stand, gleiche Anfragen werden
+nicht doppelt gerechnet und fertige Ergebnisse ohne Rechnen ausgeliefert. Der
+Ergebnis-Cache ist nach Gesamtgröße und Anzahl begrenzt; die am längsten nicht
+abgerufenen Ergebnisse werden zuerst gelöscht.
+
+Der Fortschritt wird von der Auftragsfunktion gemeldet (fortschritt(anteil));
+dabei wird auch ein Abbruch erkannt (AuftragAbgebrochen).
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from datenspeicher import Dateisperre
+from export import exportiere_bytes
+from json_antwort import serialisiere
+from kohorten import vergleiche, zusammenfassung
+from montecarlo import simuliere
+
+KENNUNG = re.compile(r"[0-9a-f]{32}")
+OFFEN = ("wartet", "laeuft")
+MELDEABSTAND = 0.2      # Sekunden zwischen zwei Fortschritts-Schreibvorgängen
+AUFBEWAHRUNG = 86400    # Sekunden, die fehlgeschlagene/abgebrochene Aufträge sichtbar bleiben
+SPERRE = ".status.lock"  # Lesen-Ändern-Schreiben der Statusdateien (Web- und Pool-Prozesse)
+
+
+class AuftragAbgebrochen(Exception):
+    """Der Auftrag wurde über abbrechen() beendet."""
+
+
+def _hash_teil(h, obj):
+    if isinstance(obj, np.ndarray) and obj.dtype != object:
+        h.update(f"{obj.dtype.str}{obj.shape}".encode())
+        h.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (list, tuple, np.ndarray)):
+        h.update(f"[{len(obj)}".encode())
+        for x in obj:
+            _hash_teil(h, x)
+    elif isinstance(obj, dict):
+        h.update(f"{{{len(obj)}".encode())
+        for k in sorted(obj, key=str):
+            _hash_teil(h, k)
+            _hash_teil(h, obj[k])
+    else:
+        h.update(repr(obj).encode())
+        h.update(b"|")
+
+
+def kennung(art: str, **eingaben) -> str:
+    """Kennung eines Auftrags aus Art und allen Eingaben (Arrays, Listen, dicts, Skalare)."""
+    h = hashlib.sha256(art.encode())
+    _hash_teil(h, eingaben)
+    return h.hexdigest()[:32]
+
+
+# --- Dateien im Auftragsverzeichnis ---
+def _pfad(verzeichnis, auftrag_id, endung):
+    return os.path.join(verzeichnis, f"{auftrag_id}.{endung}")
+
+
+def _schreibe_atomar(pfad, inhalt: bytes):
+    tmp = f"{pfad}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(inhalt)
+    os.replace(tmp, pfad)
+
+
+def _lies_status(verzeichnis, auftrag_id):
+    try:
+        with open(_pfad(verzeichnis, auftrag_id, "json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _setze_status(verzeichnis, auftrag_id, nur_offen=False, **felder) -> dict:
+    """
+    Ändert Felder der Statusdatei unter einer prozessübergreifenden Sperre. nur_offen: nur,
+    solange der Auftrag wartet oder läuft (sonst bleibt der Endstatus unverändert).
+    """
+    with Dateisperre(os.path.join(verzeichnis, SPERRE)):
+        return _aendere_status(verzeichnis, auftrag_id, nur_offen, **felder)
+
+
+def _aendere_status(verzeichnis, auftrag_id, nur_offen=False, **felder) -> dict:
+    """Wie _setze_status, aber der Aufrufer hält die Sperre bereits (sie ist nicht wiedereintrittsfähig)."""
+    status = _lies_status(verzeichnis, auftrag_id) or {"id": auftrag_id}
+    if nur_offen and status.get("status") not in OFFEN:
+        return status
+    status.update(felder, aktualisiert=time.time())
+    _schreibe_atomar(_pfad(verzeichnis, auftrag_id, "json"), json.dumps(status).encode("utf-8"))
+    return status
+
+
+class Fortschritt:
+    """Wird der Auftragsfunktion übergeben; Aufruf mit dem erledigten Anteil (0..1)."""
+
+    def __init__(self, verzeichnis, auftrag_id):
+        self.verzeichnis = verzeichnis
+        self.auftrag_id = auftrag_id
+        self._gemeldet = 0.0
+
+    def pruefen(self):
+        if os.path.exists(_pfad(self.verzeichnis, self.auftrag_id, "abbruch")):
+            raise AuftragAbgebrochen(self.auftrag_id)
+
+    def __call__(self, anteil: float):
+        self.pruefen()
+        jetzt = time.monotonic()
+        if jetzt - self._gemeldet >= MELDEABSTAND:
+            self._gemeldet = jetzt
+            _setze_status(self.verzeichnis, self.auftrag_id, nur_offen=True,
+                          fortschritt=round(min(max(anteil, 0.0), 1.0), 4))
+
+
+def _ausfuehren(verzeichnis, auftrag_id, funktion, argumente):
+    """Läuft im Pool-Prozess: rechnet, schreibt Ergebnis und Status."""
+    fortschritt = Fortschritt(verzeichnis, auftrag_id)
+    try:
+        fortschritt.pruefen()
+        _setze_status(verzeichnis, auftrag_id, status="laeuft", gestartet=time.time())
+        inhalt = funktion(fortschritt, **argumente)
+        fortschritt.pruefen()
+    except AuftragAbgebrochen:
+        _setze_status(verzeichnis, auftrag_id, status="abgebrochen", beendet=time.time())
+        return "abgebrochen"
+    except Exception as e:
+        _setze_status(verzeichnis, auftrag_id, status="fehler", meldung=str(e) or type(e).__name__,
+                      beendet=time.time())
+        return "fehler"
+    _schreibe_atomar(_pfad(verzeichnis, auftrag_id, "ergebnis"), inhalt)
+    _setze_status(verzeichnis, auftrag_id, status="fertig", fortschritt=1.0, bytes=len(inhalt), beendet=time.time())
+    return "fertig"
+
+
+def _pool_kontext():
+    """forkserver, wo verfügbar (POSIX), sonst spawn."""
+    methoden = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methoden else "spawn")
+
+
+class Auftragsverwaltung:
+    """Reicht Aufträge an den Prozess-Pool weiter und verwaltet Status und Ergebnis-Cache."""
+
+    def __init__(self, verzeichnis, max_bytes: int = 512 * 1024 * 1024, max_eintraege: int = 256,
+                 prozesse: int = 2):
+        self.verzeichnis = verzeichnis
+        self.max_bytes = max_bytes
+        self.max_eintraege = max_eintraege
+        self.prozesse = prozesse
+        self._pool = None
+        self._pid = None
+        self._laufend = {}          # Kennung -> Future (nur Aufträge dieses Prozesses)
+        self._lock = threading.Lock()
+        self.eingereicht = 0
+        self.cache_treffer = 0
+        self.fertig = 0
+        self.fehlgeschlagen = 0
+        self.abgebrochen = 0
+
+    def _prozess_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None or self._pid != os.getpid():
+            # Nach fork (gunicorn --preload) keinen Pool des Elternprozesses weiterverwenden. Die
+            # Pool-Prozesse nicht per fork aus einem Worker mit mehreren Threads erzeugen (Sperren)
+            self._pool = ProcessPoolExecutor(max_workers=self.prozesse, mp_context=_pool_kontext())
+            self._pid = os.getpid()
+            self._laufend = {}
+        return self._pool
+
+    def _verwaist(self, status: dict) -> bool:
+        """Offener Auftrag, dessen einreichender Prozess nicht mehr läuft."""
+        pid = status.get("pid")
+        if pid == os.getpid():
+            return status["id"] not in self._laufend
+        if os.name != "posix" or not isinstance(pid, int):
+            return False
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    def einreichen(self, auftrag_id: str, art: str, funktion, argumente: dict,
+                   content_type: str, dateiname: str) -> dict:
+        """
+        Startet den Auftrag, falls es kein Ergebnis und keinen laufenden Auftrag mit
+        dieser Kennung gibt, und liefert seinen Status. Prüfen und Anlegen geschehen
+        unter der Sperre der Statusdateien, damit zwei Worker-Prozesse denselben
+        Auftrag nicht beide starten.
+        """
+        os.makedirs(self.verzeichnis, exist_ok=True)
+        with self._lock:
+            with Dateisperre(os.path.join(self.verzeichnis, SPERRE)):
+                status = _lies_status(self.verzeichnis, auftrag_id)
+                if status is not None:
+                    if (status["status"] == "fertig"
+                            and os.path.exists(_pfad(self.verzeichnis, auftrag_id, "ergebnis"))):
+                        self.cache_treffer += 1
+                        return self._mit_dauer(status)
+                    if status["status"] in OFFEN and not self._verwaist(status):
+                        return self._mit_dauer(status)
+                for endung in ("abbruch", "ergebnis"):
+                    self._entfernen(auftrag_id, endung)
+                status = _aendere_status(self.verzeichnis, auftrag_id, art=art, status="wartet", fortschritt=0.0,
+                                         meldung=None, content_type=content_type, dateiname=dateiname,
+                                         erstellt=time.time(), gestartet=None, beendet=None, bytes=None,
+                                         pid=os.getpid())
+            future = self._prozess_pool().submit(_ausfuehren, self.verzeichnis, auftrag_id, funktion, argumente)
+            self._laufend[auftrag_id] = future
+            self.eingereicht += 1
+        future.add_done_callback(lambda f: self._beendet(auftrag_id, f))
+        return self._mit_dauer(status)
+
+    def _beendet(self, auftrag_id, future):
+        if future.cancelled():
+            ergebnis = "abgebrochen"
+            _setze_status(self.verzeichnis, auftrag_id, nur_offen=True, status="abgebrochen", beendet=time.time())
+        elif future.exception() is not None:
+            # z. B. BrokenProcessPool: der Pool-Prozess ist abgestürzt
+            ergebnis = "fehler"
+            _setze_status(self.verzeichnis, auftrag_id, nur_offen=True, status="fehler",
+                          meldung=str(future.exception()), beendet=time.time())
+        else:
+            ergebnis = future.result()
+        with self._lock:
+            if self._laufend.get(auftrag_id) is future:
+                del self._laufend[auftrag_id]
+            if ergebnis == "fertig":
+                self.fertig += 1
+            elif ergebnis == "abgebrochen":
+                self.abgebrochen += 1
+            else:
+                self.fehlgeschlagen += 1
+        self.aufraeumen()
+
+    @staticmethod
+    def _mit_dauer(status: dict) -> dict:
+        status = dict(status)
+        start = status.get("gestartet")
+        status["dauer"] = round((status.get("beendet") or time.time()) - start, 3) if start else None
+        status.pop("pid", None)
+        return status
+
+    def status(self, auftrag_id: str):
+        """Status als dict oder None, wenn es den Auftrag nicht gibt."""
+        if not KENNUNG.fullmatch(auftrag_id or ""):
+            return None
+        status = _lies_status(self.verzeichnis, auftrag_id)
+        if status is None:
+            return None
+        if status["status"] in OFFEN and self._verwaist(status):
+            status = _setze_status(self.verzeichnis, auftrag_id, nur_offen=True, status="fehler",
+                                   meldung="Der ausführende Prozess wurde beendet.", beendet=time.time())
+        return self._mit_dauer(status)
+
+    def ergebnis(self, auftrag_id: str):
+        """(Pfad der Ergebnisdatei, Status) eines fertigen Auftrags, sonst (None, Status)."""
+        status = self.status(auftrag_id)
+        if status is None or status["status"] != "fertig":
+            return None, status
+        pfad = _pfad(self.verzeichnis, auftrag_id, "ergebnis")
+        try:
+            os.utime(pfad)          # zuletzt abgerufen: wird als Letztes verdrängt
+        except OSError:
+            return None, status
+        return pfad, status
+
+    def abbrechen(self, auftrag_id: str):
+        """Bricht einen offenen Auftrag ab (spätestens bei seiner nächsten Fortschrittsmeldung)."""
+        status = self.status(auftrag_id)
+        if status is None or status["status"] not in OFFEN:
+            return status
+        _schreibe_atomar(_pfad(self.verzeichnis, auftrag_id, "abbruch"), b"")
+        with self._lock:
+            future = self._laufend.get(auftrag_id)
+        if future is not None and future.cancel():
+            # Noch nicht gestartet; _beendet setzt den Status
+            return self.status(auftrag_id)
+        # Den Endstatus schreibt der Pool-Prozess; ist er schon da, bleibt er erhalten
+        status = _setze_status(self.verzeichnis, auftrag_id, nur_offen=True, abbruch_angefordert=True)
+        return self._mit_dauer(status)
+
+    def _entfernen(self, auftrag_id, endung):
+        try:
+            os.remove(_pfad(self.verzeichnis, auftrag_id, endung))
+        except OSError:
+            pass
+
+    def aufraeumen(self):
+        """Hält den Ergebnis-Cache unter max_bytes/max_eintraege und löscht alte Fehlschläge."""
+        try:
+            namen = os.listdir(self.verzeichnis)
+        except OSError:
+            return
+        ergebnisse, jetzt = [], time.time()
+        for name in namen:
+            auftrag_id, _, endung = name.partition(".")
+            if not KENNUNG.fullmatch(auftrag_id):
+                continue
+            try:
+                info = os.stat(os.path.join(self.verzeichnis, name))
+            except OSError:
+                continue
+            if endung == "ergebnis":
+                ergebnisse.append((info.st_mtime, info.st_size, auftrag_id))
+            elif endung == "json" and jetzt - info.st_mtime > AUFBEWAHRUNG:
+                status = _lies_status(self.verzeichnis, auftrag_id)
+                if status is not None and status["status"] in ("fehler", "abgebrochen"):
+                    for e in ("json", "abbruch"):
+                        self._entfernen(auftrag_id, e)
+        ergebnisse.sort()
+        gesamt = sum(groesse for _, groesse, _ in ergebnisse)
+        while ergebnisse and (gesamt > self.max_bytes or len(ergebnisse) > self.max_eintraege):
+            _, groesse, auftrag_id = ergebnisse.pop(0)
+            for e in ("ergebnis", "json"):
+                self._entfernen(auftrag_id, e)
+            gesamt -= groesse
+
+    def statistik(self) -> dict:
+        with self._lock:
+            laufend = len(self._laufend) if self._pid == os.getpid() else 0
+        return {"eingereicht": self.eingereicht, "cache_treffer": self.cache_treffer, "fertig": self.fertig,
+                "fehlgeschlagen": self.fehlgeschlagen, "abgebrochen": self.abgebrochen, "laufend": laufend}
+
+
+# --- Auftragsfunktionen (laufen im Pool-Prozess) ---
+def export_auftrag(fortschritt, format_name, spalten, pers, guv) -> bytes:
+    return exportiere_bytes(format_name, spalten, pers, guv, fortschritt)
+
+
+def kohorten_auftrag(fortschritt, kohorte, zeilen, fehler) -> bytes:
+    ergebnis = vergleiche(kohorte, fortschritt=fortschritt)
+    return serialisiere({"zeilen": zeilen, **zusammenfassung(ergebnis), "fehler": [f._asdict() for f in fehler]})
+
+
+def montecarlo_auftrag(fortschritt, spalten, pers, verteilungen, pfade, seed, monate) -> bytes:
+    ergebnis = simuliere(spalten, pers, verteilungen, pfade=pfade, seed=seed, fortschritt=fortschritt)
+    return serialisiere({
+        "pfade": ergebnis.pfade,
+        "monate": monate,
+        "kumuliert_perzentile": {str(p): np.round(reihe, 2)
+                                 for p, reihe in zip(ergebnis.perzentile, ergebnis.kumuliert_perzentile)},
+        "kumuliert_mittel": np.round(ergebnis.kumuliert_mittel, 2),
+        "break_even_haeufigkeit": ergebnis.break_even_haeufigkeit,
+        "break_even_wahrscheinlichkeit": round(ergebnis.break_even_wahrscheinlichkeit, 4),
+        "break_even_perzentile": {str(p): (monate[i] if i is not None else None)
+                                  for p, i in ergebnis.break_even_perzentile.items()},
+        "gesamtgewinn_perzentile": {str(p): round(float(w), 2)
+                                    for p, w in zip(ergebnis.perzentile, ergebnis.gesamtgewinn_perzentile)},
+    })
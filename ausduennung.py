@@ -0,0 +1,61 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Serverseitiges Ausdünnen langer Monatsreihen für Diagramme.
+
+Oberhalb einer Punktzahl bekommt der Browser nicht mehr jeden Monat, sondern
+eine Auswahl von Indizes:
+- lttb: Largest-Triangle-Three-Buckets, erhält den Verlauf glatter Reihen
+  (kumulierter Gewinn),
+- minmax: je Abschnitt Minimum und Maximum, erhält die Spitzen schwankender
+  Monatswerte (Umsatz, Kosten, Gewinn).
+Erster und letzter Punkt sowie ausdrücklich übergebene Indizes (Break-Even)
+sind immer enthalten.
+"""
+import numpy as np
+
+
+def _mit(indizes, n: int, behalten) -> np.ndarray:
+    """Sortierte, eindeutige Indizes samt Rand und `behalten` (außerhalb 0..n-1 ignoriert)."""
+    extra = np.asarray([i for i in behalten if i is not None and 0 <= i < n], dtype=np.int64)
+    return np.unique(np.concatenate([np.asarray(indizes, dtype=np.int64), extra, [0, n - 1]]))
+
+
+def lttb(x, y, ziel: int, behalten=()) -> np.ndarray:
+    """Indizes von höchstens etwa `ziel` Punkten (+ behalten) nach LTTB; x aufsteigend."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max(ziel, 2):
+        return np.arange(n, dtype=np.int64)
+    x = np.asarray(x, dtype=np.float64)
+    ziel = max(ziel, 3)
+    # Innere Punkte 1..n-2 auf ziel-2 Abschnitte verteilt
+    grenzen = np.linspace(1, n - 1, ziel - 1).astype(np.int64)
+    gewaehlt = np.empty(ziel, dtype=np.int64)
+    gewaehlt[0], gewaehlt[-1] = 0, n - 1
+    a = 0
+    for k in range(ziel - 2):
+        von, bis = grenzen[k], grenzen[k + 1]
+        # Mittelpunkt des nächsten Abschnitts (beim letzten: der Endpunkt)
+        n_von, n_bis = (grenzen[k + 1], grenzen[k + 2]) if k + 2 < len(grenzen) else (n - 1, n)
+        cx, cy = x[n_von:n_bis].mean(), y[n_von:n_bis].mean()
+        flaeche = np.abs((x[a] - cx) * (y[von:bis] - y[a]) - (x[a] - x[von:bis]) * (cy - y[a]))
+        a = von + int(np.argmax(flaeche))
+        gewaehlt[k + 1] = a
+    return _mit(gewaehlt, n, behalten)
+
+
+def minmax(y, ziel: int, behalten=()) -> np.ndarray:
+    """Indizes von Minimum und Maximum in ziel/2 gleich großen Abschnitten (+ behalten)."""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= max(ziel, 2):
+        return np.arange(n, dtype=np.int64)
+    abschnitte = max(ziel // 2, 1)
+    breite = -(-n // abschnitte)
+    # Auf volle Abschnitte auffüllen: Minimum mit +inf, Maximum mit -inf, damit das Auffüllen nie gewinnt
+    rest = abschnitte * breite - n
+    unten = np.concatenate([y, np.full(rest, np.inf)]).reshape(abschnitte, breite)
+    oben = np.concatenate([y, np.full(rest, -np.inf)]).reshape(abschnitte, breite)
+    start = np.arange(abschnitte, dtype=np.int64) * breite
+    indizes = np.concatenate([start + unten.argmin(axis=1), start + oben.argmax(axis=1)])
+    return _mit(indizes[indizes < n], n, behalten)
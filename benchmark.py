@@ -0,0 +1,280 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Benchmark-Suite für Berechnungsfunktionen und Routen.
+
+Erzeugt synthetische daten.json/personal.json in mehreren Größen (von 1 Jahr
+mit 5 Mitarbeitern bis 50 Jahre mit 10.000 Mitarbeitern), misst Latenz,
+Durchsatz und Spitzenspeicher sowie die Kaltstartzeit eines neuen Prozesses
+und schreibt das Ergebnis als JSON, damit zwei Commits miteinander verglichen
+werden können.
+
+    python benchmark.py                                   # alle Größen
+    python benchmark.py --skalen klein mittel --ausgabe neu.json
+    python benchmark.py --vergleich alt.json neu.json     # Regressionen > 10 % melden
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from berechnung import MONATSNAMEN
+from personalkosten import berechne_personalkosten, mitarbeiter_aktiv_im
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Name -> (Jahre, Mitarbeiter)
+SKALEN = {
+    "klein": (1, 5),
+    "mittel": (5, 100),
+    "gross": (20, 1000),
+    "sehr_gross": (50, 10000),
+}
+
+ROUTEN = ("/monatsdaten", "/diagramm", "/szenarien", "/export_csv")
+
+STARTJAHR = 2025
+
+
+def erzeuge_daten(jahre: int, mitarbeiter: int, seed: int = 0):
+    """Synthetische Monatsdaten (mit Komponenten) und Mitarbeiterliste im Format der JSON-Dateien."""
+    rnd = random.Random(seed)
+    daten = []
+    for i in range(jahre * 12):
+        jahr, monat = STARTJAHR + i // 12, MONATSNAMEN[i % 12]
+        units = int(i * 3 + rnd.randint(0, 50))
+        price, fixed, variable = 2000.0, 28000.0 + rnd.randint(0, 5000), 20.0
+        revenue = units * price
+        costs = fixed + variable * units
+        daten.append({
+            "monat": monat, "jahr": jahr,
+            "revenue": revenue, "costs": costs, "profit": revenue - costs,
+            "personnel_included": True,
+            "components": {"units": units, "price": price, "fixed_costs": fixed, "variable_costs": variable},
+        })
+
+    personal = []
+    for _ in range(mitarbeiter):
+        start = rnd.randrange(jahre * 12)
+        eintrag = {
+            "rolle": rnd.choice(["TV-L E13", "TV-L E14", "TV-Ärzte Ä1", "TV-Ärzte Ä3"]),
+            "gehalt": float(rnd.randrange(3500, 9500, 100)),
+            "startmonat": start % 12 + 1, "startjahr": STARTJAHR + start // 12,
+            "endmonat": None, "endjahr": None,
+        }
+        if rnd.random() < 0.4:
+            ende = rnd.randrange(start, jahre * 12)
+            eintrag["endmonat"], eintrag["endjahr"] = ende % 12 + 1, STARTJAHR + ende // 12
+        personal.append(eintrag)
+    return daten, personal
+
+
+def messe(funktion, vorbereitung=None, wiederholungen: int = 5, min_zeit: float = 0.2) -> dict:
+    """
+    Führt funktion mindestens `wiederholungen`-mal bzw. `min_zeit` Sekunden lang aus.
+    vorbereitung() läuft vor jedem Aufruf und wird nicht mitgemessen. Der Spitzenspeicher
+    wird in einem eigenen Lauf mit tracemalloc bestimmt, damit er die Zeiten nicht verfälscht.
+    """
+    zeiten = []
+    gesamt_start = time.perf_counter()
+    while len(zeiten) < wiederholungen or (time.perf_counter() - gesamt_start < min_zeit and len(zeiten) < 1000):
+        if vorbereitung is not None:
+            vorbereitung()
+        gc.collect()
+        t0 = time.perf_counter()
+        funktion()
+        zeiten.append(time.perf_counter() - t0)
+
+    if vorbereitung is not None:
+        vorbereitung()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        funktion()
+        _, spitze = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    zeiten.sort()
+    median = statistics.median(zeiten)
+    return {
+        "laeufe": len(zeiten),
+        "min_ms": round(zeiten[0] * 1000, 3),
+        "median_ms": round(median * 1000, 3),
+        "p95_ms": round(zeiten[min(len(zeiten) - 1, int(0.95 * len(zeiten)))] * 1000, 3),
+        "durchsatz_pro_s": round(1.0 / median, 2) if median > 0 else None,
+        "spitzenspeicher_kib": round(spitze / 1024, 1),
+    }
+
+
+def _route_abrufen(client, url):
+    def abrufen():
+        antwort = client.get(url)
+        if antwort.status_code != 200:
+            raise RuntimeError(f"{url}: HTTP {antwort.status_code}")
+        antwort.get_data()
+    return abrufen
+
+
+def benchmark_skala(name: str, jahre: int, mitarbeiter: int, wiederholungen: int) -> dict:
+    import app as app_modul
+    from datenspeicher import oeffne_speicher
+
+    daten, personal = erzeuge_daten(jahre, mitarbeiter)
+    ergebnisse = {}
+    with tempfile.TemporaryDirectory() as verzeichnis:
+        daten_datei = os.path.join(verzeichnis, "daten.json")
+        personal_datei = os.path.join(verzeichnis, "personal.json")
+        with open(daten_datei, "w", encoding="utf-8") as f:
+            json.dump(daten, f, ensure_ascii=False)
+        with open(personal_datei, "w", encoding="utf-8") as f:
+            json.dump(personal, f, ensure_ascii=False)
+
+        # --- Hilfsfunktionen (ein voller Planungshorizont je Aufruf) ---
+        monate = [(i % 12 + 1, STARTJAHR + i // 12) for i in range(jahre * 12)]
+
+        def personalkosten_horizont():
+            for monat, jahr in monate:
+                berechne_personalkosten(monat, jahr, personal)
+
+        def aktiv_horizont():
+            for monat, jahr in monate:
+                for m in personal:
+                    mitarbeiter_aktiv_im(monat, jahr, m)
+
+        # Die Schleifen wachsen mit Monate x Mitarbeiter; bei großen Skalen genügt ein Lauf
+        hilfs_wdh = wiederholungen if jahre * mitarbeiter <= 20000 else 1
+        ergebnisse["berechne_personalkosten"] = messe(personalkosten_horizont, wiederholungen=hilfs_wdh, min_zeit=0)
+        ergebnisse["mitarbeiter_aktiv_im"] = messe(aktiv_horizont, wiederholungen=hilfs_wdh, min_zeit=0)
+
+        # --- Routen über den Flask-Test-Client ---
+        vorher = app_modul.speicher
+        client = app_modul.app.test_client()
+
+        def neuer_speicher():
+            app_modul.speicher = oeffne_speicher(daten_datei, personal_datei)
+
+        try:
+            for url in ROUTEN:
+                # kalt: frischer Speicher, Dateien werden gelesen und alles neu berechnet
+                ergebnisse[f"{url} (kalt)"] = messe(_route_abrufen(client, url), vorbereitung=neuer_speicher,
+                                                     wiederholungen=wiederholungen)
+                neuer_speicher()
+                ergebnisse[f"{url} (warm)"] = messe(_route_abrufen(client, url), wiederholungen=wiederholungen)
+        finally:
+            app_modul.speicher = vorher
+
+    return {"jahre": jahre, "mitarbeiter": mitarbeiter, "ergebnisse": ergebnisse}
+
+
+def messe_start(wiederholungen: int = 5) -> dict:
+    """Kaltstart in frischen Prozessen: Import von app.py bzw. Import plus erste Diagramm-Anfrage."""
+    def prozess(code):
+        def starten():
+            subprocess.run([sys.executable, "-c", code], cwd=BASE_DIR, check=True,
+                           stdout=subprocess.DEVNULL)
+        return starten
+    diagramm = "import app; assert app.app.test_client().get('/diagramm').status_code == 200"
+    return {
+        "import app": messe(prozess("import app"), wiederholungen=wiederholungen, min_zeit=0),
+        "import app + /diagramm": messe(prozess(diagramm), wiederholungen=wiederholungen, min_zeit=0),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def fuehre_aus(skalen, wiederholungen: int = 5) -> dict:
+    bericht = {
+        "commit": _git_commit(),
+        "zeitpunkt": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "plattform": platform.platform(),
+        "skalen": {},
+    }
+    print("[start] Kaltstart in neuen Prozessen ...", file=sys.stderr)
+    bericht["start"] = messe_start(wiederholungen)
+    for fall, werte in bericht["start"].items():
+        print(f"  {fall:<28} median {werte['median_ms']:>10.2f} ms   p95 {werte['p95_ms']:>10.2f} ms",
+              file=sys.stderr)
+    for name in skalen:
+        jahre, mitarbeiter = SKALEN[name]
+        print(f"[{name}] {jahre} Jahre, {mitarbeiter} Mitarbeiter ...", file=sys.stderr)
+        bericht["skalen"][name] = benchmark_skala(name, jahre, mitarbeiter, wiederholungen)
+        for fall, werte in bericht["skalen"][name]["ergebnisse"].items():
+            print(f"  {fall:<28} median {werte['median_ms']:>10.2f} ms   "
+                  f"p95 {werte['p95_ms']:>10.2f} ms   {werte['spitzenspeicher_kib']:>10.1f} KiB",
+                  file=sys.stderr)
+    return bericht
+
+
+def vergleiche(alt: dict, neu: dict, schwelle: float = 0.10) -> int:
+    """Vergleicht die Mediane zweier Berichte; Rückgabe 1, falls ein Fall um mehr als `schwelle` langsamer ist."""
+    regressionen = 0
+    print(f"{'Skala':<12} {'Fall':<28} {'alt ms':>10} {'neu ms':>10} {'Faktor':>8}")
+    abschnitte = {skala: werte["ergebnisse"] for skala, werte in neu["skalen"].items()}
+    alt_abschnitte = {skala: werte["ergebnisse"] for skala, werte in alt["skalen"].items()}
+    if "start" in neu and "start" in alt:
+        abschnitte["start"], alt_abschnitte["start"] = neu["start"], alt["start"]
+    for skala, ergebnisse in abschnitte.items():
+        alt_ergebnisse = alt_abschnitte.get(skala)
+        if alt_ergebnisse is None:
+            continue
+        for fall, werte in ergebnisse.items():
+            alt_werte = alt_ergebnisse.get(fall)
+            if alt_werte is None or not alt_werte["median_ms"]:
+                continue
+            faktor = werte["median_ms"] / alt_werte["median_ms"]
+            markierung = ""
+            if faktor > 1.0 + schwelle:
+                regressionen += 1
+                markierung = "  <-- langsamer"
+            print(f"{skala:<12} {fall:<28} {alt_werte['median_ms']:>10.2f} {werte['median_ms']:>10.2f} "
+                  f"{faktor:>7.2f}x{markierung}")
+    print(f"\n{alt.get('commit')} -> {neu.get('commit')}: {regressionen} Regression(en) über {schwelle:.0%}")
+    return 1 if regressionen else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark-Suite für das Finanzplanungs-Tool")
+    parser.add_argument("--skalen", nargs="+", choices=list(SKALEN), default=list(SKALEN))
+    parser.add_argument("--wiederholungen", type=int, default=5)
+    parser.add_argument("--ausgabe", help="JSON-Datei für das Ergebnis (Standard: stdout)")
+    parser.add_argument("--vergleich", nargs=2, metavar=("ALT", "NEU"),
+                        help="zwei gespeicherte Ergebnisse vergleichen statt zu messen")
+    parser.add_argument("--schwelle", type=float, default=0.10,
+                        help="erlaubte Verlangsamung beim Vergleich (Standard: 0.10)")
+    args = parser.parse_args(argv)
+
+    if args.vergleich:
+        with open(args.vergleich[0], encoding="utf-8") as f:
+            alt = json.load(f)
+        with open(args.vergleich[1], encoding="utf-8") as f:
+            neu = json.load(f)
+        return vergleiche(alt, neu, args.schwelle)
+
+    bericht = fuehre_aus(args.skalen, args.wiederholungen)
+    text = json.dumps(bericht, indent=2, ensure_ascii=False)
+    if args.ausgabe:
+        with open(args.ausgabe, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
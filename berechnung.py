@@ -0,0 +1,177 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Gemeinsame Berechnungs-Engine für die Monats-GuV.
+
+Die Monatsdatensätze aus daten.json werden einmal geprüft und normalisiert
+(Monatssatz: Monatsnummer statt Name, Komponenten-Flag) und in NumPy-Spalten überführt
+(Stückzahl, Preis, Fixkosten, variable Kosten, gespeicherte Werte, Flags);
+Umsatz, Kosten, Gewinn, kumulierter Gewinn und Break-Even werden danach für
+alle Monate gleichzeitig berechnet. Alle Routen (Monatsdaten, Diagramm,
+Szenarien, CSV-Export) greifen auf diese Funktionen zurück.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+MONATSNAMEN = ["Januar", "Februar", "März", "April", "Mai", "Juni",
+               "Juli", "August", "September", "Oktober", "November", "Dezember"]
+
+_MONAT_ZU_NUM = {name.lower(): i + 1 for i, name in enumerate(MONATSNAMEN)}
+
+KOMPONENTEN = ("units", "price", "fixed_costs", "variable_costs")
+
+
+def convertiere_monat_to_num(monatsname):
+    return _MONAT_ZU_NUM.get(str(monatsname).strip().lower(), 0)
+
+
+class MonatsSpalten(NamedTuple):
+    """Nach (Jahr, Monat) sortierte Monatsdaten in Spaltenform."""
+    monat: list                 # Monatsnamen wie gespeichert
+    jahr: np.ndarray            # int64
+    monat_num: np.ndarray       # int64, 1..12 (0 = unbekannter Monatsname)
+    units: np.ndarray           # float64, 0.0 falls keine Komponenten
+    price: np.ndarray
+    fixed_costs: np.ndarray
+    variable_costs: np.ndarray
+    revenue: np.ndarray         # gespeicherter Umsatz
+    costs: np.ndarray           # gespeicherte Kosten
+    personnel_included: np.ndarray  # bool
+    hat_komponenten: np.ndarray     # bool
+    kostenstelle: np.ndarray        # object (str), "" = Kostenstelle des Plans
+
+    def __len__(self):
+        return len(self.monat)
+
+    def labels(self, mit_jahr: bool) -> list:
+        """X-Achsen-Beschriftungen ("Januar" bzw. "Januar 2025")."""
+        if mit_jahr:
+            return [f"{m} {j}" for m, j in zip(self.monat, self.jahr.tolist())]
+        return list(self.monat)
+
+    def datum(self):
+        """Monatsanfänge als datetime64[M] für eine Datumsachse; None bei unbekannten Monatsnamen."""
+        if np.any(self.monat_num == 0):
+            return None
+        return ((self.jahr - 1970) * 12 + self.monat_num - 1).astype("datetime64[M]")
+
+
+class GuV(NamedTuple):
+    revenue: np.ndarray
+    costs: np.ndarray
+    profit: np.ndarray
+
+
+class Monatssatz(NamedTuple):
+    """Ein geprüfter Monatsdatensatz; Felder wie MonatsSpalten, je Zeile ein Wert."""
+    monat: str
+    jahr: int
+    monat_num: int              # 1..12 (0 = unbekannter Monatsname)
+    units: float                # 0.0 falls keine Komponenten
+    price: float
+    fixed_costs: float
+    variable_costs: float
+    revenue: float
+    costs: float
+    personnel_included: bool
+    hat_komponenten: bool
+    kostenstelle: str           # "" = Kostenstelle des Plans
+
+    @property
+    def ordinal(self) -> int:
+        return self.jahr * 12 + self.monat_num
+
+
+def _komponenten(eintrag: dict):
+    comps = eintrag.get("components") or {}
+    werte = [comps.get(k) for k in KOMPONENTEN]
+    if None in werte:
+        return None
+    return [float(w) for w in werte]
+
+
+def lies_monat(d: dict) -> Monatssatz:
+    """Prüft und normalisiert einen Eintrag aus daten.json (ValueError/TypeError bei ungültigen Zahlen)."""
+    werte = _komponenten(d)
+    hat_komp = werte is not None
+    units, price, fixed, variable = werte if hat_komp else (0.0, 0.0, 0.0, 0.0)
+    return Monatssatz(
+        d.get("monat"),
+        int(d.get("jahr", 0)),
+        convertiere_monat_to_num(d.get("monat", "")),
+        units, price, fixed, variable,
+        float(d.get("revenue", 0.0) or 0.0),
+        float(d.get("costs", 0.0) or 0.0),
+        bool(d.get("personnel_included", False)),
+        hat_komp,
+        str(d.get("kostenstelle") or ""),
+    )
+
+
+def lies_monate(daten: list) -> list:
+    """Monatssätze zu einer Liste von Einträgen; bereits gelesene Sätze bleiben unverändert."""
+    return [d if isinstance(d, Monatssatz) else lies_monat(d) for d in daten]
+
+
+def _reihenfolge(satz: Monatssatz):
+    return satz.jahr, satz.monat_num or 13
+
+
+_SPALTENTYPEN = (np.int64, np.int64) + (np.float64,) * 6 + (bool, bool, object)
+
+
+def baue_spalten(daten: list, jahr: Optional[int] = None) -> MonatsSpalten:
+    """
+    Überführt die Monatsdaten (Einträge oder Monatssätze) in Spalten, optional
+    gefiltert auf ein Jahr, und sortiert sie nach (Jahr, Monat). Unbekannte
+    Monatsnamen landen am Ende des Jahres.
+    """
+    saetze = lies_monate(daten)
+    if jahr is not None:
+        saetze = [s for s in saetze if s.jahr == jahr]
+    saetze.sort(key=_reihenfolge)
+
+    felder = list(zip(*saetze)) or [()] * len(Monatssatz._fields)
+    return MonatsSpalten(list(felder[0]), *(np.array(werte, dtype=typ)
+                                            for werte, typ in zip(felder[1:], _SPALTENTYPEN)))
+
+
+def berechne_guv(spalten: MonatsSpalten, personalkosten,
+                 units_faktor=1.0, preis_faktor=1.0,
+                 fixkosten_faktor=1.0, varkosten_faktor=1.0) -> GuV:
+    """
+    Umsatz, Kosten und Gewinn für alle Monate.
+
+    Monate mit Komponenten: units*price bzw. fixed + variable*units + Personal.
+    Monate ohne Komponenten: gespeicherte Werte, Personalkosten werden addiert,
+    sofern sie nicht schon enthalten sind. Die Faktoren wirken nur auf Komponenten;
+    als Arrays der Form (n, 1) ergeben sie n Szenarien (Ergebnis n x Monate).
+    """
+    pers = np.asarray(personalkosten, dtype=np.float64)
+    units = spalten.units * units_faktor
+    price = spalten.price * preis_faktor
+
+    rev_komp = units * price
+    cost_komp = spalten.fixed_costs * fixkosten_faktor + spalten.variable_costs * varkosten_faktor * units + pers
+    cost_gesp = spalten.costs + np.where(spalten.personnel_included, 0.0, pers)
+
+    k = spalten.hat_komponenten
+    revenue = np.where(k, rev_komp, spalten.revenue)
+    costs = np.where(k, cost_komp, cost_gesp)
+    return GuV(revenue, costs, revenue - costs)
+
+
+def break_even_indizes(kumuliert: np.ndarray) -> np.ndarray:
+    """Erster Index mit kumuliertem Gewinn >= 0 je Zeile (letzte Achse), -1 falls nie erreicht."""
+    erreicht = kumuliert >= 0
+    idx = np.argmax(erreicht, axis=-1)
+    return np.where(np.any(erreicht, axis=-1), idx, -1)
+
+
+def kumuliert_und_break_even(profit: np.ndarray):
+    """Kumulierter Gewinn und Index des Break-Even-Monats (None, falls nicht erreicht)."""
+    kumuliert = np.cumsum(profit)
+    if kumuliert.size == 0:
+        return kumuliert, None
+    idx = int(break_even_indizes(kumuliert))
+    return kumuliert, (idx if idx >= 0 else None)
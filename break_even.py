@@ -0,0 +1,167 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Break-Even-Löser: welcher Wert eines Parameters ist nötig, damit der kumulierte
+Gewinn spätestens in Monat X nicht mehr negativ ist?
+
+Hält man alle Faktoren bis auf einen fest, ist der kumulierte Gewinn jedes
+Monats eine Gerade a_t * x + b_t im freien Faktor x (units * price - fixed -
+variable * units - personnel). Break-Even bis Monat X heißt: für irgendein
+t <= X gilt a_t * x + b_t >= 0. Die Grenzen ergeben sich direkt aus den
+Nullstellen -b_t / a_t, für tausende Ziele gleichzeitig als Matrixrechnung.
+Für nichtlineare Erweiterungen gibt es eine vektorisierte Bisektion.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from berechnung import MonatsSpalten
+from montecarlo import FAKTOREN, gewinn_basis
+
+# Freie Variablen; personal_faktor skaliert alle Personalkosten (entspricht der Kopfzahl
+# bei unveränderter Gehaltsstruktur)
+VARIABLEN = FAKTOREN + ("personal_faktor",)
+
+
+class BreakEvenLoesung(NamedTuple):
+    grenze: np.ndarray      # benötigter Faktor (NaN = nicht erreichbar)
+    richtung: np.ndarray    # +1: mindestens grenze, -1: höchstens grenze, 0: mit jedem Wert >= 0 erreicht
+    mindestens: np.ndarray  # kleinster ausreichender Wert nach oben (inf = keiner)
+    hoechstens: np.ndarray  # größter ausreichender Wert nach unten (-inf = keiner)
+
+    @property
+    def erreichbar(self) -> np.ndarray:
+        return ~np.isnan(self.grenze)
+
+
+def kumulierte_basis(spalten: MonatsSpalten, personalkosten) -> np.ndarray:
+    """
+    5 x Monate: kumulierte Basiszeilen zu den Koeffizienten [U*P, F, V*U, 1, H]
+    (wie montecarlo.gewinn_basis, die Personalkosten aber in einer eigenen Zeile H).
+    """
+    pers = np.asarray(personalkosten, dtype=np.float64)
+    basis = np.empty((5, len(spalten)), dtype=np.float64)
+    basis[:4] = gewinn_basis(spalten, np.zeros(len(spalten)))
+    wirkt = spalten.hat_komponenten | ~spalten.personnel_included
+    basis[4] = np.where(wirkt, -pers, 0.0)
+    return np.cumsum(basis, axis=1)
+
+
+def _geraden(variable: str, f: dict, n: int):
+    """Koeffizienten c0 + x * c1 (je n x 5) für die freie Variable bei festen übrigen Faktoren."""
+    u, p, fix, v, h = (f[name] for name in VARIABLEN)
+    eins = np.ones(n)
+    c0 = np.stack([u * p, fix, v * u, eins, h], axis=1)
+    c1 = np.zeros((n, 5))
+    if variable == "units_faktor":
+        c0[:, 0] = c0[:, 2] = 0.0
+        c1[:, 0], c1[:, 2] = p, v
+    elif variable == "preis_faktor":
+        c0[:, 0] = 0.0
+        c1[:, 0] = u
+    elif variable == "fixkosten_faktor":
+        c0[:, 1] = 0.0
+        c1[:, 1] = 1.0
+    elif variable == "varkosten_faktor":
+        c0[:, 2] = 0.0
+        c1[:, 2] = u
+    elif variable == "personal_faktor":
+        c0[:, 4] = 0.0
+        c1[:, 4] = 1.0
+    else:
+        raise ValueError(f"Unbekannte Variable '{variable}' (erlaubt: {', '.join(VARIABLEN)})")
+    return c0, c1
+
+
+def loese(kum_basis: np.ndarray, zielmonat, variable, faktoren: dict = None,
+          aktuell: float = 1.0) -> BreakEvenLoesung:
+    """
+    Löst n Ziele auf einmal. `zielmonat` ist ein Monatsindex (Skalar oder Array),
+    `variable` ein Name aus VARIABLEN (oder ein Array von Namen), `faktoren` legt
+    die übrigen Faktoren fest (Skalare oder Arrays, fehlende = 1.0).
+    Nur nicht-negative Faktoren gelten als zulässig. Sind Lösungen nach oben und
+    unten möglich, wird die Grenze genommen, die näher an `aktuell` liegt.
+    """
+    faktoren = faktoren or {}
+    monate = kum_basis.shape[1]
+    zielmonat = np.atleast_1d(np.asarray(zielmonat, dtype=np.int64))
+    variable = np.atleast_1d(np.asarray(variable, dtype=object))
+    n = max([len(zielmonat), len(variable)] + [np.size(w) for w in faktoren.values()])
+    zielmonat = np.broadcast_to(zielmonat, (n,))
+    variable = np.broadcast_to(variable, (n,))
+    if monate == 0 or np.any((zielmonat < 0) | (zielmonat >= monate)):
+        raise ValueError("Zielmonat liegt außerhalb des Planungszeitraums")
+    f = {name: np.broadcast_to(np.asarray(faktoren.get(name, 1.0), dtype=np.float64), (n,))
+         for name in VARIABLEN}
+
+    a = np.empty((n, monate))
+    b = np.empty((n, monate))
+    for name in np.unique(variable):
+        auswahl = variable == name
+        c0, c1 = _geraden(name, {k: w[auswahl] for k, w in f.items()}, int(auswahl.sum()))
+        a[auswahl] = c1 @ kum_basis
+        b[auswahl] = c0 @ kum_basis
+
+    im_ziel = np.arange(monate) <= zielmonat[:, None]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        nullstelle = -b / a
+    steigend = im_ziel & (a > 0)
+    fallend = im_ziel & (a < 0)
+    immer = np.any(im_ziel & (a == 0) & (b >= 0), axis=1)
+
+    mindestens = np.where(steigend, np.maximum(nullstelle, 0.0), np.inf).min(axis=1)
+    hoechstens = np.where(fallend & (nullstelle >= 0), nullstelle, -np.inf).max(axis=1)
+    immer |= (mindestens == 0.0) | (hoechstens >= mindestens)
+
+    hat_min = np.isfinite(mindestens)
+    hat_max = np.isfinite(hoechstens)
+    nimm_min = hat_min & (~hat_max | (np.abs(mindestens - aktuell) <= np.abs(hoechstens - aktuell)))
+    grenze = np.where(nimm_min, mindestens, np.where(hat_max, hoechstens, np.nan))
+    richtung = np.where(nimm_min, 1, np.where(hat_max, -1, 0))
+    grenze = np.where(immer, 0.0, grenze)
+    richtung = np.where(immer, 0, richtung)
+    return BreakEvenLoesung(grenze, richtung, mindestens, hoechstens)
+
+
+def bisektion(funktion, lo, hi, toleranz: float = 1e-9, max_schritte: int = 200) -> np.ndarray:
+    """
+    Vektorisierte Bisektion: sucht je Element x in [lo, hi] mit funktion(x) == 0.
+    `funktion` bildet ein Array von x-Werten auf ein gleich langes Array ab.
+    Elemente ohne Vorzeichenwechsel zwischen lo und hi ergeben NaN.
+    """
+    lo = np.array(lo, dtype=np.float64, ndmin=1)
+    hi = np.array(hi, dtype=np.float64, ndmin=1)
+    lo, hi = np.broadcast_arrays(lo, hi)
+    lo, hi = lo.copy(), hi.copy()
+    f_lo = funktion(lo)
+    f_hi = funktion(hi)
+    gueltig = np.sign(f_lo) * np.sign(f_hi) <= 0
+    for _ in range(max_schritte):
+        if np.all(hi - lo <= toleranz):
+            break
+        mitte = 0.5 * (lo + hi)
+        f_mitte = funktion(mitte)
+        links = np.sign(f_mitte) * np.sign(f_lo) <= 0
+        hi = np.where(links, mitte, hi)
+        lo = np.where(links, lo, mitte)
+        f_lo = np.where(links, f_lo, f_mitte)
+    return np.where(gueltig, 0.5 * (lo + hi), np.nan)
+
+
+def loese_numerisch(gewinn, zielmonat, lo, hi, toleranz: float = 1e-9) -> np.ndarray:
+    """
+    Fallback für nichtlineare Modelle: `gewinn(x)` liefert für n Parameterwerte
+    die Monatsgewinne (n x Monate). Gesucht ist je Ziel der kleinste x in
+    [lo, hi], mit dem der kumulierte Gewinn bis `zielmonat` die Null erreicht;
+    vorausgesetzt wird, dass ein größeres x das Ergebnis nicht verschlechtert.
+    """
+    zielmonat = np.atleast_1d(np.asarray(zielmonat, dtype=np.int64))
+
+    def bestes_kumuliert(x):
+        kumuliert = np.cumsum(gewinn(x), axis=1)
+        im_ziel = np.arange(kumuliert.shape[1]) <= zielmonat[:, None]
+        return np.where(im_ziel, kumuliert, -np.inf).max(axis=1)
+
+    # Nullstelle der Stufenfunktion "erreicht / nicht erreicht"
+    lo = np.broadcast_to(np.asarray(lo, dtype=np.float64), zielmonat.shape)
+    x = bisektion(lambda x: np.where(bestes_kumuliert(x) >= 0, 1.0, -1.0), lo, hi, toleranz)
+    return np.where(bestes_kumuliert(lo) >= 0, lo, x)
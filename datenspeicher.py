@@ -0,0 +1,549 @@
+﻿# -*- coding: utf-8 -*-
+"""
+In-Process-Speicher für die Plandaten.
+
+Standard-Backend sind daten.json und personal.json: die Dateien werden nur neu
+eingelesen, wenn sich Änderungszeit oder Größe geändert haben. Alternativ liegt
+der Plan in einer SQLite-Datenbank (speicher_sqlite.py) oder in einem
+Änderungsjournal mit Historie (speicher_journal.py). Abgeleitete Ergebnisse
+(Jahresliste usw.) werden pro Datenstand einmal berechnet; die Monats-GuV und
+die verdichteten Summen werden bei eigenen Änderungen gezielt nachgeführt
+(inkrementell.py, verdichtung.py).
+"""
+import copy
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+
+from berechnung import KOMPONENTEN, convertiere_monat_to_num, lies_monate
+from inkrementell import GuVStand
+from personalkosten import PersonalZeitachse, lies_vertrag, lies_vertraege
+from verdichtung import STANDARD_KOSTENSTELLE, Wuerfel
+
+
+def safe_load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return default
+
+
+def _signatur(pfad):
+    try:
+        st = os.stat(pfad)
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def atomar_schreiben(pfad, inhalt):
+    """Schreibt JSON in eine temporäre Datei im Zielordner und ersetzt das Ziel per rename."""
+    ordner, name = os.path.split(os.path.abspath(pfad))
+    fd, tmp = tempfile.mkstemp(dir=ordner, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(inhalt, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(pfad):
+            os.chmod(tmp, os.stat(pfad).st_mode & 0o777)
+        os.replace(tmp, pfad)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class Dateisperre:
+    """Exklusive, prozessübergreifende Sperre über eine Lock-Datei (fcntl bzw. msvcrt)."""
+
+    def __init__(self, pfad):
+        self.pfad = pfad
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.pfad, "a+b")
+        if os.name == "nt":
+            import msvcrt
+            self._f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(self._f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._f.seek(0)
+                msvcrt.locking(self._f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._f.close()
+            self._f = None
+
+
+class _Auftrag:
+    __slots__ = ("funktion", "ergebnis", "fehler", "erledigt")
+
+    def __init__(self, funktion):
+        self.funktion = funktion
+        self.ergebnis = None
+        self.fehler = None
+        self.erledigt = False
+
+
+class JsonDatei:
+    """
+    Geparster Inhalt einer JSON-Liste, neu gelesen nur bei Dateiänderung.
+
+    Schreibzugriffe laufen unter einer Dateisperre als Lesen-Ändern-Schreiben auf
+    dem aktuellen Dateistand und ersetzen die Datei atomar. Gleichzeitig
+    eintreffende Änderungen eines Prozesses werden gesammelt und mit einem
+    einzigen Schreibvorgang übernommen.
+    """
+
+    def __init__(self, pfad):
+        self.pfad = pfad
+        self.sperr_datei = pfad + ".lock"
+        self._lock = threading.Lock()
+        self._schreib_lock = threading.Lock()
+        self._warteschlange = []
+        self._signatur = None
+        self._inhalt = None
+        self.version = 0
+        self.neu_geladen = 0
+        self.schreibvorgaenge = 0
+
+    def _laden(self, sig):
+        self._inhalt = safe_load_json(self.pfad, [])
+        self._signatur = sig
+        self.version += 1
+        self.neu_geladen += 1
+
+    def lesen(self) -> list:
+        """Aktueller Inhalt. Das Ergebnis wird geteilt und darf nicht verändert werden."""
+        sig = _signatur(self.pfad)
+        with self._lock:
+            if self._inhalt is None or sig != self._signatur:
+                self._laden(sig)
+            return self._inhalt
+
+    def schreiben(self, inhalt: list):
+        """Ersetzt den gesamten Inhalt."""
+        def _ersetzen(aktuell):
+            aktuell[:] = inhalt
+        self.aktualisieren(_ersetzen)
+
+    def aktualisieren(self, funktion):
+        """
+        Wendet funktion(liste) auf eine Kopie des aktuellen Dateistands an, schreibt
+        das Ergebnis und gibt den Rückgabewert von funktion zurück. Löst funktion eine
+        Ausnahme aus, bleibt die Datei für diesen Auftrag unverändert.
+        """
+        auftrag = _Auftrag(funktion)
+        with self._lock:
+            self._warteschlange.append(auftrag)
+        with self._schreib_lock:
+            if not auftrag.erledigt:
+                self._abarbeiten()
+        if auftrag.fehler is not None:
+            raise auftrag.fehler
+        return auftrag.ergebnis
+
+    def _abarbeiten(self):
+        with self._lock:
+            auftraege, self._warteschlange = self._warteschlange, []
+        try:
+            with Dateisperre(self.sperr_datei):
+                basis = self.lesen()
+                inhalt = copy.deepcopy(basis)
+                erfolgreich = []
+                for auftrag in auftraege:
+                    try:
+                        auftrag.ergebnis = auftrag.funktion(inhalt)
+                        erfolgreich.append(auftrag)
+                    except Exception as e:
+                        auftrag.fehler = e
+                        # Teiländerungen des fehlgeschlagenen Auftrags verwerfen
+                        inhalt = copy.deepcopy(basis)
+                        for a in erfolgreich:
+                            a.ergebnis = a.funktion(inhalt)
+                if erfolgreich:
+                    atomar_schreiben(self.pfad, inhalt)
+                    with self._lock:
+                        self._inhalt = inhalt
+                        self._signatur = _signatur(self.pfad)
+                        self.version += 1
+                        self.schreibvorgaenge += 1
+        except Exception as e:
+            for auftrag in auftraege:
+                if auftrag.fehler is None:
+                    auftrag.fehler = e
+        finally:
+            for auftrag in auftraege:
+                auftrag.erledigt = True
+
+
+def _monatsschluessel(monat, jahr):
+    """(Jahr, Monatsnummer); unbekannte Monatsnamen zusätzlich nach Namen, damit sie sich nicht überdecken."""
+    monat_num = convertiere_monat_to_num(monat)
+    if monat_num == 0:
+        return (int(jahr), 0, str(monat).lower())
+    return (int(jahr), monat_num)
+
+
+def _setze_monatswerte(eintrag, werte, components):
+    eintrag.update(werte)
+    if components:
+        eintrag["components"] = {k: components.get(k) for k in KOMPONENTEN}
+
+
+class JsonSpeicher:
+    """Speicher-Backend auf Basis von daten.json und personal.json."""
+
+    def __init__(self, daten_datei, personal_datei):
+        self.monate_datei = JsonDatei(daten_datei)
+        self.personal_datei = JsonDatei(personal_datei)
+        self._lock = threading.Lock()
+        self._index = None
+        self._index_version = None
+
+    @property
+    def version(self):
+        """Datenstand; ändert sich bei jedem Neuladen oder Schreiben einer der Dateien."""
+        self.monate_datei.lesen()
+        self.personal_datei.lesen()
+        return (self.monate_datei.version, self.personal_datei.version)
+
+    # --- Monate ---
+    def monate(self) -> list:
+        return self.monate_datei.lesen()
+
+    def _monatsindex(self):
+        """(jahr, monat_num) -> Eintrag und jahr -> Einträge, einmal je Dateistand."""
+        daten = self.monate_datei.lesen()
+        version = self.monate_datei.version
+        with self._lock:
+            if self._index_version == version:
+                return self._index
+        nach_schluessel, nach_jahr = {}, {}
+        for d in daten:
+            schluessel = _monatsschluessel(d.get("monat", ""), d.get("jahr", 0))
+            nach_schluessel.setdefault(schluessel, d)
+            nach_jahr.setdefault(schluessel[0], []).append(d)
+        with self._lock:
+            self._index = (nach_schluessel, nach_jahr)
+            self._index_version = version
+        return self._index
+
+    def monate_im_jahr(self, jahr) -> list:
+        return self._monatsindex()[1].get(int(jahr), [])
+
+    def finde_monat(self, monat, jahr):
+        return self._monatsindex()[0].get(_monatsschluessel(monat, jahr))
+
+    def setze_monat(self, monat, jahr, werte: dict, components=None):
+        """Legt den Monat an oder überschreibt dessen Werte (Komponenten nur, falls angegeben)."""
+        schluessel = _monatsschluessel(monat, jahr)
+
+        def _aendern(daten):
+            for eintrag in daten:
+                if _monatsschluessel(eintrag.get("monat", ""), eintrag.get("jahr", 0)) == schluessel:
+                    _setze_monatswerte(eintrag, werte, components)
+                    return
+            neu = {"monat": monat, "jahr": int(jahr)}
+            _setze_monatswerte(neu, werte, components)
+            daten.append(neu)
+
+        self.monate_datei.aktualisieren(_aendern)
+
+    def setze_monate(self, eintraege: list):
+        """Wie setze_monat für viele (monat, jahr, werte, components)-Tupel, in einem Schreibvorgang."""
+        def _aendern(daten):
+            index = {}
+            for eintrag in daten:
+                index.setdefault(_monatsschluessel(eintrag.get("monat", ""), eintrag.get("jahr", 0)), eintrag)
+            for monat, jahr, werte, components in eintraege:
+                schluessel = _monatsschluessel(monat, jahr)
+                eintrag = index.get(schluessel)
+                if eintrag is None:
+                    eintrag = index[schluessel] = {"monat": monat, "jahr": int(jahr)}
+                    daten.append(eintrag)
+                _setze_monatswerte(eintrag, werte, components)
+
+        self.monate_datei.aktualisieren(_aendern)
+
+    def aendere_monat(self, monat, jahr, werte: dict) -> bool:
+        """Überschreibt Werte eines vorhandenen Monats; False, wenn er nicht existiert."""
+        schluessel = _monatsschluessel(monat, jahr)
+
+        def _aendern(daten):
+            for eintrag in daten:
+                if _monatsschluessel(eintrag.get("monat", ""), eintrag.get("jahr", 0)) == schluessel:
+                    eintrag.update(werte)
+                    return True
+            return False
+
+        return self.monate_datei.aktualisieren(_aendern)
+
+    # --- Personal ---
+    def personal(self) -> list:
+        return self.personal_datei.lesen()
+
+    def mitarbeiter_hinzufuegen(self, mitarbeiter: dict):
+        self.personal_datei.aktualisieren(lambda liste: liste.append(mitarbeiter))
+
+    def mitarbeiter_loeschen(self, index: int) -> bool:
+        def _loeschen(liste):
+            if 0 <= index < len(liste):
+                del liste[index]
+                return True
+            return False
+        return self.personal_datei.aktualisieren(_loeschen)
+
+    def statistik(self) -> dict:
+        dateien = (self.monate_datei, self.personal_datei)
+        return {
+            "neu_geladen": sum(d.neu_geladen for d in dateien),
+            "schreibvorgaenge": sum(d.schreibvorgaenge for d in dateien),
+        }
+
+
+class Planspeicher:
+    """
+    Monats- und Personaldaten eines Plans samt abgeleiteter Ergebnisse.
+    Die Daten liegen in einem Backend (JsonSpeicher, SqliteSpeicher oder JournalSpeicher).
+
+    Die Monats-GuV aller Monate liegt als GuVStand vor. Eigene Änderungen
+    (Monat setzen/ändern, Mitarbeiter anlegen/löschen) werden gezielt in den
+    Stand übernommen, sofern seit dem Stand niemand sonst geschrieben hat;
+    andernfalls wird er beim nächsten Lesen neu aufgebaut.
+
+    Ein Plan ist genau eine Kostenstelle: Monate dürfen im Feld "kostenstelle"
+    nur diese nennen, sonst lehnen die Schreibmethoden sie mit ValueError ab.
+    """
+
+    def __init__(self, backend, tarife=None, kostenstelle=STANDARD_KOSTENSTELLE):
+        self.backend = backend
+        self.tarife = tarife            # Tariftabellen (tarife.py) oder None
+        self.kostenstelle = kostenstelle
+        self._lock = threading.Lock()
+        self._abgeleitet = {}
+        self._abgeleitet_version = None
+        self._stand = None
+        self._stand_version = None
+        self._wuerfel = None
+        self._aktive_schreiber = 0
+        self._schreib_nummer = 0
+        self.neu_aufgebaut = 0
+        self.nachgefuehrt = 0
+        self.wuerfel_aufgebaut = 0
+        self.wuerfel_nachgefuehrt = 0
+
+    # --- Rohdaten (geteilt, nicht verändern) ---
+    def monate(self) -> list:
+        return self.backend.monate()
+
+    def personal(self) -> list:
+        return self.backend.personal()
+
+    def finde_monat(self, monat, jahr):
+        return self.backend.finde_monat(monat, jahr)
+
+    # --- Schreiben ---
+    def _schreiben(self, schreiben, nachfuehren=None):
+        """
+        Führt schreiben() aus. nachfuehren(stand, ergebnis) liefert den neuen GuVStand;
+        er wird nur übernommen, wenn dieser Schreibvorgang der einzige im Prozess war
+        und die Version genau einen Schritt weiter ist (kein fremder Schreiber dazwischen).
+        """
+        with self._lock:
+            allein = self._aktive_schreiber == 0
+            self._aktive_schreiber += 1
+            self._schreib_nummer += 1
+            nummer = self._schreib_nummer
+            stand, stand_version = self._stand, self._stand_version
+        try:
+            vorher = self.version
+            ergebnis = schreiben()
+            nachher = self.version
+        finally:
+            with self._lock:
+                self._aktive_schreiber -= 1
+
+        neu = neu_wuerfel = None
+        if (nachfuehren is not None and allein and stand is not None
+                and stand_version == vorher and _versionsschritte(vorher, nachher) == 1):
+            neu = nachfuehren(stand, ergebnis)
+        wuerfel = self._wuerfel
+        if neu is not None and wuerfel is not None and wuerfel.stand is stand:
+            neu_wuerfel = wuerfel.nachgefuehrt(neu)
+        with self._lock:
+            if neu is not None and self._schreib_nummer == nummer:
+                self._stand, self._stand_version = neu, nachher
+                self.nachgefuehrt += 1
+                if neu_wuerfel is not None and self._wuerfel is wuerfel:
+                    self._wuerfel = neu_wuerfel
+                    self.wuerfel_nachgefuehrt += 1
+        return ergebnis
+
+    def _pruefe_kostenstelle(self, monat, jahr, werte: dict):
+        kostenstelle = werte.get("kostenstelle")
+        if kostenstelle and kostenstelle != self.kostenstelle:
+            raise ValueError(f"{monat} {jahr}: Kostenstelle '{kostenstelle}' gehört nicht zu diesem Plan "
+                             f"(Kostenstelle '{self.kostenstelle}').")
+
+    def setze_monat(self, monat, jahr, werte: dict, components=None):
+        self._pruefe_kostenstelle(monat, jahr, werte)
+        self._schreiben(lambda: self.backend.setze_monat(monat, jahr, werte, components),
+                        lambda stand, _: stand.mit_monat(monat, jahr, werte, components))
+
+    def setze_monate(self, eintraege: list):
+        for monat, jahr, werte, _ in eintraege:
+            self._pruefe_kostenstelle(monat, jahr, werte)
+        self._schreiben(lambda: self.backend.setze_monate(eintraege))
+
+    def aendere_monat(self, monat, jahr, werte: dict) -> bool:
+        self._pruefe_kostenstelle(monat, jahr, werte)
+        return self._schreiben(
+            lambda: self.backend.aendere_monat(monat, jahr, werte),
+            lambda stand, geaendert: stand.mit_monat(monat, jahr, werte, neu_anlegen=False) if geaendert else stand)
+
+    def mitarbeiter_hinzufuegen(self, mitarbeiter: dict):
+        self._schreiben(lambda: self.backend.mitarbeiter_hinzufuegen(mitarbeiter),
+                        lambda stand, _: _mit_mitarbeiter(stand, mitarbeiter, +1, self.tarife))
+
+    def mitarbeiter_loeschen(self, index: int) -> bool:
+        geloescht = []
+
+        def _loeschen():
+            # Erst nach dem Versionsvergleich lesen, damit der Eintrag zum Stand passt
+            liste = self.personal()
+            geloescht.append(liste[index] if 0 <= index < len(liste) else None)
+            return self.backend.mitarbeiter_loeschen(index)
+
+        return self._schreiben(
+            _loeschen,
+            lambda stand, ok: _mit_mitarbeiter(stand, geloescht[0], -1, self.tarife) if ok else stand)
+
+    @property
+    def version(self):
+        return self.backend.version
+
+    # --- abgeleitete Ergebnisse ---
+    def abgeleitet(self, schluessel, berechnen):
+        """Ergebnis von berechnen() für den aktuellen Datenstand (geteilt, nicht verändern)."""
+        version = self.version
+        with self._lock:
+            if self._abgeleitet_version != version:
+                self._abgeleitet = {}
+                self._abgeleitet_version = version
+            if schluessel in self._abgeleitet:
+                return self._abgeleitet[schluessel]
+        wert = berechnen()
+        with self._lock:
+            if self._abgeleitet_version == version:
+                self._abgeleitet[schluessel] = wert
+        return wert
+
+    def stand(self) -> GuVStand:
+        """GuV aller Monate zum aktuellen Datenstand (nachgeführt oder neu aufgebaut)."""
+        version = self.version
+        with self._lock:
+            if self._stand is not None and self._stand_version == version:
+                return self._stand
+        stand = GuVStand.aufbauen(self.monatssaetze(), self.vertraege(), self.tarife)
+        with self._lock:
+            self.neu_aufgebaut += 1
+            if self.version == version:
+                self._stand, self._stand_version = stand, version
+        return stand
+
+    def wuerfel(self, hierarchie) -> Wuerfel:
+        """Verdichtete Summen zum aktuellen Stand, zugeordnet über die Kostenstelle des Plans."""
+        stand = self.stand()
+        wuerfel = self._wuerfel
+        if wuerfel is not None and wuerfel.stand is stand and wuerfel.hierarchie is hierarchie:
+            return wuerfel
+        wuerfel = Wuerfel.aufbauen(stand, self.kostenstelle, hierarchie)
+        with self._lock:
+            self.wuerfel_aufgebaut += 1
+            if self._stand is stand:
+                self._wuerfel = wuerfel
+        return wuerfel
+
+    def statistik(self) -> dict:
+        """Zähler für /metrics: Neuaufbau/Nachführung von GuV und Würfel, Lade- und Schreibvorgänge des Backends."""
+        return {"guv_neu_aufgebaut": self.neu_aufgebaut, "guv_nachgefuehrt": self.nachgefuehrt,
+                "wuerfel_aufgebaut": self.wuerfel_aufgebaut, "wuerfel_nachgefuehrt": self.wuerfel_nachgefuehrt,
+                **self.backend.statistik()}
+
+    def monatssaetze(self) -> list:
+        """Monate als geprüfte Datensätze (berechnung.Monatssatz), einmal je Datenstand."""
+        return self.abgeleitet(("monatssaetze",), lambda: lies_monate(self.monate()))
+
+    def vertraege(self) -> list:
+        """Mitarbeiter als Verträge (personalkosten.Vertrag), gleiche Reihenfolge wie personal()."""
+        return self.abgeleitet(("vertraege",), lambda: lies_vertraege(self.personal()))
+
+    def jahre(self) -> list:
+        def _berechnen():
+            jahre = sorted({s.jahr for s in self.monatssaetze() if s.jahr})
+            return jahre or [datetime.now().year]
+        return self.abgeleitet(("jahre",), _berechnen)
+
+    def spalten(self, jahr=None):
+        return self.stand().auswahl(jahr).spalten
+
+    def zeitachse(self) -> PersonalZeitachse:
+        return self.stand().zeitachse
+
+    def personalkosten(self, jahr=None):
+        """Personalkosten je Zeile von spalten(jahr)."""
+        return self.stand().auswahl(jahr).personal
+
+
+def _versionsschritte(vorher, nachher) -> int:
+    """Anzahl Lade-/Schreibvorgänge zwischen zwei Versionen (JSON: Tupel je Datei, SQLite/Journal: Zähler)."""
+    if isinstance(vorher, tuple):
+        return sum(n - v for v, n in zip(vorher, nachher))
+    return nachher - vorher
+
+
+def _mit_mitarbeiter(stand: GuVStand, mitarbeiter, vorzeichen: int, tarife=None):
+    if mitarbeiter is None:
+        return None
+    vertrag = lies_vertrag(mitarbeiter)
+    if not vertrag.gueltig:
+        return stand
+    if tarife is not None and vertrag.tarif and tarife.kennt(vertrag):
+        return None     # Stufenverlauf und Erhöhungen: Stand neu aufbauen
+    return stand.mit_vertrag((vertrag.start, vertrag.ende), vorzeichen * vertrag.gehalt)
+
+
+def oeffne_speicher(daten_datei, personal_datei, db_datei=None, tarife=None, journal=None,
+                    kostenstelle=STANDARD_KOSTENSTELLE) -> Planspeicher:
+    """JSON-Dateien als Standard, SQLite-Datenbank falls db_datei, Journal falls journal (Verzeichnis) gesetzt ist."""
+    if db_datei:
+        from speicher_sqlite import SqliteSpeicher
+        return Planspeicher(SqliteSpeicher(db_datei), tarife, kostenstelle)
+    if journal:
+        from speicher_journal import JournalSpeicher
+        return Planspeicher(JournalSpeicher(journal), tarife, kostenstelle)
+    return Planspeicher(JsonSpeicher(daten_datei, personal_datei), tarife, kostenstelle)
@@ -0,0 +1,137 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Export der Monats-GuV als CSV, Excel (XLSX), Parquet oder Arrow.
+
+Die Zeilen werden blockweise aus den NumPy-Spalten erzeugt: CSV geht als
+Generator direkt in die Antwort, XLSX (XlsxWriter im constant_memory-Modus)
+und Parquet/Arrow (pyarrow, Record-Batches) werden in eine temporäre Datei
+geschrieben und von dort gestreamt. XlsxWriter und pyarrow sind optional.
+"""
+import csv
+import tempfile
+from io import StringIO
+
+import numpy as np
+
+from berechnung import GuV, MonatsSpalten
+
+KOPFZEILE = ["Jahr", "Monat", "Umsatz", "Kosten", "Gewinn", "Personalkosten"]
+
+BLOCKGROESSE = 1000     # Zeilen je Block
+
+# Format -> (Dateiendung, MIME-Typ, benötigtes Paket oder None)
+FORMATE = {
+    "csv": ("csv", "text/csv; charset=utf-8", None),
+    "xlsx": ("xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "xlsxwriter"),
+    "parquet": ("parquet", "application/vnd.apache.parquet", "pyarrow"),
+    "arrow": ("arrow", "application/vnd.apache.arrow.file", "pyarrow"),
+}
+
+
+class ExportNichtVerfuegbar(RuntimeError):
+    """Das für ein Format benötigte optionale Paket ist nicht installiert."""
+
+
+def _bloecke(spalten: MonatsSpalten, pers, guv: GuV, blockgroesse: int = BLOCKGROESSE, fortschritt=None):
+    """
+    Liefert je Block (Jahr, Monat, Umsatz, Kosten, Gewinn, Personalkosten) als Listen, auf 2 Stellen gerundet.
+    fortschritt: wird vor jedem Block mit dem erledigten Anteil aufgerufen (Hintergrundaufträge).
+    """
+    pers = np.asarray(pers, dtype=np.float64)
+    for i in range(0, len(spalten), blockgroesse):
+        if fortschritt is not None:
+            fortschritt(i / len(spalten))
+        s = slice(i, i + blockgroesse)
+        yield (spalten.jahr[s].tolist(), spalten.monat[s],
+               np.round(guv.revenue[s], 2).tolist(), np.round(guv.costs[s], 2).tolist(),
+               np.round(guv.profit[s], 2).tolist(), np.round(pers[s], 2).tolist())
+
+
+def csv_stream(spalten: MonatsSpalten, pers, guv: GuV, fortschritt=None):
+    """Generator über CSV-Textstücke (Semikolon-getrennt, ein Stück je Block)."""
+    if not len(spalten):
+        return
+    puffer = StringIO()
+    writer = csv.writer(puffer, delimiter=';')
+    writer.writerow(KOPFZEILE)
+    for block in _bloecke(spalten, pers, guv, fortschritt=fortschritt):
+        writer.writerows(zip(*block))
+        yield puffer.getvalue()
+        puffer.seek(0)
+        puffer.truncate()
+
+
+def _benoetigt(format_name: str):
+    paket = FORMATE[format_name][2]
+    try:
+        return __import__(paket)
+    except ImportError:
+        raise ExportNichtVerfuegbar(
+            f"Für den {format_name.upper()}-Export wird das Paket '{paket}' benötigt (pip install {paket})."
+        ) from None
+
+
+def schreibe_xlsx(spalten: MonatsSpalten, pers, guv: GuV, ziel, fortschritt=None):
+    """Schreibt ein Arbeitsblatt "Monatsdaten"; constant_memory hält nur die aktuelle Zeile im Speicher."""
+    xlsxwriter = _benoetigt("xlsx")
+    mappe = xlsxwriter.Workbook(ziel, {"constant_memory": True})
+    blatt = mappe.add_worksheet("Monatsdaten")
+    fett = mappe.add_format({"bold": True})
+    euro = mappe.add_format({"num_format": "#,##0.00 €"})
+    blatt.write_row(0, 0, KOPFZEILE, fett)
+    blatt.set_column(2, 5, 16)
+    zeile = 1
+    for block in _bloecke(spalten, pers, guv, fortschritt=fortschritt):
+        for jahr, monat, *betraege in zip(*block):
+            blatt.write_number(zeile, 0, jahr)
+            blatt.write_string(zeile, 1, monat)
+            for spalte, wert in enumerate(betraege, start=2):
+                blatt.write_number(zeile, spalte, wert, euro)
+            zeile += 1
+    mappe.close()
+
+
+def schreibe_arrow(spalten: MonatsSpalten, pers, guv: GuV, ziel, format_name: str = "parquet", fortschritt=None):
+    """Schreibt Parquet bzw. eine Arrow-IPC-Datei blockweise als Record-Batches."""
+    pa = _benoetigt(format_name)
+    schema = pa.schema([
+        ("jahr", pa.int64()), ("monat", pa.string()), ("umsatz", pa.float64()),
+        ("kosten", pa.float64()), ("gewinn", pa.float64()), ("personalkosten", pa.float64()),
+    ])
+    if format_name == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(ziel, schema)
+    else:
+        import pyarrow.ipc
+        writer = pyarrow.ipc.new_file(ziel, schema)
+    try:
+        for block in _bloecke(spalten, pers, guv, fortschritt=fortschritt):
+            writer.write_batch(pa.record_batch([pa.array(werte) for werte in block], schema=schema))
+    finally:
+        writer.close()
+
+
+def exportiere_datei(format_name: str, spalten: MonatsSpalten, pers, guv: GuV, fortschritt=None):
+    """
+    Schreibt XLSX/Parquet/Arrow in eine temporäre Datei und gibt sie (auf den Anfang
+    gespult) zurück; die Datei verschwindet beim Schließen.
+    """
+    datei = tempfile.TemporaryFile()
+    try:
+        if format_name == "xlsx":
+            schreibe_xlsx(spalten, pers, guv, datei, fortschritt)
+        else:
+            schreibe_arrow(spalten, pers, guv, datei, format_name, fortschritt)
+        datei.seek(0)
+    except BaseException:
+        datei.close()
+        raise
+    return datei
+
+
+def exportiere_bytes(format_name: str, spalten: MonatsSpalten, pers, guv: GuV, fortschritt=None) -> bytes:
+    """Der ganze Export in einem Stück (für Hintergrundaufträge, siehe auftraege.py)."""
+    if format_name == "csv":
+        return "".join(csv_stream(spalten, pers, guv, fortschritt)).encode("utf-8")
+    with exportiere_datei(format_name, spalten, pers, guv, fortschritt) as datei:
+        return datei.read()
@@ -0,0 +1,105 @@
+﻿# -*- coding: utf-8 -*-
+"""
+LRU-Cache für gerenderte Diagramm-Antworten (HTML-Seite mit Plotly-Fragment
+oder Figur-JSON).
+
+Schlüssel ist (Route, Query-Parameter); jeder Eintrag gehört zu einem Plan
+(Bereich) und dessen Datenstand. Ändert sich die Version eines Plans, werden
+dessen Einträge verworfen. Alle Pläne teilen sich einen Cache, begrenzt nach
+Anzahl Einträgen und Gesamtgröße in Bytes. Zu jedem
+Eintrag wird ein ETag aus dem Inhalt berechnet, so dass Browser mit
+If-None-Match eine 304-Antwort bekommen, ohne dass neu gerendert wird.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import NamedTuple
+
+
+class CacheEintrag(NamedTuple):
+    inhalt: bytes
+    content_type: str
+    etag: str
+
+
+class FigurCache:
+    """Threadsicherer LRU-Cache mit Treffer-/Fehlgriff-Zählern."""
+
+    def __init__(self, max_eintraege: int = 128, max_bytes: int = 64 * 1024 * 1024):
+        self.max_eintraege = max_eintraege
+        self.max_bytes = max_bytes
+        self._eintraege = OrderedDict()
+        self._bytes = 0
+        self._versionen = {}        # Bereich -> Datenstand
+        self._lock = threading.Lock()
+        self.treffer = 0
+        self.fehlgriffe = 0
+        self.verdraengt = 0
+        self.invalidierungen = 0
+
+    def _entfernen(self, bereich):
+        alte = [k for k in self._eintraege if k[0] == bereich]
+        for k in alte:
+            self._bytes -= len(self._eintraege.pop(k).inhalt)
+        return bool(alte)
+
+    def _pruefe_version(self, bereich, version):
+        if bereich not in self._versionen or self._versionen[bereich] != version:
+            if self._entfernen(bereich):
+                self.invalidierungen += 1
+            self._versionen[bereich] = version
+
+    def hole(self, version, schluessel, bereich=None):
+        """Eintrag zum Datenstand `version` des Plans `bereich` oder None."""
+        with self._lock:
+            self._pruefe_version(bereich, version)
+            eintrag = self._eintraege.get((bereich, schluessel))
+            if eintrag is None:
+                self.fehlgriffe += 1
+                return None
+            self._eintraege.move_to_end((bereich, schluessel))
+            self.treffer += 1
+            return eintrag
+
+    def ablegen(self, version, schluessel, inhalt: bytes, content_type: str, bereich=None) -> CacheEintrag:
+        """Legt inhalt ab (falls er in den Cache passt) und gibt den Eintrag samt ETag zurück."""
+        eintrag = CacheEintrag(inhalt, content_type, hashlib.sha1(inhalt).hexdigest())
+        if len(inhalt) > self.max_bytes:
+            return eintrag
+        with self._lock:
+            self._pruefe_version(bereich, version)
+            schluessel = (bereich, schluessel)
+            alt = self._eintraege.pop(schluessel, None)
+            if alt is not None:
+                self._bytes -= len(alt.inhalt)
+            self._eintraege[schluessel] = eintrag
+            self._bytes += len(inhalt)
+            while len(self._eintraege) > self.max_eintraege or self._bytes > self.max_bytes:
+                _, verdraengt = self._eintraege.popitem(last=False)
+                self._bytes -= len(verdraengt.inhalt)
+                self.verdraengt += 1
+        return eintrag
+
+    def leeren(self):
+        with self._lock:
+            self._eintraege.clear()
+            self._bytes = 0
+            self._versionen.clear()
+
+    def bereich_leeren(self, bereich):
+        """Verwirft alle Einträge eines Plans (z. B. wenn er geschlossen wird)."""
+        with self._lock:
+            self._entfernen(bereich)
+            self._versionen.pop(bereich, None)
+
+    def statistik(self) -> dict:
+        with self._lock:
+            return {
+                "eintraege": len(self._eintraege),
+                "bytes": self._bytes,
+                "bereiche": len(self._versionen),
+                "treffer": self.treffer,
+                "fehlgriffe": self.fehlgriffe,
+                "verdraengt": self.verdraengt,
+                "invalidierungen": self.invalidierungen,
+            }
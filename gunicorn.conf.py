@@ -0,0 +1,27 @@
+﻿# -*- coding: utf-8 -*-
+"""
+gunicorn-Konfiguration (nur Linux/macOS; unter Windows waitress, siehe server.py).
+
+Die App wird im Master geladen und vorgewärmt (preload_app), die Worker
+entstehen per fork und teilen sich die geladenen Module und den GuV-Stand
+copy-on-write. Jeder Worker bedient mehrere Anfragen parallel in Threads
+(NumPy gibt das GIL in den Rechenschritten frei). Worker werden nach
+max_requests Anfragen ersetzt; durch das Vorladen ist der Neustart ein fork.
+
+Umgebungsvariablen: FINANZPLAN_BIND, FINANZPLAN_WORKER, FINANZPLAN_THREADS.
+"""
+import multiprocessing
+import os
+
+wsgi_app = "wsgi:app"
+bind = os.environ.get("FINANZPLAN_BIND", "127.0.0.1:5000")
+workers = int(os.environ.get("FINANZPLAN_WORKER", min(2 * multiprocessing.cpu_count() + 1, 8)))
+threads = int(os.environ.get("FINANZPLAN_THREADS", 4))
+worker_class = "gthread"
+preload_app = True
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+max_requests = 2000
+max_requests_jitter = 200
+accesslog = "-"
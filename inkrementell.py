@@ -0,0 +1,224 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Inkrementell nachgeführte Monats-GuV.
+
+Ein GuVStand hält für alle Monate die Spalten, Personalkosten, Umsatz/Kosten/
+Gewinn, den kumulierten Gewinn und den Break-Even-Index. Ändert sich ein Monat
+oder kommt ein Vertrag hinzu bzw. fällt weg, entsteht ein neuer Stand, in dem
+nur die betroffenen Monate neu berechnet werden: bei einem Vertrag die Monate
+zwischen Beginn und Ende, beim kumulierten Gewinn der Rest ab dem ersten
+betroffenen Monat. Die Arrays werden dabei kopiert (ein memcpy), die teuren
+Schritte – Monatsdatensätze parsen, Personal-Zeitachse aufbauen, alle Monate
+neu rechnen – entfallen. Stände sind unveränderlich und können von mehreren
+Threads gleichzeitig gelesen werden.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from berechnung import KOMPONENTEN, GuV, MonatsSpalten, baue_spalten, berechne_guv, convertiere_monat_to_num
+from personalkosten import PersonalZeitachse
+
+
+class Aenderung(NamedTuple):
+    zeilen: object                  # Slice oder Indexarray der neu berechneten Zeilen (neuer Stand)
+    eingefuegt: Optional[int]       # Index einer neu eingefügten Zeile, sonst None
+
+    def alter_index(self, zeilen: np.ndarray) -> np.ndarray:
+        """Index derselben Zeilen im Vorgängerstand, -1 für die eingefügte Zeile."""
+        if self.eingefuegt is None:
+            return zeilen
+        return np.where(zeilen == self.eingefuegt, -1, zeilen - (zeilen > self.eingefuegt))
+
+
+KEINE_AENDERUNG = Aenderung(slice(0, 0), None)
+
+
+class Auswahl(NamedTuple):
+    spalten: MonatsSpalten
+    personal: np.ndarray
+    guv: GuV
+
+
+def _sortierschluessel(jahr, monat_num):
+    """Wie baue_spalten: nach Jahr, unbekannte Monatsnamen (0) am Ende des Jahres."""
+    return np.asarray(jahr, dtype=np.int64) * 16 + np.where(np.asarray(monat_num) == 0, 13, monat_num)
+
+
+def _zeilen(spalten: MonatsSpalten, auswahl) -> MonatsSpalten:
+    """Teilmenge der Zeilen (Slice oder Indexarray); Slices ergeben Sichten ohne Kopie."""
+    monat = spalten.monat[auswahl] if isinstance(auswahl, slice) else [spalten.monat[i] for i in auswahl]
+    return MonatsSpalten(monat, *(feld[auswahl] for feld in spalten[1:]))
+
+
+def _kopie(spalten: MonatsSpalten) -> MonatsSpalten:
+    return MonatsSpalten(list(spalten.monat), *(feld.copy() for feld in spalten[1:]))
+
+
+class GuVStand:
+    """Unveränderlicher Rechenstand über alle Monate (siehe Moduldoku)."""
+
+    __slots__ = ("spalten", "personal", "guv", "kumuliert", "break_even", "zeitachse", "aenderung",
+                 "_ordinale", "_schluessel", "_monoton")
+
+    def __init__(self, spalten: MonatsSpalten, zeitachse: PersonalZeitachse, personal, guv: GuV,
+                 kumuliert, break_even: int, aenderung=None):
+        self.spalten = spalten
+        # Gegenüber dem Vorgänger geänderte Zeilen: Aenderung, None bei einem neu aufgebauten Stand
+        self.aenderung = aenderung
+        self.zeitachse = zeitachse
+        self.personal = personal
+        self.guv = guv
+        self.kumuliert = kumuliert
+        self.break_even = break_even        # Index, -1 = nicht erreicht
+        self._ordinale = spalten.jahr * 12 + spalten.monat_num
+        self._schluessel = _sortierschluessel(spalten.jahr, spalten.monat_num)
+        # Nur mit unbekannten Monatsnamen sind die Ordinalzahlen nicht sortiert
+        self._monoton = bool(np.all(np.diff(self._ordinale) >= 0))
+
+    @classmethod
+    def aufbauen(cls, monate: list, personal_liste: list, tarife=None) -> "GuVStand":
+        """
+        Aus Einträgen bzw. Monatssätzen und Mitarbeitereinträgen bzw. Verträgen;
+        tarife: Tariftabellen für Tarifverträge (siehe PersonalZeitachse).
+        """
+        spalten = baue_spalten(monate)
+        zeitachse = PersonalZeitachse(personal_liste, tarife)
+        pers = zeitachse.kosten_fuer(spalten.monat_num, spalten.jahr)
+        guv = berechne_guv(spalten, pers)
+        kumuliert = np.cumsum(guv.profit)
+        return cls(spalten, zeitachse, pers, guv, kumuliert, cls._suche_break_even(kumuliert, 0))
+
+    @staticmethod
+    def _suche_break_even(kumuliert, ab: int) -> int:
+        erreicht = kumuliert[ab:] >= 0
+        return ab + int(np.argmax(erreicht)) if erreicht.any() else -1
+
+    def __len__(self):
+        return len(self.spalten)
+
+    # --- Lesen ---
+    def auswahl(self, jahr: Optional[int] = None) -> Auswahl:
+        """Alle Monate oder die Monate eines Jahres (zusammenhängender Bereich, ohne Kopie)."""
+        if jahr is None:
+            return Auswahl(self.spalten, self.personal, self.guv)
+        return self.bereich(self.jahresbereich(jahr, jahr))
+
+    def bereich(self, bereich: slice) -> Auswahl:
+        """Zusammenhängender Zeilenbereich (Sichten ohne Kopie)."""
+        return Auswahl(_zeilen(self.spalten, bereich), self.personal[bereich],
+                       GuV(*(feld[bereich] for feld in self.guv)))
+
+    def jahresbereich(self, von: int, bis: int) -> slice:
+        """Zeilenbereich der Jahre von..bis (einschließlich)."""
+        lo, hi = np.searchsorted(self.spalten.jahr, [von, bis + 1])
+        return slice(int(lo), int(hi))
+
+    def kumuliert_und_break_even(self, jahr: Optional[int] = None):
+        """Wie berechnung.kumuliert_und_break_even; für alle Monate aus dem nachgeführten Stand."""
+        if jahr is not None:
+            kumuliert = np.cumsum(self.guv.profit[self.jahresbereich(jahr, jahr)])
+            idx = self._suche_break_even(kumuliert, 0)
+        else:
+            kumuliert, idx = self.kumuliert, self.break_even
+        return kumuliert, (idx if idx >= 0 else None)
+
+    # --- Änderungen (liefern einen neuen Stand) ---
+    def _neu_berechnet(self, spalten: MonatsSpalten, zeitachse: PersonalZeitachse, pers, guv: GuV,
+                       kumuliert, zeilen, ab: int, eingefuegt: Optional[int] = None) -> "GuVStand":
+        """
+        Rechnet `zeilen` (Slice oder Indexarray) neu und den kumulierten Gewinn ab Index `ab`.
+        `eingefuegt`: Index einer gegenüber diesem Stand neu eingefügten Zeile.
+        """
+        teil = _zeilen(spalten, zeilen)
+        pers[zeilen] = zeitachse.kosten_fuer(teil.monat_num, teil.jahr)
+        neu = berechne_guv(teil, pers[zeilen])
+        for feld, werte in zip(guv, neu):
+            feld[zeilen] = werte
+        if ab < len(kumuliert):
+            # Startwert vorn addieren, damit die Summation exakt der von np.cumsum entspricht
+            rest = guv.profit[ab:].copy()
+            if ab > 0:
+                rest[0] += kumuliert[ab - 1]
+            kumuliert[ab:] = np.cumsum(rest)
+        break_even = self.break_even
+        if break_even < 0 or break_even >= ab:
+            break_even = self._suche_break_even(kumuliert, ab)
+        return GuVStand(spalten, zeitachse, pers, guv, kumuliert, break_even, Aenderung(zeilen, eingefuegt))
+
+    def mit_vertrag(self, grenzen, gehalt: float) -> "GuVStand":
+        """
+        Stand mit zusätzlichem Vertrag (grenzen = vertragsgrenzen(m)); ein negatives
+        Gehalt entfernt einen vorhandenen Vertrag wieder.
+        """
+        if grenzen is None or gehalt == 0:
+            return self
+        start, ende = grenzen
+        if ende is not None and ende < start:
+            return self
+        zeitachse = self.zeitachse.mit_vertrag(start, ende, gehalt)
+        n = len(self)
+        if self._monoton:
+            lo = int(np.searchsorted(self._ordinale, start, side="left"))
+            hi = n if ende is None else int(np.searchsorted(self._ordinale, ende, side="right"))
+            if lo >= hi:
+                return GuVStand(self.spalten, zeitachse, self.personal, self.guv, self.kumuliert, self.break_even,
+                                KEINE_AENDERUNG)
+            zeilen, ab = slice(lo, hi), lo
+        else:
+            betroffen = self._ordinale >= start
+            if ende is not None:
+                betroffen &= self._ordinale <= ende
+            zeilen = np.flatnonzero(betroffen)
+            if not len(zeilen):
+                return GuVStand(self.spalten, zeitachse, self.personal, self.guv, self.kumuliert, self.break_even,
+                                KEINE_AENDERUNG)
+            ab = int(zeilen[0])
+        return self._neu_berechnet(self.spalten, zeitachse, self.personal.copy(),
+                                   GuV(*(feld.copy() for feld in self.guv)), self.kumuliert.copy(), zeilen, ab)
+
+    def mit_monat(self, monat, jahr, werte: dict, components=None, neu_anlegen: bool = True):
+        """
+        Stand nach setze_monat (neu_anlegen=True) bzw. aendere_monat. None, wenn sich
+        die Änderung nicht gezielt nachführen lässt (unbekannter Monatsname).
+        """
+        mnum = convertiere_monat_to_num(monat)
+        if mnum == 0:
+            return None
+        schluessel = int(_sortierschluessel(int(jahr), mnum))
+        i = int(np.searchsorted(self._schluessel, schluessel, side="left"))
+        vorhanden = i < len(self) and self._schluessel[i] == schluessel
+
+        if vorhanden:
+            spalten = _kopie(self.spalten)
+            pers = self.personal.copy()
+            guv = GuV(*(feld.copy() for feld in self.guv))
+            kumuliert = self.kumuliert.copy()
+        elif neu_anlegen:
+            zeile = baue_spalten([{"monat": monat, "jahr": int(jahr)}])
+            spalten = MonatsSpalten(
+                self.spalten.monat[:i] + zeile.monat + self.spalten.monat[i:],
+                *(np.insert(feld, i, neu[0]) for feld, neu in zip(self.spalten[1:], zeile[1:])))
+            pers = np.insert(self.personal, i, 0.0)
+            guv = GuV(*(np.insert(feld, i, 0.0) for feld in self.guv))
+            kumuliert = np.insert(self.kumuliert, i, 0.0)
+        else:
+            return self
+
+        if "revenue" in werte:
+            spalten.revenue[i] = float(werte["revenue"] or 0.0)
+        if "costs" in werte:
+            spalten.costs[i] = float(werte["costs"] or 0.0)
+        if "personnel_included" in werte:
+            spalten.personnel_included[i] = bool(werte["personnel_included"])
+        if "kostenstelle" in werte:
+            spalten.kostenstelle[i] = str(werte["kostenstelle"] or "")
+        if components:
+            komp = [components.get(k) for k in KOMPONENTEN]
+            vollstaendig = None not in komp
+            for feld, wert in zip(KOMPONENTEN, komp):
+                getattr(spalten, feld)[i] = float(wert) if vollstaendig else 0.0
+            spalten.hat_komponenten[i] = vollstaendig
+
+        return self._neu_berechnet(spalten, self.zeitachse, pers, guv, kumuliert, slice(i, i + 1), i,
+                                   None if vorhanden else i)
@@ -0,0 +1,74 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Kompakte JSON-Antworten für die API.
+
+Serialisiert wird mit orjson, falls installiert (NumPy-Arrays direkt, ohne
+Umweg über Python-Listen), sonst mit dem json-Modul. Größere Antworten werden
+je nach Accept-Encoding mit Brotli (falls installiert) oder gzip komprimiert.
+Ein ETag aus dem Inhalt erlaubt 304-Antworten bei unveränderten Daten.
+"""
+import gzip
+import hashlib
+import json
+
+import numpy as np
+from flask import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_KOMPRIMIEREN = 1024     # kleinere Antworten lohnen die Kompression nicht
+
+
+def _numpy_standard(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"{type(obj).__name__} ist nicht JSON-serialisierbar")
+
+
+def serialisiere(daten) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(daten, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(daten, default=_numpy_standard, ensure_ascii=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _kodierung(accept_encoding) -> str:
+    if brotli is not None and accept_encoding["br"]:
+        return "br"
+    if accept_encoding["gzip"]:
+        return "gzip"
+    return None
+
+
+def json_antwort(daten, anfrage, status: int = 200) -> Response:
+    """JSON-Antwort mit ETag, Vary: Accept-Encoding und ggf. komprimiertem Inhalt."""
+    inhalt = serialisiere(daten)
+    antwort = Response(inhalt, status=status, mimetype="application/json")
+    antwort.vary.add("Accept-Encoding")
+    if status != 200:
+        return antwort
+
+    etag = hashlib.sha1(inhalt).hexdigest()
+    kodierung = _kodierung(anfrage.accept_encodings) if len(inhalt) >= MIN_KOMPRIMIEREN else None
+    antwort.set_etag(f"{etag}-{kodierung}" if kodierung else etag)
+    antwort.cache_control.no_cache = True
+    antwort = antwort.make_conditional(anfrage)
+    if antwort.status_code != 200 or kodierung is None:
+        return antwort
+
+    if kodierung == "br":
+        antwort.set_data(brotli.compress(inhalt, quality=5))
+    else:
+        antwort.set_data(gzip.compress(inhalt, compresslevel=6))
+    antwort.headers["Content-Encoding"] = kodierung
+    return antwort
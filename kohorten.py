@@ -0,0 +1,222 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Kostenvergleich OP vs. konservative Behandlung für ganze Patientenkohorten.
+
+Jeder Patient hat eigene Kosten und einen eigenen Betrachtungszeitraum in
+Monaten. Kumuliert kostet die OP einmalig (Implantat, Chirurg, Anästhesie)
+plus Nachsorge je Monat, die konservative Behandlung Material und Pflegezeit
+je Monat; beide Kurven sind linear in der Monatszahl t. Kreuzungsmonat (ab
+dem die OP nicht mehr teurer ist) und Gesamtkosten folgen daher für alle
+Patienten in einem Array-Durchgang. Die Perzentilbänder der kumulierten
+Differenz werden blockweise über die Monate berechnet, damit der Speicher
+auch bei zehntausenden Patienten begrenzt bleibt.
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from massenimport import ImportFehler, als_zahl
+from montecarlo import PERZENTILE, perzentile_sortiert
+
+# Werte je Patient; fehlende oder leere Felder erhalten den Standardwert
+STANDARDWERTE = {
+    "implant_unit_cost": 2600.0,
+    "surgeon_fee": 600.0,
+    "anesthesia_fee": 300.0,
+    "monthly_supplies_cost": 120.0,
+    "monthly_care_time_cost": 50.0,
+    "monthly_followup_cost": 0.0,
+    "horizon_months": 12,
+}
+FELDER = tuple(STANDARDWERTE)
+
+MAX_MONATE = 600            # 50 Jahre
+ZELLEN_JE_BLOCK = 2000000   # Patienten x Monate je Block der Perzentilberechnung
+
+
+class Kohorte(NamedTuple):
+    op_einmalig: np.ndarray     # Implantat + Chirurg + Anästhesie
+    op_monatlich: np.ndarray    # Nachsorge nach der OP
+    konservativ_monatlich: np.ndarray
+    monate: np.ndarray          # int64, Betrachtungszeitraum je Patient
+
+    def __len__(self):
+        return len(self.monate)
+
+
+class KohortenErgebnis(NamedTuple):
+    patienten: int
+    perzentile: tuple
+    aktiv: np.ndarray                   # Patienten je Monat 1..max(monate), deren Zeitraum ihn umfasst
+    differenz_perzentile: np.ndarray    # len(perzentile) x Monate; kumuliert OP − konservativ
+    op_mittel: np.ndarray               # mittlere kumulierte Kosten je Monat (aktive Patienten)
+    konservativ_mittel: np.ndarray
+    kreuzung: np.ndarray                # je Patient: erster Monat mit OP <= konservativ, -1 = nicht im Zeitraum
+    kreuzung_haeufigkeit: np.ndarray    # Anzahl Patienten je Kreuzungsmonat (Index = Monat)
+    op_gesamt: np.ndarray               # je Patient am Ende seines Zeitraums
+    konservativ_gesamt: np.ndarray
+
+    @property
+    def op_guenstiger_anteil(self) -> float:
+        """Anteil der Patienten, bei denen die OP im Zeitraum nicht teurer ist."""
+        return float(np.count_nonzero(self.kreuzung > 0)) / self.patienten if self.patienten else 0.0
+
+
+def lese_kohorte(zeilen: list, zeilen_versatz: int = 1):
+    """
+    Prüft alle Zeilen (Objekte mit den Spalten aus FELDER) und liefert
+    (Kohorte der gültigen Zeilen, Liste von ImportFehler).
+    """
+    n = len(zeilen)
+    werte, fehler_masken = {}, []
+    for f in FELDER:
+        roh = [z.get(f) for z in zeilen]
+        fehlt = np.array([r in (None, "") for r in roh], dtype=bool)
+        spalte = np.array([als_zahl(r) for r in roh], dtype=np.float64)
+        spalte[fehlt] = STANDARDWERTE[f]
+        werte[f] = spalte
+        fehler_masken.append((~np.isfinite(spalte), f"{f} ist keine Zahl"))
+        fehler_masken.append((np.isfinite(spalte) & (spalte < 0), f"{f} darf nicht negativ sein"))
+    monate = werte["horizon_months"]
+    fehler_masken.append((np.isfinite(monate) & ((monate != np.floor(monate)) | (monate < 1) | (monate > MAX_MONATE)),
+                          f"horizon_months muss eine ganze Zahl zwischen 1 und {MAX_MONATE} sein"))
+
+    ungueltig = np.zeros(n, dtype=bool)
+    fehler = []
+    for maske, meldung in fehler_masken:
+        ungueltig |= maske
+        fehler.extend(ImportFehler(int(i) + zeilen_versatz, meldung) for i in np.flatnonzero(maske))
+    fehler.sort(key=lambda f: f.zeile)
+
+    g = ~ungueltig
+    kohorte = Kohorte(
+        op_einmalig=(werte["implant_unit_cost"] + werte["surgeon_fee"] + werte["anesthesia_fee"])[g],
+        op_monatlich=werte["monthly_followup_cost"][g],
+        konservativ_monatlich=(werte["monthly_supplies_cost"] + werte["monthly_care_time_cost"])[g],
+        monate=monate[g].astype(np.int64),
+    )
+    return kohorte, fehler
+
+
+def kreuzungsmonate(kohorte: Kohorte) -> np.ndarray:
+    """
+    Erster Monat t >= 1 mit op_einmalig + op_monatlich*t <= konservativ_monatlich*t,
+    -1, wenn er nicht innerhalb des Zeitraums des Patienten liegt.
+    """
+    steigung = kohorte.konservativ_monatlich - kohorte.op_monatlich
+    kreuzung = np.full(len(kohorte), -1, dtype=np.int64)
+    steigt = steigung > 0
+    # Auf 9 Stellen runden, damit glatte Quotienten (z. B. 1200/100) nicht auf den Folgemonat springen
+    t = np.ceil(np.round(kohorte.op_einmalig[steigt] / steigung[steigt], 9))
+    kreuzung[steigt] = np.maximum(t, 1).astype(np.int64)
+    kreuzung[(steigung == 0) & (kohorte.op_einmalig <= 0)] = 1
+    kreuzung[kreuzung > kohorte.monate] = -1
+    return kreuzung
+
+
+def _summen_aktiver(monate: np.ndarray, werte: np.ndarray, laenge: int) -> np.ndarray:
+    """Summe von `werte` über alle Patienten mit monate >= t, für t = 1..laenge."""
+    je_ende = np.bincount(monate, weights=werte, minlength=laenge + 1)
+    return np.cumsum(je_ende[::-1])[::-1][1:laenge + 1]
+
+
+def vergleiche(kohorte: Kohorte, perzentile=PERZENTILE, fortschritt=None) -> KohortenErgebnis:
+    """
+    Kostenkurven, Kreuzungsmonate und Verteilungen für alle Patienten der Kohorte.
+    fortschritt: wird vor jedem Block mit dem erledigten Anteil aufgerufen (Hintergrundaufträge).
+    """
+    perzentile = tuple(perzentile)
+    n = len(kohorte)
+    laenge = int(kohorte.monate.max()) if n else 0
+    t = np.arange(1, laenge + 1, dtype=np.float64)
+
+    aktiv = _summen_aktiver(kohorte.monate, np.ones(n), laenge)
+    anzahl = np.maximum(aktiv, 1)
+    op_mittel = (_summen_aktiver(kohorte.monate, kohorte.op_einmalig, laenge)
+                 + t * _summen_aktiver(kohorte.monate, kohorte.op_monatlich, laenge)) / anzahl
+    konservativ_mittel = t * _summen_aktiver(kohorte.monate, kohorte.konservativ_monatlich, laenge) / anzahl
+
+    # Patienten nach absteigendem Zeitraum: die in Monat t aktiven bilden ein Präfix
+    reihenfolge = np.argsort(-kohorte.monate, kind="stable")
+    einmalig = kohorte.op_einmalig[reihenfolge]
+    steigung = (kohorte.op_monatlich - kohorte.konservativ_monatlich)[reihenfolge]
+    monate = kohorte.monate[reihenfolge]
+    aktiv_int = aktiv.astype(np.int64)
+
+    differenz_perzentile = np.empty((len(perzentile), laenge), dtype=np.float64)
+    block = max(1, ZELLEN_JE_BLOCK // max(n, 1))
+    for von in range(0, laenge, block):
+        if fortschritt is not None:
+            fortschritt(von / laenge)
+        bis = min(von + block, laenge)
+        k = int(aktiv_int[von])       # größte Zahl aktiver Patienten im Block
+        tb = t[von:bis]
+        # Monate x Patienten, damit die Sortierung entlang zusammenhängender Zeilen läuft
+        differenz = einmalig[None, :k] + tb[:, None] * steigung[None, :k]
+        differenz[tb[:, None] > monate[None, :k]] = np.inf
+        differenz.sort(axis=1)
+        differenz_perzentile[:, von:bis] = _perzentile_je_zeile(differenz, aktiv_int[von:bis], perzentile).T
+
+    kreuzung = kreuzungsmonate(kohorte)
+    return KohortenErgebnis(
+        patienten=n,
+        perzentile=perzentile,
+        aktiv=aktiv_int,
+        differenz_perzentile=differenz_perzentile,
+        op_mittel=op_mittel,
+        konservativ_mittel=konservativ_mittel,
+        kreuzung=kreuzung,
+        kreuzung_haeufigkeit=np.bincount(kreuzung[kreuzung > 0], minlength=laenge + 1),
+        op_gesamt=kohorte.op_einmalig + kohorte.op_monatlich * kohorte.monate,
+        konservativ_gesamt=kohorte.konservativ_monatlich * kohorte.monate,
+    )
+
+
+def _perzentile_je_zeile(sortiert: np.ndarray, anzahl: np.ndarray, perzentile) -> np.ndarray:
+    """Wie perzentile_sortiert, aber je Zeile nur über die ersten anzahl[i] Werte."""
+    pos = (anzahl[:, None] - 1) * (np.asarray(perzentile, dtype=np.float64)[None, :] / 100.0)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    zeilen = np.arange(sortiert.shape[0])[:, None]
+    unten, oben = sortiert[zeilen, lo], sortiert[zeilen, hi]
+    return unten + (oben - unten) * (pos - lo)
+
+
+def _verteilung(werte: np.ndarray, perzentile) -> dict:
+    if not len(werte):
+        return {"mittel": None, "perzentile": {str(q): None for q in perzentile}}
+    sortiert = np.sort(werte)
+    return {
+        "mittel": round(float(sortiert.mean()), 2),
+        "perzentile": {str(q): round(float(w), 2)
+                       for q, w in zip(perzentile, perzentile_sortiert(sortiert, perzentile))},
+    }
+
+
+def zusammenfassung(ergebnis: KohortenErgebnis) -> dict:
+    """Kennzahlen und Verteilungen als JSON-taugliches dict (ohne Werte je Patient)."""
+    q = ergebnis.perzentile
+    gekreuzt = ergebnis.kreuzung[ergebnis.kreuzung > 0]
+    kreuzung = _verteilung(gekreuzt.astype(np.float64), q)
+    return {
+        "patienten": ergebnis.patienten,
+        "op_guenstiger_anteil": round(ergebnis.op_guenstiger_anteil, 4),
+        "gesamtkosten": {
+            "op": _verteilung(ergebnis.op_gesamt, q),
+            "konservativ": _verteilung(ergebnis.konservativ_gesamt, q),
+            "differenz": _verteilung(ergebnis.op_gesamt - ergebnis.konservativ_gesamt, q),
+        },
+        "kreuzungsmonat": {
+            "patienten": int(len(gekreuzt)),
+            **kreuzung,
+            "haeufigkeit": ergebnis.kreuzung_haeufigkeit[1:],
+        },
+        "kurven": {
+            "monat": np.arange(1, len(ergebnis.aktiv) + 1),
+            "aktiv": ergebnis.aktiv,
+            "op_mittel": np.round(ergebnis.op_mittel, 2),
+            "konservativ_mittel": np.round(ergebnis.konservativ_mittel, 2),
+            "differenz_perzentile": {str(p): np.round(reihe, 2)
+                                     for p, reihe in zip(q, ergebnis.differenz_perzentile)},
+        },
+    }
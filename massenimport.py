@@ -0,0 +1,152 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Massenimport von Monatsdaten aus CSV oder JSON.
+
+Jede Zeile enthält jahr, monat, units, price, fixed_costs und variable_costs
+(monat als Name oder Zahl 1–12), optional eine kostenstelle; sie muss die
+Kostenstelle des Plans sein (ein Plan ist eine Kostenstelle), damit jedes
+(jahr, monat) genau eine Zeile des Plans bleibt. Die Werte werden einmal in
+NumPy-Spalten überführt und in einem Durchgang geprüft; Fehler werden je Zeile
+gemeldet.
+Personalkosten kommen aus der gemeinsamen PersonalZeitachse, Umsatz/Kosten/
+Gewinn werden wie in /calculate berechnet, und der Speicher schreibt alle
+Monate in einem einzigen Schreibvorgang.
+"""
+import csv
+import math
+from io import StringIO
+from typing import NamedTuple
+
+import numpy as np
+
+from berechnung import KOMPONENTEN, MONATSNAMEN, convertiere_monat_to_num
+from personalkosten import PersonalZeitachse
+
+FELDER = ("jahr", "monat") + KOMPONENTEN
+
+JAHR_MIN, JAHR_MAX = 1900, 2200
+
+
+class ImportFehler(NamedTuple):
+    zeile: int          # 1-basiert, bei CSV einschließlich Kopfzeile
+    meldung: str
+
+
+class ImportErgebnis(NamedTuple):
+    eintraege: list     # (monat, jahr, werte, components) für Planspeicher.setze_monate
+    fehler: list        # ImportFehler
+    zeilen: int
+
+
+def lese_csv(text: str) -> list:
+    """CSV mit Kopfzeile (Trennzeichen ';' oder ','); Spaltennamen wie FELDER."""
+    erste_zeile = text.split("\n", 1)[0]
+    trennzeichen = ";" if erste_zeile.count(";") >= erste_zeile.count(",") else ","
+    leser = csv.DictReader(StringIO(text), delimiter=trennzeichen)
+    if leser.fieldnames is None:
+        return []
+    leser.fieldnames = [f.strip().lower() for f in leser.fieldnames]
+    return list(leser)
+
+
+def lese_json(inhalt, schluessel: str = "monate") -> list:
+    """Liste von Objekten oder {"<schluessel>": [...]}."""
+    if isinstance(inhalt, dict):
+        inhalt = inhalt.get(schluessel)
+    if not isinstance(inhalt, list) or not all(isinstance(z, dict) for z in inhalt):
+        raise ValueError(f"JSON-Import erwartet eine Liste von Objekten oder {{\"{schluessel}\": [...]}}")
+    return inhalt
+
+
+def als_zahl(wert) -> float:
+    if isinstance(wert, bool) or wert is None:
+        return math.nan
+    if isinstance(wert, (int, float)):
+        return float(wert)
+    text = str(wert).strip().replace(" ", "")
+    if "," in text and "." not in text:
+        text = text.replace(",", ".")     # Dezimalkomma
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def _monatsnummer(wert) -> int:
+    zahl = als_zahl(wert)
+    if not math.isnan(zahl):
+        return int(zahl) if zahl.is_integer() and 1 <= zahl <= 12 else 0
+    return convertiere_monat_to_num(wert)
+
+
+def pruefe_und_berechne(zeilen: list, zeitachse: PersonalZeitachse, zeilen_versatz: int = 1,
+                        kostenstelle: str = None) -> ImportErgebnis:
+    """
+    Prüft alle Zeilen und berechnet die Monatswerte der gültigen. `zeilen_versatz`
+    wird auf den Listenindex addiert, um Zeilennummern zu melden (CSV: 2 wegen Kopfzeile).
+    `kostenstelle`: Kostenstelle des Plans; Zeilen mit einer anderen sind ungültig.
+    """
+    n = len(zeilen)
+    spalten = {f: np.array([als_zahl(z.get(f)) for z in zeilen], dtype=np.float64) for f in FELDER if f != "monat"}
+    monat_num = np.array([_monatsnummer(z.get("monat")) for z in zeilen], dtype=np.int64)
+    fehlt = {f: np.array([z.get(f) in (None, "") for z in zeilen], dtype=bool) for f in FELDER}
+
+    jahr = spalten["jahr"]
+    pruefungen = [
+        (fehlt["jahr"], "jahr fehlt"),
+        (~fehlt["jahr"] & (np.isnan(jahr) | (jahr != np.floor(jahr)) | (jahr < JAHR_MIN) | (jahr > JAHR_MAX)),
+         f"jahr muss eine ganze Zahl zwischen {JAHR_MIN} und {JAHR_MAX} sein"),
+        (fehlt["monat"], "monat fehlt"),
+        (~fehlt["monat"] & (monat_num == 0), "monat ist kein gültiger Monatsname bzw. keine Zahl 1–12"),
+    ]
+    for f in KOMPONENTEN:
+        werte = spalten[f]
+        pruefungen.append((fehlt[f], f"{f} fehlt"))
+        pruefungen.append((~fehlt[f] & ~np.isfinite(werte), f"{f} ist keine Zahl"))
+        pruefungen.append((np.isfinite(werte) & (werte < 0), f"{f} darf nicht negativ sein"))
+    units = spalten["units"]
+    pruefungen.append((np.isfinite(units) & (units != np.floor(units)), "units muss ganzzahlig sein"))
+    kostenstellen = [str(z.get("kostenstelle") or "").strip() for z in zeilen]
+    if kostenstelle is not None:
+        fremd = np.array([ks not in ("", kostenstelle) for ks in kostenstellen], dtype=bool)
+        pruefungen.append((fremd, f"kostenstelle gehört nicht zu diesem Plan (Kostenstelle '{kostenstelle}')"))
+
+    ungueltig = np.zeros(n, dtype=bool)
+    for maske, _ in pruefungen:
+        ungueltig |= maske
+
+    # Doppelte (jahr, monat) innerhalb des Imports: nur das erste Vorkommen gilt. Mit der
+    # Kostenstelle des Plans ist das auch je (jahr, monat, kostenstelle) eindeutig.
+    ordinale = np.where(ungueltig, -1, np.nan_to_num(jahr).astype(np.int64) * 12 + monat_num)
+    _, erstes = np.unique(ordinale, return_index=True)
+    doppelt = ~ungueltig
+    doppelt[erstes] = False
+    pruefungen.append((doppelt, "jahr/monat kommt im Import mehrfach vor"))
+    ungueltig |= doppelt
+
+    fehler = []
+    for maske, meldung in pruefungen:
+        fehler.extend(ImportFehler(int(i) + zeilen_versatz, meldung) for i in np.flatnonzero(maske))
+    fehler.sort(key=lambda f: f.zeile)
+
+    gueltig = ~ungueltig
+    units = units[gueltig]
+    price = spalten["price"][gueltig]
+    fixed_costs = spalten["fixed_costs"][gueltig]
+    variable_costs = spalten["variable_costs"][gueltig]
+    personal = zeitachse.kosten_fuer_ordinale(ordinale[gueltig])
+    revenue = units * price
+    costs = fixed_costs + variable_costs * units + personal
+    profit = revenue - costs
+
+    kostenstellen = [ks for ks, ok in zip(kostenstellen, gueltig) if ok]
+    eintraege = [
+        (MONATSNAMEN[m - 1], j, {"revenue": r, "costs": c, "profit": p, "personnel_included": True,
+                                 **({"kostenstelle": ks} if ks else {})},
+         {"units": u, "price": pr, "fixed_costs": fc, "variable_costs": vc})
+        for m, j, r, c, p, u, pr, fc, vc, ks in zip(
+            monat_num[gueltig].tolist(), jahr[gueltig].astype(np.int64).tolist(),
+            revenue.tolist(), costs.tolist(), profit.tolist(), units.astype(np.int64).tolist(),
+            price.tolist(), fixed_costs.tolist(), variable_costs.tolist(), kostenstellen)
+    ]
+    return ImportErgebnis(eintraege, fehler, n)
@@ -0,0 +1,195 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Messpunkte für Anfragen: Phasen-Timer, Metriken im Prometheus-Format und
+Profiling einzelner Anfragen.
+
+Routen markieren das Ende ihrer Abschnitte mit messpunkt("laden") usw. Die
+Dauer je Phase steht im Server-Timing-Header der Antwort (Entwicklerwerkzeuge des
+Browsers, Reiter Netzwerk/Timing) und geht in Histogramme je Route und Phase
+ein. Die Metriken gelten je Prozess: bei mehreren gunicorn-Workern sieht ein
+Abruf von /metrics nur den Worker, der ihn beantwortet.
+"""
+import io
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context
+
+# Obergrenzen der Histogramm-Eimer in Sekunden
+GRENZEN = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILER = ("cprofile", "pyinstrument")
+
+
+class ProfilerNichtVerfuegbar(RuntimeError):
+    """pyinstrument ist nicht installiert."""
+
+
+class Histogramm:
+    __slots__ = ("eimer", "summe", "anzahl")
+
+    def __init__(self):
+        self.eimer = [0] * (len(GRENZEN) + 1)     # letzter Eimer: > größte Grenze
+        self.summe = 0.0
+        self.anzahl = 0
+
+    def beobachte(self, sekunden: float):
+        self.eimer[bisect_left(GRENZEN, sekunden)] += 1
+        self.summe += sekunden
+        self.anzahl += 1
+
+
+def _wert(wert) -> str:
+    return str(wert).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_wert(v)}"' for k, v in labels.items()) + "}"
+
+
+class Metriken:
+    """Threadsichere Zähler und Histogramme je Route; weitere Werte kommen aus registrierten Funktionen."""
+
+    def __init__(self, praefix: str = "finanzplan"):
+        self.praefix = praefix
+        self._lock = threading.Lock()
+        self._anfragen = {}         # (route, methode, status) -> Anzahl
+        self._dauer = {}            # route -> Histogramm
+        self._phasen = {}           # (route, phase) -> Histogramm
+        self._quellen = []          # (name, typ, hilfe, funktion)
+
+    def anfrage(self, route: str, methode: str, status: int, sekunden: float, phasen=()):
+        with self._lock:
+            schluessel = (route, methode, status)
+            self._anfragen[schluessel] = self._anfragen.get(schluessel, 0) + 1
+            self._dauer.setdefault(route, Histogramm()).beobachte(sekunden)
+            for name, dauer in phasen:
+                self._phasen.setdefault((route, name), Histogramm()).beobachte(dauer)
+
+    def phase(self, route: str, name: str, sekunden: float):
+        """Phase außerhalb der Antwortzeit (z. B. gestreamter Export)."""
+        with self._lock:
+            self._phasen.setdefault((route, name), Histogramm()).beobachte(sekunden)
+
+    def gemessen(self, stream, route: str, name: str = "stream"):
+        """Reicht einen Antwort-Generator durch und erfasst, wie lange das Streamen dauert."""
+        t0 = time.perf_counter()
+        try:
+            yield from stream
+        finally:
+            self.phase(route, name, time.perf_counter() - t0)
+
+    def registriere(self, name: str, typ: str, hilfe: str, funktion):
+        """funktion() liefert eine Zahl oder eine Liste von (labels-dict, Zahl); wird bei jedem Abruf gelesen."""
+        self._quellen.append((name, typ, hilfe, funktion))
+
+    def _histogramm_text(self, name, hilfe, histogramme) -> list:
+        zeilen = [f"# HELP {name} {hilfe}", f"# TYPE {name} histogram"]
+        for labels, h in histogramme:
+            kumuliert = 0
+            for grenze, anzahl in zip(GRENZEN + ("+Inf",), h.eimer):
+                kumuliert += anzahl
+                zeilen.append(f"{name}_bucket{_labels({**labels, 'le': grenze})} {kumuliert}")
+            zeilen.append(f"{name}_sum{_labels(labels)} {h.summe:.6f}")
+            zeilen.append(f"{name}_count{_labels(labels)} {h.anzahl}")
+        return zeilen
+
+    def text(self) -> str:
+        """Alle Werte im Prometheus-Textformat (Version 0.0.4)."""
+        p = self.praefix
+        with self._lock:
+            # Kopien, damit das Formatieren nicht unter der Sperre läuft
+            anfragen = sorted(self._anfragen.items())
+            dauer = [({"route": r}, _kopie(h)) for r, h in sorted(self._dauer.items())]
+            phasen = [({"route": r, "phase": ph}, _kopie(h)) for (r, ph), h in sorted(self._phasen.items())]
+
+        zeilen = [f"# HELP {p}_anfragen_gesamt Beantwortete Anfragen je Route, Methode und Status.",
+                  f"# TYPE {p}_anfragen_gesamt counter"]
+        for (route, methode, status), anzahl in anfragen:
+            zeilen.append(f"{p}_anfragen_gesamt{_labels({'route': route, 'methode': methode, 'status': status})} {anzahl}")
+        zeilen += self._histogramm_text(f"{p}_anfrage_sekunden", "Antwortzeit je Route.", dauer)
+        zeilen += self._histogramm_text(f"{p}_phase_sekunden", "Dauer der Phasen je Route.", phasen)
+
+        for name, typ, hilfe, funktion in self._quellen:
+            werte = funktion()
+            zeilen += [f"# HELP {p}_{name} {hilfe}", f"# TYPE {p}_{name} {typ}"]
+            if isinstance(werte, (int, float)):
+                werte = [({}, werte)]
+            zeilen += [f"{p}_{name}{_labels(labels)} {wert}" for labels, wert in werte]
+        return "\n".join(zeilen) + "\n"
+
+
+def _kopie(h: Histogramm) -> Histogramm:
+    neu = Histogramm()
+    neu.eimer, neu.summe, neu.anzahl = list(h.eimer), h.summe, h.anzahl
+    return neu
+
+
+# --- Phasen der laufenden Anfrage ---
+def anfrage_beginnen():
+    g.messung_start = g.messung_letzter = time.perf_counter()
+    g.messung_phasen = []
+
+
+def messpunkt(name: str):
+    """
+    Schließt die Phase `name` ab: die Zeit seit dem letzten Messpunkt (bzw. dem Beginn
+    der Anfrage) zählt zu ihr. Außerhalb einer Anfrage ohne Wirkung.
+    """
+    if not has_request_context() or "messung_phasen" not in g:
+        return
+    jetzt = time.perf_counter()
+    g.messung_phasen.append((name, jetzt - g.messung_letzter))
+    g.messung_letzter = jetzt
+
+
+def anfrage_beenden():
+    """
+    (Gesamtdauer, Phasen) der laufenden Anfrage. Hat die Route Messpunkte gesetzt,
+    zählt die Zeit nach dem letzten bis zur fertigen Antwort als "rendern".
+    """
+    jetzt = time.perf_counter()
+    phasen = g.messung_phasen
+    if phasen:
+        phasen.append(("rendern", jetzt - g.messung_letzter))
+    return jetzt - g.messung_start, phasen
+
+
+def server_timing(gesamt: float, phasen, beschreibung=None) -> str:
+    """Wert für den Server-Timing-Header (Dauer in Millisekunden)."""
+    teile = [f"{name};dur={dauer * 1000:.2f}" for name, dauer in phasen]
+    teile.append(f"gesamt;dur={gesamt * 1000:.2f}" + (f';desc="{beschreibung}"' if beschreibung else ""))
+    return ", ".join(teile)
+
+
+# --- Profiling einzelner Anfragen ---
+def profil_starten(art: str):
+    if art == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            raise ProfilerNichtVerfuegbar(
+                "Für das Profiling mit pyinstrument wird das Paket 'pyinstrument' benötigt "
+                "(pip install pyinstrument).") from None
+        profiler = Profiler()
+        profiler.start()
+        return profiler
+    import cProfile
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def profil_beenden(profiler, art: str):
+    """Stoppt den Profiler; Rückgabe (Inhalt, Content-Type) des Berichts."""
+    if art == "pyinstrument":
+        profiler.stop()
+        return profiler.output_html(), "text/html; charset=utf-8"
+    import pstats
+    profiler.disable()
+    ausgabe = io.StringIO()
+    pstats.Stats(profiler, stream=ausgabe).sort_stats("cumulative").print_stats(60)
+    return ausgabe.getvalue(), "text/plain; charset=utf-8"
@@ -0,0 +1,189 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Monte-Carlo-Simulation der Szenario-Faktoren.
+
+Statt drei fester Faktorsätze wird jeder Faktor (Stückzahl, Preis, Fixkosten,
+variable Kosten) aus einer Verteilung gezogen, einmal pro Pfad. Weil der
+Monatsgewinn linear in den Produkten der Faktoren ist, entsteht die gesamte
+Gewinnmatrix (Pfade x Monate) aus einer einzigen Matrixmultiplikation; danach
+werden kumulierter Gewinn, Perzentilbänder und Break-Even-Monate ohne
+Python-Schleifen über Pfade oder Monate bestimmt.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+from berechnung import MonatsSpalten, break_even_indizes
+
+FAKTOREN = ("units_faktor", "preis_faktor", "fixkosten_faktor", "varkosten_faktor")
+
+PERZENTILE = (5, 25, 50, 75, 95)
+
+# Verteilungen: ("dreieck", min, modus, max), ("gleich", min, max),
+# ("normal", mittel, std), ("lognormal", mu, sigma) oder eine feste Zahl.
+VERTEILUNGEN = ("dreieck", "gleich", "normal", "lognormal")
+
+
+class MonteCarloErgebnis(NamedTuple):
+    pfade: int
+    perzentile: tuple               # z. B. (5, 25, 50, 75, 95)
+    kumuliert_perzentile: np.ndarray  # len(perzentile) x Monate
+    kumuliert_mittel: np.ndarray      # Monate
+    break_even_haeufigkeit: np.ndarray  # Anzahl Pfade je Break-Even-Monat (Index)
+    nie_break_even: int               # Pfade ohne Break-Even im Zeitraum
+    break_even_perzentile: dict       # Perzentil -> Monatsindex (None = nicht erreicht)
+    gesamtgewinn_perzentile: np.ndarray
+
+    @property
+    def break_even_wahrscheinlichkeit(self) -> float:
+        return 1.0 - self.nie_break_even / self.pfade if self.pfade else 0.0
+
+
+def pruefe_verteilung(name: str, verteilung):
+    """Wirft ValueError bei unbekannter oder unvollständiger Verteilungsangabe."""
+    if isinstance(verteilung, (int, float)):
+        return
+    art, *params = verteilung
+    anzahl = {"dreieck": 3, "gleich": 2, "normal": 2, "lognormal": 2}.get(art)
+    if anzahl is None:
+        raise ValueError(f"{name}: unbekannte Verteilung '{art}' (erlaubt: {', '.join(VERTEILUNGEN)})")
+    if len(params) != anzahl:
+        raise ValueError(f"{name}: '{art}' erwartet {anzahl} Parameter")
+    if art == "dreieck":
+        lo, modus, hi = params
+        if not (lo <= modus <= hi) or lo == hi:
+            raise ValueError(f"{name}: Dreieck braucht min <= modus <= max und min < max")
+    if art == "gleich" and not params[0] < params[1]:
+        raise ValueError(f"{name}: Gleichverteilung braucht min < max")
+    if art in ("normal", "lognormal") and params[1] < 0:
+        raise ValueError(f"{name}: Streuung darf nicht negativ sein")
+
+
+def verteilung_aus_text(text: str):
+    """
+    "0.7,1.0,1.3" -> Dreieck, "0.9,1.1" -> Gleichverteilung, "1.0" -> fest,
+    "normal:1.0,0.1" bzw. "lognormal:0,0.1" für die übrigen Verteilungen.
+    """
+    text = text.strip()
+    art = None
+    if ":" in text:
+        art, text = (t.strip() for t in text.split(":", 1))
+    werte = [float(w.replace(" ", "")) for w in text.split(",") if w.strip()]
+    if art is None:
+        art = {1: None, 2: "gleich", 3: "dreieck"}.get(len(werte), "?")
+        if art is None:
+            return werte[0]
+    return (art, *werte)
+
+
+def ziehe_faktoren(verteilungen: dict, pfade: int, rng: np.random.Generator) -> dict:
+    """Ein Faktor-Array (Länge pfade) je Eintrag aus FAKTOREN; fehlende Faktoren sind 1.0."""
+    gezogen = {}
+    for name in FAKTOREN:
+        verteilung = verteilungen.get(name, 1.0)
+        pruefe_verteilung(name, verteilung)
+        if isinstance(verteilung, (int, float)):
+            gezogen[name] = np.full(pfade, float(verteilung))
+            continue
+        art, *params = verteilung
+        if art == "dreieck":
+            gezogen[name] = rng.triangular(params[0], params[1], params[2], pfade)
+        elif art == "gleich":
+            gezogen[name] = rng.uniform(params[0], params[1], pfade)
+        elif art == "normal":
+            gezogen[name] = rng.normal(params[0], params[1], pfade)
+        else:
+            gezogen[name] = rng.lognormal(params[0], params[1], pfade)
+    return gezogen
+
+
+def gewinn_basis(spalten: MonatsSpalten, personalkosten) -> np.ndarray:
+    """
+    Zerlegt den Monatsgewinn in 4 Basiszeilen (4 x Monate), so dass für Faktoren
+    U, P, F, V gilt: Gewinn = (U*P)*B0 + F*B1 + (V*U)*B2 + B3.
+    Monate ohne Komponenten tragen ihren festen Gewinn in B3.
+    """
+    pers = np.asarray(personalkosten, dtype=np.float64)
+    k = spalten.hat_komponenten
+    basis = np.zeros((4, len(spalten)), dtype=np.float64)
+    basis[0] = np.where(k, spalten.units * spalten.price, 0.0)
+    basis[1] = np.where(k, -spalten.fixed_costs, 0.0)
+    basis[2] = np.where(k, -spalten.variable_costs * spalten.units, 0.0)
+    gespeichert = spalten.revenue - spalten.costs - np.where(spalten.personnel_included, 0.0, pers)
+    basis[3] = np.where(k, -pers, gespeichert)
+    return basis
+
+
+def perzentile_sortiert(sortiert: np.ndarray, perzentile, methode="linear") -> np.ndarray:
+    """
+    Perzentile entlang der letzten Achse eines bereits sortierten Arrays, wie
+    np.percentile (methode "linear" bzw. "hoeher" = method="higher").
+    """
+    n = sortiert.shape[-1]
+    pos = np.asarray(perzentile, dtype=np.float64) / 100.0 * (n - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.ceil(pos).astype(np.int64)
+    if methode == "hoeher":
+        return sortiert[..., hi]
+    gewicht = pos - lo
+    return sortiert[..., lo] + (sortiert[..., hi] - sortiert[..., lo]) * gewicht
+
+
+def simuliere(spalten: MonatsSpalten, personalkosten, verteilungen: dict,
+              pfade: int = 10000, seed: Optional[int] = None,
+              perzentile=PERZENTILE, fortschritt=None) -> MonteCarloErgebnis:
+    """
+    Simuliert `pfade` Faktor-Kombinationen über alle Monate von `spalten`.
+    fortschritt: wird zwischen den Rechenschritten mit dem erledigten Anteil aufgerufen.
+    """
+    if pfade <= 0:
+        raise ValueError("Anzahl Pfade muss positiv sein")
+    melden = fortschritt if fortschritt is not None else (lambda anteil: None)
+    rng = np.random.default_rng(seed)
+    f = ziehe_faktoren(verteilungen, pfade, rng)
+    monate = len(spalten)
+
+    koeff = np.empty((4, pfade), dtype=np.float64)
+    koeff[0] = f["units_faktor"] * f["preis_faktor"]
+    koeff[1] = f["fixkosten_faktor"]
+    koeff[2] = f["varkosten_faktor"] * f["units_faktor"]
+    koeff[3] = 1.0
+
+    # Monate x Pfade: jede Zeile ist zusammenhängend, das hält cumsum und Sortierung schnell
+    melden(0.1)
+    kumuliert = gewinn_basis(spalten, personalkosten).T @ koeff
+    np.cumsum(kumuliert, axis=0, out=kumuliert)
+    melden(0.4)
+
+    perzentile = tuple(perzentile)
+    if monate == 0:
+        leer = np.zeros((len(perzentile), 0))
+        return MonteCarloErgebnis(pfade, perzentile, leer, np.zeros(0), np.zeros(0, dtype=np.int64),
+                                  pfade, {q: None for q in perzentile}, np.zeros(len(perzentile)))
+
+    be = break_even_indizes(kumuliert.T)
+    haeufigkeit = np.bincount(be[be >= 0], minlength=monate)
+    nie = int(np.count_nonzero(be < 0))
+    mittel = kumuliert.mean(axis=1)
+
+    # Break-Even-Perzentile; nie erreichte Pfade zählen als "nach dem Zeitraum"
+    be_sortiert = np.sort(np.where(be < 0, monate, be))
+    be_perz = {}
+    for q, wert in zip(perzentile, perzentile_sortiert(be_sortiert, perzentile, methode="hoeher")):
+        be_perz[q] = int(wert) if wert < monate else None
+
+    # Vollständige Sortierung je Monat ist mit NumPy schneller als np.percentile (Partition)
+    melden(0.6)
+    kumuliert.sort(axis=1)
+    kum_perz = perzentile_sortiert(kumuliert, perzentile).T
+
+    return MonteCarloErgebnis(
+        pfade=pfade,
+        perzentile=perzentile,
+        kumuliert_perzentile=kum_perz,
+        kumuliert_mittel=mittel,
+        break_even_haeufigkeit=haeufigkeit,
+        nie_break_even=nie,
+        break_even_perzentile=be_perz,
+        gesamtgewinn_perzentile=kum_perz[:, -1],
+    )
@@ -0,0 +1,234 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Personalkosten je Monat.
+
+PersonalZeitachse baut aus der Mitarbeiterliste einmalig ein Differenz-Array
+über die Monats-Ordinalzahlen (Jahr*12 + Monat) und summiert es auf. Danach
+kostet eine Monatsabfrage O(1) und ein ganzer Planungshorizont O(Monate +
+Mitarbeiter) statt O(Monate x Mitarbeiter). Die Mitarbeiterdatensätze werden dafür
+einmal zu Verträgen (Beginn/Ende als Ordinalzahlen, Gehalt als float) normalisiert.
+Tarifverträge (tarif/entgeltgruppe/stufe) werden mit den Tabellen aus tarife.py
+bewertet, solange deren Entgeltgruppe bekannt ist; sonst gilt ihr festes Gehalt.
+"""
+from typing import NamedTuple, Optional
+
+import numpy as np
+
+
+def _ym_to_ordinal(monat:int, jahr:int) -> int:
+    """Wandelt (Monat, Jahr) in fortlaufenden Index (Jahre*12 + Monat) um."""
+    return int(jahr) * 12 + int(monat)
+
+def mitarbeiter_aktiv_im(monat: int, jahr: int, m: dict) -> bool:
+    """
+    Aktiv, wenn (startmonat/startjahr) <= (monat/jahr) <= (endmonat/endjahr) (falls Enddatum gesetzt).
+    Rückwärtskompatibel: fehlen Jahresfelder, wird startjahr=1900, endjahr=None angenommen.
+    """
+    grenzen = vertragsgrenzen(m)
+    if grenzen is None:
+        return False
+    start, end = grenzen
+    cur = _ym_to_ordinal(monat, jahr)
+    if end is not None:
+        return start <= cur <= end
+    return start <= cur
+
+def vertragsgrenzen(m: dict):
+    """
+    (start, ende) als Ordinalzahlen, ende=None bei unbefristeten Verträgen.
+    None, wenn der Datensatz keinen gültigen Beginn hat.
+    """
+    try:
+        startmonat = m.get("startmonat")
+        if not startmonat or not isinstance(startmonat, int):
+            return None
+        if not (1 <= startmonat <= 12):
+            return None
+
+        startjahr = m.get("startjahr")
+        startjahr = int(startjahr) if startjahr not in (None, "",) else 1900
+
+        endmonat = m.get("endmonat")
+        endmonat = int(endmonat) if (endmonat not in (None, "",)) else None
+        endjahr  = m.get("endjahr")
+        endjahr  = int(endjahr) if (endjahr not in (None, "",)) else None
+
+        start = _ym_to_ordinal(startmonat, startjahr)
+        if endmonat is not None and endjahr is not None:
+            return start, _ym_to_ordinal(endmonat, endjahr)
+        return start, None
+    except Exception:
+        return None
+
+class Vertrag(NamedTuple):
+    """Geprüfter Mitarbeiterdatensatz."""
+    start: Optional[int]        # Ordinalzahl; None = kein gültiger Beginn bzw. ungültiges Gehalt
+    ende: Optional[int]         # Ordinalzahl; None = unbefristet
+    gehalt: float
+    rolle: str
+    tarif: Optional[str] = None         # Tarifvertrag, z. B. "TV-Ärzte"; None = festes Gehalt
+    entgeltgruppe: Optional[str] = None
+    stufe: int = 1                      # Stufe bei Vertragsbeginn
+
+    @property
+    def gueltig(self) -> bool:
+        return self.start is not None and (self.ende is None or self.ende >= self.start)
+
+    def aktiv(self, ordinale) -> np.ndarray:
+        """Bool-Array: Vertrag läuft im jeweiligen Monat (Array von Ordinalzahlen)."""
+        aktiv = ordinale >= self.start
+        if self.ende is not None:
+            aktiv &= ordinale <= self.ende
+        return aktiv
+
+
+def lies_vertrag(m: dict) -> Vertrag:
+    grenzen = vertragsgrenzen(m)
+    try:
+        gehalt = float(m.get("gehalt", 0.0))
+    except (TypeError, ValueError):
+        grenzen, gehalt = None, 0.0
+    start, ende = grenzen if grenzen is not None else (None, None)
+    tarif = m.get("tarif") or None
+    try:
+        stufe = int(m.get("stufe") or 1)
+    except (TypeError, ValueError):
+        tarif, stufe = None, 1
+    return Vertrag(start, ende, gehalt, m.get("rolle", ""), tarif, m.get("entgeltgruppe") or None, stufe)
+
+
+def lies_vertraege(personal_liste: list) -> list:
+    """Verträge zu einer Mitarbeiterliste; bereits gelesene Verträge bleiben unverändert."""
+    return [m if isinstance(m, Vertrag) else lies_vertrag(m) for m in personal_liste]
+
+
+def _tariflich(vertraege: list, tarife) -> np.ndarray:
+    """Bool je Vertrag: wird nach Tariftabelle bezahlt (ohne Tabellen: keiner)."""
+    return np.fromiter((tarife is not None and bool(v.tarif) and tarife.kennt(v) for v in vertraege),
+                       dtype=bool, count=len(vertraege))
+
+
+def vertragskosten(vertraege: list, ordinale, tarife=None) -> np.ndarray:
+    """Kosten je Vertrag (Zeilen, alle gültig) und Monat (Spalten, Ordinalzahlen)."""
+    ordinale = np.asarray(ordinale, dtype=np.int64)
+    n = len(vertraege)
+    tariflich = _tariflich(vertraege, tarife)
+    starts = np.fromiter((v.start for v in vertraege), dtype=np.int64, count=n)
+    enden = np.fromiter((-1 if v.ende is None else v.ende for v in vertraege), dtype=np.int64, count=n)
+    gehaelter = np.fromiter((v.gehalt for v in vertraege), dtype=np.float64, count=n)
+    aktiv = (ordinale[None, :] >= starts[:, None]) & ((enden[:, None] < 0) | (ordinale[None, :] <= enden[:, None]))
+    matrix = np.where(aktiv, gehaelter[:, None], 0.0)
+    if tariflich.any():
+        matrix[tariflich] = tarife.kostenmatrix([v for v, t in zip(vertraege, tariflich) if t], ordinale)
+    return matrix
+
+
+def berechne_personalkosten(monat_nummer: int, jahr: int, personal_liste: list) -> float:
+    return sum(float(m.get("gehalt", 0.0)) for m in personal_liste if mitarbeiter_aktiv_im(monat_nummer, jahr, m))
+
+
+class PersonalZeitachse:
+    """Vorberechneter Personalkosten-Verlauf über Monats-Ordinalzahlen."""
+
+    __slots__ = ("_start", "_verlauf")
+
+    def __init__(self, personal_liste: list, tarife=None):
+        """
+        personal_liste: Mitarbeitereinträge oder Verträge (lies_vertraege).
+        tarife: Tariftabellen (tarife.py) für Tarifverträge, None = nur feste Gehälter.
+        """
+        vertraege = [v for v in lies_vertraege(personal_liste) if v.gueltig]
+        tariflich = _tariflich(vertraege, tarife)
+        if tariflich.any():
+            self._start, self._verlauf = 0, np.zeros(1, dtype=np.float64)
+            self._feste_gehaelter([v for v, t in zip(vertraege, tariflich) if not t])
+            start, verlauf = tarife.verlauf([v for v, t in zip(vertraege, tariflich) if t])
+            self._addiere(start, verlauf)
+        else:
+            self._feste_gehaelter(vertraege)
+
+    def _feste_gehaelter(self, vertraege: list):
+        if not vertraege:
+            self._start = 0
+            self._verlauf = np.zeros(1, dtype=np.float64)
+            return
+
+        n = len(vertraege)
+        starts = np.fromiter((v.start for v in vertraege), dtype=np.int64, count=n)
+        enden = np.fromiter((-1 if v.ende is None else v.ende + 1 for v in vertraege), dtype=np.int64, count=n)
+        gehaelter = np.fromiter((v.gehalt for v in vertraege), dtype=np.float64, count=n)
+        befristet = enden >= 0
+
+        lo = int(starts.min())
+        hi = int(max(starts.max(), enden.max()))
+        diff = np.zeros(hi - lo + 1, dtype=np.float64)
+        np.add.at(diff, starts - lo, gehaelter)
+        np.add.at(diff, enden[befristet] - lo, -gehaelter[befristet])
+
+        # Auf- und Abbuchungen heben sich in Gleitkomma nicht immer exakt auf
+        self._start = lo
+        self._verlauf = np.round(np.cumsum(diff), 6)
+
+    def _addiere(self, start: int, verlauf: np.ndarray):
+        """Addiert einen weiteren Verlauf (letzter Wert gilt unbegrenzt weiter)."""
+        alt_start, alt = self._start, self._verlauf
+        if not alt.any():
+            self._start, self._verlauf = start, verlauf
+            return
+        lo = min(alt_start, start)
+        hi = max(alt_start + len(alt), start + len(verlauf))
+        summe = np.zeros(hi - lo, dtype=np.float64)
+        for s, v in ((alt_start, alt), (start, verlauf)):
+            summe[s - lo:s - lo + len(v)] += v
+            summe[s - lo + len(v):] += v[-1]
+        self._start = lo
+        self._verlauf = np.round(summe, 6)
+
+    @classmethod
+    def _aus_verlauf(cls, start: int, verlauf: np.ndarray) -> "PersonalZeitachse":
+        zeitachse = cls.__new__(cls)
+        zeitachse._start = start
+        zeitachse._verlauf = verlauf
+        return zeitachse
+
+    def mit_vertrag(self, start: int, ende, gehalt: float) -> "PersonalZeitachse":
+        """
+        Neue Zeitachse mit einem zusätzlichen Vertrag von start bis ende (Ordinalzahlen,
+        ende=None: unbefristet); ein negatives Gehalt nimmt einen Vertrag wieder heraus.
+        Geändert werden nur die Monate der Vertragslaufzeit.
+        """
+        if ende is not None and ende < start:
+            return self
+        alt_start, alt = self._start, self._verlauf
+        if not alt.any():
+            alt_start, alt = start, alt[:1]
+        lo = min(alt_start, start)
+        hi = max(alt_start + len(alt) - 1, start if ende is None else ende + 1)
+        verlauf = np.empty(hi - lo + 1, dtype=np.float64)
+        vorne = alt_start - lo
+        verlauf[:vorne] = 0.0
+        verlauf[vorne:vorne + len(alt)] = alt
+        verlauf[vorne + len(alt):] = alt[-1]      # letzter Wert gilt unbegrenzt weiter
+
+        von = start - lo
+        bis = len(verlauf) if ende is None else ende + 1 - lo
+        verlauf[von:bis] = np.round(verlauf[von:bis] + gehalt, 6)
+        return self._aus_verlauf(lo, verlauf)
+
+    def kosten(self, monat: int, jahr: int) -> float:
+        """Personalkosten eines einzelnen Monats."""
+        idx = _ym_to_ordinal(monat, jahr) - self._start
+        if idx < 0:
+            return 0.0
+        return float(self._verlauf[min(idx, len(self._verlauf) - 1)])
+
+    def kosten_fuer_ordinale(self, ordinale) -> np.ndarray:
+        """Personalkosten für ein Array von Monats-Ordinalzahlen."""
+        idx = np.asarray(ordinale, dtype=np.int64) - self._start
+        werte = self._verlauf[np.clip(idx, 0, len(self._verlauf) - 1)]
+        return np.where(idx < 0, 0.0, werte)
+
+    def kosten_fuer(self, monat_num, jahr) -> np.ndarray:
+        """Personalkosten für parallele Arrays von Monatsnummern und Jahren."""
+        ordinale = np.asarray(jahr, dtype=np.int64) * 12 + np.asarray(monat_num, dtype=np.int64)
+        return self.kosten_fuer_ordinale(ordinale)
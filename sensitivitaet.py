@@ -0,0 +1,192 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Sensitivitätsanalyse: wie verschieben sich Break-Even und Gesamtgewinn, wenn
+Preis, Stückzahl, Fix-/variable Kosten oder einzelne Gehälter variieren?
+
+Der Monatsgewinn ist linear in den Koeffizienten
+    [U*P, F, V*U, 1, s_1, ..., s_k]
+(U/P/F/V = Faktoren auf Stückzahl, Preis, Fix- und variable Kosten, s_i = Faktor
+auf das Gehalt des i-ten ausgewählten Mitarbeiters). Ein Modell hält die
+zugehörigen Basiszeilen (Koeffizienten x Monate); jeder Rasterpunkt ist damit
+eine Zeile einer Matrixmultiplikation. Große Raster werden blockweise
+berechnet und ab einer Schwelle auf einen Prozess-Pool verteilt.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+from berechnung import MonatsSpalten
+from montecarlo import FAKTOREN, gewinn_basis
+from personalkosten import lies_vertraege, vertragskosten
+
+BLOCKGROESSE = 50000        # Rasterpunkte je Block (Speicher: Block x Monate x 8 Byte)
+POOL_SCHWELLE = 200000      # ab so vielen Punkten wird parallel gerechnet
+MAX_PUNKTE = 2000000
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class SensitivitaetsModell(NamedTuple):
+    basis: np.ndarray       # (4 + k) x Monate
+    mitarbeiter: list       # Indizes in der Personalliste, deren Gehalt variiert wird
+
+
+class Bewertung(NamedTuple):
+    break_even: np.ndarray  # Monatsindex je Punkt, -1 = nicht erreicht
+    gesamtgewinn: np.ndarray
+
+
+def baue_modell(spalten: MonatsSpalten, personalkosten, personal_liste: list,
+                mitarbeiter=(), tarife=None) -> SensitivitaetsModell:
+    """
+    Basiszeilen für die Monate in `spalten`. Die Gehälter der Mitarbeiter mit den
+    Indizes `mitarbeiter` erhalten eigene Zeilen, alle übrigen bleiben fest.
+    personal_liste: Mitarbeitereinträge oder Verträge (lies_vertraege);
+    tarife: Tariftabellen, mit denen auch die Personalkosten berechnet wurden.
+    """
+    mitarbeiter = list(mitarbeiter)
+    vertraege = lies_vertraege([personal_liste[i] for i in mitarbeiter])
+    basis = np.zeros((4 + len(mitarbeiter), len(spalten)), dtype=np.float64)
+    ordinale = spalten.jahr * 12 + spalten.monat_num
+    # Personalkosten wirken in Monaten mit Komponenten und in Monaten ohne enthaltene Personalkosten
+    wirkt = spalten.hat_komponenten | ~spalten.personnel_included
+
+    pers_fest = np.array(personalkosten, dtype=np.float64)
+    gueltig = [i for i, v in enumerate(vertraege) if v.gueltig]
+    anteile = vertragskosten([vertraege[i] for i in gueltig], ordinale, tarife)
+    for i, anteil in zip(gueltig, anteile):
+        pers_fest -= anteil
+        basis[4 + i] = np.where(wirkt, -anteil, 0.0)
+
+    basis[:4] = gewinn_basis(spalten, pers_fest)
+    return SensitivitaetsModell(basis, mitarbeiter)
+
+
+def koeffizienten(modell: SensitivitaetsModell, werte: dict, anzahl: int) -> np.ndarray:
+    """
+    Koeffizientenmatrix (anzahl x Basiszeilen). `werte` bildet Parameternamen
+    (FAKTOREN oder "gehalt:<index>") auf Skalare oder Arrays der Länge anzahl ab;
+    fehlende Parameter sind 1.0.
+    """
+    def f(name):
+        return np.broadcast_to(np.asarray(werte.get(name, 1.0), dtype=np.float64), (anzahl,))
+
+    koeff = np.ones((anzahl, modell.basis.shape[0]), dtype=np.float64)
+    koeff[:, 0] = f("units_faktor") * f("preis_faktor")
+    koeff[:, 1] = f("fixkosten_faktor")
+    koeff[:, 2] = f("varkosten_faktor") * f("units_faktor")
+    for zeile, index in enumerate(modell.mitarbeiter, start=4):
+        koeff[:, zeile] = f(f"gehalt:{index}")
+    return koeff
+
+
+def _bewerte_block(basis: np.ndarray, koeff: np.ndarray):
+    kumuliert = koeff @ basis
+    np.cumsum(kumuliert, axis=1, out=kumuliert)
+    erreicht = kumuliert >= 0
+    be = np.where(erreicht.any(axis=1), erreicht.argmax(axis=1), -1)
+    return be, kumuliert[:, -1].copy()
+
+
+def _prozess_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Wird in Anfrage-Threads angelegt: kein fork aus einem Prozess mit mehreren Threads
+            methoden = multiprocessing.get_all_start_methods()
+            kontext = multiprocessing.get_context("forkserver" if "forkserver" in methoden else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 1, mp_context=kontext)
+        return _pool
+
+
+def bewerte(modell: SensitivitaetsModell, koeff: np.ndarray, parallel=None) -> Bewertung:
+    """Break-Even-Index und Gesamtgewinn für jede Zeile von `koeff`."""
+    n = koeff.shape[0]
+    if modell.basis.shape[1] == 0:
+        return Bewertung(np.full(n, -1, dtype=np.int64), np.zeros(n))
+    if n > MAX_PUNKTE:
+        raise ValueError(f"Raster zu groß ({n} Punkte, maximal {MAX_PUNKTE})")
+
+    bloecke = [koeff[i:i + BLOCKGROESSE] for i in range(0, n, BLOCKGROESSE)]
+    if parallel is None:
+        parallel = n >= POOL_SCHWELLE and (os.cpu_count() or 1) > 1
+    if parallel and len(bloecke) > 1:
+        pool = _prozess_pool()
+        ergebnisse = list(pool.map(_bewerte_block, [modell.basis] * len(bloecke), bloecke))
+    else:
+        ergebnisse = [_bewerte_block(modell.basis, b) for b in bloecke]
+
+    return Bewertung(
+        np.concatenate([e[0] for e in ergebnisse]),
+        np.concatenate([e[1] for e in ergebnisse]),
+    )
+
+
+class TornadoZeile(NamedTuple):
+    parameter: str
+    niedrig: float          # Faktor
+    hoch: float
+    gewinn_niedrig: float
+    gewinn_hoch: float
+    break_even_niedrig: int
+    break_even_hoch: int
+
+
+def tornado(modell: SensitivitaetsModell, spanne: float = 0.1):
+    """
+    One-at-a-time-Analyse: jeder Parameter einzeln auf 1-spanne und 1+spanne.
+    Liefert (Basis-Bewertung, Zeilen sortiert nach Wirkung auf den Gesamtgewinn).
+    """
+    parameter = list(FAKTOREN) + [f"gehalt:{i}" for i in modell.mitarbeiter]
+    n = 1 + 2 * len(parameter)
+    werte = {p: np.ones(n) for p in parameter}
+    for i, p in enumerate(parameter):
+        werte[p][1 + 2 * i] = 1.0 - spanne
+        werte[p][2 + 2 * i] = 1.0 + spanne
+    ergebnis = bewerte(modell, koeffizienten(modell, werte, n), parallel=False)
+
+    zeilen = [
+        TornadoZeile(p, 1.0 - spanne, 1.0 + spanne,
+                     float(ergebnis.gesamtgewinn[1 + 2 * i]), float(ergebnis.gesamtgewinn[2 + 2 * i]),
+                     int(ergebnis.break_even[1 + 2 * i]), int(ergebnis.break_even[2 + 2 * i]))
+        for i, p in enumerate(parameter)
+    ]
+    zeilen.sort(key=lambda z: abs(z.gewinn_hoch - z.gewinn_niedrig), reverse=True)
+    basis = (int(ergebnis.break_even[0]), float(ergebnis.gesamtgewinn[0]))
+    return basis, zeilen
+
+
+def raster(modell: SensitivitaetsModell, param_x: str, werte_x, param_y: str, werte_y,
+           parallel=None) -> Bewertung:
+    """Vollständiges 2-D-Raster; Ergebnisse als Arrays der Form (len(werte_y), len(werte_x))."""
+    werte_x = np.asarray(werte_x, dtype=np.float64)
+    werte_y = np.asarray(werte_y, dtype=np.float64)
+    if param_x == param_y:
+        raise ValueError("Für ein 2-D-Raster werden zwei verschiedene Parameter benötigt")
+    gitter_y, gitter_x = np.meshgrid(werte_y, werte_x, indexing="ij")
+    n = gitter_x.size
+    koeff = koeffizienten(modell, {param_x: gitter_x.ravel(), param_y: gitter_y.ravel()}, n)
+    ergebnis = bewerte(modell, koeff, parallel=parallel)
+    form = (len(werte_y), len(werte_x))
+    return Bewertung(ergebnis.break_even.reshape(form), ergebnis.gesamtgewinn.reshape(form))
+
+
+def groesste_gehaelter(personal_liste: list, spalten: MonatsSpalten, anzahl: int, tarife=None) -> list:
+    """Indizes der `anzahl` Mitarbeiter mit den höchsten Gehaltskosten im betrachteten Zeitraum."""
+    ordinale = spalten.jahr * 12 + spalten.monat_num
+    if len(ordinale) == 0:
+        return []
+    vertraege = lies_vertraege(personal_liste)
+    gueltig = [i for i, v in enumerate(vertraege) if v.gueltig]
+    # Blockweise, damit die Matrix Verträge x Monate auch bei vielen Mitarbeitern klein bleibt
+    block = max(1, BLOCKGROESSE // len(ordinale))
+    summen = np.concatenate([[]] + [vertragskosten([vertraege[i] for i in gueltig[von:von + block]], ordinale, tarife)
+                                    .sum(axis=1) for von in range(0, len(gueltig), block)])
+    kosten = [(float(k), i) for k, i in zip(summen, gueltig)]
+    kosten.sort(reverse=True)
+    return [i for k, i in kosten[:anzahl] if k > 0]
@@ -0,0 +1,70 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Startet die App mit einem Produktiv-Server statt des Flask-Entwicklungsservers.
+
+Unter Linux/macOS gunicorn (mehrere Worker-Prozesse mit Threads, Einstellungen
+aus gunicorn.conf.py), unter Windows bzw. ohne gunicorn waitress (ein Prozess
+mit mehreren Threads).
+
+    python3 server.py
+    python3 server.py --bind 0.0.0.0:8000 --worker 4 --threads 8
+"""
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _verfuegbar(modul: str) -> bool:
+    from importlib.util import find_spec
+    return find_spec(modul) is not None
+
+
+def starte_gunicorn(bind, worker, threads):
+    from gunicorn.app.wsgiapp import run
+    argv = [sys.argv[0], "-c", os.path.join(BASE_DIR, "gunicorn.conf.py"), "--chdir", BASE_DIR]
+    if bind:
+        argv += ["--bind", bind]
+    if worker:
+        argv += ["--workers", str(worker)]
+    if threads:
+        argv += ["--threads", str(threads)]
+    sys.argv = argv
+    run()
+
+
+def starte_waitress(bind, threads):
+    from waitress import serve
+    sys.path.insert(0, BASE_DIR)
+    from app import erstelle_app
+    serve(erstelle_app(), listen=bind or os.environ.get("FINANZPLAN_BIND", "127.0.0.1:5000"),
+          threads=threads or int(os.environ.get("FINANZPLAN_THREADS", 8)))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Finanzplanungs-Tool mit Produktiv-Server starten")
+    parser.add_argument("--bind", help="Adresse:Port (Standard: 127.0.0.1:5000 bzw. FINANZPLAN_BIND)")
+    parser.add_argument("--worker", type=int, help="Anzahl Worker-Prozesse (nur gunicorn)")
+    parser.add_argument("--threads", type=int, help="Threads je Worker")
+    parser.add_argument("--server", choices=("gunicorn", "waitress"),
+                        help="Server erzwingen (Standard: gunicorn, falls verfügbar, sonst waitress)")
+    args = parser.parse_args(argv)
+
+    server = args.server
+    if server is None:
+        server = "gunicorn" if os.name != "nt" and _verfuegbar("gunicorn") else "waitress"
+    if not _verfuegbar(server):
+        print(f"[FEHLER] {server} ist nicht installiert (pip install -r requirements.txt).", file=sys.stderr)
+        return 1
+    if server == "gunicorn":
+        starte_gunicorn(args.bind, args.worker, args.threads)
+    else:
+        if args.worker:
+            print("[INFO] waitress läuft in einem Prozess; --worker wird ignoriert.", file=sys.stderr)
+        starte_waitress(args.bind, args.threads)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,469 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Journal-Backend für die Plandaten: Änderungen werden als Ereignisse angehängt.
+
+Jede Änderung (Monate setzen/ändern, Mitarbeiter anlegen/löschen) ist eine
+Zeile in journal.jsonl mit fortlaufender Version; ein Schreibvorgang hängt also
+eine Zeile an, statt die ganze Datei neu zu schreiben. Der Stand im Speicher
+entsteht aus dem letzten Schnappschuss (stand-<version>.json) und den
+Ereignissen danach und wird anschließend nur um neu angehängte Zeilen
+fortgeschrieben – auch bei Änderungen aus anderen Worker-Prozessen.
+
+Nach SCHNAPPSCHUSS_ABSTAND Ereignissen schreibt ein Hintergrund-Thread einen
+Schnappschuss und verschiebt die davon abgedeckten Zeilen in ein Archivsegment
+(journal-<von>-<bis>.jsonl). Die Segmente bleiben erhalten: jeder frühere Stand
+lässt sich ab dem nächstälteren Schnappschuss rekonstruieren (stand_bei), zwei
+Versionen lassen sich vergleichen (unterschied). Von den Schnappschüssen bleiben
+die neuesten erhalten und ältere ausgedünnt, je Verdopplung des Alters einer;
+der Weg zum nächstälteren Schnappschuss wächst so nur mit dem Alter der Version.
+"""
+import copy
+import json
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from datetime import datetime
+
+from datenspeicher import Dateisperre, _monatsschluessel, _setze_monatswerte
+
+JOURNAL = "journal.jsonl"
+SPERRE = "journal.lock"
+SCHNAPPSCHUSS_ABSTAND = 1000    # Ereignisse im Journal, ab denen verdichtet wird
+MAX_SCHNAPPSCHUESSE = 10        # die neuesten; ältere werden ausgedünnt, die Segmente bleiben
+
+_SCHNAPPSCHUSS = re.compile(r"stand-(\d+)\.json")
+_SEGMENT = re.compile(r"journal-(\d+)-(\d+)\.jsonl")
+
+
+class VersionNichtVerfuegbar(LookupError):
+    """Die Version liegt in der Zukunft oder ihre Ereignisse sind nicht mehr vorhanden."""
+
+
+def _ueberzaehlig(versionen: list, abstand: int) -> list:
+    """
+    Zu löschende Schnappschüsse: außer den neuesten MAX_SCHNAPPSCHUESSE bleibt je Altersstufe
+    (Alter in Vielfachen von `abstand`, Stufe = Zweierpotenz) nur der älteste erhalten – er
+    rückt mit der Zeit in die nächste Stufe nach, ohne dort eine Lücke zu hinterlassen.
+    """
+    neueste = versionen[-1] if versionen else 0
+    stufen = set()
+    loeschen = []
+    for v in versionen[:-MAX_SCHNAPPSCHUESSE]:
+        stufe = ((neueste - v) // max(abstand, 1)).bit_length()
+        if stufe in stufen:
+            loeschen.append(v)
+        stufen.add(stufe)
+    return loeschen
+
+
+def _zeile(ereignis: dict) -> bytes:
+    return (json.dumps(ereignis, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _schreibe_atomar(pfad, inhalt: bytes):
+    ordner, name = os.path.split(os.path.abspath(pfad))
+    fd, tmp = tempfile.mkstemp(dir=ordner, prefix=f".{name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(inhalt)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, pfad)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+class Stand:
+    """
+    Monate und Mitarbeiter zu einer Version. anwenden() kopiert die Listen und
+    geänderte Einträge, herausgegebene Listen bleiben also unverändert.
+    """
+
+    __slots__ = ("version", "monate", "personal", "_index")
+
+    def __init__(self, version: int = 0, monate=(), personal=()):
+        self.version = version
+        self.monate = list(monate)
+        self.personal = list(personal)
+        self._index = {}
+        for i, d in enumerate(self.monate):
+            self._index.setdefault(_monatsschluessel(d.get("monat", ""), d.get("jahr", 0)), i)
+
+    def finde(self, monat, jahr):
+        i = self._index.get(_monatsschluessel(monat, jahr))
+        return None if i is None else self.monate[i]
+
+    def anwenden(self, ereignis: dict):
+        """Übernimmt ein Ereignis und gibt dessen Ergebnis zurück (wie die Methoden von JsonSpeicher)."""
+        art = ereignis["art"]
+        ergebnis = None
+        if art == "monate":
+            monate, neu = list(self.monate), {}
+            for monat, jahr, werte, components in ereignis["eintraege"]:
+                schluessel = _monatsschluessel(monat, jahr)
+                i = self._index.get(schluessel, neu.get(schluessel))
+                if i is None:
+                    eintrag = {"monat": monat, "jahr": int(jahr)}
+                    neu[schluessel] = len(monate)
+                    monate.append(eintrag)
+                else:
+                    eintrag = monate[i] = dict(monate[i])
+                _setze_monatswerte(eintrag, werte, components)
+            self.monate = monate
+            self._index.update(neu)
+        elif art == "aendern":
+            i = self._index.get(_monatsschluessel(ereignis["monat"], ereignis["jahr"]))
+            ergebnis = i is not None
+            if ergebnis:
+                self.monate = list(self.monate)
+                self.monate[i] = {**self.monate[i], **ereignis["werte"]}
+        elif art == "mitarbeiter_neu":
+            self.personal = self.personal + [ereignis["mitarbeiter"]]
+        elif art == "mitarbeiter_weg":
+            index = ereignis["index"]
+            ergebnis = 0 <= index < len(self.personal)
+            if ergebnis:
+                self.personal = self.personal[:index] + self.personal[index + 1:]
+        elif art == "ersetzen":
+            neu = Stand(self.version, ereignis["monate"], ereignis["personal"])
+            self.monate, self.personal, self._index = neu.monate, neu.personal, neu._index
+        else:
+            raise ValueError(f"Unbekanntes Journal-Ereignis '{art}'")
+        self.version = ereignis["v"]
+        return ergebnis
+
+
+class JournalSpeicher:
+    """Speicher-Backend mit einem Journal-Verzeichnis (siehe Moduldoku)."""
+
+    def __init__(self, verzeichnis):
+        self.verzeichnis = verzeichnis
+        os.makedirs(verzeichnis, exist_ok=True)
+        self._journal = os.path.join(verzeichnis, JOURNAL)
+        self._lock = threading.Lock()
+        self._schreib_lock = threading.Lock()
+        self._verdichtung = None            # laufender Hintergrund-Thread
+        self._datei = None                  # (inode, Größe) des zuletzt gelesenen Journals
+        self._position = 0                  # gelesene Bytes (nur vollständige Zeilen)
+        self._erste = None                  # erste Version im aktuellen Journal
+        self.neu_geladen = 0
+        self.schreibvorgaenge = 0
+        self.verdichtungen = 0
+        with self._lock:
+            self._stand = self._rekonstruieren(None)
+            self._nachlesen()
+
+    # --- Dateien ---
+    def _schnappschuesse(self) -> list:
+        """Versionen der vorhandenen Schnappschüsse, aufsteigend."""
+        return sorted(int(m.group(1)) for m in map(_SCHNAPPSCHUSS.fullmatch, os.listdir(self.verzeichnis)) if m)
+
+    def _segmente(self) -> list:
+        """(von, bis, Pfad) der Archivsegmente, aufsteigend."""
+        segmente = []
+        for name in os.listdir(self.verzeichnis):
+            m = _SEGMENT.fullmatch(name)
+            if m:
+                segmente.append((int(m.group(1)), int(m.group(2)), os.path.join(self.verzeichnis, name)))
+        return sorted(segmente)
+
+    def _lade_schnappschuss(self, version: int) -> Stand:
+        with open(os.path.join(self.verzeichnis, f"stand-{version:010d}.json"), "r", encoding="utf-8") as f:
+            inhalt = json.load(f)
+        self.neu_geladen += 1
+        return Stand(inhalt["version"], inhalt["monate"], inhalt["personal"])
+
+    def _ereignisse(self, von: int, bis=None):
+        """Ereignisse mit von < Version <= bis (bis=None: alle) aus Segmenten und Journal, aufsteigend."""
+        dateien = [pfad for s_von, s_bis, pfad in self._segmente() if s_bis > von and (bis is None or s_von <= bis)]
+        dateien.append(self._journal)
+        for pfad in dateien:
+            try:
+                with open(pfad, "rb") as f:
+                    daten = f.read()
+            except FileNotFoundError:
+                continue
+            for zeile in daten[:daten.rfind(b"\n") + 1].splitlines():
+                if not zeile.strip():
+                    continue
+                ereignis = json.loads(zeile)
+                if ereignis["v"] <= von:
+                    continue
+                if bis is not None and ereignis["v"] > bis:
+                    return
+                yield ereignis
+
+    def _rekonstruieren(self, version) -> Stand:
+        """Stand zur Version (None = neueste) aus dem nächstälteren Schnappschuss und den Ereignissen danach."""
+        for _ in range(3):
+            basis = [v for v in self._schnappschuesse() if version is None or v <= version]
+            stand = self._lade_schnappschuss(basis[-1]) if basis else Stand()
+            luecke = None
+            for ereignis in self._ereignisse(stand.version, version):
+                if ereignis["v"] != stand.version + 1:
+                    luecke = f"Ereignisse {stand.version + 1}–{ereignis['v'] - 1} fehlen im Journal."
+                    break
+                stand.anwenden(ereignis)
+            if luecke is None and version is not None and stand.version != version:
+                luecke = f"Version {version} ist nicht vorhanden (neueste: {stand.version})."
+            if luecke is None:
+                return stand
+            # Eine gleichzeitige Verdichtung kann Zeilen zwischen Segment- und Journalliste verschieben
+        raise VersionNichtVerfuegbar(luecke)
+
+    def _nachlesen(self):
+        """Übernimmt neu angehängte Zeilen (auch aus anderen Prozessen); nur unter self._lock aufrufen."""
+        try:
+            st = os.stat(self._journal)
+        except FileNotFoundError:
+            return
+        if self._datei == (st.st_ino, st.st_size):
+            return
+        if self._datei is None or self._datei[0] != st.st_ino or st.st_size < self._position:
+            # Neues Journal (erster Aufruf oder verdichtet): von vorn lesen, Bekanntes überspringen
+            self._position, self._erste = 0, None
+        with open(self._journal, "rb") as f:
+            f.seek(self._position)
+            daten = f.read()
+        vollstaendig = daten[:daten.rfind(b"\n") + 1]
+        for zeile in vollstaendig.splitlines():
+            if not zeile.strip():
+                continue
+            ereignis = json.loads(zeile)
+            if self._erste is None:
+                self._erste = ereignis["v"]
+            if ereignis["v"] <= self._stand.version:
+                continue
+            if ereignis["v"] != self._stand.version + 1:
+                # Lücke: ein anderer Prozess hat verdichtet, bevor wir die Zeilen gelesen haben
+                self._stand = self._rekonstruieren(ereignis["v"] - 1)
+            self._stand.anwenden(ereignis)
+        self._position += len(vollstaendig)
+        self._datei = (st.st_ino, self._position)
+        if len(vollstaendig) == len(daten):
+            self._datei = (st.st_ino, st.st_size)
+
+    def _schreiben(self, ereignis: dict, pruefen=None):
+        """
+        Hängt ein Ereignis an und übernimmt es. pruefen(stand) -> bool entscheidet auf dem
+        aktuellen Stand, ob es überhaupt geschrieben wird; sonst ist das Ergebnis False.
+        """
+        with self._schreib_lock, Dateisperre(os.path.join(self.verzeichnis, SPERRE)):
+            with self._lock:
+                self._nachlesen()
+                if pruefen is not None and not pruefen(self._stand):
+                    return False
+                ereignis = {"v": self._stand.version + 1, "zeit": datetime.now().isoformat(timespec="seconds"),
+                            **ereignis}
+                zeile = _zeile(ereignis)
+                with open(self._journal, "ab") as f:
+                    # Reste eines abgebrochenen Schreibvorgangs abschneiden
+                    if f.tell() > self._position:
+                        f.truncate(self._position)
+                    f.write(zeile)
+                    f.flush()
+                    os.fsync(f.fileno())
+                    st = os.fstat(f.fileno())
+                ergebnis = self._stand.anwenden(ereignis)
+                self._position += len(zeile)
+                self._datei = (st.st_ino, self._position)
+                if self._erste is None:
+                    self._erste = ereignis["v"]
+                self.schreibvorgaenge += 1
+                faellig = self._stand.version - self._erste + 1 >= SCHNAPPSCHUSS_ABSTAND
+                stand = (self._stand.version, self._stand.monate, self._stand.personal)
+        if faellig:
+            self._verdichten_starten(*stand)
+        return True if ergebnis is None else ergebnis
+
+    # --- Verdichtung ---
+    def _verdichten_starten(self, version, monate, personal):
+        with self._lock:
+            if self._verdichtung is not None and self._verdichtung.is_alive():
+                return
+            self._verdichtung = threading.Thread(target=self.verdichten, args=(version, monate, personal),
+                                                 name="journal-verdichtung", daemon=True)
+            self._verdichtung.start()
+
+    def verdichten(self, version=None, monate=None, personal=None):
+        """
+        Schreibt einen Schnappschuss (Standard: aktueller Stand) und verschiebt die
+        Journalzeilen bis zu dessen Version in ein Archivsegment.
+        """
+        if version is None:
+            with self._lock:
+                self._nachlesen()
+                version, monate, personal = self._stand.version, self._stand.monate, self._stand.personal
+        if version == 0:
+            return
+        # Die Listen sind unveränderlich (siehe Stand), der Schnappschuss braucht keine Sperre
+        _schreibe_atomar(os.path.join(self.verzeichnis, f"stand-{version:010d}.json"),
+                         json.dumps({"version": version, "monate": monate, "personal": personal},
+                                    ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        with self._schreib_lock, Dateisperre(os.path.join(self.verzeichnis, SPERRE)):
+            with open(self._journal, "rb") as f:
+                daten = f.read()
+            zeilen = daten[:daten.rfind(b"\n") + 1].splitlines(keepends=True)
+            zeilen = [z for z in zeilen if z.strip()]
+            # Versionen sind aufsteigend: die abgedeckten Zeilen bilden den Anfang
+            n = sum(1 for z in zeilen if json.loads(z)["v"] <= version)
+            if n:
+                erste = json.loads(zeilen[0])["v"]
+                _schreibe_atomar(os.path.join(self.verzeichnis, f"journal-{erste:010d}-{version:010d}.jsonl"),
+                                 b"".join(zeilen[:n]))
+                _schreibe_atomar(self._journal, b"".join(zeilen[n:]))
+                with self._lock:
+                    self._datei = None      # neues Journal: beim nächsten Zugriff von vorn lesen
+                self.verdichtungen += 1
+        for alt_version in _ueberzaehlig(self._schnappschuesse(), SCHNAPPSCHUSS_ABSTAND):
+            try:
+                os.remove(os.path.join(self.verzeichnis, f"stand-{alt_version:010d}.json"))
+            except OSError:
+                pass
+
+    # --- Lesen ---
+    @property
+    def version(self):
+        with self._lock:
+            self._nachlesen()
+            return self._stand.version
+
+    def _aktuell(self) -> Stand:
+        with self._lock:
+            self._nachlesen()
+            return self._stand
+
+    def monate(self) -> list:
+        return self._aktuell().monate
+
+    def monate_im_jahr(self, jahr) -> list:
+        return [d for d in self.monate() if _monatsschluessel(d.get("monat", ""), d.get("jahr", 0))[0] == int(jahr)]
+
+    def finde_monat(self, monat, jahr):
+        with self._lock:
+            self._nachlesen()
+            return self._stand.finde(monat, jahr)
+
+    def personal(self) -> list:
+        return self._aktuell().personal
+
+    # --- Schreiben ---
+    def setze_monat(self, monat, jahr, werte: dict, components=None):
+        """Legt den Monat an oder überschreibt dessen Werte (Komponenten nur, falls angegeben)."""
+        self.setze_monate([(monat, jahr, werte, components)])
+
+    def setze_monate(self, eintraege: list):
+        """Wie setze_monat für viele (monat, jahr, werte, components)-Tupel, als ein Ereignis."""
+        self._schreiben({"art": "monate", "eintraege": [[m, int(j), w, c or None] for m, j, w, c in eintraege]})
+
+    def aendere_monat(self, monat, jahr, werte: dict) -> bool:
+        """Überschreibt Werte eines vorhandenen Monats; False, wenn er nicht existiert."""
+        return self._schreiben({"art": "aendern", "monat": monat, "jahr": int(jahr), "werte": werte},
+                               lambda stand: stand.finde(monat, jahr) is not None)
+
+    def mitarbeiter_hinzufuegen(self, mitarbeiter: dict):
+        self._schreiben({"art": "mitarbeiter_neu", "mitarbeiter": mitarbeiter})
+
+    def mitarbeiter_loeschen(self, index: int) -> bool:
+        ereignis = {"art": "mitarbeiter_weg", "index": index}
+
+        def _pruefen(stand):
+            if not 0 <= index < len(stand.personal):
+                return False
+            # Der gelöschte Eintrag steht nur für die Historie mit im Ereignis
+            ereignis["mitarbeiter"] = stand.personal[index]
+            return True
+        return self._schreiben(ereignis, _pruefen)
+
+    def importiere(self, daten: list, personal: list):
+        """Ersetzt alle Monate und Mitarbeiter (ein Ereignis)."""
+        self._schreiben({"art": "ersetzen", "monate": daten, "personal": personal})
+
+    # --- Historie ---
+    def historie(self, von: int = 0, bis=None) -> list:
+        """Ereignisse von..bis (Versionen, einschließlich) als kurze Beschreibung ohne die Werte."""
+        eintraege = []
+        for e in self._ereignisse(max(von, 1) - 1, bis):
+            eintrag = {"version": e["v"], "zeit": e.get("zeit"), "art": e["art"]}
+            if e["art"] == "monate":
+                eintrag["monate"] = [f"{m} {j}" for m, j, _, _ in e["eintraege"]]
+            elif e["art"] == "aendern":
+                eintrag["monate"] = [f"{e['monat']} {e['jahr']}"]
+            elif e["art"] in ("mitarbeiter_neu", "mitarbeiter_weg"):
+                eintrag["mitarbeiter"] = (e.get("mitarbeiter") or {}).get("rolle")
+            else:
+                eintrag.update(monate=len(e["monate"]), personal=len(e["personal"]))
+            eintraege.append(eintrag)
+        return eintraege
+
+    def stand_bei(self, version: int) -> Stand:
+        """Stand zu einer früheren (oder der aktuellen) Version als eigene Kopie; VersionNichtVerfuegbar sonst."""
+        aktuell = self._aktuell()
+        if version == aktuell.version:
+            return Stand(aktuell.version, copy.deepcopy(aktuell.monate), copy.deepcopy(aktuell.personal))
+        if not 0 <= version < aktuell.version:
+            raise VersionNichtVerfuegbar(f"Version {version} ist nicht vorhanden (neueste: {aktuell.version}).")
+        return self._rekonstruieren(version)
+
+    def unterschied(self, von: int, bis: int) -> dict:
+        """
+        Änderungen zwischen zwei Versionen: neue, geänderte und entfernte Monate (nur die
+        dazwischen berührten werden verglichen) sowie hinzugekommene/entfernte Mitarbeiter.
+        """
+        if bis < von:
+            von, bis = bis, von
+        vorher = self.stand_bei(von)
+        nachher = Stand(vorher.version, vorher.monate, vorher.personal)
+        beruehrt, ersetzt = set(), False
+        for ereignis in self._ereignisse(von, bis):
+            if ereignis["art"] == "monate":
+                beruehrt.update(_monatsschluessel(m, j) for m, j, _, _ in ereignis["eintraege"])
+            elif ereignis["art"] == "aendern":
+                beruehrt.add(_monatsschluessel(ereignis["monat"], ereignis["jahr"]))
+            elif ereignis["art"] == "ersetzen":
+                ersetzt = True
+            nachher.anwenden(ereignis)
+        if ersetzt:
+            beruehrt = set(vorher._index) | set(nachher._index)
+
+        monate = {"neu": [], "geaendert": [], "entfernt": []}
+        for schluessel in sorted(beruehrt):
+            a = vorher.monate[vorher._index[schluessel]] if schluessel in vorher._index else None
+            b = nachher.monate[nachher._index[schluessel]] if schluessel in nachher._index else None
+            if a is None and b is not None:
+                monate["neu"].append(b)
+            elif b is None and a is not None:
+                monate["entfernt"].append(a)
+            elif a != b:
+                monate["geaendert"].append({"vorher": a, "nachher": b})
+
+        def _zaehlen(liste):
+            return Counter(json.dumps(m, sort_keys=True) for m in liste)
+        alt, neu = _zaehlen(vorher.personal), _zaehlen(nachher.personal)
+        return {
+            "von": von,
+            "bis": bis,
+            "monate": monate,
+            "personal": {
+                "hinzugefuegt": [json.loads(m) for m in (neu - alt).elements()],
+                "entfernt": [json.loads(m) for m in (alt - neu).elements()],
+            },
+        }
+
+    def statistik(self) -> dict:
+        return {"neu_geladen": self.neu_geladen, "schreibvorgaenge": self.schreibvorgaenge,
+                "verdichtungen": self.verdichtungen}
+
+
+def importiere_json(verzeichnis, daten: list, personal: list) -> JournalSpeicher:
+    """Einmaliger Import von daten.json/personal.json-Inhalten als erstes Ereignis samt Schnappschuss."""
+    speicher = JournalSpeicher(verzeichnis)
+    speicher.importiere(daten, personal)
+    speicher.verdichten()
+    return speicher
@@ -0,0 +1,309 @@
+﻿# -*- coding: utf-8 -*-
+"""
+SQLite-Backend für die Plandaten (nur Standardbibliothek).
+
+Monate liegen in einer Tabelle mit Primärschlüssel (jahr, monat_num, monat_schluessel);
+monat_schluessel trennt wie datenspeicher._monatsschluessel unbekannte Monatsnamen
+(sonst leer). Mitarbeiter liegen in einer Tabelle mit Index auf den Vertrags-
+Ordinalzahlen (start/ende). Jede Änderung erhöht einen Versionszähler, über den
+Planspeicher seine abgeleiteten Ergebnisse verwirft – auch bei Änderungen aus
+anderen Worker-Prozessen.
+"""
+import os
+import sqlite3
+import threading
+
+from berechnung import KOMPONENTEN
+from datenspeicher import _monatsschluessel
+from personalkosten import vertragsgrenzen
+
+MONATE_TABELLE = """
+CREATE TABLE IF NOT EXISTS monate (
+    jahr                INTEGER NOT NULL,
+    monat_num           INTEGER NOT NULL,
+    monat_schluessel    TEXT    NOT NULL DEFAULT '',
+    monat               TEXT    NOT NULL,
+    revenue             REAL    NOT NULL DEFAULT 0,
+    costs               REAL    NOT NULL DEFAULT 0,
+    profit              REAL    NOT NULL DEFAULT 0,
+    personnel_included  INTEGER NOT NULL DEFAULT 0,
+    units               NUMERIC,
+    price               NUMERIC,
+    fixed_costs         NUMERIC,
+    variable_costs      NUMERIC,
+    kostenstelle        TEXT,
+    PRIMARY KEY (jahr, monat_num, monat_schluessel)
+)
+"""
+SCHEMA = MONATE_TABELLE + """;
+CREATE TABLE IF NOT EXISTS personal (
+    id            INTEGER PRIMARY KEY AUTOINCREMENT,
+    rolle         TEXT,
+    gehalt        REAL,
+    startmonat    INTEGER,
+    startjahr     INTEGER,
+    endmonat      INTEGER,
+    endjahr       INTEGER,
+    tarif         TEXT,
+    entgeltgruppe TEXT,
+    stufe         INTEGER,
+    start_ordinal INTEGER,
+    end_ordinal   INTEGER
+);
+CREATE INDEX IF NOT EXISTS personal_zeitraum ON personal (start_ordinal, end_ordinal);
+CREATE TABLE IF NOT EXISTS meta (
+    schluessel TEXT PRIMARY KEY,
+    wert       INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO meta (schluessel, wert) VALUES ('version', 0);
+"""
+
+_MONAT_FELDER = ("monat", "jahr", "revenue", "costs", "profit", "personnel_included", "kostenstelle") + KOMPONENTEN
+_MONAT_SPALTEN = ", ".join(_MONAT_FELDER)
+# Einzeln setzbare Monatsfelder und ihre Umwandlung für die Tabelle
+_MONATSWERTE = {
+    "revenue": lambda w: float(w or 0.0),
+    "costs": lambda w: float(w or 0.0),
+    "profit": lambda w: float(w or 0.0),
+    "personnel_included": lambda w: int(bool(w)),
+    "kostenstelle": lambda w: w or None,
+}
+_TARIF_SPALTEN = ("tarif", "entgeltgruppe", "stufe")     # nur bei Tarifverträgen gesetzt
+_PERSONAL_SPALTEN = ("rolle", "gehalt", "startmonat", "startjahr", "endmonat", "endjahr") + _TARIF_SPALTEN
+
+
+def _monat_als_dict(zeile) -> dict:
+    eintrag = {
+        "monat": zeile["monat"],
+        "jahr": zeile["jahr"],
+        "revenue": zeile["revenue"],
+        "costs": zeile["costs"],
+        "profit": zeile["profit"],
+        "personnel_included": bool(zeile["personnel_included"]),
+    }
+    if any(zeile[k] is not None for k in KOMPONENTEN):
+        eintrag["components"] = {k: zeile[k] for k in KOMPONENTEN}
+    if zeile["kostenstelle"]:
+        eintrag["kostenstelle"] = zeile["kostenstelle"]
+    return eintrag
+
+
+def _schluessel(monat, jahr) -> list:
+    """[jahr, monat_num, monat_schluessel] wie datenspeicher._monatsschluessel."""
+    jahr, monat_num, *name = _monatsschluessel(monat, jahr)
+    return [jahr, monat_num, name[0] if name else ""]
+
+
+def _mitarbeiter_zeile(m: dict) -> tuple:
+    grenzen = vertragsgrenzen(m)
+    start, ende = grenzen if grenzen is not None else (None, None)
+    return tuple(m.get(k) for k in _PERSONAL_SPALTEN) + (start, ende)
+
+
+class SqliteSpeicher:
+    """Speicher-Backend mit einer SQLite-Datenbankdatei (eine Verbindung pro Thread)."""
+
+    def __init__(self, pfad):
+        self.pfad = pfad
+        self._lokal = threading.local()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._cache = {}
+        self.neu_geladen = 0
+        self.schreibvorgaenge = 0
+        with self._verbindung() as con:
+            con.executescript(SCHEMA)
+            # Datenbanken aus älteren Versionen: Schlüssel und Spalten nachrüsten
+            if "monat_schluessel" not in {z["name"] for z in con.execute("PRAGMA table_info(monate)")}:
+                self._monate_umbauen(con)
+            vorhanden = {z["name"] for z in con.execute("PRAGMA table_info(personal)")}
+            for spalte, typ in zip(_TARIF_SPALTEN, ("TEXT", "TEXT", "INTEGER")):
+                if spalte not in vorhanden:
+                    con.execute(f"ALTER TABLE personal ADD COLUMN {spalte} {typ}")
+
+    @staticmethod
+    def _monate_umbauen(con):
+        """Legt die Monatstabelle mit (jahr, monat_num, monat_schluessel) als Schlüssel neu an."""
+        con.execute("BEGIN IMMEDIATE")
+        spalten = {z["name"] for z in con.execute("PRAGMA table_info(monate)")}
+        if "monat_schluessel" in spalten:
+            return          # ein anderer Prozess war schneller
+        alt = con.execute("SELECT * FROM monate").fetchall()
+        con.execute("DROP TABLE monate")
+        con.execute(MONATE_TABELLE)
+        con.executemany(
+            f"INSERT INTO monate (jahr, monat_num, monat_schluessel, {_MONAT_SPALTEN}) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(_MONAT_FELDER))})",
+            [_schluessel(z["monat"], z["jahr"]) + [z[k] if k in spalten else None for k in _MONAT_FELDER]
+             for z in alt])
+
+    def _verbindung(self) -> sqlite3.Connection:
+        if os.getpid() != self._pid:
+            # Nach fork (gunicorn --preload) keine Verbindung des Elternprozesses weiterverwenden
+            self._lokal = threading.local()
+            self._pid = os.getpid()
+        con = getattr(self._lokal, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.pfad, timeout=30)
+            con.row_factory = sqlite3.Row
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=NORMAL")
+            self._lokal.con = con
+        return con
+
+    def _schreiben(self, funktion):
+        """Führt funktion(con) in einer Transaktion aus und erhöht die Version."""
+        con = self._verbindung()
+        with con:
+            con.execute("BEGIN IMMEDIATE")
+            ergebnis = funktion(con)
+            con.execute("UPDATE meta SET wert = wert + 1 WHERE schluessel = 'version'")
+        self.schreibvorgaenge += 1
+        return ergebnis
+
+    @property
+    def version(self):
+        return self._verbindung().execute(
+            "SELECT wert FROM meta WHERE schluessel = 'version'").fetchone()[0]
+
+    def _gecacht(self, name, laden):
+        """Listen werden je Datenbankversion nur einmal gelesen."""
+        version = self.version
+        with self._lock:
+            eintrag = self._cache.get(name)
+            if eintrag is not None and eintrag[0] == version:
+                return eintrag[1]
+        wert = laden()
+        with self._lock:
+            self._cache[name] = (version, wert)
+            self.neu_geladen += 1
+        return wert
+
+    # --- Monate ---
+    def monate(self) -> list:
+        def _laden():
+            zeilen = self._verbindung().execute(
+                f"SELECT {_MONAT_SPALTEN} FROM monate ORDER BY jahr, monat_num")
+            return [_monat_als_dict(z) for z in zeilen]
+        return self._gecacht("monate", _laden)
+
+    def monate_im_jahr(self, jahr) -> list:
+        zeilen = self._verbindung().execute(
+            f"SELECT {_MONAT_SPALTEN} FROM monate WHERE jahr = ? ORDER BY monat_num", (int(jahr),))
+        return [_monat_als_dict(z) for z in zeilen]
+
+    def finde_monat(self, monat, jahr):
+        zeile = self._verbindung().execute(
+            f"SELECT {_MONAT_SPALTEN} FROM monate WHERE jahr = ? AND monat_num = ? AND monat_schluessel = ?",
+            _schluessel(monat, jahr)).fetchone()
+        return _monat_als_dict(zeile) if zeile is not None else None
+
+    def setze_monat(self, monat, jahr, werte: dict, components=None):
+        """Legt den Monat an oder überschreibt dessen Werte (Komponenten nur, falls angegeben)."""
+        self.setze_monate([(monat, jahr, werte, components)])
+
+    def setze_monate(self, eintraege: list):
+        """
+        Wie setze_monat für viele (monat, jahr, werte, components)-Tupel, in einer Transaktion.
+        Wie bei daten.json bleiben Felder, die in `werte` fehlen, bei vorhandenen Monaten erhalten.
+        """
+        anweisungen = {}
+        for monat, jahr, werte, components in eintraege:
+            spalten = [k for k in _MONATSWERTE if k in werte]
+            params = [_MONATSWERTE[k](werte[k]) for k in spalten]
+            if components:
+                spalten += list(KOMPONENTEN)
+                params += [components.get(k) for k in KOMPONENTEN]
+            if spalten:
+                konflikt = "DO UPDATE SET " + ", ".join(f"{s} = excluded.{s}" for s in spalten)
+            else:
+                konflikt = "DO NOTHING"
+            felder = "".join(", " + s for s in spalten)
+            sql = (f"INSERT INTO monate (jahr, monat_num, monat_schluessel, monat{felder}) "
+                   f"VALUES (?, ?, ?, ?{', ?' * len(spalten)}) "
+                   f"ON CONFLICT (jahr, monat_num, monat_schluessel) {konflikt}")
+            anweisungen.setdefault(sql, []).append(_schluessel(monat, jahr) + [monat] + params)
+
+        def _setzen(con):
+            for sql, zeilen in anweisungen.items():
+                con.executemany(sql, zeilen)
+        self._schreiben(_setzen)
+
+    def aendere_monat(self, monat, jahr, werte: dict) -> bool:
+        """Überschreibt Werte eines vorhandenen Monats; False, wenn er nicht existiert."""
+        erlaubt = [k for k in _MONATSWERTE if k in werte]
+        if not erlaubt:
+            return self.finde_monat(monat, jahr) is not None
+        sql = (f"UPDATE monate SET {', '.join(f'{k} = ?' for k in erlaubt)} "
+               "WHERE jahr = ? AND monat_num = ? AND monat_schluessel = ?")
+        params = [_MONATSWERTE[k](werte[k]) for k in erlaubt] + _schluessel(monat, jahr)
+        return self._schreiben(lambda con: con.execute(sql, params).rowcount > 0)
+
+    def importiere_monate(self, daten: list, ersetzen=False):
+        """Übernimmt Monatsdatensätze (Format von daten.json) in einer Transaktion."""
+        zeilen = []
+        for d in daten:
+            comps = d.get("components") or {}
+            zeilen.append(tuple(_schluessel(d.get("monat", ""), d.get("jahr", 0))) + (
+                d.get("monat"),
+                float(d.get("revenue", 0.0) or 0.0), float(d.get("costs", 0.0) or 0.0),
+                float(d.get("profit", 0.0) or 0.0), int(bool(d.get("personnel_included", False))),
+                d.get("kostenstelle") or None,
+            ) + tuple(comps.get(k) for k in KOMPONENTEN))
+
+        def _import(con):
+            if ersetzen:
+                con.execute("DELETE FROM monate")
+            con.executemany(
+                "INSERT OR REPLACE INTO monate (jahr, monat_num, monat_schluessel, monat, revenue, costs, profit, "
+                f"personnel_included, kostenstelle, {', '.join(KOMPONENTEN)}) VALUES ({', '.join('?' * 13)})",
+                zeilen)
+        self._schreiben(_import)
+
+    # --- Personal ---
+    def personal(self) -> list:
+        def _laden():
+            zeilen = self._verbindung().execute(
+                f"SELECT {', '.join(_PERSONAL_SPALTEN)} FROM personal ORDER BY id")
+            return [{k: z[k] for k in _PERSONAL_SPALTEN if k not in _TARIF_SPALTEN or z[k] is not None}
+                    for z in zeilen]
+        return self._gecacht("personal", _laden)
+
+    def mitarbeiter_hinzufuegen(self, mitarbeiter: dict):
+        sql = (f"INSERT INTO personal ({', '.join(_PERSONAL_SPALTEN)}, start_ordinal, end_ordinal) "
+               f"VALUES ({', '.join('?' * (len(_PERSONAL_SPALTEN) + 2))})")
+        self._schreiben(lambda con: con.execute(sql, _mitarbeiter_zeile(mitarbeiter)))
+
+    def mitarbeiter_loeschen(self, index: int) -> bool:
+        """Löscht den index-ten Mitarbeiter in Listenreihenfolge (wie personal.json)."""
+        if index < 0:
+            return False
+
+        def _loeschen(con):
+            zeile = con.execute("SELECT id FROM personal ORDER BY id LIMIT 1 OFFSET ?", (index,)).fetchone()
+            if zeile is None:
+                return False
+            con.execute("DELETE FROM personal WHERE id = ?", (zeile["id"],))
+            return True
+        return self._schreiben(_loeschen)
+
+    def importiere_personal(self, liste: list, ersetzen=False):
+        sql = (f"INSERT INTO personal ({', '.join(_PERSONAL_SPALTEN)}, start_ordinal, end_ordinal) "
+               f"VALUES ({', '.join('?' * (len(_PERSONAL_SPALTEN) + 2))})")
+
+        def _import(con):
+            if ersetzen:
+                con.execute("DELETE FROM personal")
+            con.executemany(sql, [_mitarbeiter_zeile(m) for m in liste])
+        self._schreiben(_import)
+
+    def statistik(self) -> dict:
+        return {"neu_geladen": self.neu_geladen, "schreibvorgaenge": self.schreibvorgaenge}
+
+
+def importiere_json(db_datei, daten: list, personal: list) -> SqliteSpeicher:
+    """Einmaliger Import von daten.json/personal.json-Inhalten; vorhandene Daten werden ersetzt."""
+    speicher = SqliteSpeicher(db_datei)
+    speicher.importiere_monate(daten, ersetzen=True)
+    speicher.importiere_personal(personal, ersetzen=True)
+    return speicher
@@ -29,7 +29,7 @@ echo.
 
 start http://localhost:5000
 
-python app.py
+python server.py
 
 pause
 ```
@@ -28,5 +28,5 @@ echo ""
 # Browser öffnen (macOS)
 open http://localhost:5000 2>/dev/null
 
-python3 app.py
+python3 server.py
 ```
\ No newline at end of file
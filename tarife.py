@@ -0,0 +1,169 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Tarifliche Personalkosten: Entgeltgruppen mit Stufen, Stufenaufstieg nach
+Laufzeit, Tariferhöhungen zu festen Terminen und Arbeitgeberanteil.
+
+Mitarbeiter mit "tarif", "entgeltgruppe" und "stufe" (Stufe bei Vertragsbeginn)
+werden nach den Tabellen aus tarife.json bezahlt; ihr "gehalt" wird dann nicht
+verwendet. Aus der Tarifdatei werden einmal Tabellen vorberechnet:
+Stufenentgelte je Gruppe, die erreichte Stufe je Anfangsstufe und
+Beschäftigungsdauer in Monaten sowie der Erhöhungsfaktor je Tarif und Monat.
+Der Verlauf über alle Mitarbeiter entsteht daraus wie in PersonalZeitachse als
+Differenz-Array (ein Eintrag je Stufenwechsel), die Kostenmatrix Mitarbeiter x
+Monate mit einem Indexzugriff auf die Tabellen.
+
+Format von tarife.json:
+    {"tarife": {"TV-Ärzte": {
+        "arbeitgeberanteil": 0.21,
+        "erhoehungen": [{"monat": 4, "jahr": 2025, "prozent": 4.0}],
+        "gruppen": {"Ä3": {"stufen": [8800, 9300, 9900], "laufzeit": [36, 36]}}}}}
+laufzeit[i]: Monate in Stufe i+1 bis zum Aufstieg; die letzte Stufe gilt unbegrenzt.
+"""
+import json
+import os
+
+import numpy as np
+
+
+class Tariftabellen:
+    """Vorberechnete Tabellen aller Tarife und Entgeltgruppen."""
+
+    def __init__(self, definition: dict):
+        tarife = definition.get("tarife")
+        if not isinstance(tarife, dict) or not tarife:
+            raise ValueError("Tarifdatei: 'tarife' muss ein nicht leeres Objekt sein")
+        standard_anteil = float(definition.get("arbeitgeberanteil", 0.0))
+
+        self.tarife = list(tarife)
+        self._gruppen = {}                  # (tarif, gruppe) -> Gruppenindex
+        gruppen_tarif, stufen, laufzeiten = [], [], []
+        self._aufschlag = np.empty(len(self.tarife), dtype=np.float64)
+        self._erhoehung_ab = []             # je Tarif: Ordinalzahlen der Erhöhungen (sortiert)
+        self._erhoehung_faktor = []         # je Tarif: Faktor ab der i-ten Erhöhung (Index 0 = vor der ersten)
+
+        for t, (name, tarif) in enumerate(tarife.items()):
+            self._aufschlag[t] = 1.0 + float(tarif.get("arbeitgeberanteil", standard_anteil))
+            erhoehungen = sorted((int(e["jahr"]) * 12 + int(e["monat"]), float(e["prozent"]))
+                                 for e in tarif.get("erhoehungen", []))
+            self._erhoehung_ab.append(np.array([ab for ab, _ in erhoehungen], dtype=np.int64))
+            self._erhoehung_faktor.append(np.cumprod([1.0] + [1.0 + p / 100.0 for _, p in erhoehungen]))
+            for gruppe, tabelle in (tarif.get("gruppen") or {}).items():
+                werte = [float(w) for w in tabelle["stufen"]]
+                laufzeit = [int(m) for m in tabelle.get("laufzeit", [])]
+                if not werte:
+                    raise ValueError(f"Tarifdatei: {name} {gruppe} hat keine Stufen")
+                if len(laufzeit) != len(werte) - 1 or any(m <= 0 for m in laufzeit):
+                    raise ValueError(f"Tarifdatei: {name} {gruppe} braucht {len(werte) - 1} positive Laufzeiten")
+                self._gruppen[(name, gruppe)] = len(stufen)
+                gruppen_tarif.append(t)
+                stufen.append(werte)
+                laufzeiten.append(laufzeit)
+
+        anzahl = len(stufen)
+        breite = max((len(w) for w in stufen), default=1)
+        self._tarif = np.array(gruppen_tarif, dtype=np.int64)
+        self._stufenzahl = np.array([len(w) for w in stufen], dtype=np.int64)
+        # Stufenentgelte, aufgefüllt mit der letzten Stufe
+        self._basis = np.array([w + [w[-1]] * (breite - len(w)) for w in stufen], dtype=np.float64).reshape(anzahl, breite)
+        # Monate ab Stufe 1 bis zum Erreichen jeder Stufe; nicht vorhandene Stufen nie
+        nie = np.iinfo(np.int64).max // 4
+        self._ab_monat = np.full((anzahl, breite), nie, dtype=np.int64)
+        for g, laufzeit in enumerate(laufzeiten):
+            self._ab_monat[g, :len(laufzeit) + 1] = np.concatenate(([0], np.cumsum(laufzeit)))
+        # Erreichte Stufe je (Gruppe, Anfangsstufe, Monate seit Beginn); danach gilt der letzte Wert
+        self._dauer_max = int(max((sum(l) for l in laufzeiten), default=0))
+        dauer = np.arange(self._dauer_max + 1, dtype=np.int64)
+        self._stufe_nach = np.empty((anzahl, breite, self._dauer_max + 1), dtype=np.int64)
+        for g in range(anzahl):
+            ab = self._ab_monat[g]
+            self._stufe_nach[g] = np.searchsorted(ab, ab[:, None] + dauer[None, :], side="right") - 1
+            self._stufe_nach[g, self._stufenzahl[g]:] = self._stufenzahl[g] - 1
+
+    @classmethod
+    def laden(cls, pfad):
+        """Tabellen aus einer JSON-Datei; None, wenn sie fehlt."""
+        if not os.path.exists(pfad):
+            return None
+        with open(pfad, "r", encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def gruppen(self) -> list:
+        """(Tarif, Entgeltgruppe, Anzahl Stufen) aller Gruppen."""
+        return [(t, gr, int(self._stufenzahl[g])) for (t, gr), g in self._gruppen.items()]
+
+    def entgelt(self, tarif: str, gruppe: str, stufe: int) -> float:
+        """Tabellenentgelt einer Stufe (ohne Erhöhungen und Arbeitgeberanteil)."""
+        return float(self._basis[self._gruppen[(tarif, gruppe)], stufe - 1])
+
+    def kennt(self, vertrag) -> bool:
+        g = self._gruppen.get((vertrag.tarif, vertrag.entgeltgruppe))
+        return g is not None and 1 <= vertrag.stufe <= self._stufenzahl[g]
+
+    def _indizes(self, vertraege: list):
+        n = len(vertraege)
+        gruppe = np.fromiter((self._gruppen[(v.tarif, v.entgeltgruppe)] for v in vertraege), dtype=np.int64, count=n)
+        stufe = np.fromiter((v.stufe - 1 for v in vertraege), dtype=np.int64, count=n)
+        start = np.fromiter((v.start for v in vertraege), dtype=np.int64, count=n)
+        ende = np.fromiter((-1 if v.ende is None else v.ende for v in vertraege), dtype=np.int64, count=n)
+        return gruppe, stufe, start, ende
+
+    def faktor(self, tarif: int, ordinale) -> np.ndarray:
+        """Erhöhungsfaktor mal Arbeitgeberaufschlag des Tarifs für ein Array von Ordinalzahlen."""
+        i = np.searchsorted(self._erhoehung_ab[tarif], ordinale, side="right")
+        return self._erhoehung_faktor[tarif][i] * self._aufschlag[tarif]
+
+    def kostenmatrix(self, vertraege: list, ordinale) -> np.ndarray:
+        """Kosten je Vertrag (Zeilen, alle bekannt, siehe kennt) und Monat (Spalten)."""
+        ordinale = np.asarray(ordinale, dtype=np.int64)
+        matrix = np.zeros((len(vertraege), len(ordinale)), dtype=np.float64)
+        if not len(vertraege) or not len(ordinale):
+            return matrix
+        gruppe, stufe, start, ende = self._indizes(vertraege)
+        dauer = ordinale[None, :] - start[:, None]
+        aktiv = (dauer >= 0) & ((ende[:, None] < 0) | (ordinale[None, :] <= ende[:, None]))
+        erreicht = self._stufe_nach[gruppe[:, None], stufe[:, None], np.clip(dauer, 0, self._dauer_max)]
+        matrix[:] = self._basis[gruppe[:, None], erreicht]
+        tarif = self._tarif[gruppe]
+        for t in np.unique(tarif):
+            zeilen = tarif == t
+            matrix[zeilen] *= self.faktor(t, ordinale)[None, :]
+        matrix[~aktiv] = 0.0
+        return matrix
+
+    def verlauf(self, vertraege: list):
+        """
+        (erste Ordinalzahl, Kosten je Monat) über alle Verträge (alle bekannt); nach dem
+        letzten Eintrag bleiben die Kosten gleich. None, wenn es keine Verträge gibt.
+        """
+        if not vertraege:
+            return None
+        gruppe, stufe, start, ende = self._indizes(vertraege)
+        breite = self._basis.shape[1]
+        k = np.arange(breite)[None, :]
+        # Ein Ereignis je Stufe ab der Anfangsstufe: Einstieg bzw. Aufstieg (Differenz zur Vorstufe)
+        ab = self._ab_monat[gruppe]
+        zeit = start[:, None] + ab - ab[np.arange(len(gruppe)), stufe][:, None]
+        basis = self._basis[gruppe]
+        vorher = np.where(k > stufe[:, None], np.roll(basis, 1, axis=1), 0.0)
+        delta = basis - vorher
+        gilt = (k >= stufe[:, None]) & (k < self._stufenzahl[gruppe][:, None])
+        befristet = ende >= 0
+        gilt &= ~befristet[:, None] | (zeit <= ende[:, None])
+        # Vertragsende: alle bis dahin gebuchten Beträge wieder abziehen
+        ende_betrag = np.where(gilt, delta, 0.0).sum(axis=1)
+
+        tarif = self._tarif[gruppe]
+        lo = int(start.min())
+        grenzen = [zeit[gilt], ende[befristet] + 1] + self._erhoehung_ab
+        hi = max([lo] + [int(g.max()) for g in grenzen if len(g)])
+        ordinale = np.arange(lo, hi + 1, dtype=np.int64)
+        gesamt = np.zeros(len(ordinale), dtype=np.float64)
+        for t in np.unique(tarif):
+            zeilen = tarif == t
+            maske = gilt & zeilen[:, None]
+            diff = np.zeros(len(ordinale) + 1, dtype=np.float64)
+            np.add.at(diff, zeit[maske] - lo, delta[maske])
+            beendet = befristet & zeilen
+            np.add.at(diff, ende[beendet] + 1 - lo, -ende_betrag[beendet])
+            gesamt += np.cumsum(diff[:-1]) * self.faktor(t, ordinale)
+        return lo, np.round(gesamt, 6)
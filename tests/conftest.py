@@ -0,0 +1,68 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Die Module liegen flach neben app.py; die Tests importieren sie von dort.
+Speicher-Fixtures legen Pläne je Backend in tmp_path an.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datenspeicher import atomar_schreiben, oeffne_speicher  # noqa: E402
+from verdichtung import STANDARD_KOSTENSTELLE  # noqa: E402
+
+BACKENDS = ("json", "sqlite", "journal")
+
+
+def oeffne(art, ordner, tarife=None, kostenstelle=STANDARD_KOSTENSTELLE):
+    """Planspeicher mit dem Backend `art` im Verzeichnis `ordner` (vorhandene Daten bleiben)."""
+    return oeffne_speicher(os.path.join(ordner, "daten.json"), os.path.join(ordner, "personal.json"),
+                           os.path.join(ordner, "plan.sqlite") if art == "sqlite" else None, tarife,
+                           os.path.join(ordner, "journal") if art == "journal" else None, kostenstelle)
+
+
+def neuer_speicher(art, ordner, tarife=None, kostenstelle=STANDARD_KOSTENSTELLE):
+    """Leerer Planspeicher mit dem Backend `art` im Verzeichnis `ordner`."""
+    if art == "json":
+        atomar_schreiben(os.path.join(ordner, "daten.json"), [])
+        atomar_schreiben(os.path.join(ordner, "personal.json"), [])
+    return oeffne(art, ordner, tarife, kostenstelle)
+
+
+@pytest.fixture(params=BACKENDS)
+def backend_art(request):
+    return request.param
+
+
+@pytest.fixture
+def speicher(backend_art, tmp_path):
+    return neuer_speicher(backend_art, str(tmp_path))
+
+
+@pytest.fixture
+def arbeitsbereiche(tmp_path, monkeypatch):
+    """
+    Arbeitsbereiche der App in tmp_path: leerer JSON-Standardplan statt daten.json/personal.json,
+    weitere Pläne unter tmp_path/plaene.
+    """
+    import app as app_modul
+    from arbeitsbereiche import Arbeitsbereiche
+    bereiche = Arbeitsbereiche(str(tmp_path / "plaene"), standard=neuer_speicher("json", str(tmp_path)),
+                               bei_schliessen=app_modul.figur_cache.bereich_leeren)
+    monkeypatch.setattr(app_modul, "arbeitsbereiche", bereiche)
+    app_modul.figur_cache.leeren()
+    return bereiche
+
+
+@pytest.fixture
+def app_speicher(arbeitsbereiche):
+    """Standardplan der App."""
+    return arbeitsbereiche.standard
+
+
+@pytest.fixture
+def client(app_speicher):
+    import app as app_modul
+    return app_modul.app.test_client()
@@ -0,0 +1,66 @@
+﻿# -*- coding: utf-8 -*-
+"""JSON-API v1: Seiten nach Jahren, kumulierter Gewinn über Seiten hinweg, Kompression."""
+import gzip
+import json
+
+import numpy as np
+import pytest
+from flask import request
+
+from json_antwort import json_antwort
+
+
+def _plan(speicher):
+    for jahr in (2025, 2026, 2027):
+        for monat in ("Januar", "Juli"):
+            speicher.setze_monat(monat, jahr, {"revenue": float(jahr - 2000), "costs": 20.0})
+    speicher.mitarbeiter_hinzufuegen({"rolle": "Dev", "gehalt": 1.0, "startmonat": 6, "startjahr": 2026})
+
+
+def test_monatsdaten_seitenweise(client, app_speicher):
+    _plan(app_speicher)
+    erste = client.get("/api/v1/monatsdaten?jahre_pro_seite=2").get_json()
+    assert erste["jahre"] == [2025, 2026] and erste["seiten"] == 2
+    assert erste["jahr"] == [2025, 2025, 2026, 2026]
+    assert erste["personalkosten"] == [0.0, 0.0, 0.0, 1.0]
+    zweite = client.get(erste["naechste"]).get_json()
+    assert zweite["naechste"] is None
+    assert zweite["monat"] == ["Januar", "Juli"]
+    # Der kumulierte Gewinn läuft über die Seitengrenze weiter
+    gewinn = erste["gewinn"] + zweite["gewinn"]
+    assert erste["kumuliert"] + zweite["kumuliert"] == np.cumsum(gewinn).tolist()
+
+    ab_2026 = client.get("/api/v1/monatsdaten?von=2026").get_json()
+    assert ab_2026["kumuliert"][0] == ab_2026["gewinn"][0]
+
+
+def test_szenarien_und_personalkosten(client, app_speicher):
+    _plan(app_speicher)
+    szenarien = client.get("/api/v1/szenarien").get_json()["szenarien"]
+    realistisch = client.get("/api/v1/monatsdaten").get_json()
+    assert szenarien["Realistisch"]["gewinn"] == pytest.approx(realistisch["gewinn"])
+    assert szenarien["Realistisch"]["break_even"] == {"jahr": 2025, "monat": "Januar"}
+
+    personal = client.get("/api/v1/personalkosten?von=2026&bis=2026").get_json()
+    assert len(personal["personalkosten"]) == 12
+    assert personal["personalkosten"][4:6] == [0.0, 1.0]
+
+
+@pytest.mark.parametrize("abfrage", ["von=2030&bis=2025", "seite=9", "jahre_pro_seite=0", "von=x"])
+def test_fehlerhafte_parameter(client, app_speicher, abfrage):
+    _plan(app_speicher)
+    antwort = client.get("/api/v1/monatsdaten?" + abfrage)
+    assert antwort.status_code == 400
+    assert "fehler" in antwort.get_json()
+
+
+def test_komprimiert_und_304(app_speicher):
+    import app as app_modul
+    daten = {"werte": np.arange(2000, dtype=np.float64)}
+    with app_modul.app.test_request_context(headers={"Accept-Encoding": "gzip"}):
+        antwort = json_antwort(daten, request)
+        assert antwort.headers["Content-Encoding"] == "gzip"
+        assert json.loads(gzip.decompress(antwort.get_data()))["werte"][-1] == 1999.0
+        etag = antwort.get_etag()[0]
+    with app_modul.app.test_request_context(headers={"Accept-Encoding": "gzip", "If-None-Match": etag}):
+        assert json_antwort(daten, request).status_code == 304
@@ -0,0 +1,72 @@
+﻿# -*- coding: utf-8 -*-
+"""Mehrere Pläne: LRU geöffneter Pläne, Auswahl über /plan/<name>/ oder Header, getrennte Caches."""
+import pytest
+
+from arbeitsbereiche import Arbeitsbereiche, PlanNichtGefunden
+from conftest import neuer_speicher
+
+
+def test_lru_schliesst_alte_plaene(tmp_path):
+    geschlossen = []
+    bereiche = Arbeitsbereiche(str(tmp_path / "plaene"), standard=neuer_speicher("json", str(tmp_path)),
+                               max_offen=2, bei_schliessen=geschlossen.append)
+    nord = bereiche.anlegen("nord")
+    bereiche.anlegen("sued", sqlite=True)
+    assert bereiche.hole("nord") is nord
+    bereiche.anlegen("west")
+    # "sued" war am längsten unbenutzt
+    assert geschlossen == ["sued"]
+    assert bereiche.hole("nord") is nord
+    assert bereiche.hole("sued").backend.__class__.__name__ == "SqliteSpeicher"
+    assert bereiche.namen() == ["nord", "sued", "west"]
+    assert bereiche.hole() is bereiche.standard
+    assert bereiche.statistik() == {"offen": 2, "max_offen": 2, "geoeffnet": 4, "geschlossen": 2}
+
+    with pytest.raises(FileExistsError):
+        bereiche.anlegen("nord")
+    for name in ("ost", "../nord", "", ".versteckt"):
+        with pytest.raises(PlanNichtGefunden):
+            bereiche.hole(name)
+
+
+def test_plaene_getrennt(client, arbeitsbereiche):
+    arbeitsbereiche.standard.setze_monat("Januar", 2025, {"revenue": 1.0, "costs": 0.0})
+    arbeitsbereiche.anlegen("nord").setze_monat("Januar", 2025, {"revenue": 2.0, "costs": 0.0})
+
+    assert client.get("/api/v1/monatsdaten").get_json()["umsatz"] == [1.0]
+    assert client.get("/plan/nord/api/v1/monatsdaten").get_json()["umsatz"] == [2.0]
+    antwort = client.get("/api/v1/monatsdaten", headers={"X-Finanzplan-Plan": "nord"})
+    assert antwort.get_json()["umsatz"] == [2.0]
+    assert client.get("/plan/ost/api/v1/monatsdaten").status_code == 404
+
+    # Links innerhalb eines Plans bleiben im Plan
+    seite = client.get("/api/v1/monatsdaten?jahre_pro_seite=1&bis=2026").get_json()
+    assert not seite["naechste"].startswith("/plan/")
+    seite = client.get("/plan/nord/api/v1/monatsdaten?jahre_pro_seite=1&bis=2026").get_json()
+    assert seite["naechste"].startswith("/plan/nord/")
+
+
+def test_figurcache_je_plan(client, arbeitsbereiche):
+    arbeitsbereiche.standard.setze_monat("Januar", 2025, {"revenue": 1.0, "costs": 0.0})
+    nord = arbeitsbereiche.anlegen("nord")
+    nord.setze_monat("Januar", 2025, {"revenue": 2.0, "costs": 0.0})
+
+    standard = client.get("/diagramm?format=json")
+    assert client.get("/plan/nord/diagramm?format=json").headers["X-Cache"] == "MISS"
+    # Eine Änderung in "nord" verwirft nur dessen Einträge
+    nord.setze_monat("Februar", 2025, {"revenue": 3.0, "costs": 0.0})
+    nochmal = client.get("/diagramm?format=json")
+    assert nochmal.headers["X-Cache"] == "HIT"
+    assert nochmal.get_data() == standard.get_data()
+    assert client.get("/plan/nord/diagramm?format=json").headers["X-Cache"] == "MISS"
+
+
+def test_figurcache_je_script_root(client, arbeitsbereiche):
+    arbeitsbereiche.anlegen("nord").setze_monat("Januar", 2025, {"revenue": 2.0, "costs": 0.0})
+    # Per Header gewählt: Links ohne Präfix; über /plan/nord/ darf diese Seite nicht wiederkommen
+    per_header = client.get("/diagramm", headers={"X-Finanzplan-Plan": "nord"})
+    per_pfad = client.get("/plan/nord/diagramm")
+    assert per_pfad.headers["X-Cache"] == "MISS"
+    assert 'href="/plan/nord/' in per_pfad.get_data(as_text=True)
+    assert 'href="/plan/nord/' not in per_header.get_data(as_text=True)
+    assert client.get("/plan/nord/diagramm").headers["X-Cache"] == "HIT"
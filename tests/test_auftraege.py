@@ -0,0 +1,180 @@
+﻿# -*- coding: utf-8 -*-
+"""Hintergrundaufträge: Kennung, doppelte Anfragen, Status, Abbruch, Ergebnis-Cache."""
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import auftraege
+from auftraege import AuftragAbgebrochen, Auftragsverwaltung, export_auftrag, kennung
+from berechnung import baue_spalten, berechne_guv
+from datenspeicher import Dateisperre
+
+
+def _export_argumente(umsatz=100.0):
+    spalten = baue_spalten([{"monat": "Januar", "jahr": 2025, "revenue": umsatz, "costs": 40.0}])
+    pers = np.zeros(1)
+    return {"format_name": "csv", "spalten": spalten, "pers": pers, "guv": berechne_guv(spalten, pers)}
+
+
+def _warte(verwaltung, auftrag_id, sekunden=30):
+    ende = time.monotonic() + sekunden
+    while time.monotonic() < ende:
+        status = verwaltung.status(auftrag_id)
+        if status["status"] not in auftraege.OFFEN:
+            return status
+        time.sleep(0.02)
+    raise AssertionError(f"Auftrag {auftrag_id} nicht fertig")
+
+
+@pytest.fixture
+def verwaltung(tmp_path):
+    verwaltung = Auftragsverwaltung(str(tmp_path / "auftraege"), prozesse=1)
+    yield verwaltung
+    if verwaltung._pool is not None:
+        verwaltung._pool.shutdown()
+
+
+def test_kennung():
+    a, b = _export_argumente(), _export_argumente()
+    assert kennung("export", **a) == kennung("export", **b)
+    assert kennung("export", **a) != kennung("kohorte", **a)
+    assert kennung("export", **a) != kennung("export", **_export_argumente(101.0))
+    assert auftraege.KENNUNG.fullmatch(kennung("export", **a))
+
+
+def test_gleiche_eingaben_einmal_gerechnet(verwaltung):
+    argumente = _export_argumente()
+    auftrag_id = kennung("export", **argumente)
+    erster = verwaltung.einreichen(auftrag_id, "export", export_auftrag, argumente, "text/csv", "a.csv")
+    zweiter = verwaltung.einreichen(auftrag_id, "export", export_auftrag, argumente, "text/csv", "a.csv")
+    assert erster["status"] == "wartet" and zweiter["id"] == auftrag_id
+    assert verwaltung.statistik()["eingereicht"] == 1
+
+    status = _warte(verwaltung, auftrag_id)
+    assert status["status"] == "fertig" and status["fortschritt"] == 1.0
+    pfad, _ = verwaltung.ergebnis(auftrag_id)
+    with open(pfad, "rb") as f:
+        assert f.read() == export_auftrag(lambda anteil: None, **argumente)
+
+    # Fertiges Ergebnis: aus dem Cache, ohne neue Rechnung
+    wieder = verwaltung.einreichen(auftrag_id, "export", export_auftrag, argumente, "text/csv", "a.csv")
+    assert wieder["status"] == "fertig"
+    assert verwaltung.statistik()["eingereicht"] == 1
+    assert verwaltung.statistik()["cache_treffer"] == 1
+    assert verwaltung.status("0" * 32) is None and verwaltung.status("../x") is None
+
+
+def _bricht_ab(fortschritt):
+    fortschritt(0.5)
+    raise AssertionError("nicht abgebrochen")
+
+
+def _scheitert(fortschritt):
+    raise ValueError("kaputt")
+
+
+def test_abbruch_und_fehler(tmp_path):
+    verzeichnis = str(tmp_path)
+    with open(os.path.join(verzeichnis, "a" * 32 + ".abbruch"), "wb"):
+        pass
+    assert auftraege._ausfuehren(verzeichnis, "a" * 32, _bricht_ab, {}) == "abgebrochen"
+    assert auftraege._lies_status(verzeichnis, "a" * 32)["status"] == "abgebrochen"
+
+    assert auftraege._ausfuehren(verzeichnis, "b" * 32, _scheitert, {}) == "fehler"
+    status = auftraege._lies_status(verzeichnis, "b" * 32)
+    assert (status["status"], status["meldung"]) == ("fehler", "kaputt")
+
+    auftraege._setze_status(verzeichnis, "c" * 32, status="laeuft")
+    fortschritt = auftraege.Fortschritt(verzeichnis, "c" * 32)
+    fortschritt(2.0)
+    assert auftraege._lies_status(verzeichnis, "c" * 32)["fortschritt"] == 1.0
+    with open(os.path.join(verzeichnis, "c" * 32 + ".abbruch"), "wb"):
+        pass
+    with pytest.raises(AuftragAbgebrochen):
+        fortschritt(0.1)
+
+
+
+def test_endstatus_bleibt(tmp_path):
+    verzeichnis, auftrag_id = str(tmp_path), "d" * 32
+    auftraege._setze_status(verzeichnis, auftrag_id, status="fertig", fortschritt=1.0)
+    # Späte Fortschrittsmeldung oder Abbruchwunsch ändern einen fertigen Auftrag nicht mehr
+    auftraege._setze_status(verzeichnis, auftrag_id, nur_offen=True, fortschritt=0.3, abbruch_angefordert=True)
+    status = auftraege._lies_status(verzeichnis, auftrag_id)
+    assert (status["status"], status["fortschritt"]) == ("fertig", 1.0)
+    assert "abbruch_angefordert" not in status
+    assert Auftragsverwaltung(verzeichnis).abbrechen(auftrag_id)["status"] == "fertig"
+
+
+def test_statusdatei_ohne_verlorene_aenderungen(tmp_path):
+    verzeichnis, auftrag_id = str(tmp_path), "e" * 32
+
+    def schreiben(i):
+        for j in range(20):
+            auftraege._setze_status(verzeichnis, auftrag_id, **{f"feld_{i}_{j}": j})
+
+    threads = [threading.Thread(target=schreiben, args=(i,)) for i in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    status = auftraege._lies_status(verzeichnis, auftrag_id)
+    assert sum(k.startswith("feld_") for k in status) == 6 * 20
+
+def test_einreichen_unter_dateisperre(verwaltung):
+    # Ein anderer Worker-Prozess hält die Sperre: einreichen prüft und schreibt erst danach
+    argumente = _export_argumente()
+    auftrag_id = kennung("export", **argumente)
+    os.makedirs(verwaltung.verzeichnis, exist_ok=True)
+    ergebnis = []
+    with Dateisperre(os.path.join(verwaltung.verzeichnis, auftraege.SPERRE)):
+        t = threading.Thread(target=lambda: ergebnis.append(
+            verwaltung.einreichen(auftrag_id, "export", export_auftrag, argumente, "text/csv", "a.csv")))
+        t.start()
+        t.join(0.3)
+        assert t.is_alive() and auftraege._lies_status(verwaltung.verzeichnis, auftrag_id) is None
+        # Der andere Prozess legt den Auftrag an, während er die Sperre hält
+        auftraege._aendere_status(verwaltung.verzeichnis, auftrag_id, status="laeuft", pid=os.getppid())
+    t.join(10)
+    assert ergebnis[0]["status"] == "laeuft"
+    assert verwaltung.statistik()["eingereicht"] == 0
+
+
+def test_cache_begrenzt(verwaltung):
+    verwaltung.max_eintraege = 2
+    kennungen = []
+    for umsatz in (1.0, 2.0, 3.0):
+        argumente = _export_argumente(umsatz)
+        kennungen.append(kennung("export", **argumente))
+        verwaltung.einreichen(kennungen[-1], "export", export_auftrag, argumente, "text/csv", "a.csv")
+        _warte(verwaltung, kennungen[-1])
+        time.sleep(0.05)
+    verwaltung.aufraeumen()
+    # Das am längsten nicht abgerufene Ergebnis wurde gelöscht
+    assert verwaltung.status(kennungen[0]) is None
+    assert [verwaltung.status(k)["status"] for k in kennungen[1:]] == ["fertig", "fertig"]
+
+
+def test_auftrag_routen(client, app_speicher, verwaltung, monkeypatch):
+    import app as app_modul
+    monkeypatch.setattr(app_modul, "auftragsverwaltung", verwaltung)
+    app_speicher.setze_monat("Januar", 2025, {"revenue": 100.0, "costs": 40.0, "profit": 60.0})
+
+    antwort = client.post("/auftraege/export/csv?jahr=2025")
+    assert antwort.status_code == 202
+    daten = antwort.get_json()
+    assert daten["status_url"] == f"/auftraege/{daten['id']}"
+    _warte(verwaltung, daten["id"])
+    assert client.get(daten["status_url"]).get_json()["status"] == "fertig"
+    ergebnis = client.get(daten["ergebnis_url"])
+    assert ergebnis.headers["Content-Type"] == "text/csv; charset=utf-8"
+    assert ergebnis.get_data() == client.get("/export/csv?jahr=2025").get_data()
+    # Gleiche Anfrage: sofort fertig
+    assert client.post("/auftraege/export/csv?jahr=2025").status_code == 200
+
+    assert client.get("/auftraege/" + "0" * 32).status_code == 404
+    assert client.delete("/auftraege/" + "0" * 32).status_code == 404
+    assert client.post("/auftraege/export/pdf").status_code == 404
@@ -0,0 +1,85 @@
+﻿# -*- coding: utf-8 -*-
+"""Ausdünnen langer Reihen: LTTB gegen die Originalformulierung, Min/Max erhält die Spitzen, /diagramm."""
+import numpy as np
+import plotly.io as pio
+import pytest
+
+from ausduennung import lttb, minmax
+from berechnung import MONATSNAMEN
+
+
+def _lttb_referenz(x, y, ziel):
+    """LTTB nach Steinarsson (2013), Punkt für Punkt."""
+    n = len(y)
+    schritt = (n - 2) / (ziel - 2)
+    a, gewaehlt = 0, [0]
+    for i in range(ziel - 2):
+        von, bis = int(np.floor(i * schritt)) + 1, int(np.floor((i + 1) * schritt)) + 1
+        n_von, n_bis = bis, min(int(np.floor((i + 2) * schritt)) + 1, n)
+        cx, cy = x[n_von:n_bis].mean(), y[n_von:n_bis].mean()
+        flaechen = [abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a])) for j in range(von, bis)]
+        a = von + int(np.argmax(flaechen))
+        gewaehlt.append(a)
+    return np.array(gewaehlt + [n - 1])
+
+
+@pytest.mark.parametrize("n, ziel", [(1200, 1000), (5000, 300), (101, 10)])
+def test_lttb_wie_referenz(n, ziel):
+    y = np.cumsum(np.random.default_rng(n).normal(size=n))
+    x = np.arange(n)
+    indizes = lttb(x, y, ziel)
+    referenz = _lttb_referenz(x, y, ziel)
+    assert indizes[0] == 0 and indizes[-1] == n - 1
+    assert np.all(np.diff(indizes) > 0)
+    assert len(indizes) == ziel
+    # Die Abschnittsgrenzen werden etwas anders gerundet; fast alle Punkte stimmen überein
+    assert len(np.intersect1d(indizes, referenz)) >= 0.9 * ziel
+
+
+def test_kurze_reihen_unveraendert():
+    assert lttb(np.arange(5), np.ones(5), 10).tolist() == [0, 1, 2, 3, 4]
+    assert minmax(np.ones(5), 10).tolist() == [0, 1, 2, 3, 4]
+
+
+def test_behalten():
+    y = np.cumsum(np.random.default_rng(1).normal(size=3000))
+    assert 1234 in lttb(np.arange(3000), y, 100, behalten=(1234, None, 5000))
+    assert 1234 in minmax(y, 100, behalten=(1234,))
+
+
+def test_minmax_erhaelt_spitzen():
+    y = np.random.default_rng(2).normal(size=4999)
+    y[777], y[4000] = 50.0, -50.0
+    indizes = minmax(y, 200)
+    assert len(indizes) <= 202
+    assert {777, 4000, 0, 4998} <= set(indizes.tolist())
+    # Jedes Abschnittsextrem ist enthalten
+    breite = -(-len(y) // 100)
+    for start in range(0, len(y), breite):
+        abschnitt = y[start:start + breite]
+        assert start + int(abschnitt.argmax()) in indizes
+        assert start + int(abschnitt.argmin()) in indizes
+
+
+def test_diagramm_lange_zeitraeume(client, app_speicher, monkeypatch):
+    import app as app_modul
+    monkeypatch.setattr(app_modul, "DIAGRAMM_PUNKTE", 200)
+    # 100 Jahre; der kumulierte Gewinn wird im Januar 2000 erstmals positiv
+    eintraege = []
+    for jahr in range(1950, 2050):
+        for monat in MONATSNAMEN:
+            gewinn = -1.0 if jahr < 2000 else 1000.0
+            eintraege.append((monat, jahr, {"revenue": max(gewinn, 0.0), "costs": max(-gewinn, 0.0)}, None))
+    app_speicher.setze_monate(eintraege)
+
+    fig = pio.from_json(client.get("/diagramm?jahr=alle&format=json").get_data(as_text=True))
+    assert {t.type for t in fig.data} == {"scattergl"}
+    assert fig.layout.xaxis.type == "date"
+    kumuliert = next(t for t in fig.data if t.name == "Kumul. Gewinn")
+    assert len(kumuliert.x) <= 200 + 4
+    x = [str(d)[:7] for d in kumuliert.x]
+    assert "2000-01" in x and "1999-12" in x
+
+    fig = pio.from_json(client.get("/diagramm?jahr=alle&format=json&darstellung=svg").get_data(as_text=True))
+    assert {t.type for t in fig.data} == {"scatter"}
+    assert len(fig.data[0].x) == 1200
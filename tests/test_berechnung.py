@@ -0,0 +1,95 @@
+﻿# -*- coding: utf-8 -*-
+"""Spalten-Engine gegen die frühere Schleife je Monat (Monatsdaten/Diagramm)."""
+import random
+
+import numpy as np
+import pytest
+
+from berechnung import (MONATSNAMEN, baue_spalten, berechne_guv, convertiere_monat_to_num,
+                        kumuliert_und_break_even)
+
+
+def _zufallsdaten(rnd, anzahl):
+    daten, gesehen = [], set()
+    while len(daten) < anzahl:
+        monat, jahr = rnd.choice(MONATSNAMEN), rnd.randint(2023, 2027)
+        if (monat, jahr) in gesehen:
+            continue
+        gesehen.add((monat, jahr))
+        d = {"monat": monat, "jahr": jahr, "revenue": round(rnd.uniform(0, 5e4), 2),
+             "costs": round(rnd.uniform(0, 5e4), 2), "personnel_included": rnd.random() < 0.3}
+        if rnd.random() < 0.5:
+            d["components"] = {"units": rnd.randint(0, 500), "price": round(rnd.uniform(10, 200), 2),
+                               "fixed_costs": round(rnd.uniform(0, 2e4), 2),
+                               "variable_costs": round(rnd.uniform(0, 50), 2)}
+        daten.append(d)
+    return daten
+
+
+def _schleife(daten, personal):
+    """Umsatz/Kosten/Gewinn wie die früheren Routen: Monat für Monat, danach kumuliert."""
+    zeilen = sorted(daten, key=lambda d: (int(d["jahr"]), convertiere_monat_to_num(d["monat"])))
+    werte = []
+    for d in zeilen:
+        pers = personal[(d["monat"], d["jahr"])]
+        comps = d.get("components") or {}
+        units, price, fixed, variable = (comps.get(k) for k in ("units", "price", "fixed_costs", "variable_costs"))
+        if None not in (units, price, fixed, variable):
+            rev = float(units) * float(price)
+            cost = float(fixed) + float(variable) * float(units) + float(pers)
+        else:
+            rev = float(d["revenue"])
+            cost = float(d["costs"]) + (0.0 if d.get("personnel_included", False) else float(pers))
+        werte.append((rev, cost, rev - cost))
+    kumuliert, s, break_even = [], 0.0, None
+    for i, (_, _, p) in enumerate(werte):
+        s += p
+        kumuliert.append(s)
+        if break_even is None and s >= 0:
+            break_even = i
+    return zeilen, werte, kumuliert, break_even
+
+
+@pytest.mark.parametrize("jahr", [None, 2025])
+def test_wie_monatsschleife(jahr):
+    rnd = random.Random(1)
+    daten = _zufallsdaten(rnd, 45)
+    personal = {(d["monat"], d["jahr"]): float(rnd.choice([0, 1500, 4200.5])) for d in daten}
+    auswahl = daten if jahr is None else [d for d in daten if d["jahr"] == jahr]
+    zeilen, werte, kumuliert, break_even = _schleife(auswahl, personal)
+
+    spalten = baue_spalten(daten, jahr)
+    assert list(zip(spalten.monat, spalten.jahr.tolist())) == [(d["monat"], d["jahr"]) for d in zeilen]
+    pers = np.array([personal[(m, j)] for m, j in zip(spalten.monat, spalten.jahr.tolist())])
+    guv = berechne_guv(spalten, pers)
+    np.testing.assert_allclose(np.column_stack(guv), np.array(werte).reshape(-1, 3))
+    kum, idx = kumuliert_und_break_even(guv.profit)
+    np.testing.assert_allclose(kum, kumuliert)
+    assert idx == break_even
+
+
+def test_faktoren_als_szenarien():
+    daten = _zufallsdaten(random.Random(2), 12)
+    spalten = baue_spalten(daten)
+    pers = np.full(len(spalten), 1000.0)
+    faktoren = np.array([[0.5], [1.0], [1.5]])
+    szenarien = berechne_guv(spalten, pers, units_faktor=faktoren, preis_faktor=faktoren)
+    assert szenarien.profit.shape == (3, len(spalten))
+    np.testing.assert_allclose(szenarien.profit[1], berechne_guv(spalten, pers).profit)
+    einzeln = berechne_guv(spalten, pers, units_faktor=1.5, preis_faktor=1.5)
+    np.testing.assert_allclose(szenarien.profit[2], einzeln.profit)
+
+
+def test_unbekannte_monate_am_jahresende():
+    spalten = baue_spalten([{"monat": "Sonder", "jahr": 2025, "revenue": 1, "costs": 0},
+                            {"monat": "Februar", "jahr": 2025, "revenue": 2, "costs": 0},
+                            {"monat": "Januar", "jahr": 2026, "revenue": 3, "costs": 0}])
+    assert spalten.monat == ["Februar", "Sonder", "Januar"]
+    assert spalten.monat_num.tolist() == [2, 0, 1]
+
+
+def test_leer():
+    spalten = baue_spalten([])
+    assert len(spalten) == 0
+    kum, idx = kumuliert_und_break_even(berechne_guv(spalten, np.zeros(0)).profit)
+    assert kum.size == 0 and idx is None
@@ -0,0 +1,79 @@
+﻿# -*- coding: utf-8 -*-
+"""Break-Even-Löser: an der Grenze wird der kumulierte Gewinn bis zum Zielmonat gerade nicht negativ."""
+import numpy as np
+import pytest
+
+from berechnung import MONATSNAMEN, baue_spalten, berechne_guv
+from break_even import bisektion, kumulierte_basis, loese, loese_numerisch
+
+KOMP = {"units": 100, "price": 40.0, "fixed_costs": 3000.0, "variable_costs": 10.0}
+
+
+@pytest.fixture
+def plan():
+    daten = [{"monat": name, "jahr": 2025, "revenue": 0.0, "costs": 0.0, "components": KOMP}
+             for name in MONATSNAMEN]
+    daten.append({"monat": "Januar", "jahr": 2026, "revenue": 500.0, "costs": 200.0, "personnel_included": False})
+    spalten = baue_spalten(daten)
+    personal = np.full(len(spalten), 2000.0)
+    return spalten, personal
+
+
+def _erreicht(spalten, personal, zielmonat, personal_faktor=1.0, **faktoren):
+    kumuliert = np.cumsum(berechne_guv(spalten, personal * personal_faktor, **faktoren).profit)
+    return bool(np.any(kumuliert[:zielmonat + 1] >= -1e-6))
+
+
+@pytest.mark.parametrize("variable, richtung", [("preis_faktor", 1), ("units_faktor", 1),
+                                                ("fixkosten_faktor", -1), ("personal_faktor", -1)])
+def test_grenze(plan, variable, richtung):
+    spalten, personal = plan
+    basis = kumulierte_basis(spalten, personal)
+    for zielmonat in (0, 5, 12):
+        loesung = loese(basis, zielmonat, variable)
+        grenze = float(loesung.grenze[0])
+        assert loesung.erreichbar[0] and loesung.richtung[0] == richtung
+        assert _erreicht(spalten, personal, zielmonat, **{variable: grenze})
+        assert not _erreicht(spalten, personal, zielmonat, **{variable: grenze - richtung * 0.01})
+
+
+def test_viele_ziele_auf_einmal(plan):
+    spalten, personal = plan
+    basis = kumulierte_basis(spalten, personal)
+    ziele = np.arange(len(spalten))
+    gemeinsam = loese(basis, ziele, "preis_faktor", {"units_faktor": 1.5})
+    einzeln = [loese(basis, z, "preis_faktor", {"units_faktor": 1.5}).grenze[0] for z in ziele]
+    np.testing.assert_allclose(gemeinsam.grenze, einzeln)
+
+
+def test_unerreichbar_und_immer(plan):
+    spalten, personal = plan
+    basis = kumulierte_basis(spalten, personal)
+    # Ohne Umsatz hilft kein Preis
+    assert not loese(basis, 3, "preis_faktor", {"units_faktor": 0.0}).erreichbar[0]
+    # Selbst ohne variable Kosten bleibt jeder Monat im Minus
+    assert not loese(basis, 12, "varkosten_faktor").erreichbar[0]
+    # Mit doppeltem Preis wird der Break-Even schon zum aktuellen Stand erreicht
+    assert loese(basis, 3, "fixkosten_faktor", {"preis_faktor": 2.0}).grenze[0] > 1.0
+    with pytest.raises(ValueError):
+        loese(basis, len(spalten), "preis_faktor")
+    with pytest.raises(ValueError):
+        loese(basis, 0, "unbekannt")
+
+
+def test_bisektion():
+    x = bisektion(lambda x: x * x - np.array([2.0, 9.0, -1.0]), 0.0, 5.0)
+    np.testing.assert_allclose(x[:2], [np.sqrt(2.0), 3.0], atol=1e-8)
+    assert np.isnan(x[2])
+
+
+def test_numerisch_wie_geschlossen(plan):
+    spalten, personal = plan
+    ziele = np.array([0, 5, 12])
+
+    def gewinn(x):
+        return berechne_guv(spalten, personal, preis_faktor=x[:, None]).profit
+
+    numerisch = loese_numerisch(gewinn, ziele, 0.0, 100.0)
+    geschlossen = loese(kumulierte_basis(spalten, personal), ziele, "preis_faktor").grenze
+    np.testing.assert_allclose(numerisch, geschlossen, atol=1e-6)
@@ -0,0 +1,78 @@
+﻿# -*- coding: utf-8 -*-
+"""Export: CSV-Stream, XLSX und Parquet/Arrow enthalten dieselben Zeilen wie die Monats-GuV."""
+import csv
+import io
+import zipfile
+
+import numpy as np
+import pytest
+
+import export
+from berechnung import MONATSNAMEN, baue_spalten, berechne_guv
+from export import KOPFZEILE, csv_stream, exportiere_datei
+
+
+def _plan(jahre):
+    daten = [{"monat": m, "jahr": j, "revenue": 1000.0 + i, "costs": 333.333 * (i % 5), "personnel_included": False}
+             for i, (j, m) in enumerate((j, m) for j in jahre for m in MONATSNAMEN)]
+    spalten = baue_spalten(daten)
+    pers = np.arange(len(spalten), dtype=np.float64) * 10.005
+    return spalten, pers, berechne_guv(spalten, pers)
+
+
+@pytest.fixture
+def monatsdaten():
+    return _plan(range(2025, 2028))
+
+
+def _erwartet(spalten, pers, guv):
+    betraege = np.round(np.column_stack([guv.revenue, guv.costs, guv.profit, pers]), 2).tolist()
+    return [[j, m] + zeile for j, m, zeile in zip(spalten.jahr.tolist(), spalten.monat, betraege)]
+
+
+def test_csv_stream_blockweise():
+    monatsdaten = _plan(range(1950, 2050))
+    stuecke = list(csv_stream(*monatsdaten))
+    assert len(stuecke) == -(-1200 // export.BLOCKGROESSE)
+    zeilen = list(csv.reader(io.StringIO("".join(stuecke)), delimiter=";"))
+    assert zeilen[0] == KOPFZEILE
+    gelesen = [[int(z[0]), z[1]] + [float(w) for w in z[2:]] for z in zeilen[1:]]
+    assert gelesen == _erwartet(*monatsdaten)
+
+
+def test_csv_ohne_daten():
+    spalten = baue_spalten([])
+    assert list(csv_stream(spalten, np.zeros(0), berechne_guv(spalten, np.zeros(0)))) == []
+
+
+@pytest.mark.parametrize("format_name", ["parquet", "arrow"])
+def test_parquet_und_arrow(monatsdaten, format_name):
+    pa = pytest.importorskip("pyarrow")
+    with exportiere_datei(format_name, *monatsdaten) as datei:
+        if format_name == "parquet":
+            import pyarrow.parquet as pq
+            tabelle = pq.read_table(datei)
+        else:
+            tabelle = pa.ipc.open_file(datei).read_all()
+    assert tabelle.column_names == ["jahr", "monat", "umsatz", "kosten", "gewinn", "personalkosten"]
+    assert [list(z) for z in zip(*tabelle.to_pydict().values())] == _erwartet(*monatsdaten)
+
+
+def test_xlsx(monatsdaten):
+    pytest.importorskip("xlsxwriter")
+    with exportiere_datei("xlsx", *monatsdaten) as datei:
+        with zipfile.ZipFile(datei) as mappe:
+            blatt = mappe.read("xl/worksheets/sheet1.xml").decode("utf-8")
+    assert blatt.count("<row ") == 1 + len(monatsdaten[0])
+
+
+def test_export_route(app_speicher, client):
+    app_speicher.setze_monat("Januar", 2025, {"revenue": 100.0, "costs": 40.0})
+    app_speicher.setze_monat("Februar", 2025, {"revenue": 50.0, "costs": 70.0})
+    antwort = client.get("/export/csv?jahr=2025")
+    assert antwort.status_code == 200
+    assert antwort.headers["Content-Type"].startswith("text/csv")
+    assert "monatsdaten_2025.csv" in antwort.headers["Content-Disposition"]
+    assert antwort.get_data(as_text=True).splitlines()[1:] == ["2025;Januar;100.0;40.0;60.0;0.0",
+                                                              "2025;Februar;50.0;70.0;-20.0;0.0"]
+    assert client.get("/export/pdf").status_code == 404
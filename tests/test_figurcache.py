@@ -0,0 +1,54 @@
+﻿# -*- coding: utf-8 -*-
+"""FigurCache: LRU-Grenzen, Leeren bei neuer Version; ETag/304 der Diagramm-Routen."""
+from figurcache import FigurCache
+
+
+def test_lru_und_groesse():
+    cache = FigurCache(max_eintraege=2, max_bytes=10)
+    cache.ablegen(1, "a", b"1234", "text/html")
+    cache.ablegen(1, "b", b"1234", "text/html")
+    assert cache.hole(1, "a").inhalt == b"1234"
+    cache.ablegen(1, "c", b"1234", "text/html")
+    # "b" war am längsten unbenutzt
+    assert cache.hole(1, "b") is None
+    assert cache.hole(1, "a") is not None
+    # Zu groß für den Cache: Eintrag mit ETag, aber nicht abgelegt
+    eintrag = cache.ablegen(1, "d", b"x" * 11, "text/html")
+    assert eintrag.etag and cache.hole(1, "d") is None
+    cache.ablegen(1, "e", b"123456", "text/html")
+    assert cache.statistik()["bytes"] <= 10
+    assert cache.statistik()["verdraengt"] == 2
+
+
+def test_neue_version_leert():
+    cache = FigurCache()
+    cache.ablegen(1, "a", b"x", "text/html")
+    assert cache.hole(2, "a") is None
+    assert cache.hole(1, "a") is None
+    assert cache.statistik()["invalidierungen"] == 1
+
+
+def test_etag_und_304(client, app_speicher):
+    import app as app_modul
+    app_modul.figur_cache.leeren()
+    app_speicher.setze_monat("Januar", 2025, {"revenue": 100.0, "costs": 40.0, "profit": 60.0})
+
+    erste = client.get("/diagramm?format=json")
+    assert erste.status_code == 200
+    assert erste.headers["X-Cache"] == "MISS"
+    etag = erste.headers["ETag"]
+    zweite = client.get("/diagramm?format=json")
+    assert zweite.headers["X-Cache"] == "HIT"
+    assert zweite.headers["ETag"] == etag
+    assert zweite.get_data() == erste.get_data()
+
+    antwort = client.get("/diagramm?format=json", headers={"If-None-Match": etag})
+    assert antwort.status_code == 304
+    # Andere Query-Parameter: eigener Eintrag
+    assert client.get("/diagramm").headers["X-Cache"] == "MISS"
+
+    app_speicher.setze_monat("Februar", 2025, {"revenue": 10.0, "costs": 40.0, "profit": -30.0})
+    neu = client.get("/diagramm?format=json", headers={"If-None-Match": etag})
+    assert neu.status_code == 200
+    assert neu.headers["X-Cache"] == "MISS"
+    assert neu.headers["ETag"] != etag
@@ -0,0 +1,74 @@
+﻿# -*- coding: utf-8 -*-
+"""Nachgeführter GuVStand (Planspeicher.stand) gegen einen vollständigen Neuaufbau."""
+import random
+
+import numpy as np
+
+from berechnung import MONATSNAMEN
+from inkrementell import GuVStand
+
+SCHRITTE = 800      # zufällige Änderungen je Backend
+
+
+def _gleich(a: GuVStand, b: GuVStand):
+    assert a.spalten.monat == b.spalten.monat
+    for x, y in zip(a.spalten[1:], b.spalten[1:]):
+        assert np.array_equal(x, y)
+    np.testing.assert_allclose(a.personal, b.personal, atol=1e-6)
+    for x, y in zip(a.guv, b.guv):
+        np.testing.assert_allclose(x, y, atol=1e-5)
+    np.testing.assert_allclose(a.kumuliert, b.kumuliert, atol=1e-4)
+    assert a.break_even == b.break_even
+    for jahr in set(a.spalten.jahr.tolist()):
+        np.testing.assert_allclose(a.auswahl(jahr).guv.profit, b.auswahl(jahr).guv.profit, atol=1e-5)
+        assert a.kumuliert_und_break_even(jahr)[1] == b.kumuliert_und_break_even(jahr)[1]
+
+
+def _zufaellige_aenderung(speicher, rnd):
+    art = rnd.random()
+    if art < 0.25:
+        speicher.mitarbeiter_hinzufuegen({
+            "rolle": "x", "gehalt": float(rnd.randrange(1000, 9000)) + 0.37,
+            "startmonat": rnd.randint(1, 12), "startjahr": rnd.randint(2024, 2030),
+            "endmonat": rnd.choice([None, rnd.randint(1, 12)]),
+            "endjahr": rnd.choice([None, rnd.randint(2024, 2031)]),
+        })
+    elif art < 0.4:
+        n = len(speicher.personal())
+        speicher.mitarbeiter_loeschen(rnd.randrange(n) if n else 0)
+    elif art < 0.75:
+        speicher.setze_monat(
+            rnd.choice(MONATSNAMEN), rnd.randint(2024, 2031),
+            {"revenue": rnd.random() * 1e5, "costs": rnd.random() * 1e5, "profit": 0.0,
+             "personnel_included": rnd.random() < 0.5},
+            components=rnd.choice([None, {"units": rnd.randint(0, 100), "price": 100.0,
+                                          "fixed_costs": 5000.0, "variable_costs": 2.0}]))
+    elif art < 0.85:
+        speicher.setze_monate([
+            (rnd.choice(MONATSNAMEN), rnd.randint(2024, 2031), {"revenue": rnd.random() * 1e4, "costs": 1.0}, None)
+            for _ in range(3)])
+    elif speicher.monate():
+        m = rnd.choice(speicher.monate())
+        speicher.aendere_monat(m["monat"], m["jahr"], {"revenue": 1.0, "costs": rnd.random() * 1e4})
+
+
+def test_nachgefuehrt_wie_neu_aufgebaut(speicher):
+    rnd = random.Random(3)
+    speicher.stand()
+    for _ in range(SCHRITTE):
+        _zufaellige_aenderung(speicher, rnd)
+        _gleich(speicher.stand(), GuVStand.aufbauen(speicher.monate(), speicher.personal()))
+    # Ohne fremde Schreiber muss fast jede Änderung nachgeführt worden sein
+    assert speicher.nachgefuehrt > SCHRITTE // 2
+
+
+def test_fremder_schreiber_erzwingt_neuaufbau(tmp_path):
+    from conftest import neuer_speicher
+    a = neuer_speicher("json", str(tmp_path))
+    b = neuer_speicher("json", str(tmp_path))
+    a.setze_monat("Januar", 2025, {"revenue": 100.0, "costs": 10.0})
+    a.stand()
+    b.setze_monat("Januar", 2025, {"revenue": 5.0, "costs": 10.0})
+    a.setze_monat("Februar", 2025, {"revenue": 1.0, "costs": 0.0})
+    _gleich(a.stand(), GuVStand.aufbauen(a.monate(), a.personal()))
+    assert a.stand().guv.revenue.tolist() == [5.0, 1.0]
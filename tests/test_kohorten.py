@@ -0,0 +1,87 @@
+﻿# -*- coding: utf-8 -*-
+"""Kohorten-Kostenvergleich gegen eine Monat-für-Monat-Rechnung je Patient."""
+import numpy as np
+
+import kohorten
+from kohorten import Kohorte, kreuzungsmonate, lese_kohorte, vergleiche, zusammenfassung
+from massenimport import ImportFehler
+
+
+def _zufallskohorte(n, seed=5):
+    rnd = np.random.default_rng(seed)
+    return Kohorte(
+        op_einmalig=rnd.choice([0.0, 1200.0, 3500.0, 10000.0], n) + rnd.integers(0, 3, n) * 0.5,
+        op_monatlich=rnd.choice([0.0, 10.0, 100.0], n),
+        konservativ_monatlich=rnd.choice([0.0, 100.0, 170.0, 300.0], n),
+        monate=rnd.integers(1, 40, n),
+    )
+
+
+def _kurven(kohorte, i):
+    t = np.arange(1, kohorte.monate[i] + 1)
+    return kohorte.op_einmalig[i] + kohorte.op_monatlich[i] * t, kohorte.konservativ_monatlich[i] * t
+
+
+def test_kreuzungsmonate_wie_schleife():
+    kohorte = _zufallskohorte(2000)
+    kreuzung = kreuzungsmonate(kohorte)
+    for i in range(len(kohorte)):
+        op, konservativ = _kurven(kohorte, i)
+        treffer = np.flatnonzero(op <= konservativ)
+        assert kreuzung[i] == (treffer[0] + 1 if len(treffer) else -1)
+
+
+def test_kreuzung_glatter_quotient():
+    kohorte = Kohorte(np.array([1200.0, 1200.0]), np.array([0.0, 0.0]),
+                      np.array([100.0, 100.0]), np.array([12, 11]))
+    assert kreuzungsmonate(kohorte).tolist() == [12, -1]
+
+
+def test_vergleiche_wie_schleife(monkeypatch):
+    # Kleine Blöcke, damit die Perzentile über mehrere Blöcke laufen
+    monkeypatch.setattr(kohorten, "ZELLEN_JE_BLOCK", 500)
+    kohorte = _zufallskohorte(300)
+    ergebnis = vergleiche(kohorte)
+    laenge = kohorte.monate.max()
+    for t in (1, 7, laenge // 2, laenge):
+        aktiv = np.flatnonzero(kohorte.monate >= t)
+        assert ergebnis.aktiv[t - 1] == len(aktiv)
+        op = kohorte.op_einmalig[aktiv] + kohorte.op_monatlich[aktiv] * t
+        konservativ = kohorte.konservativ_monatlich[aktiv] * t
+        np.testing.assert_allclose(ergebnis.op_mittel[t - 1], op.mean())
+        np.testing.assert_allclose(ergebnis.konservativ_mittel[t - 1], konservativ.mean())
+        np.testing.assert_allclose(ergebnis.differenz_perzentile[:, t - 1],
+                                   np.percentile(op - konservativ, ergebnis.perzentile))
+    np.testing.assert_allclose(ergebnis.op_gesamt - ergebnis.konservativ_gesamt,
+                               [(_kurven(kohorte, i)[0] - _kurven(kohorte, i)[1])[-1] for i in range(300)])
+    assert ergebnis.kreuzung_haeufigkeit.sum() == np.count_nonzero(ergebnis.kreuzung > 0)
+
+
+def test_lese_kohorte_standardwerte_und_fehler():
+    zeilen = [{}, {"implant_unit_cost": "1000", "horizon_months": "24"},
+              {"surgeon_fee": "-1"}, {"horizon_months": "2,5"}, {"anesthesia_fee": "x"}]
+    kohorte, fehler = lese_kohorte(zeilen, zeilen_versatz=2)
+    assert kohorte.op_einmalig.tolist() == [3500.0, 1900.0]
+    assert kohorte.monate.tolist() == [12, 24]
+    assert fehler == [
+        ImportFehler(4, "surgeon_fee darf nicht negativ sein"),
+        ImportFehler(5, f"horizon_months muss eine ganze Zahl zwischen 1 und {kohorten.MAX_MONATE} sein"),
+        ImportFehler(6, "anesthesia_fee ist keine Zahl"),
+    ]
+    assert zusammenfassung(vergleiche(kohorte))["kreuzungsmonat"]["patienten"] == 1
+
+
+def test_kohorte_route(client):
+    csv = "implant_unit_cost;horizon_months\n1200;24\n;6\n"
+    antwort = client.post("/kostenvergleich/kohorte", data=csv, content_type="text/csv")
+    assert antwort.status_code == 200
+    daten = antwort.get_json()
+    assert daten["patienten"] == 2 and daten["fehler"] == []
+    # 1200 + 900 einmalig gegen 170 je Monat: Kreuzung in Monat 13, nur beim ersten Patienten
+    assert daten["kreuzungsmonat"]["patienten"] == 1
+    assert daten["kreuzungsmonat"]["mittel"] == 13.0
+    assert daten["kurven"]["aktiv"][:7] == [2] * 6 + [1]
+
+    antwort = client.post("/kostenvergleich/kohorte", json={"patienten": [{"horizon_months": 0}]})
+    assert antwort.status_code == 400
+    assert antwort.get_json()["fehler"][0]["zeile"] == 1
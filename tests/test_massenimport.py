@@ -0,0 +1,105 @@
+﻿# -*- coding: utf-8 -*-
+"""Massenimport: Fehler je Zeile, Duplikate, berechnete Monatswerte, POST /import."""
+import pytest
+
+from massenimport import ImportFehler, lese_csv, lese_json, pruefe_und_berechne
+from personalkosten import PersonalZeitachse
+
+PERSONAL = [{"rolle": "Dev", "gehalt": 1000.0, "startmonat": 2, "startjahr": 2025}]
+
+CSV = """jahr;monat;units;price;fixed_costs;variable_costs;kostenstelle
+2025;Januar;10;5,5;100;1;
+2025;2;20;5;100;1;Vertrieb
+2025;Februar;1;1;1;1;
+;März;1;1;1;1;
+2025;Brumaire;1;1;1;1;
+2025;April;-1;1;x;1;
+2025;Mai;1.5;1;1;;
+"""
+
+
+def test_csv():
+    zeilen = lese_csv(CSV)
+    ergebnis = pruefe_und_berechne(zeilen, PersonalZeitachse(PERSONAL), zeilen_versatz=2)
+    assert ergebnis.zeilen == 7
+    assert ergebnis.fehler == [
+        ImportFehler(4, "jahr/monat kommt im Import mehrfach vor"),
+        ImportFehler(5, "jahr fehlt"),
+        ImportFehler(6, "monat ist kein gültiger Monatsname bzw. keine Zahl 1–12"),
+        ImportFehler(7, "units darf nicht negativ sein"),
+        ImportFehler(7, "fixed_costs ist keine Zahl"),
+        ImportFehler(8, "variable_costs fehlt"),
+        ImportFehler(8, "units muss ganzzahlig sein"),
+    ]
+
+    januar, februar = ergebnis.eintraege
+    assert januar[:2] == ("Januar", 2025)
+    assert januar[2] == {"revenue": 55.0, "costs": 110.0, "profit": -55.0, "personnel_included": True}
+    assert januar[3] == {"units": 10, "price": 5.5, "fixed_costs": 100.0, "variable_costs": 1.0}
+    # Ab Februar kommen die Personalkosten hinzu
+    assert februar[:2] == ("Februar", 2025)
+    assert februar[2] == {"revenue": 100.0, "costs": 1120.0, "profit": -1020.0, "personnel_included": True,
+                          "kostenstelle": "Vertrieb"}
+
+
+def test_kostenstelle_des_plans():
+    zeilen = lese_csv("""jahr;monat;units;price;fixed_costs;variable_costs;kostenstelle
+2025;Januar;1;1;0;0;Vertrieb
+2025;Januar;2;1;0;0;Einkauf
+2025;Januar;3;1;0;0;
+2025;Januar;4;1;0;0;Vertrieb
+""")
+    ergebnis = pruefe_und_berechne(zeilen, PersonalZeitachse([]), zeilen_versatz=2, kostenstelle="Vertrieb")
+    assert ergebnis.fehler == [
+        ImportFehler(3, "kostenstelle gehört nicht zu diesem Plan (Kostenstelle 'Vertrieb')"),
+        ImportFehler(4, "jahr/monat kommt im Import mehrfach vor"),
+        ImportFehler(5, "jahr/monat kommt im Import mehrfach vor"),
+    ]
+    assert [e[2]["revenue"] for e in ergebnis.eintraege] == [1.0]
+    assert ergebnis.eintraege[0][2]["kostenstelle"] == "Vertrieb"
+
+
+def test_csv_mit_komma():
+    zeilen = lese_csv("Jahr,Monat,Units,Price,Fixed_Costs,Variable_Costs\n2025,12,1,2,3,4\n")
+    ergebnis = pruefe_und_berechne(zeilen, PersonalZeitachse([]))
+    assert ergebnis.fehler == []
+    assert ergebnis.eintraege[0][2]["profit"] == 2.0 - 3.0 - 4.0
+
+
+def test_json():
+    zeilen = [{"jahr": 2026, "monat": "märz", "units": 2, "price": 3, "fixed_costs": 0, "variable_costs": 0}]
+    assert lese_json({"monate": zeilen}) == lese_json(zeilen) == zeilen
+    ergebnis = pruefe_und_berechne(zeilen, PersonalZeitachse(PERSONAL), zeilen_versatz=1)
+    assert ergebnis.eintraege[0][0] == "März"
+    assert ergebnis.eintraege[0][2]["costs"] == 1000.0
+    with pytest.raises(ValueError):
+        lese_json({"monate": [1, 2]})
+    with pytest.raises(ValueError):
+        lese_json({"andere": []})
+
+
+def test_import_route(client, app_speicher):
+    zeile = {"jahr": 2025, "monat": "Januar", "units": 2, "price": 10, "fixed_costs": 5, "variable_costs": 1}
+    falsch = dict(zeile, monat="Februar", units=-1)
+
+    # Ohne ?teilweise wird bei einem Fehler nichts geschrieben
+    antwort = client.post("/import", json=[zeile, falsch])
+    assert antwort.status_code == 400
+    assert antwort.get_json()["importiert"] == 0
+    assert app_speicher.monate() == []
+
+    antwort = client.post("/import?trocken=1", json=[zeile])
+    assert antwort.get_json() == {"zeilen": 1, "gueltig": 1, "importiert": 0, "fehler": []}
+    assert app_speicher.monate() == []
+
+    antwort = client.post("/import?teilweise=1", json=[zeile, falsch])
+    assert antwort.status_code == 200
+    assert antwort.get_json()["importiert"] == 1
+    assert app_speicher.finde_monat("Januar", 2025)["profit"] == 13.0
+
+    # Monate einer anderen Kostenstelle gehören in deren Plan
+    fremd = dict(zeile, monat="März", kostenstelle="klinik-nord")
+    antwort = client.post("/import", json=[fremd])
+    assert antwort.status_code == 400
+    assert antwort.get_json()["fehler"][0]["meldung"].startswith("kostenstelle gehört nicht zu diesem Plan")
+    assert app_speicher.finde_monat("März", 2025) is None
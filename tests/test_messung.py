@@ -0,0 +1,69 @@
+﻿# -*- coding: utf-8 -*-
+"""Messung: Server-Timing je Phase, Prometheus-Text, Profiling nur mit Token."""
+import importlib.util
+
+import pytest
+
+from messung import GRENZEN, Metriken, server_timing
+
+
+def test_prometheus_text():
+    metriken = Metriken(praefix="t")
+    metriken.anfrage("diagramm", "GET", 200, 0.003, [("laden", 0.001), ("rendern", 0.002)])
+    metriken.anfrage("diagramm", "GET", 200, 20.0)
+    metriken.registriere("offen", "gauge", "Offene Pläne.", lambda: 3)
+    metriken.registriere("je_plan", "counter", "Je Plan.", lambda: [({"plan": 'a"b'}, 1)])
+    zeilen = metriken.text().splitlines()
+
+    assert 't_anfragen_gesamt{route="diagramm",methode="GET",status="200"} 2' in zeilen
+    assert 't_anfrage_sekunden_bucket{route="diagramm",le="0.0025"} 0' in zeilen
+    assert 't_anfrage_sekunden_bucket{route="diagramm",le="0.005"} 1' in zeilen
+    assert f't_anfrage_sekunden_bucket{{route="diagramm",le="{GRENZEN[-1]}"}} 1' in zeilen
+    assert 't_anfrage_sekunden_bucket{route="diagramm",le="+Inf"} 2' in zeilen
+    assert 't_anfrage_sekunden_count{route="diagramm"} 2' in zeilen
+    assert 't_phase_sekunden_count{route="diagramm",phase="laden"} 1' in zeilen
+    assert "# TYPE t_offen gauge" in zeilen and "t_offen 3" in zeilen
+    assert 't_je_plan{plan="a\\"b"} 1' in zeilen
+
+
+def test_server_timing_header(client, app_speicher):
+    app_speicher.setze_monat("Januar", 2025, {"revenue": 1.0, "costs": 0.0})
+    kopf = client.get("/diagramm").headers["Server-Timing"]
+    phasen = [teil.split(";")[0] for teil in kopf.split(", ")]
+    assert phasen == ["laden", "berechnung", "figur", "rendern", "gesamt"]
+    assert 'desc="MISS"' in kopf
+    assert 'desc="HIT"' in client.get("/diagramm").headers["Server-Timing"]
+
+    # Die Metriken gelten für den ganzen Prozess, also auch für frühere Tests
+    antwort = client.get("/metrics")
+    assert antwort.headers["Content-Type"] == "text/plain; version=0.0.4; charset=utf-8"
+    text = antwort.get_data(as_text=True)
+    assert 'finanzplan_phase_sekunden_count{route="diagramm",phase="figur"} ' in text
+    assert "finanzplan_figur_cache_trefferquote " in text
+    assert 'finanzplan_speicher_schreibvorgaenge_gesamt{plan="standard"} 1\n' in text
+
+
+def test_server_timing_text():
+    assert server_timing(0.5, [("laden", 0.001)], "HIT") == 'laden;dur=1.00, gesamt;dur=500.00;desc="HIT"'
+
+
+def test_profil_nur_mit_token(client, app_speicher, monkeypatch):
+    import app as app_modul
+    # Ohne gesetztes Token wird ?profil ignoriert
+    assert client.get("/diagramm?profil=cprofile").content_type.startswith("text/html")
+
+    monkeypatch.setattr(app_modul, "PROFIL_TOKEN", "geheim")
+    assert client.get("/diagramm?profil=cprofile&token=falsch").status_code == 403
+    antwort = client.get("/diagramm?profil=cprofile&token=geheim")
+    assert antwort.status_code == 200
+    assert antwort.headers["Content-Type"] == "text/plain; charset=utf-8"
+    assert "cumulative" in antwort.get_data(as_text=True)
+    antwort = client.get("/diagramm?profil=cprofile", headers={"X-Finanzplan-Token": "geheim"})
+    assert antwort.status_code == 200
+
+
+@pytest.mark.skipif(importlib.util.find_spec("pyinstrument") is not None, reason="pyinstrument installiert")
+def test_pyinstrument_fehlt(client, app_speicher, monkeypatch):
+    import app as app_modul
+    monkeypatch.setattr(app_modul, "PROFIL_TOKEN", "geheim")
+    assert client.get("/diagramm?profil=pyinstrument&token=geheim").status_code == 501
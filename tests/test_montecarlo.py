@@ -0,0 +1,82 @@
+﻿# -*- coding: utf-8 -*-
+"""Monte-Carlo-Simulation gegen eine Berechnung Pfad für Pfad mit berechne_guv."""
+import numpy as np
+import pytest
+
+from berechnung import baue_spalten, berechne_guv, kumuliert_und_break_even
+from montecarlo import (FAKTOREN, gewinn_basis, pruefe_verteilung, simuliere, verteilung_aus_text,
+                        ziehe_faktoren)
+
+VERTEILUNGEN = {"units_faktor": ("dreieck", 0.6, 1.0, 1.3), "preis_faktor": ("gleich", 0.9, 1.1),
+                "fixkosten_faktor": ("normal", 1.0, 0.1), "varkosten_faktor": ("lognormal", 0.0, 0.1)}
+
+
+@pytest.fixture
+def plan():
+    daten = [{"monat": m, "jahr": 2025, "revenue": 0, "costs": 0,
+              "components": {"units": 100 + 10 * i, "price": 45.0, "fixed_costs": 3000.0, "variable_costs": 12.0}}
+             for i, m in enumerate(["Januar", "Februar", "März", "April", "Mai", "Juni"])]
+    daten += [{"monat": "Juli", "jahr": 2025, "revenue": 5000.0, "costs": 800.0, "personnel_included": True},
+              {"monat": "August", "jahr": 2025, "revenue": 900.0, "costs": 300.0}]
+    spalten = baue_spalten(daten)
+    return spalten, np.linspace(1000.0, 1500.0, len(spalten))
+
+
+def test_gewinnbasis_linear_in_faktoren(plan):
+    spalten, pers = plan
+    basis = gewinn_basis(spalten, pers)
+    u, p, f, v = 1.2, 0.8, 1.1, 0.7
+    erwartet = berechne_guv(spalten, pers, units_faktor=u, preis_faktor=p,
+                            fixkosten_faktor=f, varkosten_faktor=v).profit
+    np.testing.assert_allclose(np.array([u * p, f, v * u, 1.0]) @ basis, erwartet)
+
+
+def test_wie_einzelne_pfade(plan):
+    spalten, pers = plan
+    pfade = 400
+    ergebnis = simuliere(spalten, pers, VERTEILUNGEN, pfade=pfade, seed=11)
+    faktoren = ziehe_faktoren(VERTEILUNGEN, pfade, np.random.default_rng(11))
+
+    kumuliert, break_even = [], []
+    for i in range(pfade):
+        guv = berechne_guv(spalten, pers, **{name: faktoren[name][i] for name in FAKTOREN})
+        kum, idx = kumuliert_und_break_even(guv.profit)
+        kumuliert.append(kum)
+        break_even.append(idx)
+    kumuliert = np.array(kumuliert)
+
+    np.testing.assert_allclose(ergebnis.kumuliert_perzentile,
+                               np.percentile(kumuliert, ergebnis.perzentile, axis=0), rtol=1e-9, atol=1e-6)
+    np.testing.assert_allclose(ergebnis.kumuliert_mittel, kumuliert.mean(axis=0), rtol=1e-9)
+    assert ergebnis.nie_break_even == break_even.count(None)
+    erreicht = [i for i in break_even if i is not None]
+    assert ergebnis.break_even_haeufigkeit.tolist() == np.bincount(erreicht, minlength=len(spalten)).tolist()
+
+
+def test_feste_faktoren(plan):
+    spalten, pers = plan
+    ergebnis = simuliere(spalten, pers, {}, pfade=50, seed=1)
+    kum, idx = kumuliert_und_break_even(berechne_guv(spalten, pers).profit)
+    for zeile in ergebnis.kumuliert_perzentile:
+        np.testing.assert_allclose(zeile, kum)
+    assert set(ergebnis.break_even_perzentile.values()) == {idx}
+    assert ergebnis.break_even_wahrscheinlichkeit == (0.0 if idx is None else 1.0)
+
+
+def test_verteilung_aus_text():
+    assert verteilung_aus_text("0.7, 1.0, 1.3") == ("dreieck", 0.7, 1.0, 1.3)
+    assert verteilung_aus_text("0.9,1.1") == ("gleich", 0.9, 1.1)
+    assert verteilung_aus_text("1.05") == 1.05
+    assert verteilung_aus_text("normal: 1.0, 0.1") == ("normal", 1.0, 0.1)
+
+
+@pytest.mark.parametrize("verteilung", [("dreieck", 1.2, 1.0, 1.3), ("gleich", 1.0, 1.0),
+                                        ("normal", 1.0, -0.1), ("beta", 1.0, 2.0), ("gleich", 1.0)])
+def test_ungueltige_verteilung(verteilung):
+    with pytest.raises(ValueError):
+        pruefe_verteilung("units_faktor", verteilung)
+
+
+def test_ohne_pfade(plan):
+    with pytest.raises(ValueError):
+        simuliere(*plan, {}, pfade=0)
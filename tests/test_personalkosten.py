@@ -0,0 +1,80 @@
+﻿# -*- coding: utf-8 -*-
+"""Personalkosten-Zeitachse gegen den früheren Durchlauf über alle Mitarbeiter je Monat."""
+import random
+
+import numpy as np
+
+from personalkosten import PersonalZeitachse, berechne_personalkosten
+
+
+def _aktiv_alt(monat, jahr, m):
+    """mitarbeiter_aktiv_im aus der ursprünglichen app.py."""
+    try:
+        startmonat = m.get("startmonat")
+        if not startmonat or not isinstance(startmonat, int):
+            return False
+        if not (1 <= startmonat <= 12):
+            return False
+        startjahr = m.get("startjahr")
+        startjahr = int(startjahr) if startjahr not in (None, "",) else 1900
+        endmonat = m.get("endmonat")
+        endmonat = int(endmonat) if (endmonat not in (None, "",)) else None
+        endjahr = m.get("endjahr")
+        endjahr = int(endjahr) if (endjahr not in (None, "",)) else None
+        cur = int(jahr) * 12 + int(monat)
+        start = int(startjahr) * 12 + int(startmonat)
+        if endmonat is not None and endjahr is not None:
+            return start <= cur <= int(endjahr) * 12 + int(endmonat)
+        return start <= cur
+    except Exception:
+        return False
+
+
+def _personal(rnd, anzahl):
+    personal = []
+    for _ in range(anzahl):
+        m = {"rolle": "x", "gehalt": round(rnd.uniform(1000, 9000), 2),
+             "startmonat": rnd.randint(1, 12), "startjahr": rnd.randint(2020, 2030)}
+        art = rnd.random()
+        if art < 0.4:
+            m["endmonat"], m["endjahr"] = rnd.randint(1, 12), m["startjahr"] + rnd.randint(0, 6)
+        elif art < 0.5:
+            m["endmonat"] = rnd.randint(1, 12)          # ohne Endjahr: unbefristet
+        elif art < 0.55:
+            m["endmonat"], m["endjahr"] = 1, m["startjahr"] - 1     # Ende vor Beginn
+        elif art < 0.6:
+            del m["startjahr"]                          # ab 1900
+        elif art < 0.65:
+            m["startmonat"] = str(m["startmonat"])      # ungültig
+        elif art < 0.7:
+            m["startmonat"] = 13
+        personal.append(m)
+    return personal
+
+
+def test_wie_durchlauf_je_monat():
+    rnd = random.Random(7)
+    personal = _personal(rnd, 300)
+    zeitachse = PersonalZeitachse(personal)
+    monate = [(monat, jahr) for jahr in range(2018, 2040) for monat in range(1, 13)]
+    erwartet = np.array([sum(m["gehalt"] for m in personal if _aktiv_alt(monat, jahr, m))
+                         for monat, jahr in monate])
+
+    np.testing.assert_allclose([zeitachse.kosten(monat, jahr) for monat, jahr in monate], erwartet, atol=1e-6)
+    monat_num, jahr = np.array(monate).T
+    np.testing.assert_allclose(zeitachse.kosten_fuer(monat_num, jahr), erwartet, atol=1e-6)
+    np.testing.assert_allclose([berechne_personalkosten(monat, jahr, personal) for monat, jahr in monate[:24]],
+                               erwartet[:24], atol=1e-6)
+
+
+def test_ohne_mitarbeiter():
+    zeitachse = PersonalZeitachse([])
+    assert zeitachse.kosten(5, 2025) == 0.0
+    assert zeitachse.kosten_fuer_ordinale(np.array([0, 2025 * 12 + 5])).tolist() == [0.0, 0.0]
+
+
+def test_vor_beginn_und_nach_ende():
+    zeitachse = PersonalZeitachse([{"gehalt": 100.0, "startmonat": 3, "startjahr": 2025,
+                                    "endmonat": 4, "endjahr": 2025}])
+    assert [zeitachse.kosten(m, 2025) for m in (2, 3, 4, 5)] == [0.0, 100.0, 100.0, 0.0]
+    assert zeitachse.kosten(1, 2090) == 0.0
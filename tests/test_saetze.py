@@ -0,0 +1,60 @@
+﻿# -*- coding: utf-8 -*-
+"""Monatssätze und Verträge: einmal gelesen, gleiche Ergebnisse wie aus den Roh-Einträgen."""
+import numpy as np
+
+from berechnung import Monatssatz, baue_spalten, lies_monat, lies_monate
+from personalkosten import PersonalZeitachse, Vertrag, lies_vertrag, lies_vertraege
+
+MONATE = [
+    {"monat": "März", "jahr": 2025, "revenue": 10.0, "costs": 4.0,
+     "components": {"units": 2, "price": 5, "fixed_costs": 1, "variable_costs": 1.5}},
+    {"monat": "Q1", "jahr": "2025", "revenue": None, "costs": 1.0, "personnel_included": True},
+    {"monat": "Januar", "jahr": 2024, "revenue": 3.0, "costs": 0.0, "components": {"units": 1}},
+]
+PERSONAL = [
+    {"rolle": "Dev", "gehalt": "5000", "startmonat": 2, "startjahr": 2025, "endmonat": 4, "endjahr": 2025},
+    {"rolle": "Ops", "gehalt": "x", "startmonat": 1, "startjahr": 2025},
+    {"rolle": "QA", "gehalt": 1.0, "startmonat": 6, "startjahr": 2025, "endmonat": 1, "endjahr": 2025},
+]
+
+
+def test_monatssatz():
+    maerz, q1, januar = lies_monate(MONATE)
+    assert maerz == Monatssatz("März", 2025, 3, 2.0, 5.0, 1.0, 1.5, 10.0, 4.0, False, True, "")
+    assert maerz.ordinal == 2025 * 12 + 3
+    assert (q1.jahr, q1.monat_num, q1.revenue, q1.personnel_included) == (2025, 0, 0.0, True)
+    # Unvollständige Komponenten zählen als keine
+    assert not januar.hat_komponenten and januar.units == 0.0
+    assert lies_monate([maerz])[0] is maerz
+
+
+def test_spalten_aus_saetzen_wie_aus_eintraegen():
+    aus_eintraegen = baue_spalten(MONATE)
+    aus_saetzen = baue_spalten(lies_monate(MONATE))
+    assert aus_eintraegen.monat == aus_saetzen.monat == ["Januar", "März", "Q1"]
+    for a, b in zip(aus_eintraegen[1:], aus_saetzen[1:]):
+        assert np.array_equal(a, b)
+    assert baue_spalten(MONATE, jahr=2024).monat == ["Januar"]
+
+
+def test_vertraege():
+    dev, ops, qa = lies_vertraege(PERSONAL)
+    assert dev == Vertrag(2025 * 12 + 2, 2025 * 12 + 4, 5000.0, "Dev")
+    assert dev.aktiv(np.arange(2025 * 12 + 1, 2025 * 12 + 6)).tolist() == [False, True, True, True, False]
+    assert not ops.gueltig and not qa.gueltig
+    assert lies_vertraege([dev])[0] is dev
+    assert lies_vertrag({"rolle": "x"}).start is None
+
+    monat_num, jahr = np.tile(np.arange(1, 13), 3), np.repeat(np.arange(2024, 2027), 12)
+    np.testing.assert_array_equal(PersonalZeitachse(PERSONAL).kosten_fuer(monat_num, jahr),
+                                  PersonalZeitachse([dev, ops, qa]).kosten_fuer(monat_num, jahr))
+
+
+def test_saetze_je_datenstand(speicher):
+    speicher.setze_monat("Januar", 2025, {"revenue": 1.0, "costs": 0.0})
+    speicher.mitarbeiter_hinzufuegen({"rolle": "Dev", "gehalt": 1.0, "startmonat": 1, "startjahr": 2025})
+    saetze, vertraege = speicher.monatssaetze(), speicher.vertraege()
+    assert speicher.monatssaetze() is saetze and speicher.vertraege() is vertraege
+    speicher.setze_monat("Februar", 2025, {"revenue": 1.0, "costs": 0.0})
+    assert [s.monat for s in speicher.monatssaetze()] == ["Januar", "Februar"]
+    assert lies_monat(speicher.monate()[0]) == saetze[0]
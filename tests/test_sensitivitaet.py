@@ -0,0 +1,79 @@
+﻿# -*- coding: utf-8 -*-
+"""Sensitivitätsraster und Tornado gegen Einzelrechnungen mit berechne_guv."""
+import numpy as np
+import pytest
+
+import sensitivitaet
+from berechnung import baue_spalten, berechne_guv, kumuliert_und_break_even
+from personalkosten import PersonalZeitachse
+from sensitivitaet import baue_modell, groesste_gehaelter, raster, tornado
+
+PERSONAL = [{"rolle": "Chefarzt", "gehalt": 9000.0, "startmonat": 1, "startjahr": 2025},
+            {"rolle": "Pflege", "gehalt": 3500.0, "startmonat": 4, "startjahr": 2025,
+             "endmonat": 9, "endjahr": 2025},
+            {"rolle": "Verwaltung", "gehalt": 2500.0, "startmonat": 1, "startjahr": 2026}]
+
+
+@pytest.fixture
+def plan():
+    daten = [{"monat": m, "jahr": 2025, "revenue": 0, "costs": 0,
+              "components": {"units": 250 + 5 * i, "price": 80.0, "fixed_costs": 4000.0, "variable_costs": 20.0}}
+             for i, m in enumerate(["Januar", "Februar", "März", "April", "Mai", "Juni",
+                                    "Juli", "August", "September", "Oktober"])]
+    daten.append({"monat": "November", "jahr": 2025, "revenue": 9000.0, "costs": 1000.0})
+    daten.append({"monat": "Dezember", "jahr": 2025, "revenue": 9000.0, "costs": 1000.0, "personnel_included": True})
+    spalten = baue_spalten(daten)
+    return spalten, PersonalZeitachse(PERSONAL).kosten_fuer(spalten.monat_num, spalten.jahr)
+
+
+def _einzeln(spalten, faktoren, gehalt_faktor=None):
+    personal = [dict(m) for m in PERSONAL]
+    for index, faktor in (gehalt_faktor or {}).items():
+        personal[index]["gehalt"] *= faktor
+    pers = PersonalZeitachse(personal).kosten_fuer(spalten.monat_num, spalten.jahr)
+    kum, idx = kumuliert_und_break_even(berechne_guv(spalten, pers, **faktoren).profit)
+    return (-1 if idx is None else idx), kum[-1]
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_raster_wie_einzelrechnung(plan, monkeypatch, parallel):
+    spalten, pers = plan
+    monkeypatch.setattr(sensitivitaet, "BLOCKGROESSE", 7)
+    modell = baue_modell(spalten, pers, PERSONAL, mitarbeiter=[0, 1])
+    preise = np.linspace(0.5, 1.5, 6)
+    gehalt = np.linspace(0.5, 2.0, 5)
+    ergebnis = raster(modell, "preis_faktor", preise, "gehalt:1", gehalt, parallel=parallel)
+    assert ergebnis.break_even.shape == (5, 6)
+    for iy, g in enumerate(gehalt):
+        for ix, p in enumerate(preise):
+            be, gesamt = _einzeln(spalten, {"preis_faktor": p}, {1: g})
+            assert ergebnis.break_even[iy, ix] == be
+            assert ergebnis.gesamtgewinn[iy, ix] == pytest.approx(gesamt)
+
+
+def test_tornado(plan):
+    spalten, pers = plan
+    modell = baue_modell(spalten, pers, PERSONAL, mitarbeiter=[0])
+    (be, gesamt), zeilen = tornado(modell, 0.2)
+    assert (be, gesamt) == pytest.approx(_einzeln(spalten, {}))
+    assert {z.parameter for z in zeilen} == {"units_faktor", "preis_faktor", "fixkosten_faktor",
+                                             "varkosten_faktor", "gehalt:0"}
+    wirkung = [abs(z.gewinn_hoch - z.gewinn_niedrig) for z in zeilen]
+    assert wirkung == sorted(wirkung, reverse=True)
+    preis = next(z for z in zeilen if z.parameter == "preis_faktor")
+    assert preis.gewinn_hoch == pytest.approx(_einzeln(spalten, {"preis_faktor": 1.2})[1])
+    chef = next(z for z in zeilen if z.parameter == "gehalt:0")
+    assert chef.gewinn_niedrig == pytest.approx(_einzeln(spalten, {}, {0: 0.8})[1])
+
+
+def test_groesste_gehaelter(plan):
+    spalten, _ = plan
+    # Verwaltung beginnt erst nach dem Zeitraum
+    assert groesste_gehaelter(PERSONAL, spalten, 5) == [0, 1]
+    assert groesste_gehaelter(PERSONAL, spalten, 1) == [0]
+
+
+def test_gleicher_parameter_abgelehnt(plan):
+    modell = baue_modell(*plan, PERSONAL)
+    with pytest.raises(ValueError):
+        raster(modell, "preis_faktor", [1.0], "preis_faktor", [1.0])
@@ -0,0 +1,26 @@
+﻿# -*- coding: utf-8 -*-
+"""Produktivstart: Vorladen vor dem Fork, schlanker Import ohne Plotly."""
+import os
+import subprocess
+import sys
+
+
+def test_erstelle_app_laedt_vor(arbeitsbereiche, monkeypatch):
+    import app as app_modul
+    arbeitsbereiche.standard.setze_monat("Januar", 2025, {"revenue": 1.0, "costs": 0.0})
+    arbeitsbereiche.anlegen("nord").setze_monat("Januar", 2025, {"revenue": 2.0, "costs": 0.0})
+    arbeitsbereiche.schliessen("nord")
+    monkeypatch.setenv("FINANZPLAN_VORLADEN", " nord ,")
+
+    assert app_modul.erstelle_app() is app_modul.app
+    assert arbeitsbereiche.statistik()["offen"] == 1
+    # Die erste echte Anfrage kommt schon aus dem Figur-Cache
+    assert app_modul.app.test_client().get("/diagramm").headers["X-Cache"] == "HIT"
+
+
+def test_import_ohne_plotly():
+    ordner = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    ausgabe = subprocess.run(
+        [sys.executable, "-c", "import sys, app; print('plotly' in sys.modules)"],
+        cwd=ordner, capture_output=True, text=True, check=True).stdout
+    assert ausgabe.strip() == "False"
@@ -0,0 +1,324 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Planspeicher: Rundlauf je Backend (schreiben, neu öffnen, zweite Instanz), Neuladen nur bei
+Dateiänderung, abgeleitete Ergebnisse je Datenstand, sichere Schreibvorgänge.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import speicher_journal
+from conftest import BACKENDS, neuer_speicher, oeffne
+from datenspeicher import JsonDatei, _monatsschluessel, oeffne_speicher
+from speicher_journal import JournalSpeicher, VersionNichtVerfuegbar
+from speicher_sqlite import importiere_json
+
+KOMP = {"units": 10, "price": 50.0, "fixed_costs": 100.0, "variable_costs": 2.5}
+
+
+def _schreibe(pfad, inhalt):
+    with open(pfad, "w") as f:
+        json.dump(inhalt, f)
+
+
+def _befuellen(speicher):
+    speicher.setze_monat("Januar", 2025, {"revenue": 1000.0, "costs": 400.0, "profit": 600.0})
+    speicher.setze_monat("Februar", 2025, {"revenue": 0.0, "costs": 0.0}, components=KOMP)
+    speicher.setze_monate([("März", 2025, {"revenue": 7.0, "costs": 3.0}, None),
+                           ("Januar", 2026, {"revenue": 1.5, "costs": 0.5, "personnel_included": True}, None)])
+    speicher.aendere_monat("januar", 2025, {"costs": 450.0})
+    speicher.mitarbeiter_hinzufuegen({"rolle": "Dev", "gehalt": 5000.0, "startmonat": 1, "startjahr": 2025})
+    speicher.mitarbeiter_hinzufuegen({"rolle": "Ops", "gehalt": 4000.0, "startmonat": 3, "startjahr": 2025})
+    speicher.mitarbeiter_loeschen(0)
+
+
+def _inhalt(speicher):
+    spalten = tuple(np.asarray(s).tolist() for s in speicher.spalten())
+    # SQLite liefert fehlende optionale Felder (endmonat, endjahr) als None
+    personal = [{k: v for k, v in m.items() if v is not None} for m in speicher.personal()]
+    return spalten, personal
+
+
+def test_schreiben_und_lesen(speicher):
+    version = speicher.version
+    _befuellen(speicher)
+    assert speicher.version != version
+
+    januar = speicher.finde_monat("Januar", 2025)
+    assert (januar["revenue"], januar["costs"]) == (1000.0, 450.0)
+    assert speicher.finde_monat("Februar", 2025)["components"]["units"] == 10
+    assert speicher.finde_monat("Dezember", 2025) is None
+    assert [d["monat"] for d in speicher.backend.monate_im_jahr(2026)] == ["Januar"]
+    assert [m["rolle"] for m in speicher.personal()] == ["Ops"]
+    assert speicher.personalkosten().tolist() == [0.0, 0.0, 4000.0, 4000.0]
+
+    assert speicher.aendere_monat("April", 2025, {"costs": 1.0}) is False
+    assert speicher.mitarbeiter_loeschen(5) is False
+
+
+def test_neu_geoeffnet_gleicher_inhalt(backend_art, tmp_path):
+    a = neuer_speicher(backend_art, str(tmp_path))
+    _befuellen(a)
+    assert _inhalt(oeffne(backend_art, str(tmp_path))) == _inhalt(a)
+
+
+def test_zweite_instanz_sieht_aenderungen(backend_art, tmp_path):
+    a = neuer_speicher(backend_art, str(tmp_path))
+    b = oeffne(backend_art, str(tmp_path))
+    a.setze_monat("Mai", 2025, {"revenue": 10.0, "costs": 1.0})
+    assert b.finde_monat("Mai", 2025)["revenue"] == 10.0
+    version = a.version
+    b.mitarbeiter_hinzufuegen({"rolle": "QA", "gehalt": 3000.0, "startmonat": 5, "startjahr": 2025})
+    assert a.version != version
+    assert [m["rolle"] for m in a.personal()] == ["QA"]
+    assert a.personalkosten().tolist() == [3000.0]
+
+
+def test_backends_gleichwertig(tmp_path):
+    inhalte = []
+    for art in BACKENDS:
+        ordner = tmp_path / art
+        ordner.mkdir()
+        speicher = neuer_speicher(art, str(ordner))
+        _befuellen(speicher)
+        inhalte.append(_inhalt(speicher))
+    assert all(inhalt == inhalte[0] for inhalt in inhalte)
+
+
+def test_setzen_behaelt_fehlende_felder(speicher):
+    speicher.setze_monat("Januar", 2025, {"revenue": 10.0, "costs": 4.0, "personnel_included": True},
+                         components=KOMP)
+    speicher.setze_monat("Januar", 2025, {"costs": 5.0})
+    speicher.setze_monate([("Januar", 2025, {"revenue": 12.0}, None), ("Februar", 2025, {"costs": 1.0}, None)])
+    januar = speicher.finde_monat("Januar", 2025)
+    assert (januar["revenue"], januar["costs"], januar["personnel_included"]) == (12.0, 5.0, True)
+    assert januar["components"] == KOMP
+    assert speicher.finde_monat("Februar", 2025)["costs"] == 1.0
+
+
+def test_unbekannte_monatsnamen_getrennt(speicher):
+    speicher.setze_monat("Q1", 2025, {"revenue": 1.0, "costs": 0.0})
+    speicher.setze_monate([("Q2", 2025, {"revenue": 2.0, "costs": 0.0}, None)])
+    assert speicher.aendere_monat("q1", 2025, {"costs": 0.5})
+    assert speicher.finde_monat("q1", 2025)["revenue"] == 1.0
+    assert speicher.finde_monat("q1", 2025)["costs"] == 0.5
+    assert speicher.finde_monat("Q2", 2025)["revenue"] == 2.0
+    assert speicher.finde_monat("Q3", 2025) is None
+    assert len(speicher.monate()) == 2
+
+
+def test_sqlite_alter_schluessel_umgebaut(tmp_path):
+    pfad = str(tmp_path / "alt.sqlite")
+    con = sqlite3.connect(pfad)
+    con.execute("CREATE TABLE monate (jahr INTEGER NOT NULL, monat_num INTEGER NOT NULL, monat TEXT NOT NULL, "
+                "revenue REAL, costs REAL, profit REAL, personnel_included INTEGER, units NUMERIC, "
+                "price NUMERIC, fixed_costs NUMERIC, variable_costs NUMERIC, PRIMARY KEY (jahr, monat_num))")
+    con.execute("INSERT INTO monate VALUES (2025, 1, 'Januar', 5.0, 1.0, 4.0, 0, 10, 50.0, 100.0, 2.5)")
+    con.execute("INSERT INTO monate VALUES (2025, 0, 'Q1', 7.0, 0.0, 7.0, 0, NULL, NULL, NULL, NULL)")
+    con.commit()
+    con.close()
+    speicher = oeffne_speicher(None, None, pfad)
+    assert speicher.finde_monat("Januar", 2025)["components"] == KOMP
+    speicher.setze_monat("Q2", 2025, {"revenue": 2.0, "costs": 0.0})
+    assert speicher.finde_monat("Q1", 2025)["revenue"] == 7.0
+    assert len(speicher.monate()) == 3
+
+
+def test_monatsschluessel():
+    assert _monatsschluessel("März", "2025") == _monatsschluessel(" märz ", 2025)
+    assert _monatsschluessel("Q1", 2025) != _monatsschluessel("Q2", 2025)
+    assert _monatsschluessel("Q1", 2025) == _monatsschluessel("q1", 2025)
+
+
+def test_sqlite_import_aus_json(tmp_path):
+    json_speicher = neuer_speicher("json", str(tmp_path))
+    _befuellen(json_speicher)
+    sqlite_speicher = oeffne_speicher(None, None, str(tmp_path / "import.sqlite"))
+    importiere_json(str(tmp_path / "import.sqlite"), json_speicher.monate(), json_speicher.personal())
+    assert _inhalt(sqlite_speicher) == _inhalt(json_speicher)
+
+
+# --- JSON-Dateien ---
+
+def test_neu_laden_nur_bei_aenderung(tmp_path):
+    pfad = str(tmp_path / "daten.json")
+    _schreibe(pfad, [{"monat": "Januar", "jahr": 2025}])
+    datei = JsonDatei(pfad)
+    assert datei.lesen() is datei.lesen()
+    assert datei.neu_geladen == 1
+
+    _schreibe(pfad, [{"monat": "Januar", "jahr": 2025}, {"monat": "Februar", "jahr": 2025}])
+    assert len(datei.lesen()) == 2
+    assert datei.neu_geladen == 2
+
+
+def test_fehlende_datei_ist_leer(tmp_path):
+    assert JsonDatei(str(tmp_path / "fehlt.json")).lesen() == []
+
+
+def test_abgeleitet_je_datenstand(tmp_path):
+    daten, personal = str(tmp_path / "daten.json"), str(tmp_path / "personal.json")
+    _schreibe(daten, [{"monat": "Februar", "jahr": 2025, "revenue": 10.0, "costs": 1.0},
+                      {"monat": "Januar", "jahr": 2025, "revenue": 20.0, "costs": 2.0}])
+    _schreibe(personal, [{"rolle": "Dev", "gehalt": 100.0, "startmonat": 2, "startjahr": 2025}])
+    speicher = oeffne_speicher(daten, personal)
+
+    spalten = speicher.spalten()
+    assert speicher.spalten() is spalten
+    assert spalten.monat == ["Januar", "Februar"]
+    assert speicher.personalkosten().tolist() == [0.0, 100.0]
+    assert speicher.jahre() == [2025]
+
+    # Änderung von außen (anderer Prozess, Editor): neuer Datenstand
+    _schreibe(personal, [{"rolle": "Dev", "gehalt": 250.0, "startmonat": 1, "startjahr": 2025}])
+    assert speicher.personalkosten().tolist() == [250.0, 250.0]
+
+
+# --- Schreiben ---
+
+def test_parallele_aenderungen_gehen_nicht_verloren(tmp_path):
+    pfad = str(tmp_path / "daten.json")
+    _schreibe(pfad, [])
+    # Zwei Instanzen wie zwei Worker-Prozesse: nur die Dateisperre ordnet ihre Schreibvorgänge
+    dateien = [JsonDatei(pfad), JsonDatei(pfad)]
+
+    def _anhaengen(datei, nummer):
+        for i in range(40):
+            datei.aktualisieren(lambda liste: liste.append([nummer, i]))
+
+    threads = [threading.Thread(target=_anhaengen, args=(dateien[n % 2], n)) for n in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with open(pfad) as f:
+        inhalt = json.load(f)
+    assert sorted(map(tuple, inhalt)) == [(n, i) for n in range(6) for i in range(40)]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_fehlgeschlagene_aenderung_im_sammelauftrag(tmp_path):
+    pfad = str(tmp_path / "daten.json")
+    _schreibe(pfad, [])
+    datei = JsonDatei(pfad)
+    freigabe = threading.Event()
+
+    def _blockieren(liste):
+        freigabe.wait(5)
+        liste.append("erster")
+
+    def _fehler(liste):
+        liste.append("teilweise")
+        raise ValueError("ungültig")
+
+    ergebnisse = {}
+
+    def _auftrag(name, funktion):
+        try:
+            ergebnisse[name] = datei.aktualisieren(funktion)
+        except ValueError as e:
+            ergebnisse[name] = e
+
+    erster = threading.Thread(target=_auftrag, args=("erster", _blockieren))
+    erster.start()
+    while not datei._schreib_lock.locked():
+        time.sleep(0.001)
+    weitere = [threading.Thread(target=_auftrag, args=(name, funktion)) for name, funktion in
+               [("a", lambda liste: liste.append("a")), ("fehler", _fehler), ("b", lambda liste: liste.append("b"))]]
+    for t in weitere:
+        t.start()
+    while len(datei._warteschlange) < 3:
+        time.sleep(0.001)
+    freigabe.set()
+    for t in [erster] + weitere:
+        t.join()
+
+    assert isinstance(ergebnisse["fehler"], ValueError)
+    # Die drei Nachzügler wurden gemeinsam geschrieben, der fehlerhafte ohne Spuren
+    assert datei.schreibvorgaenge == 2
+    assert datei.lesen() == ["erster", "a", "b"]
+
+
+# --- Journal ---
+
+def _journal(tmp_path, n=0):
+    speicher = JournalSpeicher(str(tmp_path / "journal"))
+    for i in range(n):
+        speicher.setze_monat("Januar", 2025, {"revenue": float(i), "costs": 0.0})
+    return speicher
+
+
+def test_journal_stand_bei_und_unterschied(tmp_path):
+    speicher = _journal(tmp_path, 3)
+    speicher.mitarbeiter_hinzufuegen({"rolle": "Dev", "gehalt": 1.0, "startmonat": 1, "startjahr": 2025})
+    speicher.setze_monat("Februar", 2025, {"revenue": 9.0, "costs": 0.0})
+
+    assert speicher.stand_bei(2).finde("Januar", 2025)["revenue"] == 1.0
+    assert speicher.stand_bei(0).monate == []
+    with pytest.raises(VersionNichtVerfuegbar):
+        speicher.stand_bei(speicher.version + 1)
+
+    diff = speicher.unterschied(2, speicher.version)
+    assert [d["monat"] for d in diff["monate"]["neu"]] == ["Februar"]
+    assert diff["monate"]["geaendert"][0]["nachher"]["revenue"] == 2.0
+    assert [m["rolle"] for m in diff["personal"]["hinzugefuegt"]] == ["Dev"]
+    assert [e["art"] for e in speicher.historie(4)] == ["mitarbeiter_neu", "monate"]
+
+
+
+def test_journal_stand_bei_liefert_kopie(tmp_path):
+    speicher = _journal(tmp_path, 2)
+    kopie = speicher.stand_bei(speicher.version)
+    kopie.monate[0]["revenue"] = -1.0
+    kopie.monate.append({"monat": "Mai", "jahr": 2025})
+    assert speicher.finde_monat("Januar", 2025)["revenue"] == 1.0
+    assert len(speicher.monate()) == 1
+
+def test_journal_verdichtung(tmp_path):
+    speicher = _journal(tmp_path, 25)
+    speicher.verdichten()
+    speicher.setze_monat("Januar", 2025, {"revenue": 100.0, "costs": 0.0})
+    neu = _journal(tmp_path)
+    assert neu.version == speicher.version == 26
+    assert neu.finde_monat("Januar", 2025)["revenue"] == 100.0
+    # Frühere Versionen kommen aus Archivsegment und Schnappschuss
+    assert neu.stand_bei(10).finde("Januar", 2025)["revenue"] == 9.0
+    assert neu.stand_bei(25).finde("Januar", 2025)["revenue"] == 24.0
+
+
+
+def test_journal_schnappschuesse_ausgeduennt(tmp_path, monkeypatch):
+    monkeypatch.setattr(speicher_journal, "SCHNAPPSCHUSS_ABSTAND", 1)
+    speicher = _journal(tmp_path)
+    for i in range(200):
+        speicher.setze_monat("Januar", 2025, {"revenue": float(i), "costs": 0.0})
+        speicher.verdichten()
+    versionen = speicher._schnappschuesse()
+    assert versionen[-speicher_journal.MAX_SCHNAPPSCHUESSE:] == list(range(191, 201))
+    # Ältere Schnappschüsse etwa logarithmisch verteilt, die ältesten bleiben erhalten
+    assert len(versionen) < speicher_journal.MAX_SCHNAPPSCHUESSE + 10
+    assert versionen[0] <= 2
+    for v in (1, 50, 120, 199):
+        assert speicher.stand_bei(v).finde("Januar", 2025)["revenue"] == float(v - 1)
+
+def test_journal_api(client, arbeitsbereiche):
+    nord = arbeitsbereiche.anlegen("nord", journal=True)
+    nord.setze_monat("Januar", 2025, {"revenue": 10.0, "costs": 4.0})
+    nord.setze_monat("Januar", 2025, {"revenue": 20.0, "costs": 4.0})
+
+    verlauf = client.get("/plan/nord/api/v1/journal").get_json()
+    assert verlauf["version"] == 2 and len(verlauf["ereignisse"]) == 2
+    stand = client.get("/plan/nord/api/v1/journal/1").get_json()
+    assert stand["summen"]["gewinn"] == 6.0
+    diff = client.get("/plan/nord/api/v1/journal/unterschied?von=1").get_json()
+    assert diff["monate"]["geaendert"][0]["nachher"]["revenue"] == 20.0
+
+    assert client.get("/plan/nord/api/v1/journal/9").status_code == 404
+    assert client.get("/plan/nord/api/v1/journal?von=x").status_code == 400
+    # JSON-Pläne haben keine Historie
+    assert client.get("/api/v1/journal").status_code == 404
@@ -0,0 +1,83 @@
+﻿# -*- coding: utf-8 -*-
+"""Tarifliche Personalkosten (Stufenaufstieg, Erhöhungen, Arbeitgeberanteil) gegen eine Monatsschleife."""
+import random
+
+import numpy as np
+import pytest
+
+from personalkosten import PersonalZeitachse, lies_vertraege, vertragskosten
+from tarife import Tariftabellen
+
+
+def _definition(rnd):
+    definition = {"arbeitgeberanteil": 0.2, "tarife": {}}
+    for t in range(3):
+        gruppen = {}
+        for g in range(rnd.randint(1, 4)):
+            n = rnd.randint(1, 6)
+            gruppen[f"E{g}"] = {"stufen": sorted(rnd.randrange(3000, 9000, 50) for _ in range(n)),
+                                "laufzeit": [rnd.randint(1, 48) for _ in range(n - 1)]}
+        tarif = {"gruppen": gruppen,
+                 "erhoehungen": [{"monat": rnd.randint(1, 12), "jahr": rnd.randint(2020, 2040),
+                                  "prozent": rnd.uniform(0, 6)} for _ in range(rnd.randint(0, 4))]}
+        if t:
+            tarif["arbeitgeberanteil"] = rnd.uniform(0, 0.3)
+        definition["tarife"][f"T{t}"] = tarif
+    return definition
+
+
+def _mitarbeiter(rnd, definition, anzahl):
+    personal = []
+    for _ in range(anzahl):
+        m = {"rolle": "x", "gehalt": float(rnd.randrange(1000, 5000)), "startmonat": rnd.randint(1, 12),
+             "startjahr": rnd.randint(2018, 2035), "endmonat": None, "endjahr": None}
+        if rnd.random() < 0.5:
+            m["endmonat"], m["endjahr"] = rnd.randint(1, 12), m["startjahr"] + rnd.randint(1, 10)
+        if rnd.random() < 0.7:
+            tarif = rnd.choice(list(definition["tarife"]))
+            gruppe = rnd.choice(list(definition["tarife"][tarif]["gruppen"]))
+            stufen = len(definition["tarife"][tarif]["gruppen"][gruppe]["stufen"])
+            m.update(tarif=tarif, entgeltgruppe=gruppe, stufe=rnd.randint(1, stufen))
+        personal.append(m)
+    return personal
+
+
+def _kosten(definition, m, ordinal):
+    """Kosten eines Mitarbeiters in einem Monat, Monat für Monat nachgerechnet."""
+    start = m["startjahr"] * 12 + m["startmonat"]
+    ende = m["endjahr"] * 12 + m["endmonat"] if m.get("endjahr") else None
+    if ordinal < start or (ende is not None and ordinal > ende):
+        return 0.0
+    if not m.get("tarif"):
+        return m["gehalt"]
+    tarif = definition["tarife"][m["tarif"]]
+    gruppe = tarif["gruppen"][m["entgeltgruppe"]]
+    stufe, dauer = m["stufe"] - 1, ordinal - start
+    while stufe < len(gruppe["laufzeit"]) and dauer >= gruppe["laufzeit"][stufe]:
+        dauer -= gruppe["laufzeit"][stufe]
+        stufe += 1
+    faktor = 1.0
+    for e in tarif["erhoehungen"]:
+        if ordinal >= e["jahr"] * 12 + e["monat"]:
+            faktor *= 1 + e["prozent"] / 100
+    return gruppe["stufen"][stufe] * faktor * (1 + tarif.get("arbeitgeberanteil", definition["arbeitgeberanteil"]))
+
+
+def test_verlauf_und_matrix_wie_monatsschleife():
+    rnd = random.Random(3)
+    definition = _definition(rnd)
+    tabellen = Tariftabellen(definition)
+    personal = _mitarbeiter(rnd, definition, 150)
+    ordinale = np.arange(2015 * 12, 2050 * 12)
+    erwartet = np.array([[_kosten(definition, m, o) for o in ordinale] for m in personal])
+
+    np.testing.assert_allclose(PersonalZeitachse(personal, tabellen).kosten_fuer_ordinale(ordinale),
+                               erwartet.sum(axis=0), atol=1e-6)
+    np.testing.assert_allclose(vertragskosten(lies_vertraege(personal), ordinale, tabellen), erwartet, atol=1e-6)
+
+
+def test_ungueltige_tarifdatei():
+    with pytest.raises(ValueError):
+        Tariftabellen({"tarife": {}})
+    with pytest.raises(ValueError):
+        Tariftabellen({"tarife": {"T": {"gruppen": {"E1": {"stufen": [1, 2], "laufzeit": []}}}}})
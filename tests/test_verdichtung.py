@@ -0,0 +1,145 @@
+﻿# -*- coding: utf-8 -*-
+"""Verdichtung: Würfel gegen Summen über die Monatszeilen, Nachführung, Konsolidierung mehrerer Pläne."""
+import random
+
+import numpy as np
+import pytest
+
+from berechnung import MONATSNAMEN
+from verdichtung import GROESSEN, ORGEBENEN, STANDARD_KOSTENSTELLE, ZEITEBENEN, Hierarchie, Wuerfel, konsolidiere
+
+HIERARCHIE = Hierarchie({"a": "nord", "b": "nord", "plan": "sued", STANDARD_KOSTENSTELLE: "sued"}, {"nord": "ost"})
+
+
+def _summen_je_zeile(stand, kostenstelle, ebene, zeit, von, bis):
+    """Dieselben Summen Zeile für Zeile aufaddiert."""
+    spalten = stand.spalten
+    perioden = ZEITEBENEN[zeit]
+    summen = {}
+    for i in range(len(spalten.monat)):
+        if not spalten.monat_num[i] or not von <= spalten.jahr[i] <= bis:
+            continue
+        name = HIERARCHIE.schluessel(ebene, spalten.kostenstelle[i] or kostenstelle)
+        zeile = summen.setdefault(name, np.zeros((len(GROESSEN), (bis - von + 1) * perioden)))
+        spalte = (spalten.jahr[i] - von) * perioden + (spalten.monat_num[i] - 1) * perioden // 12
+        werte = (stand.guv.revenue[i], stand.guv.costs[i], stand.guv.profit[i], stand.personal[i])
+        zeile[:, spalte] += werte
+    return summen
+
+
+def _pruefe(wuerfel, stand, kostenstelle):
+    for ebene in ORGEBENEN:
+        for zeit in ZEITEBENEN:
+            von, bis = 2024, 2027
+            schluessel, perioden, werte = wuerfel.abfrage(ebene, zeit, von, bis)
+            erwartet = _summen_je_zeile(stand, kostenstelle, ebene, zeit, von, bis)
+            assert schluessel == sorted(erwartet) or not erwartet
+            assert len(perioden) == (bis - von + 1) * ZEITEBENEN[zeit]
+            for k, name in enumerate(schluessel):
+                np.testing.assert_allclose(werte[:, k], erwartet.get(name, 0.0), atol=1e-6)
+
+
+def _zufaellige_aenderung(speicher, rnd):
+    art = rnd.random()
+    ks = rnd.choice([STANDARD_KOSTENSTELLE, ""])
+    if art < 0.5:
+        speicher.setze_monat(rnd.choice(MONATSNAMEN), rnd.randint(2025, 2026),
+                             {"revenue": float(rnd.randrange(1000)), "costs": float(rnd.randrange(500)),
+                              "kostenstelle": ks})
+    elif art < 0.7 and speicher.monate():
+        m = rnd.choice([m for m in speicher.monate() if m["jahr"] < 2027])
+        speicher.aendere_monat(m["monat"], m["jahr"], {"revenue": 5.0, "kostenstelle": ks})
+    elif art < 0.85:
+        speicher.mitarbeiter_hinzufuegen({"rolle": "x", "gehalt": 100.0, "startmonat": rnd.randint(1, 12),
+                                          "startjahr": 2025, "endmonat": 6, "endjahr": 2026})
+    elif speicher.personal():
+        speicher.mitarbeiter_loeschen(0)
+
+
+def test_wuerfel_nachgefuehrt_wie_neu_aufgebaut(speicher):
+    rnd = random.Random(21)
+    speicher.setze_monat("Januar", 2025, {"revenue": 1.0, "costs": 0.0})
+    # Ältere Daten können eine fremde Kostenstelle tragen
+    speicher.backend.setze_monat("Dezember", 2027, {"revenue": 1.0, "costs": 0.0, "kostenstelle": "a"})
+    speicher.setze_monat("Q1", 2025, {"revenue": 1.0, "costs": 0.0})
+    speicher.wuerfel(HIERARCHIE)
+    for _ in range(150):
+        _zufaellige_aenderung(speicher, rnd)
+        wuerfel = speicher.wuerfel(HIERARCHIE)
+        assert wuerfel.stand is speicher.stand()
+        _pruefe(wuerfel, speicher.stand(), STANDARD_KOSTENSTELLE)
+    assert speicher.wuerfel_nachgefuehrt > 0
+    # Ein unveränderter Stand liefert denselben Würfel
+    assert speicher.wuerfel(HIERARCHIE) is wuerfel
+
+
+def test_plan_ist_eine_kostenstelle(speicher):
+    speicher.setze_monat("Januar", 2025, {"revenue": 1.0, "costs": 0.0, "kostenstelle": STANDARD_KOSTENSTELLE})
+    with pytest.raises(ValueError):
+        speicher.setze_monat("Januar", 2025, {"revenue": 2.0, "costs": 0.0, "kostenstelle": "a"})
+    with pytest.raises(ValueError):
+        speicher.setze_monate([("Februar", 2025, {"revenue": 2.0}, None),
+                               ("Januar", 2025, {"revenue": 2.0, "kostenstelle": "b"}, None)])
+    with pytest.raises(ValueError):
+        speicher.aendere_monat("Januar", 2025, {"kostenstelle": "a"})
+    assert len(speicher.monate()) == 1
+    assert speicher.finde_monat("Januar", 2025)["revenue"] == 1.0
+
+
+def test_konsolidiere_mehrere_plaene(tmp_path):
+    from conftest import neuer_speicher
+    wuerfel = []
+    for name, umsatz, jahr in (("a", 10.0, 2025), ("b", 5.0, 2026), ("plan", 1.0, 2025)):
+        ordner = tmp_path / name
+        ordner.mkdir()
+        speicher = neuer_speicher("json", str(ordner), kostenstelle=name)
+        speicher.setze_monat("April", jahr, {"revenue": umsatz, "costs": 0.0})
+        wuerfel.append(speicher.wuerfel(HIERARCHIE))
+
+    daten = konsolidiere(wuerfel, "standort", "jahr")
+    assert daten["perioden"] == ["2025", "2026"]
+    assert daten["schluessel"] == ["nord", "sued"]
+    assert [r.tolist() for r in daten["werte"]["revenue"]] == [[10.0, 5.0], [1.0, 0.0]]
+    daten = konsolidiere(wuerfel, "gruppe", "quartal", 2025, 2025)
+    assert daten["schluessel"] == ["gesamt", "ost"]
+    assert daten["werte"]["revenue"][1].tolist() == [0.0, 10.0, 0.0, 0.0]
+    with pytest.raises(ValueError):
+        konsolidiere(wuerfel, "abteilung", "jahr")
+    with pytest.raises(ValueError):
+        konsolidiere(wuerfel, "standort", "woche")
+
+
+def test_verdichtung_route(client, arbeitsbereiche, monkeypatch):
+    import app as app_modul
+    monkeypatch.setattr(app_modul, "hierarchie", Hierarchie({"nord": "n", "standard": "n"}))
+    arbeitsbereiche.standard.setze_monat("Januar", 2025, {"revenue": 1.0, "costs": 0.0})
+    arbeitsbereiche.anlegen("nord").setze_monat("Januar", 2025, {"revenue": 2.0, "costs": 0.0})
+    arbeitsbereiche.anlegen("sued").setze_monat("Februar", 2025, {"revenue": 4.0, "costs": 1.0})
+
+    daten = client.get("/api/v1/verdichtung?plaene=alle&ebene=standort&zeit=jahr").get_json()
+    assert daten["schluessel"] == ["n", "sued"]
+    assert daten["werte"]["revenue"] == [[3.0], [4.0]]
+    assert sorted(daten["datenstand"]) == ["nord", "standard", "sued"]
+
+    daten = client.get("/plan/sued/api/v1/verdichtung?zeit=quartal").get_json()
+    assert daten["werte"]["profit"] == [[3.0, 0.0, 0.0, 0.0]]
+    assert client.get("/api/v1/verdichtung?plaene=ost").status_code == 404
+    assert client.get("/api/v1/verdichtung?zeit=woche").status_code == 400
+
+
+def test_verdichtung_mehr_plaene_als_offen(client, arbeitsbereiche):
+    arbeitsbereiche.max_offen = 2
+    for i in range(1, 6):
+        arbeitsbereiche.anlegen(f"klinik-{i}").setze_monat("Januar", 2025, {"revenue": float(i), "costs": 0.0})
+    daten = client.get("/api/v1/verdichtung?plaene=alle").get_json()
+    assert daten["schluessel"] == [f"klinik-{i}" for i in range(1, 6)]
+    assert daten["werte"]["revenue"] == [[float(i)] for i in range(1, 6)]
+    # Das LRU wächst auf die Zahl der Pläne; weitere Abfragen öffnen keinen Plan neu
+    assert arbeitsbereiche.max_offen == 5
+    geoeffnet = arbeitsbereiche.statistik()["geoeffnet"]
+    for _ in range(3):
+        assert client.get("/api/v1/verdichtung?plaene=alle").status_code == 200
+    assert arbeitsbereiche.statistik()["geoeffnet"] == geoeffnet
+    # Nicht vorhandene Pläne vergrößern das LRU nicht
+    assert client.get("/api/v1/verdichtung?plaene=" + ",".join(f"x{i}" for i in range(9))).status_code == 404
+    assert arbeitsbereiche.max_offen == 5
@@ -0,0 +1,214 @@
+﻿# -*- coding: utf-8 -*-
+"""
+Verdichtete Summen: Monat -> Quartal -> Jahr und Kostenstelle -> Standort -> Gruppe.
+
+Ein Plan ist eine Kostenstelle (sein Name, beim Standardplan
+STANDARD_KOSTENSTELLE); das Feld "kostenstelle" eines Monats darf nur diese
+nennen (siehe Planspeicher), ältere Daten mit abweichender Angabe werden unter
+ihr geführt. Ein Wuerfel hält für einen
+Plan Umsatz, Kosten, Gewinn und Personalkosten für jede Kombination aus Zeit-
+und Organisationsebene als Array (Größen x Schlüssel x Jahre x Perioden). Eine
+Abfrage schneidet nur noch den gewünschten Bereich heraus, ihr Aufwand
+entspricht der Zahl der Ergebniszellen. Bei gezielt nachgeführten GuV-Ständen
+(inkrementell.py) werden nur die geänderten Monate aus- und wieder
+eingebucht; Würfel sind wie die Stände unveränderlich.
+
+Die Zuordnung Kostenstelle -> Standort -> Gruppe steht in einer JSON-Datei:
+    {"kostenstellen": {"klinik-nord": "nord", ...}, "standorte": {"nord": "sued-ost", ...}}
+Nicht zugeordnete Kostenstellen bilden einen eigenen Standort, Standorte ohne
+Gruppe gehören zur Gruppe STANDARDGRUPPE.
+"""
+import json
+import os
+
+import numpy as np
+
+ZEITEBENEN = {"monat": 12, "quartal": 4, "jahr": 1}     # Perioden je Jahr
+ORGEBENEN = ("kostenstelle", "standort", "gruppe")
+GROESSEN = ("revenue", "costs", "profit", "personal")
+
+STANDARD_KOSTENSTELLE = "standard"      # Kostenstelle des Standardplans
+STANDARDGRUPPE = "gesamt"
+
+
+class Hierarchie:
+    """Zuordnung Kostenstelle -> Standort -> Gruppe."""
+
+    def __init__(self, standorte=None, gruppen=None):
+        self.standorte = dict(standorte or {})      # Kostenstelle -> Standort
+        self.gruppen = dict(gruppen or {})          # Standort -> Gruppe
+
+    @classmethod
+    def laden(cls, pfad) -> "Hierarchie":
+        """Leere Hierarchie, wenn die Datei fehlt; ValueError bei ungültigem Inhalt."""
+        if not os.path.exists(pfad):
+            return cls()
+        with open(pfad, "r", encoding="utf-8") as f:
+            inhalt = json.load(f)
+        if not isinstance(inhalt, dict):
+            raise ValueError(f"{pfad}: erwartet ein Objekt mit 'kostenstellen' und 'standorte'")
+        return cls(inhalt.get("kostenstellen"), inhalt.get("standorte"))
+
+    def schluessel(self, ebene: str, kostenstelle: str) -> str:
+        if ebene == "kostenstelle":
+            return kostenstelle
+        standort = self.standorte.get(kostenstelle, kostenstelle)
+        if ebene == "standort":
+            return standort
+        return self.gruppen.get(standort, STANDARDGRUPPE)
+
+
+def _perioden_labels(zeit: str, von: int, bis: int) -> list:
+    if zeit == "jahr":
+        return [str(j) for j in range(von, bis + 1)]
+    if zeit == "quartal":
+        return [f"{j}-Q{q}" for j in range(von, bis + 1) for q in range(1, 5)]
+    return [f"{j}-{m:02d}" for j in range(von, bis + 1) for m in range(1, 13)]
+
+
+class Wuerfel:
+    """Unveränderliche Summen eines GuV-Stands je Zeit- und Organisationsebene."""
+
+    __slots__ = ("stand", "kostenstelle", "hierarchie", "jahr0", "jahre", "schluessel", "_zuordnung", "_summen")
+
+    def __init__(self, stand, kostenstelle: str, hierarchie: Hierarchie, jahr0: int, jahre: int,
+                 schluessel: dict, zuordnung: dict, summen: dict):
+        self.stand = stand                  # GuVStand, aus dem der Würfel stammt
+        self.kostenstelle = kostenstelle    # für Monate ohne eigene Kostenstelle
+        self.hierarchie = hierarchie
+        self.jahr0 = jahr0
+        self.jahre = jahre
+        self.schluessel = schluessel        # Ebene -> Liste der Schlüssel
+        self._zuordnung = zuordnung         # Ebene -> Index je Kostenstellen-Index
+        self._summen = summen               # (Ebene, Zeit) -> Größen x Schlüssel x Jahre x Perioden
+
+    @classmethod
+    def aufbauen(cls, stand, kostenstelle: str, hierarchie: Hierarchie) -> "Wuerfel":
+        spalten = stand.spalten
+        gueltig = spalten.monat_num > 0
+        ks = [k or kostenstelle for k in spalten.kostenstelle[gueltig]]
+        kostenstellen = sorted(set(ks))
+        jahr = spalten.jahr[gueltig]
+        jahr0 = int(jahr.min()) if len(jahr) else 0
+        jahre = int(jahr.max()) - jahr0 + 1 if len(jahr) else 0
+
+        schluessel, zuordnung = {}, {}
+        for ebene in ORGEBENEN:
+            namen = [hierarchie.schluessel(ebene, k) for k in kostenstellen]
+            schluessel[ebene] = sorted(set(namen))
+            position = {n: i for i, n in enumerate(schluessel[ebene])}
+            zuordnung[ebene] = np.array([position[n] for n in namen], dtype=np.int64)
+
+        wuerfel = cls(stand, kostenstelle, hierarchie, jahr0, jahre, schluessel, zuordnung, {})
+        for ebene in ORGEBENEN:
+            for zeit, perioden in ZEITEBENEN.items():
+                wuerfel._summen[(ebene, zeit)] = np.zeros(
+                    (len(GROESSEN), len(schluessel[ebene]), jahre, perioden), dtype=np.float64)
+        position = {k: i for i, k in enumerate(kostenstellen)}
+        ks_index = np.array([position[k] for k in ks], dtype=np.int64)
+        wuerfel._buchen(ks_index, jahr, spalten.monat_num[gueltig], wuerfel._werte(stand, gueltig), +1)
+        return wuerfel
+
+    @staticmethod
+    def _werte(stand, zeilen) -> np.ndarray:
+        """Größen x Zeilen."""
+        guv = stand.guv
+        return np.stack([guv.revenue[zeilen], guv.costs[zeilen], guv.profit[zeilen], stand.personal[zeilen]])
+
+    def _buchen(self, ks_index, jahr, monat_num, werte, vorzeichen: int):
+        """Addiert (bzw. zieht ab) werte[:, i] in allen Summen für Zeile i."""
+        j = np.asarray(jahr, dtype=np.int64) - self.jahr0
+        m = np.asarray(monat_num, dtype=np.int64) - 1
+        for (ebene, zeit), summe in self._summen.items():
+            periode = m * ZEITEBENEN[zeit] // 12
+            index = self._zuordnung[ebene][ks_index]
+            for g in range(len(GROESSEN)):
+                np.add.at(summe[g], (index, j, periode), vorzeichen * werte[g])
+
+    def nachgefuehrt(self, neu):
+        """
+        Würfel zum Nachfolger `neu` des eigenen Stands (neu.aenderung gesetzt); None,
+        wenn eine neue Kostenstelle oder ein Jahr außerhalb des Würfels hinzukommt.
+        """
+        if neu is self.stand:
+            return self
+        aenderung = neu.aenderung
+        if aenderung is None:
+            return None
+        zeilen = np.arange(len(neu))[aenderung.zeilen]
+        alt_zeilen = aenderung.alter_index(zeilen)
+        alt_zeilen = alt_zeilen[alt_zeilen >= 0]
+        alt_zeilen = alt_zeilen[self.stand.spalten.monat_num[alt_zeilen] > 0]
+        zeilen = zeilen[neu.spalten.monat_num[zeilen] > 0]
+
+        position = {k: i for i, k in enumerate(self.schluessel["kostenstelle"])}
+        try:
+            ks_alt = np.array([position[k or self.kostenstelle]
+                               for k in self.stand.spalten.kostenstelle[alt_zeilen]], dtype=np.int64)
+            ks_neu = np.array([position[k or self.kostenstelle]
+                               for k in neu.spalten.kostenstelle[zeilen]], dtype=np.int64)
+        except KeyError:
+            return None
+        jahr = neu.spalten.jahr[zeilen]
+        if len(jahr) and (jahr.min() < self.jahr0 or jahr.max() >= self.jahr0 + self.jahre):
+            return None
+
+        wuerfel = Wuerfel(neu, self.kostenstelle, self.hierarchie, self.jahr0, self.jahre,
+                          self.schluessel, self._zuordnung, {k: v.copy() for k, v in self._summen.items()})
+        alt = self.stand.spalten
+        wuerfel._buchen(ks_alt, alt.jahr[alt_zeilen], alt.monat_num[alt_zeilen],
+                        self._werte(self.stand, alt_zeilen), -1)
+        wuerfel._buchen(ks_neu, jahr, neu.spalten.monat_num[zeilen], self._werte(neu, zeilen), +1)
+        return wuerfel
+
+    def abfrage(self, ebene: str, zeit: str, von=None, bis=None):
+        """
+        (Schlüssel, Perioden-Labels, Größen x Schlüssel x Perioden) für die Jahre von..bis
+        (einschließlich, Standard: alle Jahre des Würfels). Jahre außerhalb sind 0.
+        """
+        von = self.jahr0 if von is None else von
+        bis = self.jahr0 + self.jahre - 1 if bis is None else bis
+        summe = self._summen[(ebene, zeit)]
+        perioden = ZEITEBENEN[zeit]
+        jahre = max(bis - von + 1, 0)
+        werte = np.zeros((len(GROESSEN), len(self.schluessel[ebene]), jahre, perioden), dtype=np.float64)
+        lo, hi = max(von, self.jahr0), min(bis, self.jahr0 + self.jahre - 1)
+        if lo <= hi:
+            werte[:, :, lo - von:hi - von + 1] = summe[:, :, lo - self.jahr0:hi - self.jahr0 + 1]
+        return self.schluessel[ebene], _perioden_labels(zeit, von, bis), werte.reshape(len(GROESSEN), -1, jahre * perioden)
+
+
+def konsolidiere(wuerfel_liste: list, ebene: str, zeit: str, von=None, bis=None) -> dict:
+    """
+    Summen mehrerer Pläne (Würfel) auf Ebene `ebene`; gleiche Schlüssel verschiedener
+    Pläne (z. B. derselbe Standort) werden addiert. Ohne von/bis gilt der gemeinsame
+    Jahresbereich aller Würfel.
+    """
+    if ebene not in ORGEBENEN:
+        raise ValueError(f"Unbekannte Ebene '{ebene}' (erlaubt: {', '.join(ORGEBENEN)})")
+    if zeit not in ZEITEBENEN:
+        raise ValueError(f"Unbekannte Zeitebene '{zeit}' (erlaubt: {', '.join(ZEITEBENEN)})")
+    belegt = [w for w in wuerfel_liste if w.jahre]
+    if von is None:
+        von = min((w.jahr0 for w in belegt), default=0)
+    if bis is None:
+        bis = max((w.jahr0 + w.jahre - 1 for w in belegt), default=von - 1)
+    if bis < von:
+        raise ValueError("'bis' liegt vor 'von'")
+
+    summen, perioden = {}, _perioden_labels(zeit, von, bis)
+    for w in wuerfel_liste:
+        schluessel, _, werte = w.abfrage(ebene, zeit, von, bis)
+        for i, name in enumerate(schluessel):
+            if name in summen:
+                summen[name] += werte[:, i]
+            else:
+                summen[name] = werte[:, i].copy()
+    namen = sorted(summen)
+    return {
+        "ebene": ebene,
+        "zeit": zeit,
+        "perioden": perioden,
+        "schluessel": namen,
+        "werte": {g: [np.round(summen[n][k], 2) for n in namen] for k, g in enumerate(GROESSEN)},
+    }
@@ -0,0 +1,10 @@
+﻿# -*- coding: utf-8 -*-
+"""
+WSGI-Einstiegspunkt für den Produktivbetrieb.
+
+    gunicorn -c gunicorn.conf.py          # liest wsgi:app aus der Konfiguration
+    waitress-serve --threads 8 wsgi:app
+"""
+from app import erstelle_app
+
+app = erstelle_app()